@@ -0,0 +1,86 @@
+"""add leaderboard_standings materialized table
+
+Precomputed per-(user, period) scores backing /leaderboard/global,
+/leaderboard/school and the weekly friends board — see
+services/leaderboard.py. Backfills all-time rows from users and the
+current week from completed, non-abandoned study_sessions so the boards
+are populated the moment the new code starts serving.
+
+Also merges the two heads left by a4b5c6d8e29 / b5c6d7e89f30, which both
+descend from z3a4b5c67d28.
+
+Revision ID: a1l2b3d4s5t6
+Revises: a4b5c6d8e29, b5c6d7e89f30
+Create Date: 2026-10-17
+"""
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "a1l2b3d4s5t6"
+down_revision = ("a4b5c6d8e29", "b5c6d7e89f30")
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS leaderboard_standings (
+            id          SERIAL PRIMARY KEY,
+            user_id     INTEGER NOT NULL REFERENCES users(id),
+            period_key  VARCHAR(16) NOT NULL,
+            school_key  VARCHAR(255) NULL,
+            minutes     INTEGER NOT NULL DEFAULT 0,
+            updated_at  TIMESTAMP NOT NULL DEFAULT NOW(),
+            CONSTRAINT uq_leaderboard_standing UNIQUE (user_id, period_key)
+        )
+        """
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_leaderboard_standings_user_id "
+        "ON leaderboard_standings (user_id)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_leaderboard_standings_period_minutes "
+        "ON leaderboard_standings (period_key, minutes)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_leaderboard_standings_period_school_minutes "
+        "ON leaderboard_standings (period_key, school_key, minutes)"
+    )
+
+    op.execute(
+        """
+        INSERT INTO leaderboard_standings (user_id, period_key, school_key, minutes, updated_at)
+        SELECT id, 'all_time', NULLIF(LOWER(TRIM(school)), ''), COALESCE(total_study_minutes, 0), NOW()
+        FROM users
+        ON CONFLICT (user_id, period_key) DO NOTHING
+        """
+    )
+    now = datetime.utcnow()
+    monday = datetime(now.year, now.month, now.day) - timedelta(days=now.weekday())
+    op.get_bind().execute(
+        sa.text(
+            """
+            INSERT INTO leaderboard_standings (user_id, period_key, school_key, minutes, updated_at)
+            SELECT s.user_id, :week_key, NULLIF(LOWER(TRIM(u.school)), ''),
+                   COALESCE(SUM(s.duration_minutes), 0), NOW()
+            FROM study_sessions s
+            JOIN users u ON u.id = s.user_id
+            WHERE s.completed_at >= :week_start AND s.abandoned_at IS NULL
+            GROUP BY s.user_id, u.school
+            ON CONFLICT (user_id, period_key) DO NOTHING
+            """
+        ),
+        {"week_key": monday.date().isoformat(), "week_start": monday},
+    )
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_leaderboard_standings_period_school_minutes")
+    op.execute("DROP INDEX IF EXISTS ix_leaderboard_standings_period_minutes")
+    op.execute("DROP INDEX IF EXISTS ix_leaderboard_standings_user_id")
+    op.execute("DROP TABLE IF EXISTS leaderboard_standings")
@@ -0,0 +1,25 @@
+"""add functional index on lower(users.email)
+
+get_current_user falls back to `WHERE lower(email) = ?` for tokens issued
+before the `uid` claim, and login/registration match emails the same way.
+Without this index each of those is a sequential scan of users.
+
+Revision ID: b2u3e4m5l6w7
+Revises: a1l2b3d4s5t6
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+revision = "b2u3e4m5l6w7"
+down_revision = "a1l2b3d4s5t6"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE INDEX IF NOT EXISTS ix_users_email_lower ON users (lower(email))")
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_users_email_lower")
@@ -0,0 +1,59 @@
+"""add user_badge_progress counters
+
+One row per user holding the history-derived inputs `crud.check_badges`
+evaluates (early/night session counts, weekly days/subjects, per-subject
+minutes, animal species counts, friend count, per-group minutes). See
+services/badge_progress.py.
+
+No backfill: rows are built from source tables the first time a user's
+badges are checked, then maintained incrementally.
+
+Revision ID: c3b4p5r6g7s8
+Revises: b2u3e4m5l6w7
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+revision = "c3b4p5r6g7s8"
+down_revision = "b2u3e4m5l6w7"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS user_badge_progress (
+            user_id             INTEGER PRIMARY KEY REFERENCES users(id),
+            sessions_completed  INTEGER NOT NULL DEFAULT 0,
+            early_sessions      INTEGER NOT NULL DEFAULT 0,
+            night_sessions      INTEGER NOT NULL DEFAULT 0,
+            last_completed_at   TIMESTAMP NULL,
+            last_gap_days       INTEGER NOT NULL DEFAULT 0,
+            week_start          TIMESTAMP NULL,
+            week_days           INTEGER NOT NULL DEFAULT 0,
+            week_subject_ids    JSON NOT NULL DEFAULT '[]',
+            subject_minutes     JSON NOT NULL DEFAULT '{}',
+            distinct_subjects   INTEGER NOT NULL DEFAULT 0,
+            max_subject_minutes INTEGER NOT NULL DEFAULT 0,
+            total_animals       INTEGER NOT NULL DEFAULT 0,
+            species_counts      JSON NOT NULL DEFAULT '{}',
+            unique_animals      INTEGER NOT NULL DEFAULT 0,
+            max_species_count   INTEGER NOT NULL DEFAULT 0,
+            hatch_day           TIMESTAMP NULL,
+            hatches_on_day      INTEGER NOT NULL DEFAULT 0,
+            has_rare            BOOLEAN NOT NULL DEFAULT FALSE,
+            has_legendary       BOOLEAN NOT NULL DEFAULT FALSE,
+            named_animals       INTEGER NOT NULL DEFAULT 0,
+            friend_count        INTEGER NOT NULL DEFAULT 0,
+            group_minutes       JSON NOT NULL DEFAULT '{}',
+            max_group_minutes   INTEGER NOT NULL DEFAULT 0,
+            updated_at          TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+        """
+    )
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS user_badge_progress")
@@ -0,0 +1,60 @@
+"""add session_followups outbox
+
+Durable queue for the side effects of completing a study session (badge
+evaluation, activity-feed events, badge push). Rows are written in the
+same transaction as the coin/streak credit and drained by
+services/session_pipeline.py.
+
+Revision ID: d4s5f6u7p8q9
+Revises: c3b4p5r6g7s8
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+revision = "d4s5f6u7p8q9"
+down_revision = "c3b4p5r6g7s8"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS session_followups (
+            id                   SERIAL PRIMARY KEY,
+            session_id           INTEGER NOT NULL REFERENCES study_sessions(id),
+            user_id              INTEGER NOT NULL REFERENCES users(id),
+            session_hour         INTEGER NULL,
+            session_minutes      INTEGER NOT NULL DEFAULT 0,
+            hatched_animal_name  VARCHAR NULL,
+            status               VARCHAR(16) NOT NULL DEFAULT 'pending',
+            attempts             INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at      TIMESTAMP NULL,
+            locked_at            TIMESTAMP NULL,
+            last_error           TEXT NULL,
+            result               JSON NOT NULL DEFAULT '{}',
+            created_at           TIMESTAMP NOT NULL DEFAULT NOW(),
+            completed_at         TIMESTAMP NULL
+        )
+        """
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_session_followups_session_id "
+        "ON session_followups (session_id)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_session_followups_user_id "
+        "ON session_followups (user_id)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_session_followups_status_next_attempt "
+        "ON session_followups (status, next_attempt_at)"
+    )
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_session_followups_status_next_attempt")
+    op.execute("DROP INDEX IF EXISTS ix_session_followups_user_id")
+    op.execute("DROP INDEX IF EXISTS ix_session_followups_session_id")
+    op.execute("DROP TABLE IF EXISTS session_followups")
@@ -0,0 +1,27 @@
+"""add (group_id, created_at) index on group_messages
+
+Backs GET /groups/{id}/messages, which now pages with before_id / after_id
+cursors — every read is "messages of one group ordered by created_at".
+
+Revision ID: e5g6m7s8g9i0
+Revises: d4s5f6u7p8q9
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+revision = "e5g6m7s8g9i0"
+down_revision = "d4s5f6u7p8q9"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_group_messages_group_created "
+        "ON group_messages (group_id, created_at)"
+    )
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_group_messages_group_created")
@@ -0,0 +1,57 @@
+"""add user_daily_minutes rollup
+
+Study minutes per (user, UTC day, subject) backing /stats, the daily study
+cap and group goal progress — see services/daily_minutes.py. Backfilled
+from completed, non-abandoned study_sessions so readers see full history
+the moment the new code starts serving. `scripts/backfill_daily_minutes.py`
+re-runs the same backfill and checks for drift.
+
+Revision ID: f6d7m8r9l0u1
+Revises: e5g6m7s8g9i0
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+revision = "f6d7m8r9l0u1"
+down_revision = "e5g6m7s8g9i0"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS user_daily_minutes (
+            id          SERIAL PRIMARY KEY,
+            user_id     INTEGER NOT NULL REFERENCES users(id),
+            day         DATE NOT NULL,
+            subject_id  INTEGER NOT NULL DEFAULT 0,
+            minutes     INTEGER NOT NULL DEFAULT 0,
+            sessions    INTEGER NOT NULL DEFAULT 0,
+            updated_at  TIMESTAMP NOT NULL DEFAULT NOW(),
+            CONSTRAINT uq_user_daily_minutes UNIQUE (user_id, day, subject_id)
+        )
+        """
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_user_daily_minutes_user_id "
+        "ON user_daily_minutes (user_id)"
+    )
+
+    op.execute(
+        """
+        INSERT INTO user_daily_minutes (user_id, day, subject_id, minutes, sessions, updated_at)
+        SELECT user_id, CAST(completed_at AS DATE), COALESCE(subject_id, 0),
+               COALESCE(SUM(duration_minutes), 0), COUNT(*), NOW()
+        FROM study_sessions
+        WHERE completed_at IS NOT NULL AND abandoned_at IS NULL
+        GROUP BY user_id, CAST(completed_at AS DATE), COALESCE(subject_id, 0)
+        ON CONFLICT (user_id, day, subject_id) DO NOTHING
+        """
+    )
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_user_daily_minutes_user_id")
+    op.execute("DROP TABLE IF EXISTS user_daily_minutes")
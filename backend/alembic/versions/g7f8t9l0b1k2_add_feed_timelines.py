@@ -0,0 +1,78 @@
+"""add feed timeline tables
+
+feed_timeline_entries holds one row per (recipient, activity event), written
+when the event is created, so GET /feed is an index range scan on
+(owner_id, event_id) — see services/feed_timeline.py.
+
+feed_timeline_backfills queues "copy this friend's recent events into my
+feed" jobs, drained on the owner's next feed read. Every existing accepted
+friendship is queued in both directions here, so current users' feeds fill
+lazily on first read instead of in this migration.
+
+Revision ID: g7f8t9l0b1k2
+Revises: f6d7m8r9l0u1
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+revision = "g7f8t9l0b1k2"
+down_revision = "f6d7m8r9l0u1"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS feed_timeline_entries (
+            id          SERIAL PRIMARY KEY,
+            owner_id    INTEGER NOT NULL REFERENCES users(id),
+            event_id    INTEGER NOT NULL REFERENCES activity_events(id) ON DELETE CASCADE,
+            author_id   INTEGER NOT NULL REFERENCES users(id),
+            created_at  TIMESTAMP NOT NULL DEFAULT NOW(),
+            CONSTRAINT uq_feed_timeline_entry UNIQUE (owner_id, event_id)
+        )
+        """
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_feed_timeline_entries_event_id "
+        "ON feed_timeline_entries (event_id)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_feed_timeline_entries_created_at "
+        "ON feed_timeline_entries (created_at)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_feed_timeline_entries_owner_author "
+        "ON feed_timeline_entries (owner_id, author_id)"
+    )
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS feed_timeline_backfills (
+            id          SERIAL PRIMARY KEY,
+            owner_id    INTEGER NOT NULL REFERENCES users(id),
+            author_id   INTEGER NOT NULL REFERENCES users(id),
+            created_at  TIMESTAMP NOT NULL DEFAULT NOW(),
+            CONSTRAINT uq_feed_timeline_backfill UNIQUE (owner_id, author_id)
+        )
+        """
+    )
+
+    op.execute(
+        """
+        INSERT INTO feed_timeline_backfills (owner_id, author_id, created_at)
+        SELECT user_id, friend_id, NOW() FROM friendships WHERE status = 'accepted'
+        UNION
+        SELECT friend_id, user_id, NOW() FROM friendships WHERE status = 'accepted'
+        ON CONFLICT (owner_id, author_id) DO NOTHING
+        """
+    )
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS feed_timeline_backfills")
+    op.execute("DROP INDEX IF EXISTS ix_feed_timeline_entries_owner_author")
+    op.execute("DROP INDEX IF EXISTS ix_feed_timeline_entries_created_at")
+    op.execute("DROP INDEX IF EXISTS ix_feed_timeline_entries_event_id")
+    op.execute("DROP TABLE IF EXISTS feed_timeline_entries")
@@ -0,0 +1,46 @@
+"""add feed_reaction_counters
+
+One row per user counting friends' reactions on their events that they
+haven't been shown yet, plus a version used as the ETag of
+GET /feed/reactions/new — see services/reaction_inbox.py. Backfilled from
+the unseen rows already in feed_reactions so nothing pending is lost.
+
+Revision ID: h8r9c0n1t2r3
+Revises: g7f8t9l0b1k2
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+revision = "h8r9c0n1t2r3"
+down_revision = "g7f8t9l0b1k2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS feed_reaction_counters (
+            user_id     INTEGER PRIMARY KEY REFERENCES users(id),
+            unseen      INTEGER NOT NULL DEFAULT 0,
+            version     INTEGER NOT NULL DEFAULT 0,
+            updated_at  TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO feed_reaction_counters (user_id, unseen, version, updated_at)
+        SELECT e.user_id, COUNT(*), 1, NOW()
+        FROM feed_reactions r
+        JOIN activity_events e ON e.id = r.event_id
+        WHERE r.user_id <> e.user_id AND (r.seen IS NULL OR r.seen = FALSE)
+        GROUP BY e.user_id
+        ON CONFLICT (user_id) DO NOTHING
+        """
+    )
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS feed_reaction_counters")
@@ -0,0 +1,34 @@
+"""move upload bytes to the blob store: uploads.sha256 / size
+
+New uploads are written to services/blob_store.py and the row only keeps
+the content hash and size, so `data` becomes nullable. Existing rows keep
+their bytes until they are served once or moved in bulk with
+`python -m scripts.migrate_uploads_to_blobs`.
+
+Revision ID: i9b0l1o2b3s4
+Revises: h8r9c0n1t2r3
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+revision = "i9b0l1o2b3s4"
+down_revision = "h8r9c0n1t2r3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("ALTER TABLE uploads ADD COLUMN IF NOT EXISTS sha256 VARCHAR(64) NULL")
+    op.execute("ALTER TABLE uploads ADD COLUMN IF NOT EXISTS size INTEGER NULL")
+    op.execute("ALTER TABLE uploads ALTER COLUMN data DROP NOT NULL")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_uploads_sha256 ON uploads (sha256)")
+
+
+def downgrade():
+    # Rows already moved out have data IS NULL; run the migration script
+    # with --restore before downgrading or this will fail.
+    op.execute("ALTER TABLE uploads ALTER COLUMN data SET NOT NULL")
+    op.execute("DROP INDEX IF EXISTS ix_uploads_sha256")
+    op.execute("ALTER TABLE uploads DROP COLUMN IF EXISTS size")
+    op.execute("ALTER TABLE uploads DROP COLUMN IF EXISTS sha256")
@@ -0,0 +1,41 @@
+"""add email_dispatch_runs
+
+Progress and resume checkpoint for bulk email runs (the daily onboarding
+cron) — see services/email_dispatch.py.
+
+Revision ID: j0e1m2d3s4p5
+Revises: i9b0l1o2b3s4
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+revision = "j0e1m2d3s4p5"
+down_revision = "i9b0l1o2b3s4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS email_dispatch_runs (
+            id            SERIAL PRIMARY KEY,
+            run_key       VARCHAR(64) NOT NULL UNIQUE,
+            status        VARCHAR(20) NOT NULL DEFAULT 'running',
+            total         INTEGER NOT NULL DEFAULT 0,
+            sent          INTEGER NOT NULL DEFAULT 0,
+            failed        INTEGER NOT NULL DEFAULT 0,
+            counts        JSON NOT NULL DEFAULT '{}',
+            last_user_id  INTEGER NOT NULL DEFAULT 0,
+            note          VARCHAR,
+            started_at    TIMESTAMP NOT NULL DEFAULT NOW(),
+            updated_at    TIMESTAMP NOT NULL DEFAULT NOW(),
+            finished_at   TIMESTAMP
+        )
+        """
+    )
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS email_dispatch_runs")
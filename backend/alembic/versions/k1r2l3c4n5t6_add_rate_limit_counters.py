@@ -0,0 +1,36 @@
+"""add rate_limit_counters
+
+Shared storage for slowapi rate limits so every web worker sees the same
+counters — see services/rate_limit_store.py.
+
+Revision ID: k1r2l3c4n5t6
+Revises: j0e1m2d3s4p5
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+revision = "k1r2l3c4n5t6"
+down_revision = "j0e1m2d3s4p5"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS rate_limit_counters (
+            key         VARCHAR(255) PRIMARY KEY,
+            count       INTEGER NOT NULL DEFAULT 0,
+            expires_at  DOUBLE PRECISION NOT NULL
+        )
+        """
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_rate_limit_counters_expires_at "
+        "ON rate_limit_counters (expires_at)"
+    )
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS rate_limit_counters")
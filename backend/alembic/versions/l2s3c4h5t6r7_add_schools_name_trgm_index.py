@@ -0,0 +1,34 @@
+"""add pg_trgm index on schools.name
+
+/schools/search is served from an in-memory index (services/school_search.py);
+until a web worker has built it, the endpoint falls back to
+`name ILIKE '%q%'`. A GIN trigram index serves ILIKE, so Postgres answers
+that fallback without a sequential scan. No-op on SQLite.
+
+Revision ID: l2s3c4h5t6r7
+Revises: k1r2l3c4n5t6
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+revision = "l2s3c4h5t6r7"
+down_revision = "k1r2l3c4n5t6"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_schools_name_trgm "
+        "ON schools USING gin (name gin_trgm_ops)"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute("DROP INDEX IF EXISTS ix_schools_name_trgm")
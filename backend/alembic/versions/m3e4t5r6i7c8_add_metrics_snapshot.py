@@ -0,0 +1,45 @@
+"""add metrics_snapshot + metrics_counters
+
+Precomputed /admin/overview payload and its live headline counters — see
+services/metrics_snapshot.py.
+
+Revision ID: m3e4t5r6i7c8
+Revises: l2s3c4h5t6r7
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+revision = "m3e4t5r6i7c8"
+down_revision = "l2s3c4h5t6r7"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS metrics_snapshot (
+            key              VARCHAR(64) PRIMARY KEY,
+            payload          JSON NOT NULL,
+            computed_at      TIMESTAMP NOT NULL,
+            full_rebuild_at  TIMESTAMP NOT NULL,
+            build_ms         INTEGER NOT NULL DEFAULT 0,
+            dirty_at         TIMESTAMP
+        )
+        """
+    )
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS metrics_counters (
+            name        VARCHAR(64) PRIMARY KEY,
+            value       INTEGER NOT NULL DEFAULT 0,
+            updated_at  TIMESTAMP NOT NULL
+        )
+        """
+    )
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS metrics_counters")
+    op.execute("DROP TABLE IF EXISTS metrics_snapshot")
@@ -0,0 +1,40 @@
+"""add cohort_retention_cells + study_sessions.started_at index
+
+Settled cells of the cohort retention matrix (services/cohort_retention.py),
+and the index its ranged "activity since" scan reads.
+
+Revision ID: n4c5o6h7r8t9
+Revises: m3e4t5r6i7c8
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+revision = "n4c5o6h7r8t9"
+down_revision = "m3e4t5r6i7c8"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS cohort_retention_cells (
+            granularity  VARCHAR(8) NOT NULL,
+            cohort_date  DATE NOT NULL,
+            period       INTEGER NOT NULL,
+            size         INTEGER NOT NULL,
+            active       INTEGER NOT NULL,
+            PRIMARY KEY (granularity, cohort_date, period)
+        )
+        """
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_study_sessions_started_at "
+        "ON study_sessions (started_at)"
+    )
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_study_sessions_started_at")
+    op.execute("DROP TABLE IF EXISTS cohort_retention_cells")
@@ -0,0 +1,27 @@
+"""add users (created_at, id) index
+
+GET /admin/users now pages by keyset on (sort column, id) instead of
+OFFSET/LIMIT; this covers the default created_at sort.
+
+Revision ID: o5d6p7q8r9s0
+Revises: n4c5o6h7r8t9
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+revision = "o5d6p7q8r9s0"
+down_revision = "n4c5o6h7r8t9"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_users_created_at_id "
+        "ON users (created_at, id)"
+    )
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_users_created_at_id")
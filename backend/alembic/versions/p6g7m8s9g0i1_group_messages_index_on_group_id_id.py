@@ -0,0 +1,34 @@
+"""index group_messages on (group_id, id) for the chat cursors
+
+GET /groups/{id}/messages filters and orders by message id (before_id /
+after_id are ids), so the (group_id, created_at) index added in
+e5g6m7s8g9i0 couldn't serve the seek or the ORDER BY. Replace it with
+(group_id, id).
+
+Revision ID: p6g7m8s9g0i1
+Revises: o5d6p7q8r9s0
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+revision = "p6g7m8s9g0i1"
+down_revision = "o5d6p7q8r9s0"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_group_messages_group_id_id "
+        "ON group_messages (group_id, id)"
+    )
+    op.execute("DROP INDEX IF EXISTS ix_group_messages_group_created")
+
+
+def downgrade():
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_group_messages_group_created "
+        "ON group_messages (group_id, created_at)"
+    )
+    op.execute("DROP INDEX IF EXISTS ix_group_messages_group_id_id")
@@ -1,5 +1,9 @@
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Optional
+import hashlib
+import threading
+import time
 import jwt
 from jwt.exceptions import PyJWTError as JWTError
 import bcrypt
@@ -10,6 +14,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func
 from database import get_db
 import models
+from services import app_version_telemetry
 import os
 
 logger = logging.getLogger(__name__)
@@ -55,6 +60,148 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
+# ─── Token → user resolution cache ───────────────────────────────────────
+# Every authenticated call (including the /feed/reactions/new poll) used to
+# decode the JWT and then run `WHERE lower(email) = ?`. We now remember, per
+# raw token, the verified (user_id, token_version, email) so repeat calls
+# resolve with a primary-key `db.get`. The live row's token_version and
+# is_archived are still checked on every request, so a cached entry can
+# never authenticate a revoked token — explicit invalidation (logout, password
+# reset, archive, account deletion) just frees the slot early.
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "300"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+
+
+class _TokenCache:
+    """Bounded TTL + LRU map of sha256(token) → (user_id, tv, email_key)."""
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple[float, int, int, str]]" = OrderedDict()
+        self._by_user: dict[int, set[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str) -> Optional[tuple[int, int, str]]:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, user_id, token_ver, email_key = entry
+            if expires_at <= time.time():
+                self._drop(key, user_id)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return user_id, token_ver, email_key
+
+    def put(self, token: str, user_id: int, token_ver: int, email_key: str,
+            token_exp: Optional[float] = None) -> None:
+        if self.max_entries <= 0:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        if token_exp is not None:
+            expires_at = min(expires_at, float(token_exp))
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (expires_at, user_id, token_ver, email_key)
+            self._entries.move_to_end(key)
+            self._by_user.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                old_key, (_, old_uid, _, _) = self._entries.popitem(last=False)
+                self._forget(old_key, old_uid)
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            for key in self._by_user.pop(user_id, set()):
+                self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _drop(self, key: str, user_id: int) -> None:
+        self._entries.pop(key, None)
+        self._forget(key, user_id)
+
+    def _forget(self, key: str, user_id: int) -> None:
+        keys = self._by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                self._by_user.pop(user_id, None)
+
+
+token_cache = _TokenCache(AUTH_CACHE_TTL_SECONDS, AUTH_CACHE_MAX_ENTRIES)
+
+
+def invalidate_user_tokens(user_id: int) -> None:
+    """Drop cached token resolutions for a user. Call after bumping
+    token_version, archiving, or deleting the account."""
+    token_cache.invalidate_user(user_id)
+
+
+def _load_token_user(db: Session, payload: dict, email_key: str) -> Optional[models.User]:
+    """Resolve the user a decoded token refers to.
+
+    Tokens issued since the `uid` claim was added resolve by primary key;
+    older (10-year) tokens fall back to the case-insensitive email match,
+    which is served by the `ix_users_email_lower` functional index.
+    """
+    uid = payload.get("uid")
+    if isinstance(uid, int):
+        user = db.get(models.User, uid)
+        if user is not None and (user.email or "").lower() == email_key:
+            return user
+    if not email_key:
+        return None
+    return (
+        db.query(models.User)
+        .filter(func.lower(models.User.email) == email_key)
+        .first()
+    )
+
+
+def _resolve_token(token: str, db: Session) -> tuple[Optional[models.User], int, Optional[dict]]:
+    """Return (user, token_version_claim, payload). `payload` is None when
+    the answer came from the cache. Raises JWTError for undecodable tokens
+    and ValueError when the token has no subject."""
+    cached = token_cache.get(token)
+    if cached is not None:
+        user_id, token_ver, email_key = cached
+        user = db.get(models.User, user_id)
+        # Guard against a recycled primary key pointing at someone else.
+        if user is not None and (user.email or "").lower() == email_key:
+            return user, token_ver, None
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    email = payload.get("sub")
+    if email is None:
+        raise ValueError("no subject")
+    email_key = (email or "").strip().lower()
+    return _load_token_user(db, payload, email_key), payload.get("tv", 0), payload
+
+
+def _remember_token(token: str, user: models.User, token_ver: int, payload: Optional[dict]) -> None:
+    if payload is None:
+        return
+    token_cache.put(
+        token, user.id, token_ver, (user.email or "").lower(), payload.get("exp"),
+    )
+
+
 def _capture_app_version_from_headers(
     request: Request, user: models.User, db: Session
 ) -> None:
@@ -67,9 +214,11 @@ def _capture_app_version_from_headers(
     binary version, so the admin "outdated" cohort and update-prompt email
     pipeline see ~all users, not just the ones who said yes to push.
 
-    Only writes when the value differs from what's stored, to avoid hot-row
-    contention on every API call. Failures are swallowed — telemetry must
-    never break a real request.
+    Only queues a write when the value differs from what's stored, and the
+    write itself is deferred to `services.app_version_telemetry`, which
+    batches every user's change into one UPDATE every few seconds — no
+    commit happens inside the auth dependency. Failures are swallowed —
+    telemetry must never break a real request.
     """
     try:
         version = request.headers.get("x-app-version")
@@ -80,22 +229,16 @@ def _capture_app_version_from_headers(
         version = version[:20].strip() if version else None
         build = build[:20].strip() if build else None
 
-        changed = False
-        if version and version != getattr(user, "app_version", None):
-            user.app_version = version
-            user.app_version_updated_at = datetime.utcnow()
-            changed = True
-        if build and build != getattr(user, "app_build", None):
-            user.app_build = build
-            changed = True
-        if changed:
-            db.commit()
+        # Compare against what the next flush will write, falling back to the row.
+        queued_version, queued_build = app_version_telemetry.pending(user.id) or (None, None)
+        stored_version = queued_version or getattr(user, "app_version", None)
+        stored_build = queued_build or getattr(user, "app_build", None)
+        new_version = version if version and version != stored_version else None
+        new_build = build if build and build != stored_build else None
+        if new_version or new_build:
+            app_version_telemetry.record(user.id, new_version, new_build)
     except Exception as exc:
         logger.warning("capture_app_version failed: %s", exc)
-        try:
-            db.rollback()
-        except Exception:
-            pass
 
 
 def get_current_user(
@@ -108,25 +251,16 @@ def get_current_user(
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    token = credentials.credentials
     try:
-        token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            logger.warning("Auth: no email in token payload")
-            raise credentials_exception
+        user, token_ver, payload = _resolve_token(token, db)
     except JWTError:
         logger.warning("Auth: JWT decode failed")
         raise credentials_exception
+    except ValueError:
+        logger.warning("Auth: no email in token payload")
+        raise credentials_exception
 
-    email_key = (email or "").strip().lower()
-    user = (
-        db.query(models.User)
-        .filter(func.lower(models.User.email) == email_key)
-        .first()
-        if email_key
-        else None
-    )
     if user is None:
         logger.warning("Auth: user not found for token")
         raise HTTPException(
@@ -134,7 +268,6 @@ def get_current_user(
             detail="User not found - please register again",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    token_ver = payload.get("tv", 0)
     if token_ver != (user.token_version or 0):
         raise credentials_exception
     if getattr(user, "is_archived", False):
@@ -142,6 +275,7 @@ def get_current_user(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="This account has been deactivated. Please contact support.",
         )
+    _remember_token(token, user, token_ver, payload)
     _capture_app_version_from_headers(request, user, db)
     return user
 
@@ -154,26 +288,15 @@ def get_optional_user(
     """Get current user if authenticated, None otherwise"""
     if credentials is None:
         return None
+    token = credentials.credentials
     try:
-        token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            return None
-        email_key = (email or "").strip().lower()
-        user = (
-            db.query(models.User)
-            .filter(func.lower(models.User.email) == email_key)
-            .first()
-            if email_key
-            else None
-        )
-        if user is None:
-            return None
-        token_ver = payload.get("tv", 0)
-        if (user.token_version or 0) != token_ver:
-            return None
-        _capture_app_version_from_headers(request, user, db)
-        return user
-    except JWTError:
+        user, token_ver, payload = _resolve_token(token, db)
+    except (JWTError, ValueError):
         return None
+    if user is None:
+        return None
+    if (user.token_version or 0) != token_ver:
+        return None
+    _remember_token(token, user, token_ver, payload)
+    _capture_app_version_from_headers(request, user, db)
+    return user
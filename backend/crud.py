@@ -4,6 +4,14 @@ from datetime import datetime, timedelta
 from typing import List, Optional
 import models
 import random
+from services import leaderboard as leaderboard_service
+from services import badge_progress as badge_progress_service
+from services import daily_minutes as daily_minutes_service
+from services import feed_timeline as feed_timeline_service
+from services import metrics_snapshot
+from services import reaction_inbox
+from services import response_cache
+from services import session_pipeline
 
 
 def get_effective_streak(user: models.User) -> int:
@@ -37,6 +45,11 @@ def create_user(db: Session, email: str, hashed_password: str) -> models.User:
     db.add(user)
     db.commit()
     db.refresh(user)
+    metrics_snapshot.bump("total_users")
+
+    # Seed the all-time standing so new users show up on boards at 0 min.
+    leaderboard_service.sync_user(db, user)
+    db.commit()
     
     create_egg_for_user(db, user.id)
     
@@ -140,11 +153,15 @@ def _calc_session_coins(duration_minutes: int, user) -> int:
     return coins
 
 
-def _finalize_session(db: Session, session: models.StudySession, user, duration_minutes: int, animal_name: str = None) -> tuple:
+def _finalize_session(db: Session, session: models.StudySession, user, duration_minutes: int, animal_name: str = None, with_followup: bool = False) -> tuple:
     """Apply the side-effects of completing a study session: coins, totals,
     streak update, optional auto-hatch. Mutates `session` and `user` in place
     and commits.
 
+    `with_followup=True` also writes the `session_followups` outbox row in the
+    same transaction, for the endpoints that hand badges / feed events / push
+    to `services.session_pipeline` instead of running them inline.
+
     Shared by both:
       - `create_study_session`: legacy path that creates+completes in one shot
         (POST /sessions, used by older app builds and as a fallback)
@@ -154,6 +171,7 @@ def _finalize_session(db: Session, session: models.StudySession, user, duration_
     """
     coins = _calc_session_coins(duration_minutes, user)
 
+    metrics_snapshot.bump("total_study_minutes", duration_minutes - (session.duration_minutes or 0))
     session.duration_minutes = duration_minutes
     session.coins_earned = coins
     session.completed_at = datetime.utcnow()
@@ -180,9 +198,11 @@ def _finalize_session(db: Session, session: models.StudySession, user, duration_
 
     # Auto-hatch the user's selected animal
     hatched_animal = None
+    new_species = False
     if animal_name:
         animal = db.query(models.Animal).filter(models.Animal.name == animal_name).first()
         if not animal:
+            new_species = True
             animal = models.Animal(
                 name=animal_name,
                 species=f"{animal_name} species",
@@ -193,14 +213,27 @@ def _finalize_session(db: Session, session: models.StudySession, user, duration_
             db.add(animal)
             db.flush()
         db.add(models.UserAnimal(user_id=user.id, animal_id=animal.id))
+        badge_progress_service.record_hatch(db, user.id, animal)
         hatched_animal = animal
 
+    # Same transaction as the credit above, so the reaper and /complete
+    # both keep the materialized leaderboards, badge counters and daily
+    # minute rollup in step with user totals.
+    leaderboard_service.record_session(db, user, duration_minutes, session.completed_at)
+    badge_progress_service.record_session(db, user.id, session)
+    daily_minutes_service.record_session(db, session)
+    if with_followup:
+        session_pipeline.enqueue(db, session, hatched_animal)
+
     db.commit()
+    if new_species:
+        # GET /animals is cached; a species created on demand belongs in it.
+        response_cache.invalidate("animals")
     db.refresh(session)
     return session, hatched_animal
 
 
-def create_study_session(db: Session, user_id: int, duration_minutes: int, task_id: int = None, animal_name: str = None, subject_id: int = None) -> tuple:
+def create_study_session(db: Session, user_id: int, duration_minutes: int, task_id: int = None, animal_name: str = None, subject_id: int = None, with_followup: bool = False) -> tuple:
     """Legacy path: create a study_sessions row that is already completed.
 
     Still used by `POST /sessions` (older clients and as a fallback when the
@@ -219,7 +252,9 @@ def create_study_session(db: Session, user_id: int, duration_minutes: int, task_
     )
     db.add(session)
     db.flush()
-    return _finalize_session(db, session, user, duration_minutes, animal_name)
+    metrics_snapshot.bump("total_sessions")
+    metrics_snapshot.bump("total_study_minutes", duration_minutes)
+    return _finalize_session(db, session, user, duration_minutes, animal_name, with_followup=with_followup)
 
 
 def start_study_session(db: Session, user_id: int, duration_minutes: int, animal_name: str = None, subject_id: int = None) -> models.StudySession:
@@ -245,6 +280,8 @@ def start_study_session(db: Session, user_id: int, duration_minutes: int, animal
     db.add(session)
     db.commit()
     db.refresh(session)
+    metrics_snapshot.bump("total_sessions")
+    metrics_snapshot.bump("total_study_minutes", duration_minutes)
     return session
 
 
@@ -256,6 +293,7 @@ def complete_study_session_by_id(
     task_id: int = None,
     animal_name: str = None,
     subject_id: int = None,
+    with_followup: bool = False,
 ) -> tuple:
     """Finalise a previously-started session.
 
@@ -277,7 +315,7 @@ def complete_study_session_by_id(
         session.task_id = task_id
     if subject_id is not None:
         session.subject_id = subject_id
-    return _finalize_session(db, session, user, duration_minutes, animal_name)
+    return _finalize_session(db, session, user, duration_minutes, animal_name, with_followup=with_followup)
 
 
 def get_user_sessions(db: Session, user_id: int, limit: int = 50) -> List[models.StudySession]:
@@ -341,10 +379,19 @@ def abandon_study_session(
     # sessions, the reaper will skip abandoned rows entirely so this
     # branch is rare in practice.
     now = datetime.utcnow()
+    credited = session.completed_at is not None
     session.abandoned_at = now
     if session.completed_at is None:
         session.completed_at = now
     session.coins_earned = 0
+    if credited:
+        # Reaper-credited row: take it back out of every rollup that a
+        # rebuild would exclude it from — /stats, the daily cap and group
+        # goals, the weekly board, and badge progress.
+        daily_minutes_service.reverse_session(db, session)
+        leaderboard_service.reverse_session(db, session)
+        db.flush()
+        badge_progress_service.reverse_session(db, user_id)
     db.commit()
     return "ok"
 
@@ -481,6 +528,7 @@ def hatch_pending_session(
         return None, None, "not_pending"
 
     animal = db.query(models.Animal).filter(models.Animal.name == animal_name).first()
+    new_species = animal is None
     if not animal:
         # Mirror _finalize_session's "create on demand" so user-typed names
         # are accepted. The animal_name length is already capped by the
@@ -496,7 +544,10 @@ def hatch_pending_session(
         db.flush()
 
     db.add(models.UserAnimal(user_id=user_id, animal_id=animal.id))
+    badge_progress_service.record_hatch(db, user_id, animal)
     db.commit()
+    if new_species:
+        response_cache.invalidate("animals")
     db.refresh(session)
     return session, animal, None
 
@@ -733,6 +784,9 @@ def name_animal(db: Session, user_animal_id: int, user_id: int, nickname: str) -
         models.UserAnimal.user_id == user_id
     ).first()
     if animal:
+        badge_progress_service.record_nickname(
+            db, user_id, animal.nickname is not None, nickname is not None,
+        )
         animal.nickname = nickname
         db.commit()
         db.refresh(animal)
@@ -799,6 +853,7 @@ def hatch_egg(db: Session, user_id: int) -> tuple[bool, Optional[models.Animal],
         animal_id=animal.id
     )
     db.add(user_animal)
+    badge_progress_service.record_hatch(db, user_id, animal)
     
     # Deduct coins from user
     user = db.query(models.User).filter(models.User.id == user_id).first()
@@ -904,6 +959,8 @@ def accept_friend_request(db: Session, user_id: int, request_id: int) -> bool:
     
     if friendship:
         friendship.status = "accepted"
+        badge_progress_service.adjust_friends(db, (friendship.user_id, friendship.friend_id), +1)
+        feed_timeline_service.queue_backfill(db, friendship.user_id, friendship.friend_id)
         db.commit()
         return True
     return False
@@ -971,6 +1028,8 @@ def remove_friend(db: Session, user_id: int, friend_id: int) -> bool:
     ).first()
     if not friendship:
         return False
+    badge_progress_service.adjust_friends(db, (friendship.user_id, friendship.friend_id), -1)
+    feed_timeline_service.remove_pair(db, friendship.user_id, friendship.friend_id)
     db.delete(friendship)
     db.commit()
     return True
@@ -1024,121 +1083,65 @@ def remove_group_member(db: Session, admin_user_id: int, group_id: int, target_u
     ).first()
     if not member:
         return False, "User is not a member of this group"
+    badge_progress_service.record_group_left(db, [target_user_id], group_id)
     db.delete(member)
     db.commit()
     return True, "Member removed"
 
 
-def _week_start() -> datetime:
-    now = datetime.utcnow()
-    return datetime(now.year, now.month, now.day) - timedelta(days=now.weekday())
-
-
-def _weekly_minutes_map(db: Session, user_ids: List[int] | None = None):
-    """Return {user_id: total_minutes_this_week}."""
-    start = _week_start()
-    q = db.query(
-        models.StudySession.user_id,
-        func.coalesce(func.sum(models.StudySession.duration_minutes), 0),
-    ).filter(models.StudySession.started_at >= start)
-    if user_ids is not None:
-        q = q.filter(models.StudySession.user_id.in_(user_ids))
-    rows = q.group_by(models.StudySession.user_id).all()
-    return {uid: int(mins) for uid, mins in rows}
-
-
-def get_global_leaderboard(db: Session, period: str = "all_time") -> List[dict]:
-    if period == "week":
-        weekly = _weekly_minutes_map(db)
-        user_ids = list(weekly.keys())
-        if not user_ids:
-            return []
-        users_by_id = {
-            u.id: u
-            for u in db.query(models.User).filter(
-                models.User.id.in_(user_ids),
-                or_(models.User.is_archived == False, models.User.is_archived == None),
-            ).all()
-        }
-        sorted_ids = sorted(user_ids, key=lambda uid: weekly.get(uid, 0), reverse=True)[:100]
-        leaderboard = []
-        for rank, uid in enumerate(sorted_ids, 1):
-            u = users_by_id.get(uid)
-            if not u:
-                continue
-            leaderboard.append({
-                "rank": rank,
-                "user_id": u.id,
-                "username": u.username or f"User {u.id}",
-                "total_study_minutes": weekly.get(uid, 0),
-                "current_streak": get_effective_streak(u),
-                "animals_count": 0,
-                "total_donated": 0,
-                "profile_pic_url": u.profile_pic_url,
-            })
-        return leaderboard
+def _leaderboard_row(rank: int, u: models.User, minutes: int) -> dict:
+    return {
+        "rank": rank,
+        "user_id": u.id,
+        "username": u.username or f"User {u.id}",
+        "total_study_minutes": minutes,
+        "current_streak": get_effective_streak(u),
+        "animals_count": 0,
+        "total_donated": 0,
+        "profile_pic_url": u.profile_pic_url,
+    }
 
-    users = db.query(models.User).filter(
-        or_(models.User.is_archived == False, models.User.is_archived == None),
-    ).order_by(
-        models.User.total_study_minutes.desc()
-    ).limit(100).all()
 
-    leaderboard = []
-    for rank, u in enumerate(users, 1):
-        leaderboard.append({
-            "rank": rank,
-            "user_id": u.id,
-            "username": u.username or f"User {u.id}",
-            # `total_study_minutes` is `Optional[int]` in the DB (legacy NULLs);
-            # coerce so pydantic never sees None on a non-optional field.
-            "total_study_minutes": int(u.total_study_minutes or 0),
-            "current_streak": get_effective_streak(u),
-            "animals_count": 0,
-            "total_donated": 0,
-            "profile_pic_url": u.profile_pic_url,
-        })
-    return leaderboard
+def get_global_leaderboard(db: Session, period: str = "all_time", limit: int = 100) -> List[dict]:
+    """Top studiers across every school, read from the materialized
+    `leaderboard_standings` (see services/leaderboard.py)."""
+    rows = leaderboard_service.top(db, period=period, limit=limit)
+    return [_leaderboard_row(rank, u, mins) for rank, (u, mins) in enumerate(rows, 1)]
 
 
 def get_school_leaderboard(db: Session, current_user, period: str = "all_time", limit: int = 100) -> List[dict]:
-    if not current_user.school:
-        return []
-    school_lower = current_user.school.strip().lower()
-    # IMPORTANT: do NOT call `.limit(limit)` here. We must sort by study minutes
-    # *first* and then truncate, otherwise Postgres returns rows in arbitrary
-    # order and the top studiers can be cut off before they're ever ranked
-    # (see endura-v-2 bug: missing users on friends/school leaderboards).
-    users = db.query(models.User).filter(
-        models.User.school.isnot(None),
-        func.lower(func.trim(models.User.school)) == school_lower,
-        or_(models.User.is_archived == False, models.User.is_archived == None),
-    ).all()
+    """Top studiers at the caller's school (matched on lower/trimmed name).
 
-    if period == "week":
-        user_ids = [u.id for u in users]
-        weekly = _weekly_minutes_map(db, user_ids)
-        users_with_mins = [(u, int(weekly.get(u.id) or 0)) for u in users]
-    else:
-        # Coerce NULL → 0 to avoid crashing the sort on legacy rows. See
-        # `get_leaderboard` for the full failure-mode write-up.
-        users_with_mins = [(u, int(u.total_study_minutes or 0)) for u in users]
-    users_with_mins.sort(key=lambda x: x[1], reverse=True)
-    users_with_mins = users_with_mins[:limit]
-
-    leaderboard = []
-    for rank, (u, mins) in enumerate(users_with_mins, 1):
-        leaderboard.append({
-            "rank": rank,
-            "user_id": u.id,
-            "username": u.username or f"User {u.id}",
-            "total_study_minutes": mins,
-            "current_streak": get_effective_streak(u),
-            "animals_count": 0,
-            "total_donated": 0,
-            "profile_pic_url": u.profile_pic_url,
-        })
-    return leaderboard
+    Ordering and truncation happen in SQL on the standings index, so the
+    top studiers can no longer be cut off before they're ranked (the
+    original endura-v-2 bug) and we never load the whole school.
+    """
+    key = leaderboard_service.school_key(current_user.school)
+    if not key:
+        return []
+    rows = leaderboard_service.top(db, period=period, school=key, limit=limit)
+    return [_leaderboard_row(rank, u, mins) for rank, (u, mins) in enumerate(rows, 1)]
+
+
+def get_leaderboard_rank(db: Session, current_user, scope: str = "global", period: str = "all_time") -> dict:
+    """The caller's own position on a board, so clients outside the top
+    page can still show "you are #412"."""
+    if scope == "friends":
+        board = get_leaderboard(db, current_user.id, limit=10_000, period=period)
+        mine = next((r for r in board if r["user_id"] == current_user.id), None)
+        return {
+            "scope": scope,
+            "period": period,
+            "rank": mine["rank"] if mine else None,
+            "total_study_minutes": mine["total_study_minutes"] if mine else 0,
+        }
+    school = None
+    if scope == "school":
+        school = leaderboard_service.school_key(current_user.school)
+        if not school:
+            return {"scope": scope, "period": period, "rank": None, "total_study_minutes": 0}
+    rank, minutes = leaderboard_service.rank_of(db, current_user, period=period, school=school)
+    return {"scope": scope, "period": period, "rank": rank, "total_study_minutes": minutes}
 
 
 def get_leaderboard(db: Session, user_id: int, limit: int = 100, period: str = "all_time") -> List[dict]:
@@ -1162,7 +1165,7 @@ def get_leaderboard(db: Session, user_id: int, limit: int = 100, period: str = "
     ).all()
 
     if period == "week":
-        weekly = _weekly_minutes_map(db, friend_ids)
+        weekly = leaderboard_service.minutes_for(db, friend_ids, period="week")
         users_with_mins = [(u, int(weekly.get(u.id) or 0)) for u in users]
     else:
         # Coerce NULL → 0. Legacy users created before `default=0` was added
@@ -1225,52 +1228,32 @@ def get_user_stats(db: Session, user_id: int) -> dict:
         models.Task.is_completed == True
     ).count()
     
-    # Weekly study minutes - daily breakdown [Mon, Tue, Wed, Thu, Fri, Sat, Sun]
+    # Minute breakdowns come from the user_daily_minutes rollup, so their
+    # cost is bounded by days studied rather than sessions logged.
     today = datetime.utcnow().date()
     current_weekday = today.weekday()  # 0=Monday
     monday = today - timedelta(days=current_weekday)
-    
-    weekly_daily = [0] * 7
-    week_sessions = db.query(models.StudySession).filter(
-        models.StudySession.user_id == user_id,
-        models.StudySession.completed_at >= datetime.combine(monday, datetime.min.time())
-    ).all()
-    for session in week_sessions:
-        if session.completed_at:
-            day_idx = session.completed_at.weekday()
-            if 0 <= day_idx < 7:
-                weekly_daily[day_idx] += session.duration_minutes
-    
-    weekly_minutes = sum(weekly_daily)
+    four_weeks_ago = monday - timedelta(days=21)
+    by_day = daily_minutes_service.minutes_by_day(db, user_id, four_weeks_ago)
 
+    # Weekly study minutes - daily breakdown [Mon, Tue, Wed, Thu, Fri, Sat, Sun]
+    weekly_daily = [0] * 7
     # Monthly study minutes - weekly breakdown for last 4 weeks [Week 1, Week 2, Week 3, This Week]
     monthly_weekly = [0] * 4
-    four_weeks_ago = monday - timedelta(days=21)
-    four_weeks_ago_dt = datetime.combine(four_weeks_ago, datetime.min.time())
-    month_sessions = db.query(models.StudySession).filter(
-        models.StudySession.user_id == user_id,
-        models.StudySession.completed_at != None,
-        models.StudySession.completed_at >= four_weeks_ago_dt
-    ).all()
-    for session in month_sessions:
-        if session.completed_at and session.duration_minutes:
-            session_date = session.completed_at.date() if hasattr(session.completed_at, 'date') else session.completed_at
-            days_since_start = (session_date - four_weeks_ago).days
-            week_idx = min(max(days_since_start // 7, 0), 3)
-            monthly_weekly[week_idx] += session.duration_minutes
+    for day, minutes in by_day.items():
+        if day >= monday:
+            weekly_daily[day.weekday()] += minutes
+        week_idx = min(max((day - four_weeks_ago).days // 7, 0), 3)
+        monthly_weekly[week_idx] += minutes
 
     # Study minutes by subject
-    subject_query = db.query(
-        models.Subject.display_name,
-        func.sum(models.StudySession.duration_minutes)
-    ).join(
-        models.Subject, models.StudySession.subject_id == models.Subject.id
-    ).filter(
-        models.StudySession.user_id == user_id,
-        models.StudySession.subject_id != None
-    ).group_by(models.Subject.id, models.Subject.display_name).all()
-    
-    study_minutes_by_subject = {row[0]: int(row[1]) for row in subject_query if row[0]}
+    subject_minutes = daily_minutes_service.minutes_by_subject(db, user_id)
+    study_minutes_by_subject = {}
+    if subject_minutes:
+        names = db.query(models.Subject.id, models.Subject.display_name).filter(
+            models.Subject.id.in_(list(subject_minutes))
+        ).all()
+        study_minutes_by_subject = {name: subject_minutes[sid] for sid, name in names if name}
     
     return {
         "total_coins": user.total_coins,
@@ -1299,6 +1282,7 @@ def create_group(db: Session, creator_id: int, name: str, goal_minutes: int, goa
     db.commit()
     db.refresh(group)
     db.add(models.GroupMember(group_id=group.id, user_id=creator_id, role="admin"))
+    badge_progress_service.record_group_joined(db, creator_id, group)
     db.commit()
     creator = db.query(models.User).filter(models.User.id == creator_id).first()
     _create_event(db, creator_id, "group_created", f"created study group \"{name}\"")
@@ -1320,6 +1304,7 @@ def join_group(db: Session, user_id: int, group_id: int) -> tuple:
     if member_count >= 10:
         return None, "Group is full (max 10)"
     db.add(models.GroupMember(group_id=group_id, user_id=user_id))
+    badge_progress_service.record_group_joined(db, user_id, group)
     try:
         db.commit()
     except IntegrityError:
@@ -1351,6 +1336,7 @@ def leave_group(db: Session, user_id: int, group_id: int) -> bool:
     if not member:
         return False
 
+    badge_progress_service.record_group_left(db, [user_id], group_id)
     group = db.query(models.StudyGroup).filter(models.StudyGroup.id == group_id).first()
     if not group:
         # Membership row pointed at a missing group — clean it up and call it done.
@@ -1391,34 +1377,53 @@ def leave_group(db: Session, user_id: int, group_id: int) -> bool:
 
 
 def get_user_groups(db: Session, user_id: int) -> List[dict]:
-    memberships = db.query(models.GroupMember).filter(models.GroupMember.user_id == user_id).all()
-    results = []
-    for m in memberships:
-        group = db.query(models.StudyGroup).filter(models.StudyGroup.id == m.group_id).first()
-        if not group:
-            continue
-        members_raw = db.query(models.GroupMember).filter(models.GroupMember.group_id == group.id).all()
-        member_ids = [mb.user_id for mb in members_raw]
+    """Every group `user_id` belongs to, with members and goal progress.
 
+    Backs GET /groups (home screen), so it runs a fixed four queries no
+    matter how many groups or members are involved: groups + subjects,
+    members + users, and two grouped SUMs for every (group, member)
+    contribution window — see `_group_minutes_by_member`.
+    """
+    rows = (
+        db.query(models.StudyGroup, models.Subject.display_name)
+        .join(models.GroupMember, models.GroupMember.group_id == models.StudyGroup.id)
+        .outerjoin(models.Subject, models.Subject.id == models.StudyGroup.subject_id)
+        .filter(models.GroupMember.user_id == user_id)
+        .order_by(models.GroupMember.id.asc())
+        .all()
+    )
+    if not rows:
+        return []
+    group_ids = [group.id for group, _ in rows]
+
+    members_by_group: dict = {gid: [] for gid in group_ids}
+    member_rows = (
+        db.query(models.GroupMember, models.User.username, models.User.profile_pic_url)
+        .outerjoin(models.User, models.User.id == models.GroupMember.user_id)
+        .filter(models.GroupMember.group_id.in_(group_ids))
+        .order_by(models.GroupMember.id.asc())
+        .all()
+    )
+    for mb, username, pic in member_rows:
+        members_by_group[mb.group_id].append((mb, username, pic))
+
+    minutes = _group_minutes_by_member(db, group_ids)
+
+    results = []
+    for group, subject_display in rows:
         total = 0
         member_list = []
-        for mb in members_raw:
-            u = db.query(models.User).filter(models.User.id == mb.user_id).first()
-            mins = _group_member_minutes(db, mb.user_id, group)
+        for mb, username, pic in members_by_group[group.id]:
+            mins = minutes.get((group.id, mb.user_id), 0)
             total += mins
             member_list.append({
                 "user_id": mb.user_id,
-                "username": u.username if u else None,
+                "username": username,
                 "role": mb.role,
                 "minutes_contributed": mins,
-                "profile_pic_url": u.profile_pic_url if u else None,
+                "profile_pic_url": pic,
             })
 
-        subject_display = None
-        if group.subject_id:
-            subj = db.query(models.Subject).filter(models.Subject.id == group.subject_id).first()
-            subject_display = subj.display_name if subj else None
-
         results.append({
             "id": group.id, "name": group.name, "creator_id": group.creator_id,
             "goal_minutes": group.goal_minutes, "goal_deadline": group.goal_deadline,
@@ -1430,63 +1435,146 @@ def get_user_groups(db: Session, user_id: int) -> List[dict]:
     return results
 
 
-def _group_member_minutes(db: Session, user_id: int, group) -> int:
-    since = group.created_at
-    q = db.query(func.sum(models.StudySession.duration_minutes)).filter(
-        models.StudySession.user_id == user_id,
-        models.StudySession.completed_at >= since
+def _group_minutes_by_member(db: Session, group_ids: List[int]) -> dict:
+    """{(group_id, user_id): minutes} for every member of `group_ids`.
+
+    A member's contribution is their study minutes completed since the group
+    was created, restricted to the group's subject when it has one. Whole
+    days after the creation day come from the `user_daily_minutes` rollup;
+    only the creation day itself needs raw sessions, to honour the exact
+    creation time.
+    """
+    if not group_ids:
+        return {}
+    created_day = func.date(models.StudyGroup.created_at)
+    rollup_rows = (
+        db.query(
+            models.GroupMember.group_id,
+            models.GroupMember.user_id,
+            func.sum(models.UserDailyMinutes.minutes),
+        )
+        .join(models.StudyGroup, models.StudyGroup.id == models.GroupMember.group_id)
+        .join(models.UserDailyMinutes, models.UserDailyMinutes.user_id == models.GroupMember.user_id)
+        .filter(
+            models.GroupMember.group_id.in_(group_ids),
+            models.UserDailyMinutes.day > created_day,
+            or_(
+                models.StudyGroup.subject_id.is_(None),
+                models.UserDailyMinutes.subject_id == models.StudyGroup.subject_id,
+            ),
+        )
+        .group_by(models.GroupMember.group_id, models.GroupMember.user_id)
+        .all()
+    )
+    first_day_rows = (
+        db.query(
+            models.GroupMember.group_id,
+            models.GroupMember.user_id,
+            func.sum(models.StudySession.duration_minutes),
+        )
+        .join(models.StudyGroup, models.StudyGroup.id == models.GroupMember.group_id)
+        .join(models.StudySession, models.StudySession.user_id == models.GroupMember.user_id)
+        .filter(
+            models.GroupMember.group_id.in_(group_ids),
+            models.StudySession.completed_at >= models.StudyGroup.created_at,
+            func.date(models.StudySession.completed_at) == created_day,
+            models.StudySession.abandoned_at.is_(None),
+            or_(
+                models.StudyGroup.subject_id.is_(None),
+                models.StudySession.subject_id == models.StudyGroup.subject_id,
+            ),
+        )
+        .group_by(models.GroupMember.group_id, models.GroupMember.user_id)
+        .all()
     )
-    if group.subject_id:
-        q = q.filter(models.StudySession.subject_id == group.subject_id)
-    return q.scalar() or 0
+    minutes: dict = {}
+    for gid, uid, total in rollup_rows + first_day_rows:
+        minutes[(gid, uid)] = minutes.get((gid, uid), 0) + int(total or 0)
+    return minutes
 
 
 def send_group_message(db: Session, user_id: int, group_id: int, content: str) -> Optional[dict]:
-    member = db.query(models.GroupMember).filter(
-        models.GroupMember.group_id == group_id,
-        models.GroupMember.user_id == user_id
-    ).first()
-    if not member:
+    # Membership check and author fields in one round trip.
+    row = (
+        db.query(models.GroupMember.id, models.User.username, models.User.profile_pic_url)
+        .outerjoin(models.User, models.User.id == models.GroupMember.user_id)
+        .filter(
+            models.GroupMember.group_id == group_id,
+            models.GroupMember.user_id == user_id,
+        )
+        .first()
+    )
+    if not row:
         return None
+    _, username, profile_pic_url = row
     msg = models.GroupMessage(group_id=group_id, user_id=user_id, content=content)
     db.add(msg)
+    db.flush()
+    result = {"id": msg.id, "user_id": user_id, "username": username,
+              "content": msg.content, "created_at": msg.created_at,
+              "profile_pic_url": profile_pic_url}
     db.commit()
-    db.refresh(msg)
-    u = db.query(models.User).filter(models.User.id == user_id).first()
-    return {"id": msg.id, "user_id": user_id, "username": u.username if u else None,
-            "content": msg.content, "created_at": msg.created_at,
-            "profile_pic_url": u.profile_pic_url if u else None}
+    return result
 
 
-def get_group_messages(db: Session, group_id: int, user_id: int, limit: int = 50) -> List[dict]:
-    member = db.query(models.GroupMember).filter(
+def get_group_messages(
+    db: Session,
+    group_id: int,
+    user_id: int,
+    limit: int = 50,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+) -> Optional[List[dict]]:
+    """Group chat page, oldest first, authors joined in the same query.
+
+    No cursor → the latest `limit` messages. `before_id` pages backwards
+    through history; `after_id` returns only messages newer than the last
+    one the client has, so polling costs nothing when the chat is quiet.
+    Both cursors are message ids and the order is by id, which is also
+    send order, so every page is a range scan on (group_id, id).
+    Returns None if `user_id` isn't a member.
+    """
+    member = db.query(models.GroupMember.id).filter(
         models.GroupMember.group_id == group_id,
         models.GroupMember.user_id == user_id
     ).first()
     if not member:
         return None
-    msgs = db.query(models.GroupMessage).filter(
-        models.GroupMessage.group_id == group_id
-    ).order_by(models.GroupMessage.created_at.desc()).limit(limit).all()
-    results = []
-    for m in msgs:
-        u = db.query(models.User).filter(models.User.id == m.user_id).first()
-        results.append({
+    q = (
+        db.query(models.GroupMessage, models.User.username, models.User.profile_pic_url)
+        .outerjoin(models.User, models.User.id == models.GroupMessage.user_id)
+        .filter(models.GroupMessage.group_id == group_id)
+    )
+    if after_id is not None:
+        q = q.filter(models.GroupMessage.id > after_id).order_by(models.GroupMessage.id.asc())
+    else:
+        if before_id is not None:
+            q = q.filter(models.GroupMessage.id < before_id)
+        q = q.order_by(models.GroupMessage.id.desc())
+    rows = q.limit(limit).all()
+    if after_id is None:
+        rows.reverse()
+    return [
+        {
             "id": m.id, "user_id": m.user_id,
-            "username": u.username if u else None,
+            "username": username,
             "content": m.content, "created_at": m.created_at,
-            "profile_pic_url": u.profile_pic_url if u else None,
-        })
-    return list(reversed(results))
+            "profile_pic_url": profile_pic_url,
+        }
+        for m, username, profile_pic_url in rows
+    ]
 
 
 # ============ Activity Feed CRUD ============
 
 def _create_event(db: Session, user_id: int, event_type: str, description: str, extra_data: str = None):
-    db.add(models.ActivityEvent(
+    event = models.ActivityEvent(
         user_id=user_id, event_type=event_type,
         description=description, extra_data=extra_data
-    ))
+    )
+    db.add(event)
+    db.flush()
+    feed_timeline_service.fan_out(db, event)
     db.commit()
 
 
@@ -1500,31 +1588,15 @@ def create_session_event(db: Session, user_id: int, minutes: int, animal_name: s
         _create_event(db, user_id, "streak_milestone", f"is on a {user.current_streak}-day streak!")
 
 
-def get_friend_feed(db: Session, user_id: int, limit: int = 30) -> List[dict]:
-    friends = get_friends(db, user_id)
-    friend_ids = [entry["user"].id for entry in friends]
-    if not friend_ids:
-        return []
-
-    # Exclude blocked users
-    blocked_ids = [b.blocked_id for b in db.query(models.UserBlock).filter(
-        models.UserBlock.blocker_id == user_id
-    ).all()]
-    visible_ids = [fid for fid in friend_ids if fid not in blocked_ids]
-    if not visible_ids:
-        return []
-
-    events = (
-        db.query(models.ActivityEvent)
-        .options(selectinload(models.ActivityEvent.user))
-        .filter(models.ActivityEvent.user_id.in_(visible_ids))
-        .order_by(models.ActivityEvent.created_at.desc())
-        .limit(limit)
-        .all()
-    )
-
-    if not events:
+def get_friend_feed(db: Session, user_id: int, limit: int = 30, before_id: Optional[int] = None) -> List[dict]:
+    """Friends' activity, newest first, read from the caller's precomputed
+    timeline (see services/feed_timeline.py). Pass the last event id seen as
+    `before_id` to page further back."""
+    rows = feed_timeline_service.page(db, user_id, limit=limit, before_id=before_id)
+    if not rows:
         return []
+    events = [e for e, _ in rows]
+    usernames = {e.id: username for e, username in rows}
 
     event_ids = [e.id for e in events]
     reactions_by_event: dict[int, list] = {e.id: [] for e in events}
@@ -1542,10 +1614,9 @@ def get_friend_feed(db: Session, user_id: int, limit: int = 30) -> List[dict]:
 
     results = []
     for e in events:
-        author = e.user
         results.append({
             "id": e.id, "user_id": e.user_id,
-            "username": author.username if author is not None else None,
+            "username": usernames[e.id],
             "event_type": e.event_type, "description": e.description,
             "created_at": e.created_at,
             "reactions": reactions_by_event[e.id],
@@ -1575,6 +1646,8 @@ def add_reaction(db: Session, user_id: int, event_id: int, reaction: str) -> boo
         existing.reaction = reaction
     else:
         db.add(models.FeedReaction(event_id=event_id, user_id=user_id, reaction=reaction))
+    if event.user_id != user_id and (existing is None or not existing.seen):
+        reaction_inbox.record_reaction(db, event.user_id, new_unseen=existing is None)
     db.commit()
     return True
 
@@ -1750,8 +1823,12 @@ def _award(db: Session, user_id: int, badge_id: str, already: set) -> Optional[s
     return badge_id
 
 
-def check_badges(db: Session, user_id: int, session_hour: int = None, session_minutes: int = None) -> List[str]:
-    """Check all badge conditions and award any newly earned. Returns list of newly awarded badge_ids."""
+def check_badges(db: Session, user_id: int, session_hour: int = None, session_minutes: int = None,
+                 commit: bool = True) -> List[str]:
+    """Check all badge conditions and award any newly earned. Returns list of newly awarded badge_ids.
+
+    With commit=False the awards are only flushed, so the caller can commit
+    them together with its own bookkeeping."""
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if not user:
         return []
@@ -1817,75 +1894,41 @@ def check_badges(db: Session, user_id: int, session_hour: int = None, session_mi
         if 17 <= session_hour < 19: capped_award("golden_hour")
         if 2 <= session_hour < 5: capped_award("all_nighter")
 
+    # Everything below reads the precomputed counters, not session/animal history.
+    built = db.get(models.UserBadgeProgress, user_id) is None
+    progress = badge_progress_service.get_progress(db, user_id)
+
     # Early bird / night owl multi-session
-    early_count = db.query(models.StudySession).filter(
-        models.StudySession.user_id == user_id
-    ).all()
-    early_sessions = sum(1 for s in early_count if s.completed_at and s.completed_at.hour < 8)
-    night_sessions = sum(1 for s in early_count if s.completed_at and s.completed_at.hour >= 22)
-    if early_sessions >= 5: capped_award("dawn_patrol")
-    if night_sessions >= 5: capped_award("moonlight_scholar")
+    if progress.early_sessions >= 5: capped_award("dawn_patrol")
+    if progress.night_sessions >= 5: capped_award("moonlight_scholar")
 
     # Weekend scholar
-    today = datetime.utcnow().date()
-    current_weekday = today.weekday()
-    monday = today - timedelta(days=current_weekday)
-    week_sessions = db.query(models.StudySession).filter(
-        models.StudySession.user_id == user_id,
-        models.StudySession.completed_at >= datetime.combine(monday, datetime.min.time())
-    ).all()
-    week_days = {s.completed_at.weekday() for s in week_sessions if s.completed_at}
+    week_days = badge_progress_service.week_days(progress)
     if 5 in week_days and 6 in week_days: capped_award("weekend_scholar")
 
     # Comeback kid
-    if user.last_study_date and "comeback_kid" not in already:
-        all_sessions = db.query(models.StudySession).filter(
-            models.StudySession.user_id == user_id
-        ).order_by(models.StudySession.completed_at.desc()).limit(2).all()
-        if len(all_sessions) >= 2 and all_sessions[0].completed_at and all_sessions[1].completed_at:
-            gap = (all_sessions[0].completed_at - all_sessions[1].completed_at).days
-            if gap >= 7: capped_award("comeback_kid")
+    if progress.last_gap_days >= 7: capped_award("comeback_kid")
 
     # Animals
-    total_animals = db.query(func.count(models.UserAnimal.id)).filter(
-        models.UserAnimal.user_id == user_id
-    ).scalar() or 0
-    unique_animals = db.query(models.UserAnimal.animal_id).filter(
-        models.UserAnimal.user_id == user_id
-    ).distinct().count()
+    total_animals = progress.total_animals
+    unique_animals = progress.unique_animals
     if total_animals >= 1: capped_award("first_friend")
     if unique_animals >= 8: capped_award("growing_family")
     if total_animals >= 25: capped_award("collectors_pride")
     if unique_animals >= 30: capped_award("full_sanctuary")
 
     # Favourite friend (same animal 5 times)
-    dupes = db.query(func.count(models.UserAnimal.id)).filter(
-        models.UserAnimal.user_id == user_id
-    ).group_by(models.UserAnimal.animal_id).all()
-    if any(c[0] >= 5 for c in dupes): capped_award("favourite_friend")
+    if progress.max_species_count >= 5: capped_award("favourite_friend")
 
     # Speed hatcher (3 in one day)
-    today_start = datetime.combine(today, datetime.min.time())
-    today_hatches = db.query(models.UserAnimal).filter(
-        models.UserAnimal.user_id == user_id,
-        models.UserAnimal.hatched_at >= today_start
-    ).count()
-    if today_hatches >= 3: capped_award("speed_hatcher")
+    if badge_progress_service.hatches_today(progress) >= 3: capped_award("speed_hatcher")
 
     # Rare/legendary animal badges
-    user_animal_rarities = db.query(models.Animal.rarity).join(
-        models.UserAnimal, models.UserAnimal.animal_id == models.Animal.id
-    ).filter(models.UserAnimal.user_id == user_id).all()
-    rarity_set = {r[0] for r in user_animal_rarities if r[0]}
-    if "rare" in rarity_set or "epic" in rarity_set: capped_award("rare_finder")
-    if "legendary" in rarity_set: capped_award("legendary_keeper")
+    if progress.has_rare: capped_award("rare_finder")
+    if progress.has_legendary: capped_award("legendary_keeper")
 
     # Naming ceremony
-    named = db.query(models.UserAnimal).filter(
-        models.UserAnimal.user_id == user_id,
-        models.UserAnimal.nickname != None
-    ).count()
-    if named >= 5: capped_award("naming_ceremony")
+    if progress.named_animals >= 5: capped_award("naming_ceremony")
 
     # Eco-Credits
     if cc >= 500: capped_award("saver")
@@ -1894,29 +1937,16 @@ def check_badges(db: Session, user_id: int, session_hour: int = None, session_mi
     if spent >= 1000: capped_award("big_spender")
 
     # Subjects
-    subject_query = db.query(
-        models.StudySession.subject_id,
-        func.sum(models.StudySession.duration_minutes)
-    ).filter(
-        models.StudySession.user_id == user_id,
-        models.StudySession.subject_id != None
-    ).group_by(models.StudySession.subject_id).all()
-
-    distinct_subjects = len(subject_query)
+    distinct_subjects = progress.distinct_subjects
     if distinct_subjects >= 3: capped_award("subject_explorer")
     if distinct_subjects >= 6: capped_award("renaissance_student")
 
-    max_subject_mins = max((s[1] for s in subject_query if s[1]), default=0)
+    max_subject_mins = progress.max_subject_minutes
     if max_subject_mins >= 600: capped_award("deep_diver")
     if max_subject_mins >= 1500: capped_award("subject_champion")
 
     # Balanced brain: 3+ subjects in current week
-    week_subjects = db.query(models.StudySession.subject_id).filter(
-        models.StudySession.user_id == user_id,
-        models.StudySession.completed_at >= datetime.combine(monday, datetime.min.time()),
-        models.StudySession.subject_id != None
-    ).distinct().count()
-    if week_subjects >= 3: capped_award("balanced_brain")
+    if badge_progress_service.week_subject_count(progress) >= 3: capped_award("balanced_brain")
     if distinct_subjects >= 10: capped_award("polymath")
 
     # Eco-credits: first purchase
@@ -1924,22 +1954,12 @@ def check_badges(db: Session, user_id: int, session_hour: int = None, session_mi
     if spent > 0: capped_award("first_purchase")
 
     # Friends count
-    friend_count = db.query(models.Friendship).filter(
-        models.Friendship.status == "accepted",
-        ((models.Friendship.user_id == user_id) | (models.Friendship.friend_id == user_id))
-    ).count()
+    friend_count = progress.friend_count
     if friend_count >= 1: capped_award("first_friend_social")
     if friend_count >= 10: capped_award("social_butterfly")
 
     # Team player: contributed 60+ mins to any group
-    user_groups = db.query(models.GroupMember).filter(models.GroupMember.user_id == user_id).all()
-    for gm in user_groups:
-        group = db.query(models.StudyGroup).filter(models.StudyGroup.id == gm.group_id).first()
-        if group:
-            mins_in_group = _group_member_minutes(db, user_id, group)
-            if mins_in_group >= 60:
-                capped_award("team_player")
-                break
+    if progress.max_group_minutes >= 60: capped_award("team_player")
 
     # Founding Member — first 100 users who complete at least 2 study sessions.
     # (Previous rule was "first 100 verified by created_at" but many users who
@@ -1953,11 +1973,7 @@ def check_badges(db: Session, user_id: int, session_hour: int = None, session_mi
             models.UserBadge.badge_id == "founding_member"
         ).scalar() or 0
         if current_count < FOUNDING_MEMBER_LIMIT:
-            sessions_completed = db.query(func.count(models.StudySession.id)).filter(
-                models.StudySession.user_id == user_id,
-                models.StudySession.completed_at.isnot(None),
-            ).scalar() or 0
-            if sessions_completed >= 2:
+            if progress.sessions_completed >= 2:
                 awarded = _award(db, user_id, "founding_member", already)
                 if awarded:
                     new_badges.append(awarded)
@@ -1965,8 +1981,12 @@ def check_badges(db: Session, user_id: int, session_hour: int = None, session_mi
                     user.total_coins = (user.total_coins or 0) + 500
                     user.eco_credits_multiplier = 1.25
 
-    if new_badges:
-        db.commit()
+    # Commits a freshly built progress row too, so the next check is cheap.
+    if new_badges or built:
+        if commit:
+            db.commit()
+        else:
+            db.flush()
 
     return new_badges
 
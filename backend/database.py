@@ -17,12 +17,24 @@ if SQLALCHEMY_DATABASE_URL.startswith("postgres://"):
 # All sync `def` route handlers run in Starlette's threadpool (default 40
 # threads in anyio). At peak each thread can hold one DB connection while
 # its request is in-flight, so the DB pool MUST exceed 40 to avoid the
-# Starlette pool feeding faster than SQLAlchemy can serve. Three cron jobs
-# (onboarding emails, lifecycle pushes, reaper) hold one extra connection
-# each while running, eating into the budget further.
+# Starlette pool feeding faster than SQLAlchemy can serve.
 #
-# Defaults below give 50 total connections (25 base + 25 overflow) which
-# leaves comfortable headroom over the 40-thread Starlette pool. Override
+# Cron jobs share this pool too: the web process runs the leader-elected
+# scheduler unless RUN_SCHEDULER_IN_WEB=0 (see main.start_scheduler). The
+# leader pins one connection for the advisory lock (services/leader.
+# LeaderLock) for as long as it holds it — standbys only borrow one briefly
+# per poll — and the leader also runs up to 10 APScheduler job threads (the
+# default executor), each holding a connection while its job runs. Worst
+# case on the leader is therefore 40 + 1 + 10 = 51. Only once a dedicated
+# `python -m worker` is deployed and RUN_SCHEDULER_IN_WEB=0 is set does the
+# web budget drop back to the 40 request threads. With N Uvicorn workers
+# the totals multiply by N — size DB_POOL_SIZE / DB_POOL_OVERFLOW down
+# accordingly.
+#
+# Defaults below give 50 total connections (25 base + 25 overflow): enough
+# for the request threads plus the lock connection, and crons rarely run
+# all at once, so a burst that overlaps them queues for at most
+# pool_timeout instead of failing. Override
 # via env if Railway's Postgres plan caps you lower (Hobby ≈ 20-25,
 # Standard ≈ 100). pool_timeout=10s means requests fail fast instead of
 # spinning for 30s and piling up — better UX and clearer Sentry signals
@@ -2,34 +2,62 @@ from fastapi import FastAPI, Depends, HTTPException, status, Request, Header, Up
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, EmailStr, Field, field_validator
 from sqlalchemy.orm import Session
-from sqlalchemy import text, func, or_, and_, select, inspect
+from sqlalchemy import text, func, or_, and_, select, inspect, exists, literal, union_all
 from datetime import timedelta, datetime, date
 from typing import List, Optional
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
-from fastapi.responses import JSONResponse, Response
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 import models
 import schemas
 import crud
 from database import engine, get_db, Base, SQLALCHEMY_DATABASE_URL
 from auth import (
     get_password_hash, verify_password, create_access_token,
-    get_current_user, get_optional_user, ACCESS_TOKEN_EXPIRE_MINUTES
+    get_current_user, get_optional_user, ACCESS_TOKEN_EXPIRE_MINUTES,
+    invalidate_user_tokens,
 )
 from services import push as push_service
+from services import email_dispatch
+from services import leaderboard as leaderboard_service
+from services import badge_progress as badge_progress_service
+from services import daily_minutes as daily_minutes_service
+from services import feed_timeline as feed_timeline_service
+from services import reaction_inbox
+from services import blob_store
+from services import image_variants
+from services import session_pipeline
+from services import app_version_telemetry
+from services import rate_limit_store
+from services import school_search
+from services import school_clusters
+from services import metrics_snapshot
+from services import cohort_retention
+from services import keyset
+from services import streaming
+from services import response_cache
 import os
 import re
 import html
 import json as _json
 import logging
+import threading
 import time
 import httpx
 from content_filter import contains_profanity
 
 logger = logging.getLogger(__name__)
-limiter = Limiter(key_func=get_remote_address)
+# Counters live in shared storage (services/rate_limit_store.py) so limits hold
+# across Uvicorn workers and deploys. If the store is unreachable, slowapi
+# falls back to per-process memory rather than failing requests.
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=rate_limit_store.STORAGE_URI,
+    strategy="sliding-window-counter",
+    in_memory_fallback_enabled=True,
+)
 
 
 # ── Sentry error tracking ────────────────────────────────────────
@@ -77,7 +105,8 @@ else:
                      "product_tests", "product_test_events",
                      "research_surveys", "research_survey_questions",
                      "research_survey_assignments", "research_survey_responses",
-                     "school_display"]:
+                     "school_display", "leaderboard_standings",
+                     "user_badge_progress", "session_followups"]:
             if not _insp.has_table(_tbl):
                 Base.metadata.tables[_tbl].create(bind=engine)
                 print(f"Created missing table: {_tbl}")
@@ -149,6 +178,12 @@ else:
                 _conn.commit()
         except Exception as _ixe:
             print(f"Note: could not create ix_users_app_version: {_ixe}")
+        try:
+            with engine.connect() as _conn:
+                _conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_email_lower ON users (lower(email))"))
+                _conn.commit()
+        except Exception as _ixe:
+            print(f"Note: could not create ix_users_email_lower: {_ixe}")
         _oauth_cols = ("apple_id_sub", "google_id_sub")
         for _oc in _oauth_cols:
             if _oc not in _user_cols:
@@ -202,6 +237,16 @@ else:
                         _conn.commit()
                 except Exception as _ixe:
                     print(f"Note: could not create ix_study_sessions_auto_completed_at: {_ixe}")
+        # uploads.sha256 / size (alembic i9b0l1o2b3s4). serve_upload selects
+        # these columns, so make sure they exist before the first request.
+        if _insp.has_table("uploads"):
+            _up_cols = [c["name"] for c in _insp.get_columns("uploads")]
+            for _col, _ddl in (("sha256", "VARCHAR(64) NULL"), ("size", "INTEGER NULL")):
+                if _col not in _up_cols:
+                    with engine.connect() as _conn:
+                        _conn.execute(text(f"ALTER TABLE uploads ADD COLUMN {_col} {_ddl}"))
+                        _conn.commit()
+                    print(f"Added {_col} column to uploads")
         # product_tests.cohort_started_at (alembic z3a4b5c67d28).
         # Safety net so the funnel cohort fix works even on envs that haven't
         # run migrations yet — the column is read by _funnel_arm_counts to
@@ -224,6 +269,14 @@ try:
     from database import SessionLocal
     _seed_db = SessionLocal()
     crud.seed_default_subjects(_seed_db)
+    # Standings table created by the safety net above (or an env that
+    # skipped the alembic backfill) starts empty — populate it once.
+    if not leaderboard_service.has_standings(_seed_db) and _seed_db.query(models.User.id).first():
+        leaderboard_service.rebuild_standings(_seed_db)
+    if not daily_minutes_service.has_rollup(_seed_db) and _seed_db.query(models.StudySession.id).filter(
+        models.StudySession.completed_at.isnot(None)
+    ).first():
+        daily_minutes_service.rebuild(_seed_db)
     for _uid in [1, 2]:
         _u = _seed_db.query(models.User).filter(models.User.id == _uid).first()
         if _u and not _u.is_admin:
@@ -301,104 +354,139 @@ def _match_reengagement(templates, user, last_active_days, sent_keys):
     return best
 
 
-def _cron_run_onboarding_emails():
-    """Background job: send onboarding lifecycle emails daily."""
-    import time
-    from database import SessionLocal
-    import resend.exceptions as _resend_exc
-    _db = SessionLocal()
-    try:
-        resend_key = os.getenv("RESEND_API_KEY")
-        if not resend_key:
-            logger.warning("Cron: RESEND_API_KEY not set, skipping onboarding emails")
-            return
+def _onboarding_email_jobs(
+    db: Session, now: datetime, *, after_user_id: int = 0, run_started_at: datetime | None = None,
+) -> list[email_dispatch.EmailJob]:
+    """Resolve a whole onboarding run in a few set-based queries.
 
-        # Safety ceiling — prevents a bug from burning through your monthly quota
-        # in one runaway cron. On paid plans set DAILY_EMAIL_CAP to a high value
-        # or leave unset (defaults to 10 000, well above any realistic daily send).
-        daily_cap = int(os.getenv("DAILY_EMAIL_CAP", "10000"))
+    One UNION ALL returns (user, kind, template) candidates — per template,
+    verified users past its threshold (and inside its session/streak band
+    for re-engagement) with no EmailLog for it yet. Each user then gets at
+    most one milestone email (lowest trigger_day) and one re-engagement
+    email (lowest inactive_days, then id), with variables bulk-loaded.
+    Users after `after_user_id` only; on a resumed run anyone already
+    emailed one of these templates since `run_started_at` is skipped.
+    """
+    templates = db.query(models.EmailTemplate).filter(
+        models.EmailTemplate.is_active == True,  # noqa: E712
+        or_(
+            models.EmailTemplate.trigger_day.isnot(None),
+            models.EmailTemplate.inactive_days.isnot(None),
+        ),
+    ).all()
+    milestones = sorted((t for t in templates if t.trigger_day is not None), key=lambda t: t.trigger_day)
+    reengagement = sorted(
+        (t for t in templates if t.inactive_days is not None), key=lambda t: (t.inactive_days, t.id),
+    )
+    if not milestones and not reengagement:
+        return []
 
-        # Throttle: Resend allows 5 req/s. We send at ~3/s (0.35s gap) to stay
-        # well clear of the per-second limit even under jitter.
-        send_interval = float(os.getenv("EMAIL_SEND_INTERVAL", "0.35"))
+    base_filter = [
+        models.User.email_verified == True,  # noqa: E712
+        or_(models.User.is_archived == False, models.User.is_archived == None),  # noqa: E712
+        models.User.created_at.isnot(None),
+        models.User.email.isnot(None),
+        models.User.id > after_user_id,
+    ]
+    if run_started_at is not None:
+        base_filter.append(~exists().where(
+            models.EmailLog.user_id == models.User.id,
+            models.EmailLog.sent_at >= run_started_at,
+            models.EmailLog.template_key.in_([t.template_key for t in templates]),
+        ))
 
-        now = datetime.utcnow()
-        sent = {"day3": 0, "day7": 0, "day14": 0, "day30": 0, "reengagement": 0}
-        total_sent = 0
+    def _not_sent(template_key: str):
+        return ~exists().where(
+            models.EmailLog.user_id == models.User.id,
+            models.EmailLog.template_key == template_key,
+        )
 
-        milestone_templates = _db.query(models.EmailTemplate).filter(
-            models.EmailTemplate.is_active == True,
-            models.EmailTemplate.trigger_day.isnot(None),
-        ).all()
-        reengagement_templates = _db.query(models.EmailTemplate).filter(
-            models.EmailTemplate.is_active == True,
-            models.EmailTemplate.inactive_days.isnot(None),
-        ).order_by(models.EmailTemplate.id).all()
-        if not milestone_templates and not reengagement_templates:
-            return
+    sessions = func.coalesce(models.User.total_sessions, 0)
+    streak = func.coalesce(models.User.longest_streak, 0)
+    selects = []
+    for t in milestones:
+        window = [models.User.created_at <= now - timedelta(days=t.trigger_day)]
+        selects.append((t, window))
+    for t in reengagement:
+        window = [
+            models.User.created_at <= now - timedelta(days=4),
+            models.User.last_study_date.isnot(None),
+            models.User.last_study_date <= now - timedelta(days=t.inactive_days),
+        ]
+        if t.min_sessions is not None:
+            window.append(sessions >= t.min_sessions)
+        if t.max_sessions is not None:
+            window.append(sessions <= t.max_sessions)
+        if t.min_streak is not None:
+            window.append(streak >= t.min_streak)
+        if t.max_streak is not None:
+            window.append(streak <= t.max_streak)
+        selects.append((t, window))
+    query = union_all(*(
+        select(models.User.id, literal(t.template_key).label("template_key"))
+        .where(*base_filter, *window, _not_sent(t.template_key))
+        for t, window in selects
+    ))
+    eligible: dict[int, set[str]] = {}
+    for user_id, template_key in db.execute(query).all():
+        eligible.setdefault(user_id, set()).add(template_key)
+    if not eligible:
+        return []
 
-        milestones = sorted(
-            [(t.trigger_day, t.template_key) for t in milestone_templates],
-            key=lambda x: x[0],
+    users = db.query(models.User).filter(models.User.id.in_(list(eligible))).order_by(models.User.id).all()
+    # Email templates use the same {placeholder} set as push templates.
+    variables = _push_variables_for_users(db, users)
+    compiled = email_dispatch.compile_templates(templates)
+    jobs: list[email_dispatch.EmailJob] = []
+    for user in users:
+        keys = eligible[user.id]
+        picked = []
+        milestone = next((t for t in milestones if t.template_key in keys), None)
+        if milestone:
+            picked.append((milestone, f"day{milestone.trigger_day}"))
+        reengage = next(
+            (t for t in reengagement if t.template_key in keys and t is not milestone), None,
         )
+        if reengage:
+            picked.append((reengage, "reengagement"))
+        for t, label in picked:
+            jobs.append(email_dispatch.EmailJob(
+                user.id, user.email, compiled[t.template_key], label, variables[user.id],
+            ))
+    return jobs
 
-        users = _db.query(models.User).filter(
-            models.User.email_verified == True,
-            or_(models.User.is_archived == False, models.User.is_archived == None),
-        ).all()
-        for user in users:
-            if total_sent >= daily_cap:
-                logger.warning(
-                    f"Cron: daily email cap ({daily_cap}) reached after {total_sent} sends "
-                    f"— stopping early ({len(users) - users.index(user)} users skipped)."
-                )
-                break
 
-            if not user.created_at or not user.email:
-                continue
-            days_since_signup = (now - user.created_at).days
-            last_active_days = (now - user.last_study_date).days if user.last_study_date else None
-            name = user.username or "there"
-            animals_count = _db.query(func.count(models.UserAnimal.id)).filter(models.UserAnimal.user_id == user.id).scalar() or 0
-            badges_count = _db.query(func.count(models.UserBadge.id)).filter(models.UserBadge.user_id == user.id).scalar() or 0
-            variables = {
-                "name": name, "total_minutes": str(user.total_study_minutes or 0),
-                "animals_count": str(animals_count), "streak": str(user.current_streak or 0),
-                "longest_streak": str(user.longest_streak or 0), "sessions": str(user.total_sessions or 0),
-                "badges": str(badges_count),
-            }
-            sent_keys = {el.template_key for el in _db.query(models.EmailLog.template_key).filter(
-                models.EmailLog.user_id == user.id
-            ).all()}
-            try:
-                for trigger_day, tkey in milestones:
-                    if days_since_signup >= trigger_day and tkey not in sent_keys:
-                        if _send_template_email(tkey, user.email, variables, _db):
-                            label = f"day{trigger_day}"
-                            if label in sent:
-                                sent[label] += 1
-                            total_sent += 1
-                            sent_keys.add(tkey)
-                            time.sleep(send_interval)
-                            break
-                if (reengagement_templates and last_active_days is not None and days_since_signup > 3):
-                    matched = _match_reengagement(reengagement_templates, user, last_active_days, sent_keys)
-                    if matched:
-                        if _send_template_email(matched.template_key, user.email, variables, _db):
-                            sent["reengagement"] += 1
-                            total_sent += 1
-                            time.sleep(send_interval)
-            except _resend_exc.RateLimitError:
-                # Resend daily quota exhausted — stop the whole batch immediately.
-                # Log as warning (not error) so Sentry isn't spammed.
-                logger.warning(
-                    f"Cron: Resend RateLimitError after {total_sent} sends today. "
-                    "Stopping batch. Consider raising DAILY_EMAIL_CAP or upgrading Resend plan."
-                )
-                break
-            except Exception as e:
-                logger.error(f"Cron: Failed to send onboarding email to {user.email}: {e}")
-        logger.info(f"Cron: Onboarding emails sent: {sent} (total={total_sent}), users checked: {len(users)}")
+def _run_onboarding_emails(db: Session, run_key: str | None = None) -> dict:
+    """Daily onboarding + re-engagement emails, one resumable run per day."""
+    if not os.getenv("RESEND_API_KEY"):
+        return {"error": "RESEND_API_KEY not set"}
+
+    # Safety ceiling — prevents a bug from burning through your monthly quota
+    # in one runaway cron. On paid plans set DAILY_EMAIL_CAP to a high value
+    # or leave unset (defaults to 10 000, well above any realistic daily send).
+    daily_cap = int(os.getenv("DAILY_EMAIL_CAP", "10000"))
+    now = datetime.utcnow()
+    run = email_dispatch.begin(db, run_key or f"onboarding:{now.date().isoformat()}")
+    if run.status == "completed":
+        return {**email_dispatch.summary(run), "note": "already completed"}
+    resumed = run.last_user_id > 0 or run.sent > 0
+    jobs = _onboarding_email_jobs(
+        db, now, after_user_id=run.last_user_id,
+        run_started_at=run.started_at if resumed else None,
+    )
+    return email_dispatch.dispatch(db, run, jobs, cap=daily_cap)
+
+
+def _cron_run_onboarding_emails():
+    """Background job: send onboarding lifecycle emails daily."""
+    from database import SessionLocal
+    _db = SessionLocal()
+    try:
+        if not os.getenv("RESEND_API_KEY"):
+            logger.warning("Cron: RESEND_API_KEY not set, skipping onboarding emails")
+            return
+        result = _run_onboarding_emails(_db)
+        logger.info(f"Cron: Onboarding emails: {result}")
     except Exception as e:
         logger.error(f"Cron: Error running onboarding emails: {e}", exc_info=True)
     finally:
@@ -458,44 +546,243 @@ def _cron_reap_stale_sessions():
         _db.close()
 
 
+def _cron_flush_app_versions():
+    """Every few seconds — write buffered X-App-Version / X-App-Build
+    observations to users in one batch. See services/app_version_telemetry."""
+    from database import SessionLocal
+    _db = SessionLocal()
+    try:
+        app_version_telemetry.flush(_db)
+    except Exception as e:
+        logger.error(f"Cron flush_app_versions failed: {e}", exc_info=True)
+    finally:
+        _db.close()
+
+
+def _cron_flush_metric_counters():
+    """Every few seconds — fold this process's buffered overview counter
+    deltas into metrics_counters. See services/metrics_snapshot."""
+    from database import SessionLocal
+    _db = SessionLocal()
+    try:
+        metrics_snapshot.flush_counters(_db)
+    except Exception as e:
+        logger.error(f"Cron flush_metric_counters failed: {e}", exc_info=True)
+    finally:
+        _db.close()
+
+
+def _cron_refresh_metrics_snapshot():
+    """Every few minutes — incrementally refresh the /admin/overview snapshot."""
+    from database import SessionLocal
+    _db = SessionLocal()
+    try:
+        metrics_snapshot.refresh(_db, _overview_funnel)
+    except Exception as e:
+        logger.error(f"Cron refresh_metrics_snapshot failed: {e}", exc_info=True)
+    finally:
+        _db.close()
+
+
+def _cron_sweep_session_followups():
+    """Every 30s — retry failed / orphaned session follow-up jobs. See
+    services/session_pipeline.py."""
+    from database import SessionLocal
+    _db = SessionLocal()
+    try:
+        result = session_pipeline.sweep(_db)
+        if result["dispatched"] or result["reclaimed"]:
+            logger.info(f"Cron sweep_session_followups: {result}")
+    except Exception as e:
+        logger.error(f"Cron sweep_session_followups failed: {e}", exc_info=True)
+    finally:
+        _db.close()
+
+
+def _cron_prune_feed_timelines():
+    """Daily — drop feed timeline entries past services.feed_timeline.KEEP_DAYS."""
+    from database import SessionLocal
+    _db = SessionLocal()
+    try:
+        deleted = feed_timeline_service.prune(_db)
+        if deleted:
+            logger.info(f"Cron prune_feed_timelines: deleted={deleted}")
+    except Exception as e:
+        logger.error(f"Cron prune_feed_timelines failed: {e}", exc_info=True)
+    finally:
+        _db.close()
+
+
+def _cron_prune_leaderboard_standings():
+    """Daily — drop weekly standings older than services.leaderboard.KEEP_WEEKS."""
+    from database import SessionLocal
+    _db = SessionLocal()
+    try:
+        deleted = leaderboard_service.prune_standings(_db)
+        _db.commit()
+        if deleted:
+            logger.info(f"Cron prune_leaderboard_standings: deleted={deleted}")
+    except Exception as e:
+        logger.error(f"Cron prune_leaderboard_standings failed: {e}", exc_info=True)
+    finally:
+        _db.close()
+
+
+def _cron_poll_push_receipts():
+    """Every 15 min — resolve 'sent' pushes to delivered/failed from Expo receipts."""
+    from database import SessionLocal
+    _db = SessionLocal()
+    try:
+        result = push_service.poll_receipts(_db)
+        if result["checked"]:
+            logger.info(f"Cron poll_push_receipts: {result}")
+    except Exception as e:
+        logger.error(f"Cron poll_push_receipts failed: {e}", exc_info=True)
+    finally:
+        _db.close()
+
+
+# Defaults applied to every job:
+#   misfire_grace_time=3600 → if the container was restarting at the
+#     scheduled minute (Railway redeploy etc.), the job still fires as
+#     soon as APScheduler is back online, up to 1h late.
+#   coalesce=True           → if multiple runs were missed (e.g. long
+#     downtime), collapse them into a single run on recovery.
+_SCHEDULER_JOB_DEFAULTS = {"misfire_grace_time": 3600, "coalesce": True}
+
+
+def build_scheduler():
+    """The cluster-wide cron jobs. Run by `python -m worker` on whichever
+    instance holds the leader lock (services/leader.py), never in more than
+    one process at a time."""
+    from apscheduler.schedulers.background import BackgroundScheduler
+    scheduler = BackgroundScheduler(job_defaults=_SCHEDULER_JOB_DEFAULTS)
+    scheduler.add_job(_cron_run_onboarding_emails, "cron", hour=8, minute=0, id="onboarding_emails")
+    # Apple iTunes RSS sync runs twice daily (04:00 + 16:00 UTC). Apple
+    # refreshes the marketing RSS feed roughly every few hours, so the
+    # second run captures intraday movement and recovers if the morning
+    # run was missed (e.g. Railway deploy at the wrong minute).
+    scheduler.add_job(_cron_sync_app_ranks, "cron", hour=4, minute=0, id="sync_app_ranks_am")
+    scheduler.add_job(_cron_sync_app_ranks, "cron", hour=16, minute=0, id="sync_app_ranks_pm")
+    # Lifecycle push notifications run a couple hours after the email cron
+    # so users on both channels don't get hit with two notifications at the
+    # exact same minute. Push at 10:00 UTC = early morning in LATAM, lunchtime
+    # in Europe, evening in Asia — covers the bulk of the user base.
+    scheduler.add_job(_cron_lifecycle_pushes, "cron", hour=10, minute=0, id="lifecycle_pushes")
+    # Stale session reaper every 15 min. Cheap query (only scans rows
+    # with completed_at IS NULL AND auto_completed_at IS NULL, indexed),
+    # so safe to run frequently. Tighter cadence = less time between a
+    # user finishing their study and seeing their coins next launch.
+    scheduler.add_job(_cron_reap_stale_sessions, "interval", minutes=15, id="reap_stale_sessions")
+    scheduler.add_job(_cron_prune_feed_timelines, "cron", hour=3, minute=30, id="prune_feed_timelines")
+    scheduler.add_job(
+        _cron_prune_leaderboard_standings, "cron", hour=3, minute=45, id="prune_leaderboard_standings",
+    )
+    scheduler.add_job(
+        _cron_poll_push_receipts, "interval", minutes=15,
+        id="poll_push_receipts", max_instances=1,
+    )
+    # Session follow-up retries: the sweep re-dispatches into this
+    # process's pipeline pool, so it must only run in one place.
+    scheduler.add_job(
+        _cron_sweep_session_followups, "interval",
+        seconds=session_pipeline.SWEEP_INTERVAL_SECONDS,
+        id="sweep_session_followups", misfire_grace_time=30, max_instances=1,
+    )
+    # Admin overview snapshot: incremental, so cheap enough to keep fresh.
+    scheduler.add_job(
+        _cron_refresh_metrics_snapshot, "interval",
+        minutes=metrics_snapshot.SNAPSHOT_INTERVAL_MINUTES,
+        id="refresh_metrics_snapshot", misfire_grace_time=60, max_instances=1,
+    )
+    return scheduler
+
+
+def run_leader_scheduler(stop_event: threading.Event) -> None:
+    """Compete for the scheduler leader lock and run `build_scheduler()`
+    while we hold it. Blocks until `stop_event` is set."""
+    from database import engine
+    from services import leader
+
+    current = {}
+
+    def _start():
+        current["scheduler"] = build_scheduler()
+        current["scheduler"].start()
+        logger.info(
+            "Scheduler started: onboarding emails 08:00 UTC, lifecycle pushes 10:00 UTC, "
+            "app_ranks sync 04:00 + 16:00 UTC, stale session reaper every 15 min, "
+            "feed timeline prune 03:30 UTC, standings prune 03:45 UTC, push receipts every 15 min, "
+            f"session follow-up sweep every {session_pipeline.SWEEP_INTERVAL_SECONDS}s, "
+            f"metrics snapshot every {metrics_snapshot.SNAPSHOT_INTERVAL_MINUTES} min "
+            "(misfire_grace=1h)"
+        )
+
+    def _stop():
+        scheduler = current.pop("scheduler", None)
+        if scheduler is not None:
+            scheduler.shutdown(wait=True)
+
+    leader.run_as_leader(leader.LeaderLock(engine), _start, _stop, stop_event)
+
+
+_web_scheduler_stop = threading.Event()
+
+
 @app.on_event("startup")
 def start_scheduler():
+    """Per-process jobs, plus the leader-elected cron loop unless
+    RUN_SCHEDULER_IN_WEB=0. The loop is on by default because the Railway
+    deploy only runs the `web:` service; extra web workers and a
+    `python -m worker` service just stand by behind the same leader lock,
+    so crons never run twice. Set it to 0 on the web service once a
+    dedicated worker is deployed."""
     try:
         from apscheduler.schedulers.background import BackgroundScheduler
-        # Defaults applied to every job:
-        #   misfire_grace_time=3600 → if the container was restarting at the
-        #     scheduled minute (Railway redeploy etc.), the job still fires as
-        #     soon as APScheduler is back online, up to 1h late.
-        #   coalesce=True           → if multiple runs were missed (e.g. long
-        #     downtime), collapse them into a single run on recovery.
-        scheduler = BackgroundScheduler(
-            job_defaults={"misfire_grace_time": 3600, "coalesce": True},
+        scheduler = BackgroundScheduler(job_defaults=_SCHEDULER_JOB_DEFAULTS)
+        # App version telemetry write-behind. The buffer is per process, so
+        # every web worker flushes its own. Short misfire grace: a missed
+        # tick is simply absorbed by the next one.
+        scheduler.add_job(
+            _cron_flush_app_versions, "interval",
+            seconds=app_version_telemetry.FLUSH_INTERVAL_SECONDS,
+            id="flush_app_versions", misfire_grace_time=30, max_instances=1,
+        )
+        # Overview counter deltas are buffered per process too.
+        scheduler.add_job(
+            _cron_flush_metric_counters, "interval",
+            seconds=metrics_snapshot.FLUSH_INTERVAL_SECONDS,
+            id="flush_metric_counters", misfire_grace_time=30, max_instances=1,
         )
-        scheduler.add_job(_cron_run_onboarding_emails, "cron", hour=8, minute=0, id="onboarding_emails")
-        # Apple iTunes RSS sync runs twice daily (04:00 + 16:00 UTC). Apple
-        # refreshes the marketing RSS feed roughly every few hours, so the
-        # second run captures intraday movement and recovers if the morning
-        # run was missed (e.g. Railway deploy at the wrong minute).
-        scheduler.add_job(_cron_sync_app_ranks, "cron", hour=4, minute=0, id="sync_app_ranks_am")
-        scheduler.add_job(_cron_sync_app_ranks, "cron", hour=16, minute=0, id="sync_app_ranks_pm")
-        # Lifecycle push notifications run a couple hours after the email cron
-        # so users on both channels don't get hit with two notifications at the
-        # exact same minute. Push at 10:00 UTC = early morning in LATAM, lunchtime
-        # in Europe, evening in Asia — covers the bulk of the user base.
-        scheduler.add_job(_cron_lifecycle_pushes, "cron", hour=10, minute=0, id="lifecycle_pushes")
-        # Stale session reaper every 15 min. Cheap query (only scans rows
-        # with completed_at IS NULL AND auto_completed_at IS NULL, indexed),
-        # so safe to run frequently. Tighter cadence = less time between a
-        # user finishing their study and seeing their coins next launch.
-        scheduler.add_job(_cron_reap_stale_sessions, "interval", minutes=15, id="reap_stale_sessions")
         scheduler.start()
         print(
-            "✅ Scheduler started: onboarding emails 08:00 UTC, lifecycle pushes 10:00 UTC, "
-            "app_ranks sync 04:00 + 16:00 UTC, stale session reaper every 15 min "
-            "(misfire_grace=1h)"
+            f"✅ Web scheduler started: app version flush every {app_version_telemetry.FLUSH_INTERVAL_SECONDS}s, "
+            f"metric counter flush every {metrics_snapshot.FLUSH_INTERVAL_SECONDS}s"
         )
     except Exception as e:
         print(f"❌ Failed to start scheduler: {e}")
+    if os.getenv("RUN_SCHEDULER_IN_WEB", "1") == "1":
+        threading.Thread(
+            target=run_leader_scheduler, args=(_web_scheduler_stop,),
+            name="scheduler-leader", daemon=True,
+        ).start()
+
+
+@app.on_event("shutdown")
+def stop_leader_scheduler():
+    _web_scheduler_stop.set()
+
+
+@app.on_event("shutdown")
+def flush_app_versions_on_shutdown():
+    """Don't drop the telemetry buffer on a deploy restart."""
+    _cron_flush_app_versions()
+    _cron_flush_metric_counters()
+
+
+@app.on_event("shutdown")
+def close_push_client():
+    push_service.close_client()
 
 _allowed_origins = [
     "https://web-production-34028.up.railway.app",
@@ -607,13 +894,20 @@ def _apply_resend_webhook_event(
         to_addrs = event_data.get("to", [])
         if isinstance(to_addrs, str):
             to_addrs = [to_addrs]
+        archived = 0
         for addr in to_addrs:
             addr = addr.strip().lower()
             if addr:
                 logger.warning(f"Resend {event_type}: suppressing {addr}")
-                db.query(models.User).filter(func.lower(models.User.email) == addr).update(
-                    {"is_archived": True}, synchronize_session=False
-                )
+                archived += db.query(models.User).filter(
+                    func.lower(models.User.email) == addr,
+                    or_(models.User.is_archived == False, models.User.is_archived == None),
+                ).update({"is_archived": True}, synchronize_session=False)
+        if archived:
+            # Same as the admin archive: archived users drop out of the
+            # overview and of every (otherwise never recounted) cohort cell.
+            metrics_snapshot.mark_dirty(db)
+            cohort_retention.invalidate(db)
 
 
 @app.post("/webhooks/resend")
@@ -1187,7 +1481,7 @@ def verify_email(request: Request, body: VerifyEmailRequest, db: Session = Depen
     threading.Thread(target=_send_welcome_email_delayed, args=(_email, _uname), daemon=True).start()
 
     access_token = create_access_token(
-        data={"sub": user.email, "tv": user.token_version or 0},
+        data={"sub": user.email, "tv": user.token_version or 0, "uid": user.id},
         expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     )
     return {"access_token": access_token, "token_type": "bearer"}
@@ -1350,7 +1644,7 @@ def _send_template_email(template_key: str, to_email: str, variables: dict, db:
                 if attempt == 2:
                     logger.error(
                         f"Resend rate limit exhausted for '{template_key}' → {to_email} "
-                        f"after 3 attempts (stay under ~5 req/s; use EMAIL_SEND_INTERVAL on bulk sends)."
+                        f"after 3 attempts (bulk sends go through services/email_dispatch)."
                     )
                     return False
                 wait = 1.0 * (attempt + 1)
@@ -1401,7 +1695,7 @@ def _send_welcome_email_delayed(email: str, username: str | None, delay_seconds:
 def _issue_token_for_user(user: models.User) -> dict:
     """Issue a JWT for a user. Mirrors what /auth/login + /auth/verify-email return."""
     access_token = create_access_token(
-        data={"sub": user.email, "tv": user.token_version or 0},
+        data={"sub": user.email, "tv": user.token_version or 0, "uid": user.id},
         expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
     )
     return {"access_token": access_token, "token_type": "bearer"}
@@ -1475,7 +1769,7 @@ def login(request: Request, user: schemas.UserLogin, db: Session = Depends(get_d
         raise HTTPException(status_code=403, detail="This account has been deactivated. Please contact support.")
 
     access_token = create_access_token(
-        data={"sub": db_user.email, "tv": db_user.token_version or 0},
+        data={"sub": db_user.email, "tv": db_user.token_version or 0, "uid": db_user.id},
         expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     )
     return {"access_token": access_token, "token_type": "bearer"}
@@ -1517,6 +1811,7 @@ def get_me(
 def logout(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
     current_user.token_version = (current_user.token_version or 0) + 1
     db.commit()
+    invalidate_user_tokens(current_user.id)
     return {"message": "Logged out"}
 
 
@@ -1563,14 +1858,8 @@ async def upload_profile_pic(
         raise HTTPException(400, "File too large (max 5 MB)")
     if not _valid_image_magic(data):
         raise HTTPException(400, "File does not appear to be a valid image")
-    upload = models.Upload(
-        filename=file.filename or "profile.jpg",
-        content_type=file.content_type,
-        data=data,
-    )
-    db.add(upload)
-    db.commit()
-    db.refresh(upload)
+    upload = blob_store.create_upload(db, data, file.filename or "profile.jpg", file.content_type)
+    image_variants.schedule(upload.sha256, upload.content_type)
     base = os.getenv("API_BASE_URL", "https://web-production-34028.up.railway.app")
     pic_url = f"{base}/uploads/{upload.public_id}"
     user = db.query(models.User).filter(models.User.id == current_user.id).first()
@@ -1633,9 +1922,17 @@ def delete_account(
         db.query(models.UserBlock).filter(
             (models.UserBlock.blocker_id == user_id) | (models.UserBlock.blocked_id == user_id)
         ).delete(synchronize_session=False)
+        friend_ids = [
+            a if b == user_id else b
+            for a, b in db.query(models.Friendship.user_id, models.Friendship.friend_id).filter(
+                models.Friendship.status == "accepted",
+                (models.Friendship.user_id == user_id) | (models.Friendship.friend_id == user_id),
+            ).all()
+        ]
         db.query(models.Friendship).filter(
             (models.Friendship.user_id == user_id) | (models.Friendship.friend_id == user_id)
         ).delete(synchronize_session=False)
+        badge_progress_service.refresh_friend_count(db, friend_ids)
 
         # ── 3. Orphan tables with no Python model (legacy pacts feature) ──
         # Production Postgres has these; minimal SQLite test DBs may omit them.
@@ -1658,6 +1955,11 @@ def delete_account(
             models.StudyGroup.creator_id == user_id
         ).all()
         for group in owned_groups:
+            member_ids = [
+                uid for (uid,) in db.query(models.GroupMember.user_id)
+                .filter(models.GroupMember.group_id == group.id).all()
+            ]
+            badge_progress_service.record_group_left(db, member_ids, group.id)
             db.query(models.GroupMessage).filter(models.GroupMessage.group_id == group.id).delete(synchronize_session=False)
             db.query(models.GroupMember).filter(models.GroupMember.group_id == group.id).delete(synchronize_session=False)
             db.delete(group)
@@ -1666,11 +1968,14 @@ def delete_account(
         db.query(models.GroupMessage).filter(models.GroupMessage.user_id == user_id).delete(synchronize_session=False)
         db.query(models.GroupMember).filter(models.GroupMember.user_id == user_id).delete(synchronize_session=False)
         db.query(models.FeedReaction).filter(models.FeedReaction.user_id == user_id).delete(synchronize_session=False)
+        feed_timeline_service.delete_user(db, user_id)
+        reaction_inbox.delete_user(db, user_id)
         db.query(models.ActivityEvent).filter(models.ActivityEvent.user_id == user_id).delete(synchronize_session=False)
         db.query(models.Donation).filter(models.Donation.user_id == user_id).delete(synchronize_session=False)
         db.query(models.TipView).filter(models.TipView.user_id == user_id).delete(synchronize_session=False)
         db.query(models.UserBadge).filter(models.UserBadge.user_id == user_id).delete(synchronize_session=False)
         db.query(models.UserAnimal).filter(models.UserAnimal.user_id == user_id).delete(synchronize_session=False)
+        session_pipeline.delete_user(db, user_id)
         db.query(models.StudySession).filter(models.StudySession.user_id == user_id).delete(synchronize_session=False)
         db.query(models.Task).filter(models.Task.user_id == user_id).delete(synchronize_session=False)
         db.query(models.Egg).filter(models.Egg.user_id == user_id).delete(synchronize_session=False)
@@ -1678,6 +1983,9 @@ def delete_account(
         db.query(models.UserSubject).filter(models.UserSubject.user_id == user_id).delete(synchronize_session=False)
         db.query(models.UserPurchase).filter(models.UserPurchase.user_id == user_id).delete(synchronize_session=False)
         db.query(models.UserItemAssignment).filter(models.UserItemAssignment.user_id == user_id).delete(synchronize_session=False)
+        leaderboard_service.delete_user(db, user_id)
+        badge_progress_service.delete_user(db, user_id)
+        daily_minutes_service.delete_user(db, user_id)
         # feedback_upvotes: DB ON DELETE CASCADE from users; user_feedback SET NULL
         # Research: assignments/responses reference users(id) without ON DELETE — must
         # remove assignments first (responses CASCADE from assignments in Postgres).
@@ -1687,7 +1995,11 @@ def delete_account(
 
         # ── 6. The user themselves ──
         db.query(models.User).filter(models.User.id == user_id).delete(synchronize_session=False)
+        # Their history vanishes from days the overview snapshot considers closed.
+        metrics_snapshot.mark_dirty(db)
+        cohort_retention.invalidate(db)
         db.commit()
+        invalidate_user_tokens(user_id)
         return {"message": "Account deleted successfully"}
     except Exception as e:
         db.rollback()
@@ -1804,9 +2116,10 @@ def reset_password(request: Request, body: ResetPasswordRequest, db: Session = D
     user.reset_attempts = 0
     user.token_version = (user.token_version or 0) + 1
     db.commit()
+    invalidate_user_tokens(user.id)
 
     access_token = create_access_token(
-        data={"sub": user.email, "tv": user.token_version},
+        data={"sub": user.email, "tv": user.token_version, "uid": user.id},
         expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     )
     return {"message": "Password reset successful", "access_token": access_token, "token_type": "bearer"}
@@ -1865,6 +2178,8 @@ def update_profile(
         user.city = profile.city.strip() if profile.city.strip() else None
     if profile.country is not None:
         user.country = profile.country.strip() if profile.country.strip() else None
+    if profile.school is not None:
+        leaderboard_service.sync_user(db, user)
     db.commit()
     db.refresh(user)
     return {"message": "Profile updated"}
@@ -1876,18 +2191,28 @@ def search_schools(
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    if not q or len(q) < 2:
-        return []
-    query = f"%{q}%"
-    results = db.query(models.School).filter(
-        models.School.name.ilike(query)
-    ).order_by(models.School.name).limit(20).all()
-    return [
-        {"name": s.name, "city": s.city, "region": s.region, "country": s.country}
-        for s in results
-    ]
+    """Onboarding autocomplete, served from the in-memory index in
+    services/school_search.py (ranked by match quality, then popularity)."""
+    return school_search.search(db, q)
 
 
+@app.on_event("startup")
+def warm_school_index():
+    school_search.warm()
+
+
+@app.on_event("startup")
+def check_blob_store():
+    blob_store.check_config()
+
+
+@app.exception_handler(blob_store.BlobStoreMisconfigured)
+def blob_store_misconfigured(request: Request, exc: blob_store.BlobStoreMisconfigured):
+    # Uploads and serving fail closed rather than writing to disk that the
+    # next deploy wipes; everything else keeps running.
+    logger.error(f"{request.method} {request.url.path}: {exc}")
+    return JSONResponse(status_code=503, content={"detail": "Uploads are temporarily unavailable"})
+
 ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
 if not ADMIN_API_KEY:
     if os.getenv("RAILWAY_ENVIRONMENT") or os.getenv("DATABASE_URL", "").startswith("postgresql"):
@@ -1984,6 +2309,7 @@ def seed_schools(
     except Exception as e:
         errors.append(f"Unis: {str(e)}")
 
+    school_search.refresh(db)
     return {
         "message": f"Seeded {count} schools",
         "breakdown": breakdown,
@@ -2018,6 +2344,8 @@ def seed_additional_schools(
         n = _seed_schools_from_json(db, filepath, None, errors)
         added[country] = n
 
+    if any(isinstance(n, int) and n for n in added.values()):
+        school_search.refresh(db)
     return {"added": added, "errors": errors if errors else None}
 
 
@@ -2070,6 +2398,44 @@ def delete_task(
 
 # ============ Study Session Endpoints ============
 
+def _dispatch_session_followup(db: Session, study_session: models.StudySession) -> tuple[list, bool]:
+    """Kick off the outbox job written by `_finalize_session` and wait briefly
+    for its badge step. Returns (new_badge_ids, badges_pending)."""
+    job = session_pipeline.followup_for_session(db, study_session.id, study_session.user_id)
+    if job is None:
+        return [], False
+    job_id = job.id
+    # End the read transaction so the pooled connection goes back while we
+    # wait: the pipeline thread needs one of its own to finish the job.
+    # wait_for_badges re-reads the job on a fresh checkout afterwards.
+    db.commit()
+    session_pipeline.dispatch(job_id)
+    badges = session_pipeline.wait_for_badges(db, job_id)
+    if badges is None:
+        return [], True
+    return badges, False
+
+
+@app.get("/sessions/{session_id}/followup", response_model=schemas.SessionFollowupResponse)
+def get_session_followup(
+    session_id: int,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Poll target when /complete answered with `badges_pending: true`."""
+    job = session_pipeline.followup_for_session(db, session_id, current_user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="No follow-up for this session")
+    result = job.result or {}
+    badge_ids = result.get("new_badges") or []
+    return {
+        "session_id": session_id,
+        "status": job.status,
+        "badges_ready": "new_badges" in result,
+        "new_badges": [crud.BADGE_MAP[bid] for bid in badge_ids if bid in crud.BADGE_MAP],
+    }
+
+
 @app.post("/sessions", response_model=schemas.StudySessionWithHatchResponse)
 @limiter.limit("12/hour")
 def complete_study_session(
@@ -2080,11 +2446,7 @@ def complete_study_session(
 ):
     import traceback
     try:
-        today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        daily_minutes = db.query(func.coalesce(func.sum(models.StudySession.duration_minutes), 0)).filter(
-            models.StudySession.user_id == current_user.id,
-            models.StudySession.completed_at >= today_start,
-        ).scalar()
+        daily_minutes = daily_minutes_service.minutes_on(db, current_user.id)
         if daily_minutes + session.duration_minutes > 720:
             raise HTTPException(status_code=400, detail="Daily study cap of 12 hours reached")
 
@@ -2108,36 +2470,10 @@ def complete_study_session(
             session.duration_minutes,
             task_id,
             session.animal_name,
-            session.subject_id
+            session.subject_id,
+            with_followup=True,
         )
-        session_hour = None
-        if study_session.completed_at:
-            session_hour = study_session.completed_at.hour
-        new_badges = crud.check_badges(
-            db, current_user.id,
-            session_hour=session_hour,
-            session_minutes=session.duration_minutes
-        )
-        try:
-            crud.create_session_event(db, current_user.id, session.duration_minutes,
-                                      hatched_animal.name if hatched_animal else None)
-        except Exception:
-            pass
-        # Push notify on badge earned (one push per session, even if multiple
-        # badges earned simultaneously — pick the first to avoid spam).
-        try:
-            if new_badges:
-                first_badge = new_badges[0]
-                badge_def = crud.BADGE_MAP.get(first_badge) or {}
-                _safe_send_push(
-                    "push_badge_earned", current_user, db,
-                    extra_vars={
-                        "badge_name": badge_def.get("name", "a new badge"),
-                        "badge_emoji": badge_def.get("emoji", "🏅"),
-                    },
-                )
-        except Exception as _e:
-            logger.error(f"Badge push hook failed: {_e}")
+        new_badges, badges_pending = _dispatch_session_followup(db, study_session)
         session_dict = {
             "id": study_session.id,
             "task_id": study_session.task_id,
@@ -2152,6 +2488,7 @@ def complete_study_session(
             "session": session_dict,
             "hatched_animal": hatched_animal,
             "new_badges": [crud.BADGE_MAP[bid] for bid in new_badges if bid in crud.BADGE_MAP],
+            "badges_pending": badges_pending,
         }
     except Exception as e:
         db.rollback()
@@ -2224,11 +2561,7 @@ def complete_study_session_by_id_endpoint(
     """
     try:
         # Daily cap enforcement, same rule as POST /sessions
-        today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        daily_minutes = db.query(func.coalesce(func.sum(models.StudySession.duration_minutes), 0)).filter(
-            models.StudySession.user_id == current_user.id,
-            models.StudySession.completed_at >= today_start,
-        ).scalar()
+        daily_minutes = daily_minutes_service.minutes_on(db, current_user.id)
         if daily_minutes + payload.duration_minutes > 720:
             raise HTTPException(status_code=400, detail="Daily study cap of 12 hours reached")
 
@@ -2266,38 +2599,16 @@ def complete_study_session_by_id_endpoint(
             task_id=task_id,
             animal_name=animal_name,
             subject_id=payload.subject_id,
+            with_followup=True,
         )
         if not study_session:
             # Race or model invariant violated — caller can retry against the
             # legacy POST /sessions to avoid losing the user's reward.
             raise HTTPException(status_code=410, detail="Session no longer completable")
 
-        session_hour = study_session.completed_at.hour if study_session.completed_at else None
-        new_badges = crud.check_badges(
-            db, current_user.id,
-            session_hour=session_hour,
-            session_minutes=payload.duration_minutes,
-        )
-        try:
-            crud.create_session_event(
-                db, current_user.id, payload.duration_minutes,
-                hatched_animal.name if hatched_animal else None,
-            )
-        except Exception:
-            pass
-        try:
-            if new_badges:
-                first_badge = new_badges[0]
-                badge_def = crud.BADGE_MAP.get(first_badge) or {}
-                _safe_send_push(
-                    "push_badge_earned", current_user, db,
-                    extra_vars={
-                        "badge_name": badge_def.get("name", "a new badge"),
-                        "badge_emoji": badge_def.get("emoji", "🏅"),
-                    },
-                )
-        except Exception as _e:
-            logger.error(f"Badge push hook failed: {_e}")
+        # Badges, feed events and the badge push run on the session pipeline;
+        # only the badge step is (briefly) waited for.
+        new_badges, badges_pending = _dispatch_session_followup(db, study_session)
 
         return {
             "session": {
@@ -2312,6 +2623,7 @@ def complete_study_session_by_id_endpoint(
             },
             "hatched_animal": hatched_animal,
             "new_badges": [crud.BADGE_MAP[bid] for bid in new_badges if bid in crud.BADGE_MAP],
+            "badges_pending": badges_pending,
         }
     except HTTPException:
         raise
@@ -2494,8 +2806,10 @@ def hatch_egg(
 
 
 @app.get("/animals", response_model=List[schemas.AnimalResponse])
-def get_all_animals(db: Session = Depends(get_db)):
-    return crud.get_all_animals(db)
+def get_all_animals(request: Request, db: Session = Depends(get_db)):
+    return response_cache.respond(
+        request, "animals", lambda: crud.get_all_animals(db), model=List[schemas.AnimalResponse],
+    )
 
 
 @app.get("/my-animals", response_model=List[schemas.UserAnimalResponse])
@@ -2988,6 +3302,18 @@ def get_school_leaderboard(
     return crud.get_school_leaderboard(db, current_user, period=period)
 
 
+@app.get("/leaderboard/me", response_model=schemas.LeaderboardRankResponse)
+def get_my_leaderboard_rank(
+    scope: str = Query(default="global", pattern="^(global|school|friends)$"),
+    period: str = "all_time",
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """The caller's own rank on a board. The list endpoints only return the
+    top page, so users outside it use this to render their own row."""
+    return crud.get_leaderboard_rank(db, current_user, scope=scope, period=period)
+
+
 # ============ Stats Endpoints ============
 
 @app.get("/stats", response_model=schemas.UserStats)
@@ -3145,9 +3471,11 @@ def check_badges(
 # ============ Subject Endpoints ============
 
 @app.get("/subjects", response_model=List[schemas.SubjectResponse])
-def list_subjects(db: Session = Depends(get_db)):
+def list_subjects(request: Request, db: Session = Depends(get_db)):
     """Return all standard (default) subjects."""
-    return crud.get_all_subjects(db)
+    return response_cache.respond(
+        request, "subjects", lambda: crud.get_all_subjects(db), model=List[schemas.SubjectResponse],
+    )
 
 
 @app.get("/subjects/search", response_model=List[schemas.SubjectResponse])
@@ -3259,13 +3587,18 @@ def update_group(
             if contains_profanity(name):
                 raise HTTPException(status_code=400, detail="Group name contains inappropriate language.")
             group.name = name
+    subject_changed = False
     if "subject_id" in data:
         sid = data["subject_id"]
-        group.subject_id = int(sid) if sid else None
+        new_sid = int(sid) if sid else None
+        subject_changed = new_sid != group.subject_id
+        group.subject_id = new_sid
     if "goal_minutes" in data:
         goal = data["goal_minutes"]
         if isinstance(goal, int) and goal >= 1:
             group.goal_minutes = goal
+    if subject_changed:
+        badge_progress_service.refresh_group(db, group)
     db.commit()
     subj_name = None
     if group.subject_id:
@@ -3342,10 +3675,17 @@ def send_group_message(
 @app.get("/groups/{group_id}/messages", response_model=List[schemas.GroupMessageResponse])
 def get_group_messages(
     group_id: int,
+    limit: int = Query(default=50, ge=1, le=200),
+    before_id: Optional[int] = Query(None, ge=1, description="Page back: messages older than this id"),
+    after_id: Optional[int] = Query(None, ge=0, description="Poll: only messages newer than this id"),
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    result = crud.get_group_messages(db, group_id, current_user.id)
+    if before_id is not None and after_id is not None:
+        raise HTTPException(status_code=400, detail="Use either before_id or after_id, not both")
+    result = crud.get_group_messages(
+        db, group_id, current_user.id, limit=limit, before_id=before_id, after_id=after_id,
+    )
     if result is None:
         raise HTTPException(status_code=403, detail="Not a member of this group")
     return result
@@ -3380,76 +3720,80 @@ def invite_to_group(
 
 @app.get("/feed", response_model=List[schemas.ActivityEventResponse])
 def get_feed(
+    limit: int = Query(default=30, ge=1, le=100),
+    before_id: Optional[int] = Query(None, ge=1, description="Page back: events older than this id"),
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     try:
-        return crud.get_friend_feed(db, current_user.id)
+        return crud.get_friend_feed(db, current_user.id, limit=limit, before_id=before_id)
     except Exception as e:
         logger.error(f"Feed error for user {current_user.id}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to load feed")
 
 @app.get("/feed/reactions/new")
 def get_new_reactions(
+    request: Request,
+    response: Response,
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     try:
-        # Hot endpoint: every authed app polls this on a timer. Optimised to
-        # short-circuit aggressively so the 99% no-op case is one cheap query.
-        # 1) No friends → nobody can react → bail out.
-        has_friend = db.query(models.Friendship.id).filter(
-            models.Friendship.status == "accepted",
-            (models.Friendship.user_id == current_user.id)
-            | (models.Friendship.friend_id == current_user.id),
-        ).first()
-        if not has_friend:
-            return []
-        # 2) Only consider events from the last 30 days. Reactions on older
-        # activity are not surfaced as "new" overlays anyway.
-        cutoff = datetime.utcnow() - timedelta(days=30)
-        my_events = db.query(models.ActivityEvent).filter(
-            models.ActivityEvent.user_id == current_user.id,
-            models.ActivityEvent.created_at >= cutoff,
-        ).all()
-        event_ids = [e.id for e in my_events]
-        if not event_ids:
-            return []
-        unseen = db.query(models.FeedReaction).filter(
-            models.FeedReaction.event_id.in_(event_ids),
-            models.FeedReaction.user_id != current_user.id,
-            (models.FeedReaction.seen == False) | (models.FeedReaction.seen == None)
-        ).all()
-        if not unseen:
+        # Hot endpoint: every authed app polls this on a timer and ~99% of
+        # polls find nothing. The per-user counter (services/reaction_inbox)
+        # makes that case one primary-key read, or a 304 when the client
+        # sends back the ETag it already has.
+        counter = reaction_inbox.get(db, current_user.id)
+        tag = reaction_inbox.etag(counter)
+        if request.headers.get("if-none-match") == tag:
+            return Response(status_code=304, headers={"ETag": tag})
+        if counter is None or not counter.unseen:
+            response.headers["ETag"] = tag
             return []
+        # From here on the ETag is only sent once the delivery is
+        # committed. A tag for a poll that failed would make every later
+        # poll a 304 while the reactions stay unseen.
+        observed = counter.unseen
 
-        # Batch-fetch all reaction senders in one query (eliminates N+1).
-        sender_ids = list({r.user_id for r in unseen})
-        senders_by_id = {
-            u.id: u
-            for u in db.query(models.User).filter(models.User.id.in_(sender_ids)).all()
-        }
-        events_by_id = {e.id: e for e in my_events}
+        # Reactions on older activity are marked seen but not surfaced as
+        # "new" overlays.
+        cutoff = datetime.utcnow() - timedelta(days=30)
+        unseen = (
+            db.query(models.FeedReaction, models.ActivityEvent, models.User.username)
+            .join(models.ActivityEvent, models.ActivityEvent.id == models.FeedReaction.event_id)
+            .outerjoin(models.User, models.User.id == models.FeedReaction.user_id)
+            .filter(
+                models.ActivityEvent.user_id == current_user.id,
+                models.FeedReaction.user_id != current_user.id,
+                (models.FeedReaction.seen == False) | (models.FeedReaction.seen == None)
+            )
+            .all()
+        )
 
         results = []
-        for r in unseen:
-            sender = senders_by_id.get(r.user_id)
-            event = events_by_id.get(r.event_id)
-            results.append({
-                "id": r.id,
-                "sender_username": sender.username if sender else "Someone",
-                "reaction": r.reaction,
-                "event_description": event.description if event else "",
-                "created_at": r.created_at.isoformat() if r.created_at else "",
-            })
+        for r, event, sender_username in unseen:
+            if event.created_at is None or event.created_at >= cutoff:
+                results.append({
+                    "id": r.id,
+                    "sender_username": sender_username or "Someone",
+                    "reaction": r.reaction,
+                    "event_description": event.description or "",
+                    "created_at": r.created_at.isoformat() if r.created_at else "",
+                })
             r.seen = True
+        reaction_inbox.mark_delivered(db, current_user.id, observed)
         try:
             db.commit()
         except Exception:
             db.rollback()
+            return results
+        db.refresh(counter)
+        response.headers["ETag"] = reaction_inbox.etag(counter)
         return results
     except Exception as e:
         logger.error(f"Error fetching new reactions for user {current_user.id}: {e}")
+        if "etag" in response.headers:
+            del response.headers["etag"]
         return []
 
 @app.post("/feed/{event_id}/react")
@@ -3536,6 +3880,8 @@ def send_tip_to_friend(
         extra_data=_json.dumps({"recipient_id": friend_id, "animal_name": animal_name}),
     )
     db.add(event)
+    db.flush()
+    feed_timeline_service.fan_out(db, event)
     db.commit()
     return {"message": f"Tip sent to {friend.username}"}
 
@@ -3603,6 +3949,8 @@ def block_user(
         ((models.Friendship.user_id == current_user.id) & (models.Friendship.friend_id == user_id)) |
         ((models.Friendship.user_id == user_id) & (models.Friendship.friend_id == current_user.id))
     ).delete()
+    badge_progress_service.refresh_friend_count(db, (current_user.id, user_id))
+    feed_timeline_service.remove_pair(db, current_user.id, user_id)
     db.commit()
     return {"message": "User blocked. Their content will no longer appear in your feed."}
 
@@ -3727,6 +4075,7 @@ async def every_org_webhook(
             )
             db.add(donation)
             db.commit()
+            response_cache.invalidate("donations")
             logger.info(f"Donation stored: ${amount} {currency} | user_id={linked_user_id}")
             # Send a thank-you push if we attributed this donation to a user.
             # Category 'system' so it always lands (donations are too important
@@ -3763,46 +4112,49 @@ def check_donation(partner_id: str, db: Session = Depends(get_db)):
 
 
 @app.get("/donations/community-stats")
-def get_community_donation_stats(db: Session = Depends(get_db)):
+def get_community_donation_stats(request: Request, db: Session = Depends(get_db)):
     """Public endpoint: community donation totals for the Take Action screen."""
     from sqlalchemy import func
     from datetime import datetime, timedelta
 
-    total_raised = db.query(func.coalesce(func.sum(models.Donation.amount), 0)).scalar()
-    total_donors = db.query(models.Donation).distinct(models.Donation.donor_email).count()
-    total_donations = db.query(models.Donation).count()
-
-    month_ago = datetime.utcnow() - timedelta(days=30)
-    this_month = db.query(
-        func.coalesce(func.sum(models.Donation.amount), 0)
-    ).filter(models.Donation.created_at >= month_ago).scalar()
-
-    this_month_count = db.query(models.Donation).filter(
-        models.Donation.created_at >= month_ago
-    ).count()
-
-    recent = db.query(models.Donation).order_by(
-        models.Donation.created_at.desc()
-    ).limit(5).all()
+    def build():
+        total_raised = db.query(func.coalesce(func.sum(models.Donation.amount), 0)).scalar()
+        total_donors = db.query(models.Donation).distinct(models.Donation.donor_email).count()
+        total_donations = db.query(models.Donation).count()
+
+        month_ago = datetime.utcnow() - timedelta(days=30)
+        this_month = db.query(
+            func.coalesce(func.sum(models.Donation.amount), 0)
+        ).filter(models.Donation.created_at >= month_ago).scalar()
+
+        this_month_count = db.query(models.Donation).filter(
+            models.Donation.created_at >= month_ago
+        ).count()
+
+        recent = db.query(models.Donation).order_by(
+            models.Donation.created_at.desc()
+        ).limit(5).all()
+
+        recent_list = []
+        for d in recent:
+            name = d.donor_first_name or "Anonymous"
+            recent_list.append({
+                "name": name,
+                "amount": d.amount,
+                "currency": d.currency,
+                "date": d.created_at.isoformat() if d.created_at else "",
+            })
 
-    recent_list = []
-    for d in recent:
-        name = d.donor_first_name or "Anonymous"
-        recent_list.append({
-            "name": name,
-            "amount": d.amount,
-            "currency": d.currency,
-            "date": d.created_at.isoformat() if d.created_at else "",
-        })
+        return {
+            "total_raised": float(total_raised),
+            "total_donors": total_donors,
+            "total_donations": total_donations,
+            "this_month_raised": float(this_month),
+            "this_month_count": this_month_count,
+            "recent_donations": recent_list,
+        }
 
-    return {
-        "total_raised": float(total_raised),
-        "total_donors": total_donors,
-        "total_donations": total_donations,
-        "this_month_raised": float(this_month),
-        "this_month_count": this_month_count,
-        "recent_donations": recent_list,
-    }
+    return response_cache.respond(request, "donations", build)
 
 
 @app.get("/donations/user/{user_id}")
@@ -4070,342 +4422,21 @@ def admin_funnel_cohort(
     return {"scope": scope, "key": key or None, "funnel": funnel}
 
 
-@app.get("/admin/overview")
-def admin_overview(db: Session = Depends(get_db), _=Depends(verify_admin)):
-    now = datetime.utcnow()
-    week_ago = now - timedelta(days=7)
-    month_ago = now - timedelta(days=30)
-
-    total_users = db.query(func.count(models.User.id)).scalar() or 0
-    archived_users = db.query(func.count(models.User.id)).filter(
-        models.User.is_archived == True
-    ).scalar() or 0
-    active_7d = db.query(func.count(models.User.id)).filter(
-        models.User.last_study_date >= week_ago
-    ).scalar() or 0
-    signups_7d = db.query(func.count(models.User.id)).filter(
-        models.User.created_at >= week_ago
-    ).scalar() or 0
-    signups_30d = db.query(func.count(models.User.id)).filter(
-        models.User.created_at >= month_ago
-    ).scalar() or 0
-    total_sessions = db.query(func.count(models.StudySession.id)).scalar() or 0
-    total_minutes = db.query(func.coalesce(func.sum(models.StudySession.duration_minutes), 0)).scalar()
-    total_animals_hatched = db.query(func.count(models.UserAnimal.id)).scalar() or 0
-
-    donation_row = db.query(
-        func.coalesce(func.sum(models.Donation.amount), 0),
-        func.count(models.Donation.id),
-    ).first()
-    total_donated = float(donation_row[0])
-    total_donation_count = donation_row[1]
-
-    archived_ids = [u.id for u in db.query(models.User.id).filter(models.User.is_archived == True).all()]
-    if archived_ids:
-        real_sessions = db.query(func.count(models.StudySession.id)).filter(
-            models.StudySession.user_id.notin_(archived_ids)
-        ).scalar() or 0
-        real_minutes = db.query(func.coalesce(func.sum(models.StudySession.duration_minutes), 0)).filter(
-            models.StudySession.user_id.notin_(archived_ids)
-        ).scalar()
-        real_animals = db.query(func.count(models.UserAnimal.id)).filter(
-            models.UserAnimal.user_id.notin_(archived_ids)
-        ).scalar() or 0
-        real_donation_row = db.query(
-            func.coalesce(func.sum(models.Donation.amount), 0),
-            func.count(models.Donation.id),
-        ).filter(models.Donation.user_id.notin_(archived_ids)).first()
-        real_donated = float(real_donation_row[0])
-        real_donation_count = real_donation_row[1]
-    else:
-        real_sessions = total_sessions
-        real_minutes = total_minutes
-        real_animals = total_animals_hatched
-        real_donated = total_donated
-        real_donation_count = total_donation_count
-
-    # User funnel (excluding archived users) — shared with GET /admin/funnel
-    real_users = total_users - archived_users
+def _overview_funnel(db: Session) -> dict:
     cohort_all = db.query(models.User.id).filter(models.User.is_archived == False).subquery()
-    funnel = _engagement_funnel_from_user_subquery(db, cohort_all)
-
-    # ---- Engagement totals (social + study artifacts + tips) ----
-    def _exclude_archived(q, user_col):
-        if archived_ids:
-            return q.filter(user_col.notin_(archived_ids))
-        return q
-
-    total_friendships = _exclude_archived(
-        db.query(func.count(models.Friendship.id)).filter(models.Friendship.status == "accepted"),
-        models.Friendship.user_id,
-    ).scalar() or 0
-    friendships_7d = _exclude_archived(
-        db.query(func.count(models.Friendship.id)).filter(
-            models.Friendship.status == "accepted",
-            models.Friendship.created_at >= week_ago,
-        ),
-        models.Friendship.user_id,
-    ).scalar() or 0
-
-    total_groups_created = _exclude_archived(
-        db.query(func.count(models.StudyGroup.id)),
-        models.StudyGroup.creator_id,
-    ).scalar() or 0
-    groups_created_7d = _exclude_archived(
-        db.query(func.count(models.StudyGroup.id)).filter(models.StudyGroup.created_at >= week_ago),
-        models.StudyGroup.creator_id,
-    ).scalar() or 0
-
-    total_feed_reactions = db.query(func.count(models.FeedReaction.id)).scalar() or 0
-    feed_reactions_7d = db.query(func.count(models.FeedReaction.id)).filter(
-        models.FeedReaction.created_at >= week_ago
-    ).scalar() or 0
-
-    total_user_subjects = _exclude_archived(
-        db.query(func.count(models.UserSubject.id)),
-        models.UserSubject.user_id,
-    ).scalar() or 0
-    user_subjects_7d = _exclude_archived(
-        db.query(func.count(models.UserSubject.id)).filter(models.UserSubject.added_at >= week_ago),
-        models.UserSubject.user_id,
-    ).scalar() or 0
-
-    total_tasks_created = _exclude_archived(
-        db.query(func.count(models.Task.id)),
-        models.Task.user_id,
-    ).scalar() or 0
-    tasks_created_7d = _exclude_archived(
-        db.query(func.count(models.Task.id)).filter(models.Task.created_at >= week_ago),
-        models.Task.user_id,
-    ).scalar() or 0
-
-    total_tip_views = _exclude_archived(
-        db.query(func.count(models.TipView.id)),
-        models.TipView.user_id,
-    ).scalar() or 0
-    tip_views_7d = _exclude_archived(
-        db.query(func.count(models.TipView.id)).filter(models.TipView.viewed_at >= week_ago),
-        models.TipView.user_id,
-    ).scalar() or 0
-
-    total_tip_likes = _exclude_archived(
-        db.query(func.count(models.TipView.id)).filter(models.TipView.liked == True),
-        models.TipView.user_id,
-    ).scalar() or 0
-    tip_likes_7d = _exclude_archived(
-        db.query(func.count(models.TipView.id)).filter(
-            models.TipView.liked == True,
-            models.TipView.viewed_at >= week_ago,
-        ),
-        models.TipView.user_id,
-    ).scalar() or 0
+    return _engagement_funnel_from_user_subquery(db, cohort_all)
 
-    total_tip_saves = _exclude_archived(
-        db.query(func.count(models.TipView.id)).filter(models.TipView.saved == True),
-        models.TipView.user_id,
-    ).scalar() or 0
-    tip_saves_7d = _exclude_archived(
-        db.query(func.count(models.TipView.id)).filter(
-            models.TipView.saved == True,
-            models.TipView.saved_at >= week_ago,
-        ),
-        models.TipView.user_id,
-    ).scalar() or 0
 
-    # Daily charts starting from April 1
-    apr1 = datetime(now.year, 4, 1)
-    num_days = (now - apr1).days + 1
-    date_keys = [(apr1 + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(num_days)]
-
-    def _bucket(timestamps):
-        counts = {k: 0 for k in date_keys}
-        for ts in timestamps:
-            if ts is None:
-                continue
-            k = ts.strftime("%Y-%m-%d")
-            if k in counts:
-                counts[k] += 1
-        return counts
-
-    def _series(counts):
-        return [{"date": k, "count": counts[k]} for k in date_keys]
-
-    def _fetch_dates(query, ts_col, user_col):
-        q = _exclude_archived(query, user_col).filter(ts_col >= apr1)
-        return [r[0] for r in q.all()]
-
-    # Daily signups — excludes archived users (KPI box and "real_*" totals
-    # already do; the chart now matches). We also derive a parallel
-    # `daily_signups_activated` series: of the users who signed up on day D,
-    # how many have eventually started ≥1 study session (not necessarily on
-    # the same day). Anchored to signup date so the line maps 1:1 to the
-    # bars and shows activation conversion in calendar-day form.
-    user_q = db.query(models.User.id, models.User.created_at).filter(
-        models.User.created_at >= apr1,
-    )
-    if archived_ids:
-        user_q = user_q.filter(models.User.id.notin_(archived_ids))
-    user_rows = user_q.all()
-
-    if user_rows:
-        active_user_ids: set[int] = {
-            uid for (uid,) in db.query(func.distinct(models.StudySession.user_id))
-            .filter(models.StudySession.user_id.in_([u.id for u in user_rows]))
-            .all()
-        }
-    else:
-        active_user_ids = set()
-
-    sign_counts: dict[str, int] = {k: 0 for k in date_keys}
-    act_counts: dict[str, int] = {k: 0 for k in date_keys}
-    for uid, created_at in user_rows:
-        if not created_at:
-            continue
-        k = created_at.strftime("%Y-%m-%d")
-        if k not in sign_counts:
-            continue
-        sign_counts[k] += 1
-        if uid in active_user_ids:
-            act_counts[k] += 1
-    daily_signups = [{"date": k, "count": sign_counts[k]} for k in date_keys]
-    daily_signups_activated = [{"date": k, "count": act_counts[k]} for k in date_keys]
-
-    daily_active = []
-    daily_sessions = []
-    for i in range(num_days):
-        day = apr1 + timedelta(days=i)
-        start = day.replace(hour=0, minute=0, second=0, microsecond=0)
-        end = start + timedelta(days=1)
-        date_str = start.strftime("%Y-%m-%d")
-
-        dau = db.query(func.count(func.distinct(models.StudySession.user_id))).filter(
-            models.StudySession.started_at >= start,
-            models.StudySession.started_at < end,
-        ).scalar() or 0
-        daily_active.append({"date": date_str, "count": dau})
-
-        sessions = db.query(func.count(models.StudySession.id)).filter(
-            models.StudySession.started_at >= start,
-            models.StudySession.started_at < end,
-        ).scalar() or 0
-        mins = db.query(func.coalesce(func.sum(models.StudySession.duration_minutes), 0)).filter(
-            models.StudySession.started_at >= start,
-            models.StudySession.started_at < end,
-        ).scalar()
-        daily_sessions.append({"date": date_str, "sessions": sessions, "minutes": int(mins)})
-
-    # Daily series for new engagement metrics (single batched query each, bucketed in Python)
-    daily_friendships = _series(_bucket(_fetch_dates(
-        db.query(models.Friendship.created_at).filter(models.Friendship.status == "accepted"),
-        models.Friendship.created_at, models.Friendship.user_id,
-    )))
-    daily_groups_created = _series(_bucket(_fetch_dates(
-        db.query(models.StudyGroup.created_at),
-        models.StudyGroup.created_at, models.StudyGroup.creator_id,
-    )))
-    daily_user_subjects = _series(_bucket(_fetch_dates(
-        db.query(models.UserSubject.added_at),
-        models.UserSubject.added_at, models.UserSubject.user_id,
-    )))
-    daily_tasks_created = _series(_bucket(_fetch_dates(
-        db.query(models.Task.created_at),
-        models.Task.created_at, models.Task.user_id,
-    )))
-    daily_tip_views = _series(_bucket(_fetch_dates(
-        db.query(models.TipView.viewed_at),
-        models.TipView.viewed_at, models.TipView.user_id,
-    )))
-    daily_tip_likes = _series(_bucket(_fetch_dates(
-        db.query(models.TipView.viewed_at).filter(models.TipView.liked == True),
-        models.TipView.viewed_at, models.TipView.user_id,
-    )))
-    daily_tip_saves = _series(_bucket(_fetch_dates(
-        db.query(models.TipView.saved_at).filter(models.TipView.saved == True),
-        models.TipView.saved_at, models.TipView.user_id,
-    )))
-
-    daily_feed_reactions = _series(_bucket(_fetch_dates(
-        db.query(models.FeedReaction.created_at),
-        models.FeedReaction.created_at, models.FeedReaction.user_id,
-    )))
-
-    # Weekly + Monthly Active Users (DB) — distinct user_ids per ISO-Monday
-    # and per calendar-month-start since apr1. Computed server-side because
-    # the dashboard's old "sum daily uniques" aggregator double-counts users
-    # active on multiple days. Fetch once, bucket in Python (portable across
-    # Postgres + SQLite).
-    sess_rows = db.query(
-        models.StudySession.user_id,
-        models.StudySession.started_at,
-    ).filter(models.StudySession.started_at >= apr1).all()
-    weekly_users: dict = {}
-    monthly_users: dict = {}
-    for user_id, started_at in sess_rows:
-        if started_at is None or user_id is None:
-            continue
-        d = started_at.date()
-        monday = d - timedelta(days=d.weekday())
-        month_start = d.replace(day=1)
-        weekly_users.setdefault(monday, set()).add(user_id)
-        monthly_users.setdefault(month_start, set()).add(user_id)
-    weekly_active = [
-        {"date": monday.strftime("%Y-%m-%d"), "count": len(users)}
-        for monday, users in sorted(weekly_users.items())
-    ]
-    monthly_active = [
-        {"date": month_start.strftime("%Y-%m-%d"), "count": len(users)}
-        for month_start, users in sorted(monthly_users.items())
-    ]
-
-    return {
-        "total_users": total_users,
-        "archived_users": archived_users,
-        "real_users": total_users - archived_users,
-        "active_users_7d": active_7d,
-        "signups_7d": signups_7d,
-        "signups_30d": signups_30d,
-        "total_sessions": total_sessions,
-        "total_study_minutes": int(total_minutes),
-        "total_animals_hatched": total_animals_hatched,
-        "total_donated": total_donated,
-        "total_donation_count": total_donation_count,
-        "real_sessions": real_sessions,
-        "real_study_minutes": int(real_minutes),
-        "real_animals_hatched": real_animals,
-        "real_donated": real_donated,
-        "real_donation_count": real_donation_count,
-        "daily_signups": daily_signups,
-        "daily_signups_activated": daily_signups_activated,
-        "daily_active": daily_active,
-        "weekly_active": weekly_active,
-        "monthly_active": monthly_active,
-        "daily_sessions": daily_sessions,
-        "total_friendships": total_friendships,
-        "friendships_7d": friendships_7d,
-        "total_groups_created": total_groups_created,
-        "groups_created_7d": groups_created_7d,
-        "total_feed_reactions": total_feed_reactions,
-        "feed_reactions_7d": feed_reactions_7d,
-        "total_user_subjects": total_user_subjects,
-        "user_subjects_7d": user_subjects_7d,
-        "total_tasks_created": total_tasks_created,
-        "tasks_created_7d": tasks_created_7d,
-        "total_tip_views": total_tip_views,
-        "tip_views_7d": tip_views_7d,
-        "total_tip_likes": total_tip_likes,
-        "tip_likes_7d": tip_likes_7d,
-        "total_tip_saves": total_tip_saves,
-        "tip_saves_7d": tip_saves_7d,
-        "daily_friendships": daily_friendships,
-        "daily_groups_created": daily_groups_created,
-        "daily_user_subjects": daily_user_subjects,
-        "daily_tasks_created": daily_tasks_created,
-        "daily_tip_views": daily_tip_views,
-        "daily_tip_likes": daily_tip_likes,
-        "daily_tip_saves": daily_tip_saves,
-        "daily_feed_reactions": daily_feed_reactions,
-        "funnel": funnel,
-    }
+@app.get("/admin/overview")
+def admin_overview(
+    refresh: bool = False,
+    db: Session = Depends(get_db),
+    _=Depends(verify_admin),
+):
+    """Dashboard KPIs and charts from the precomputed snapshot
+    (services/metrics_snapshot.py). `snapshot.age_seconds` says how stale it
+    is; `refresh=true` recomputes it first."""
+    return metrics_snapshot.load(db, _overview_funnel, refresh_now=refresh)
 
 
 @app.get("/admin/cohorts/retention")
@@ -4442,9 +4473,9 @@ def admin_cohorts_retention(
                     cohorts so the chart starts at your actual launch.
 
     Excludes archived users so the % isn't dragged down by test accounts.
+    The matrix comes from services/cohort_retention.py, which caches
+    settled cells and only recounts the open ones.
     """
-    from collections import defaultdict
-
     granularity = (granularity or "weekly").lower()
     if granularity not in ("daily", "weekly"):
         raise HTTPException(status_code=400, detail="granularity must be 'daily' or 'weekly'")
@@ -4458,13 +4489,7 @@ def admin_cohorts_retention(
         period_count = periods if periods > 0 else 8
         period_days = 7
 
-    now = datetime.utcnow()
-    today = now.date()
-
-    def _bucket_start(d: date) -> date:
-        if granularity == "weekly":
-            return d - timedelta(days=d.weekday())  # Monday
-        return d
+    today = datetime.utcnow().date()
 
     cohort_floor_bucket: Optional[date] = None
     if start_date:
@@ -4475,35 +4500,32 @@ def admin_cohorts_retention(
                 status_code=400,
                 detail="start_date must be 'YYYY-MM-DD'",
             )
-        cohort_floor_bucket = _bucket_start(parsed_start)
-        earliest_dt = datetime.combine(cohort_floor_bucket, datetime.min.time())
+        cohort_floor_bucket = cohort_retention.bucket_start(parsed_start, granularity)
+        earliest = cohort_floor_bucket
         # Auto-extend periods to span from the floor to today, so the
         # oldest cohort doesn't render with an artificially short curve.
         span_periods = (today - cohort_floor_bucket).days // period_days + 1
         period_count = max(period_count, span_periods)
     else:
-        earliest_cohort = _bucket_start(today) - timedelta(days=period_days * (cohort_count - 1))
-        earliest_dt = datetime.combine(earliest_cohort, datetime.min.time())
-
-    # Pull users + their (active) sessions in two queries; bucket in Python.
-    user_rows = db.query(
-        models.User.id,
-        models.User.created_at,
-    ).filter(
-        models.User.is_archived == False,  # noqa: E712
-        models.User.created_at >= earliest_dt,
-    ).all()
-
-    cohort_to_users: dict = defaultdict(set)
-    user_to_cohort: dict = {}
-    for uid, created_at in user_rows:
-        if created_at is None:
-            continue
-        bucket = _bucket_start(created_at.date())
-        cohort_to_users[bucket].add(uid)
-        user_to_cohort[uid] = bucket
+        earliest = cohort_retention.bucket_start(today, granularity) - timedelta(days=period_days * (cohort_count - 1))
 
-    if not user_to_cohort:
+    # Periods that haven't started yet are left out rather than shown as 0%
+    # (a today-cohort would otherwise render a misleading flat line). Empty
+    # cohorts are skipped.
+    cells = cohort_retention.matrix(db, granularity, earliest, period_count, today)
+    out = [
+        {
+            "cohort_date": cohort_bucket.strftime("%Y-%m-%d"),
+            "size": size,
+            "retention": [
+                {"period": p, "active": active, "pct": round(100.0 * active / size, 1)}
+                for p, active in enumerate(row)
+            ],
+        }
+        for cohort_bucket, (size, row) in sorted(cells.items())
+        if size
+    ]
+    if not out:
         return {
             "granularity": granularity,
             "period_label": "Day" if granularity == "daily" else "Week",
@@ -4511,65 +4533,8 @@ def admin_cohorts_retention(
             "cohorts": [],
         }
 
-    user_ids = list(user_to_cohort.keys())
-    sess_rows = db.query(
-        models.StudySession.user_id,
-        models.StudySession.started_at,
-    ).filter(
-        models.StudySession.user_id.in_(user_ids),
-        models.StudySession.started_at >= earliest_dt,
-    ).all()
-
-    # active_in_bucket[(user_id, bucket_date)] = True
-    user_active_buckets: dict = defaultdict(set)
-    for uid, started_at in sess_rows:
-        if started_at is None:
-            continue
-        bucket = _bucket_start(started_at.date())
-        user_active_buckets[uid].add(bucket)
-
-    # Pick which cohorts to render. With a floor we include everything from
-    # that date onwards (data is small, so no count cap needed). Without a
-    # floor we keep the legacy behaviour of "most-recent N".
-    if cohort_floor_bucket is not None:
-        cohort_keys = sorted(
-            b for b in cohort_to_users.keys() if b >= cohort_floor_bucket
-        )
-    else:
-        cohort_keys = sorted(cohort_to_users.keys(), reverse=True)[:cohort_count]
-        cohort_keys.sort()
-
-    # For each cohort, walk forward `period_count` buckets and count uniques
-    out = []
-    for cohort_bucket in cohort_keys:
-        members = cohort_to_users[cohort_bucket]
-        size = len(members)
-        if size == 0:
-            continue
-        retention = []
-        for p in range(period_count):
-            target = cohort_bucket + timedelta(days=period_days * p)
-            # Only emit periods that have already (mostly) completed.
-            # Otherwise a today-cohort would show "0% retention" for periods
-            # that haven't elapsed yet, which would be misleading on the chart.
-            if target > today:
-                break
-            active = sum(1 for uid in members if target in user_active_buckets.get(uid, ()))
-            retention.append({
-                "period": p,
-                "active": active,
-                "pct": round(100.0 * active / size, 1),
-            })
-        out.append({
-            "cohort_date": cohort_bucket.strftime("%Y-%m-%d"),
-            "size": size,
-            "retention": retention,
-        })
-
-    # `cohort_keys` is already chronological (oldest → newest), so legend
-    # reads in signup order and the bold "newest cohort" styling lands on
-    # the freshest data.
-
+    # Chronological (oldest → newest), so the legend reads in signup order
+    # and the bold "newest cohort" styling lands on the freshest data.
     return {
         "granularity": granularity,
         "period_label": "Day" if granularity == "daily" else "Week",
@@ -4592,7 +4557,7 @@ SCHOOL_VALID_TIERS = ("hidden", "tier1", "tier2", "tier3")
 
 
 @app.get("/public/geography")
-def public_geography(db: Session = Depends(get_db)):
+def public_geography(request: Request, db: Session = Depends(get_db)):
     """Public-facing geography summary for the website.
 
     Schools are joined against `school_display` and grouped by tier so the
@@ -4600,47 +4565,56 @@ def public_geography(db: Session = Depends(get_db)):
     'hidden' is omitted entirely. Unflagged schools fall through to
     `SCHOOL_DEFAULT_TIER` so the page never goes blank just because we
     haven't curated yet.
+
+    The body is encoded row by row (services/streaming.py), with the totals
+    after the school list, and served from services/response_cache.py.
     """
-    country_rows = (
-        db.query(models.User.country, func.count(models.User.id))
-        .filter(models.User.country.isnot(None), models.User.country != "")
-        .group_by(models.User.country)
-        .order_by(func.count(models.User.id).desc())
-        .all()
-    )
-    school_rows = (
-        db.query(models.User.school, models.User.city, models.User.country)
-        .filter(models.User.school.isnot(None), models.User.school != "")
-        .distinct()
-        .all()
-    )
+    def build():
+        country_rows = (
+            db.query(models.User.country, func.count(models.User.id))
+            .filter(models.User.country.isnot(None), models.User.country != "")
+            .group_by(models.User.country)
+            .order_by(func.count(models.User.id).desc())
+            .all()
+        )
+        school_rows = (
+            select(models.User.school, models.User.city, models.User.country)
+            .where(models.User.school.isnot(None), models.User.school != "")
+            .distinct()
+        )
 
-    # Bulk-fetch tier overrides keyed on lowercased name so "Harvard" and
-    # "harvard" share the same flag without making the admin canonicalise.
-    flag_rows = db.query(models.SchoolDisplay).all()
-    tier_by_key: dict[str, str] = {f.name_key: f.tier for f in flag_rows}
-
-    schools_out = []
-    hidden_count = 0
-    for school, city, country in school_rows:
-        tier = tier_by_key.get(_school_name_key(school), SCHOOL_DEFAULT_TIER)
-        if tier == "hidden":
-            hidden_count += 1
-            continue
-        schools_out.append({
-            "school": school,
-            "city": city,
-            "country": country,
-            "tier": tier,
-        })
+        # Bulk-fetch tier overrides keyed on lowercased name so "Harvard" and
+        # "harvard" share the same flag without making the admin canonicalise.
+        tier_by_key: dict[str, str] = dict(
+            db.query(models.SchoolDisplay.name_key, models.SchoolDisplay.tier).all()
+        )
 
-    return {
-        "total_countries": len(country_rows),
-        "total_schools": len(schools_out),
-        "total_schools_hidden": hidden_count,
-        "countries": [{"country": r[0], "users": r[1]} for r in country_rows],
-        "schools": schools_out,
-    }
+        shown = hidden = 0
+
+        def schools_out():
+            nonlocal shown, hidden
+            for school, city, country in streaming.rows(db, school_rows):
+                tier = tier_by_key.get(_school_name_key(school), SCHOOL_DEFAULT_TIER)
+                if tier == "hidden":
+                    hidden += 1
+                    continue
+                shown += 1
+                yield {
+                    "school": school,
+                    "city": city,
+                    "country": country,
+                    "tier": tier,
+                }
+
+        return "".join(streaming.json_object([
+            ("total_countries", len(country_rows)),
+            ("countries", [{"country": r[0], "users": r[1]} for r in country_rows]),
+            ("schools", schools_out()),
+            ("total_schools", lambda: shown),
+            ("total_schools_hidden", lambda: hidden),
+        ]))
+
+    return response_cache.respond(request, "geography", build)
 
 
 def _env_str(name: str) -> Optional[str]:
@@ -4714,30 +4688,35 @@ def is_app_version_outdated(app_version: Optional[str]) -> bool:
 
 
 @app.get("/public/client-config")
-def public_client_config():
+def public_client_config(request: Request):
     """
     Public mobile client flags (no auth). Used on app launch to require a
     minimum store build — set via Railway env when you need everyone on a
     newer binary (MOBILE_MIN_IOS_VERSION / MOBILE_MIN_IOS_BUILD, etc.).
+    Env changes take effect on redeploy, so the response is cached and
+    revalidated by ETag.
     """
-    ios_store_id = _env_str("MOBILE_IOS_APP_STORE_ID") or "6759482612"
-    default_ios_url = f"https://apps.apple.com/app/id{ios_store_id}"
-    default_android_url = (
-        "https://play.google.com/store/apps/details?id=com.endura.study"
-    )
-    return {
-        "ios": {
-            "min_version": _env_str("MOBILE_MIN_IOS_VERSION"),
-            "min_build": _env_int_optional("MOBILE_MIN_IOS_BUILD"),
-        },
-        "android": {
-            "min_version": _env_str("MOBILE_MIN_ANDROID_VERSION"),
-            "min_version_code": _env_int_optional("MOBILE_MIN_ANDROID_VERSION_CODE"),
-        },
-        "update_message": _env_str("MOBILE_UPDATE_MESSAGE"),
-        "ios_store_url": _env_str("MOBILE_IOS_STORE_URL") or default_ios_url,
-        "android_store_url": _env_str("MOBILE_ANDROID_STORE_URL") or default_android_url,
-    }
+    def build():
+        ios_store_id = _env_str("MOBILE_IOS_APP_STORE_ID") or "6759482612"
+        default_ios_url = f"https://apps.apple.com/app/id{ios_store_id}"
+        default_android_url = (
+            "https://play.google.com/store/apps/details?id=com.endura.study"
+        )
+        return {
+            "ios": {
+                "min_version": _env_str("MOBILE_MIN_IOS_VERSION"),
+                "min_build": _env_int_optional("MOBILE_MIN_IOS_BUILD"),
+            },
+            "android": {
+                "min_version": _env_str("MOBILE_MIN_ANDROID_VERSION"),
+                "min_version_code": _env_int_optional("MOBILE_MIN_ANDROID_VERSION_CODE"),
+            },
+            "update_message": _env_str("MOBILE_UPDATE_MESSAGE"),
+            "ios_store_url": _env_str("MOBILE_IOS_STORE_URL") or default_ios_url,
+            "android_store_url": _env_str("MOBILE_ANDROID_STORE_URL") or default_android_url,
+        }
+
+    return response_cache.respond(request, "client-config", build)
 
 
 @app.get("/admin/geography")
@@ -4796,41 +4775,43 @@ def admin_geography(db: Session = Depends(get_db), _=Depends(verify_admin)):
         })
 
     school_rows = (
-        db.query(
+        select(
             models.User.school,
             models.User.city,
             models.User.country,
             func.count(models.User.id),
         )
-        .filter(models.User.school.isnot(None), models.User.school != "")
+        .where(models.User.school.isnot(None), models.User.school != "")
         .group_by(models.User.school, models.User.city, models.User.country)
         .order_by(func.count(models.User.id).desc())
-        .all()
     )
-    flag_rows = db.query(models.SchoolDisplay).all()
-    tier_by_key: dict[str, str] = {f.name_key: f.tier for f in flag_rows}
-    schools = [
-        {
-            "school": r[0],
-            "city": r[1],
-            "country": r[2],
-            "users": r[3],
-            "tier": tier_by_key.get(_school_name_key(r[0]), SCHOOL_DEFAULT_TIER),
-        }
-        for r in school_rows
-    ]
+    tier_by_key: dict[str, str] = dict(
+        db.query(models.SchoolDisplay.name_key, models.SchoolDisplay.tier).all()
+    )
+    total_schools = 0
+
+    # One row per (school, city, country) users typed; streamed, with the
+    # count written after the list.
+    def schools():
+        nonlocal total_schools
+        for r in streaming.rows(db, school_rows):
+            total_schools += 1
+            yield {
+                "school": r[0],
+                "city": r[1],
+                "country": r[2],
+                "users": r[3],
+                "tier": tier_by_key.get(_school_name_key(r[0]), SCHOOL_DEFAULT_TIER),
+            }
 
-    total_countries = len(countries)
-    total_schools = len(schools)
-
-    return {
-        "total_countries": total_countries,
-        "total_schools": total_schools,
-        "countries": countries,
-        "schools": schools,
-        "default_tier": SCHOOL_DEFAULT_TIER,
-        "valid_tiers": list(SCHOOL_VALID_TIERS),
-    }
+    return streaming.json_response([
+        ("total_countries", len(countries)),
+        ("countries", countries),
+        ("default_tier", SCHOOL_DEFAULT_TIER),
+        ("valid_tiers", list(SCHOOL_VALID_TIERS)),
+        ("schools", schools()),
+        ("total_schools", lambda: total_schools),
+    ])
 
 
 class SchoolTierUpdate(BaseModel):
@@ -4875,6 +4856,7 @@ def admin_set_school_tier(
         if body.country and not row.country:
             row.country = body.country
     db.commit()
+    response_cache.invalidate("geography")
     db.refresh(row)
     return {
         "school_name": row.school_name,
@@ -4925,6 +4907,7 @@ def admin_bulk_set_school_tiers(
             row.tier = tier
         saved += 1
     db.commit()
+    response_cache.invalidate("geography")
     return {"saved": saved, "skipped": skipped}
 
 
@@ -4990,26 +4973,18 @@ def admin_subjects_audit(db: Session = Depends(get_db), _=Depends(verify_admin))
     return {
         "total_subjects": len(rows),
         "default_count": sum(1 for r in rows if r["is_default"]),
-        "custom_count": len(customs),
-        "custom_with_suggestion": sum(1 for r in customs if r["suggested_merge_into"]),
-        "subjects": rows,
-    }
-
-
-@app.get("/admin/users")
-def admin_users(
-    search: Optional[str] = None,
-    sort: str = "created_at",
-    order: str = "desc",
-    limit: int = Query(10000, ge=1, le=50000),
-    offset: int = 0,
-    archived_filter: str = Query(
-        "all",
-        description="all = everyone; active = not archived; archived_only = closed/archived accounts",
-    ),
-    db: Session = Depends(get_db),
-    _=Depends(verify_admin),
-):
+        "custom_count": len(customs),
+        "custom_with_suggestion": sum(1 for r in customs if r["suggested_merge_into"]),
+        "subjects": rows,
+    }
+
+
+_ADMIN_USER_SORT_COLS = {"created_at", "username", "total_study_minutes", "current_streak", "last_study_date"}
+
+
+def _admin_users_query(db: Session, search: Optional[str], archived_filter: str, sort: str, order: str):
+    """Filtered, ordered user query shared by /admin/users and its export.
+    Returns (query, sort name, sort column, descending)."""
     q = db.query(models.User)
     if search:
         pattern = f"%{search}%"
@@ -5027,11 +5002,13 @@ def admin_users(
             detail="archived_filter must be one of: all, active, archived_only",
         )
 
-    ALLOWED_SORT_COLS = {"created_at", "username", "total_study_minutes", "current_streak", "last_study_date"}
-    sort_col = getattr(models.User, sort, models.User.created_at) if sort in ALLOWED_SORT_COLS else models.User.created_at
-    q = q.order_by(sort_col.desc() if order == "desc" else sort_col.asc())
-    total = q.count()
-    users = q.offset(offset).limit(limit).all()
+    sort = sort if sort in _ADMIN_USER_SORT_COLS else "created_at"
+    sort_col = getattr(models.User, sort)
+    descending = order == "desc"
+    return keyset.ordered(q, sort_col, models.User.id, descending), sort, sort_col, descending
+
+
+def _admin_user_rows(db: Session, users: list) -> list[dict]:
     user_ids = [u.id for u in users]
 
     # Bulk-aggregate per-user counts to avoid N+1 queries
@@ -5064,7 +5041,6 @@ def admin_users(
         ).filter(models.GroupMember.user_id.in_(user_ids)).group_by(models.GroupMember.user_id).all():
             groups_map[uid] = cnt
 
-    latest_v = latest_app_version()
     result = []
     for u in users:
         u_version = getattr(u, "app_version", None)
@@ -5098,8 +5074,85 @@ def admin_users(
             "app_version_updated_at": u_version_at.isoformat() if u_version_at else None,
             "app_version_outdated": is_app_version_outdated(u_version) if u_version else None,
         })
+    return result
+
+
+@app.get("/admin/users")
+def admin_users(
+    search: Optional[str] = None,
+    sort: str = "created_at",
+    order: str = "desc",
+    limit: int = Query(500, ge=1, le=5000),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    offset: int = Query(0, ge=0, description="Legacy paging; prefer cursor"),
+    count: str = Query("exact", description="exact = COUNT(*); estimate = planner estimate; none = skip"),
+    archived_filter: str = Query(
+        "all",
+        description="all = everyone; active = not archived; archived_only = closed/archived accounts",
+    ),
+    db: Session = Depends(get_db),
+    _=Depends(verify_admin),
+):
+    """One page of users. Follow `next_cursor` for the next page (null on
+    the last one); pass `count=none` on follow-up pages to skip the count.
+    For the full list use /admin/users/export, which streams."""
+    if count not in ("exact", "estimate", "none"):
+        raise HTTPException(status_code=400, detail="count must be one of: exact, estimate, none")
+    if cursor and offset:
+        raise HTTPException(status_code=400, detail="Use either cursor or offset, not both")
+    q, sort, sort_col, descending = _admin_users_query(db, search, archived_filter, sort, order)
+
+    if count == "exact":
+        total = q.order_by(None).count()
+    elif count == "estimate":
+        total = keyset.estimated_count(db, q)
+    else:
+        total = None
+
+    page_q = q
+    if cursor:
+        try:
+            after = keyset.decode_cursor(cursor, sort, order, sort_col)
+        except keyset.InvalidCursor as exc:
+            raise HTTPException(status_code=400, detail=f"Invalid cursor: {exc}")
+        page_q = keyset.seek(q, sort_col, models.User.id, descending, after)
+    users = page_q.offset(offset).limit(limit + 1).all()
+    next_cursor = keyset.next_cursor(
+        users, limit, sort, order, lambda u: getattr(u, sort), lambda u: u.id,
+    )
+
+    return {
+        "total": total,
+        "total_is_estimate": count == "estimate",
+        "users": _admin_user_rows(db, users),
+        "next_cursor": next_cursor,
+        "latest_app_version": latest_app_version(),
+    }
 
-    return {"total": total, "users": result, "latest_app_version": latest_v}
+
+@app.get("/admin/users/export")
+def admin_users_export(
+    fmt: str = Query("csv", alias="format", description="csv or ndjson"),
+    search: Optional[str] = None,
+    sort: str = "created_at",
+    order: str = "desc",
+    archived_filter: str = Query("all"),
+    db: Session = Depends(get_db),
+    _=Depends(verify_admin),
+):
+    """Every matching user, same fields and filters as /admin/users, streamed
+    in chunks from a server-side cursor so the worker never holds the whole
+    list."""
+    if fmt not in streaming.MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be 'csv' or 'ndjson'")
+    q, *_rest = _admin_users_query(db, search, archived_filter, sort, order)
+    chunks = (_admin_user_rows(db, users) for users in streaming.partitions(db, q.statement))
+    filename = f"users-{datetime.utcnow():%Y%m%d}.{fmt}"
+    return StreamingResponse(
+        streaming.encode(chunks, fmt),
+        media_type=streaming.MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 
 @app.put("/admin/users/{user_id}")
@@ -5130,6 +5183,7 @@ async def admin_update_user(
         if total_study_minutes < 0:
             raise HTTPException(400, "Study minutes cannot be negative")
         user.total_study_minutes = total_study_minutes
+        leaderboard_service.sync_user(db, user)
 
     if profile_pic is not None:
         if profile_pic.content_type not in {"image/png", "image/jpeg", "image/webp", "image/gif"}:
@@ -5137,14 +5191,10 @@ async def admin_update_user(
         data = await profile_pic.read()
         if len(data) > 5 * 1024 * 1024:
             raise HTTPException(400, "File too large (max 5 MB)")
-        upload = models.Upload(
-            filename=profile_pic.filename or "profile.jpg",
-            content_type=profile_pic.content_type,
-            data=data,
+        upload = blob_store.create_upload(
+            db, data, profile_pic.filename or "profile.jpg", profile_pic.content_type,
         )
-        db.add(upload)
-        db.commit()
-        db.refresh(upload)
+        image_variants.schedule(upload.sha256, upload.content_type)
         base = os.getenv("API_BASE_URL", "https://web-production-34028.up.railway.app")
         user.profile_pic_url = f"{base}/uploads/{upload.public_id}"
 
@@ -5168,7 +5218,10 @@ def admin_archive_user(user_id: int, db: Session = Depends(get_db), _=Depends(ve
         raise HTTPException(status_code=400, detail="Cannot archive admin users")
     user.is_archived = True
     user.token_version = (user.token_version or 0) + 1
+    metrics_snapshot.mark_dirty(db)
+    cohort_retention.invalidate(db)
     db.commit()
+    invalidate_user_tokens(user_id)
     return {"archived": True, "user_id": user_id}
 
 
@@ -5178,6 +5231,8 @@ def admin_reactivate_user(user_id: int, db: Session = Depends(get_db), _=Depends
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     user.is_archived = False
+    metrics_snapshot.mark_dirty(db)
+    cohort_retention.invalidate(db)
     db.commit()
     return {"reactivated": True, "user_id": user_id}
 
@@ -5328,25 +5383,36 @@ def admin_sessions(
     _=Depends(verify_admin),
 ):
     total = db.query(func.count(models.StudySession.id)).scalar() or 0
-    sessions = db.query(models.StudySession).order_by(
-        models.StudySession.started_at.desc()
-    ).offset(offset).limit(limit).all()
+    S = models.StudySession
+    page = (
+        select(
+            S.id, S.user_id, S.duration_minutes, S.coins_earned, S.subject_id, S.started_at,
+            models.User.id.label("found_user"), models.User.username, models.User.email,
+            models.Subject.display_name,
+        )
+        .outerjoin(models.User, models.User.id == S.user_id)
+        .outerjoin(models.Subject, models.Subject.id == S.subject_id)
+        .order_by(S.started_at.desc())
+        .offset(offset)
+        .limit(limit)
+    )
 
-    result = []
-    for s in sessions:
-        u = db.query(models.User).filter(models.User.id == s.user_id).first()
-        result.append({
-            "id": s.id,
-            "user_id": s.user_id,
-            "username": (u.username or u.email) if u else None,
-            "duration_minutes": s.duration_minutes,
-            "coins_earned": s.coins_earned,
-            "subject": s.subject.display_name if s.subject else None,
-            "subject_id": s.subject_id,
-            "started_at": s.started_at.isoformat() if s.started_at else None,
-        })
+    # Author and subject come from the same query (this used to issue a
+    # user lookup and a subject lazy-load per row); rows are streamed.
+    def sessions():
+        for r in streaming.rows(db, page):
+            yield {
+                "id": r.id,
+                "user_id": r.user_id,
+                "username": (r.username or r.email) if r.found_user else None,
+                "duration_minutes": r.duration_minutes,
+                "coins_earned": r.coins_earned,
+                "subject": r.display_name,
+                "subject_id": r.subject_id,
+                "started_at": r.started_at.isoformat() if r.started_at else None,
+            }
 
-    return {"total": total, "sessions": result}
+    return streaming.json_response([("total", total), ("sessions", sessions())])
 
 
 @app.get("/admin/sessions/incomplete")
@@ -5480,6 +5546,36 @@ def admin_reap_stale_sessions(
     )
 
 
+@app.post("/admin/leaderboard/rebuild")
+def admin_rebuild_leaderboard(db: Session = Depends(get_db), _=Depends(verify_admin)):
+    """Recompute `leaderboard_standings` from users + study_sessions.
+
+    Standings are maintained incrementally on session finalisation, so this
+    is only needed after a manual data fix or if drift is suspected.
+    """
+    return leaderboard_service.rebuild_standings(db)
+
+
+@app.post("/admin/daily-minutes/rebuild")
+def admin_rebuild_daily_minutes(
+    user_id: Optional[int] = Query(None, description="Only rebuild this user's rows"),
+    db: Session = Depends(get_db),
+    _=Depends(verify_admin),
+):
+    """Recompute `user_daily_minutes` from study_sessions (all users, or one)."""
+    return daily_minutes_service.rebuild(db, None if user_id is None else [user_id])
+
+
+@app.get("/admin/daily-minutes/check")
+def admin_check_daily_minutes(
+    user_id: Optional[int] = Query(None, description="Only check this user's rows"),
+    db: Session = Depends(get_db),
+    _=Depends(verify_admin),
+):
+    """Report rows where the daily-minutes rollup disagrees with study_sessions."""
+    return daily_minutes_service.check(db, None if user_id is None else [user_id])
+
+
 # ============ Admin App Store Rankings (via Apple iTunes RSS) ============
 #
 # We pull rank data straight from Apple's free, public, no-auth iTunes RSS
@@ -6197,14 +6293,7 @@ async def upload_feedback_attachment(
         raise HTTPException(400, "File too large (max 5 MB)")
     if not _valid_image_magic(data):
         raise HTTPException(400, "File does not appear to be a valid image")
-    upload = models.Upload(
-        filename=file.filename or "feedback.jpg",
-        content_type=file.content_type,
-        data=data,
-    )
-    db.add(upload)
-    db.commit()
-    db.refresh(upload)
+    upload = blob_store.create_upload(db, data, file.filename or "feedback.jpg", file.content_type)
     base = os.getenv("API_BASE_URL", "https://web-production-34028.up.railway.app")
     url = f"{base}/uploads/{upload.public_id}"
     logger.info(
@@ -6328,13 +6417,12 @@ def admin_list_feedback(
             | (func.lower(models.UserFeedback.email).like(like))
         )
 
-    items = query.order_by(models.UserFeedback.created_at.desc()).limit(limit).all()
-
-    user_ids = {fb.user_id for fb in items if fb.user_id}
-    users_map = {}
-    if user_ids:
-        users = db.query(models.User).filter(models.User.id.in_(user_ids)).all()
-        users_map = {u.id: u for u in users}
+    items = (
+        query.with_entities(*models.UserFeedback.__table__.c, models.User.username)
+        .outerjoin(models.User, models.User.id == models.UserFeedback.user_id)
+        .order_by(models.UserFeedback.created_at.desc())
+        .limit(limit)
+    )
 
     # Aggregate counts for KPIs
     week_ago = datetime.utcnow() - timedelta(days=7)
@@ -6358,10 +6446,9 @@ def admin_list_feedback(
         },
     }
 
-    return {
-        "counts": counts,
-        "items": [
-            {
+    def rows():
+        for fb in streaming.rows(db, items.statement):
+            yield {
                 "id": fb.id,
                 "feedback_type": fb.feedback_type,
                 "title": fb.title,
@@ -6371,7 +6458,7 @@ def admin_list_feedback(
                 "upvotes": fb.upvotes,
                 "email": fb.email,
                 "user_id": fb.user_id,
-                "username": users_map.get(fb.user_id).username if fb.user_id and users_map.get(fb.user_id) else None,
+                "username": fb.username if fb.user_id else None,
                 "app_version": fb.app_version,
                 "os": fb.os,
                 "device_model": fb.device_model,
@@ -6388,9 +6475,8 @@ def admin_list_feedback(
                 "updated_at": fb.updated_at.isoformat(),
                 "resolved_at": fb.resolved_at.isoformat() if fb.resolved_at else None,
             }
-            for fb in items
-        ],
-    }
+
+    return streaming.json_response([("counts", counts), ("items", rows())])
 
 
 @app.get("/admin/feedback/{feedback_id}")
@@ -6950,6 +7036,7 @@ def admin_create_animal(body: AnimalCreate, db: Session = Depends(get_db), _=Dep
     )
     db.add(animal)
     db.commit()
+    response_cache.invalidate("animals")
     db.refresh(animal)
     return {
         "id": animal.id,
@@ -6977,6 +7064,7 @@ def admin_update_animal(
     for field, value in updates.items():
         setattr(animal, field, value)
     db.commit()
+    response_cache.invalidate("animals")
     db.refresh(animal)
     return {
         "id": animal.id,
@@ -6996,6 +7084,7 @@ def admin_delete_animal(animal_id: int, db: Session = Depends(get_db), _=Depends
         raise HTTPException(status_code=404, detail="Animal not found")
     db.delete(animal)
     db.commit()
+    response_cache.invalidate("animals")
     return {"deleted": True, "id": animal_id}
 
 
@@ -7015,33 +7104,58 @@ async def admin_upload_image(
     data = await file.read()
     if len(data) > MAX_FILE_SIZE:
         raise HTTPException(400, "File too large (max 5 MB)")
-    upload = models.Upload(
-        filename=file.filename or "image.png",
-        content_type=file.content_type,
-        data=data,
-    )
-    db.add(upload)
-    db.commit()
-    db.refresh(upload)
+    upload = blob_store.create_upload(db, data, file.filename or "image.png", file.content_type)
     base = os.getenv("API_BASE_URL", "https://web-production-34028.up.railway.app")
     return {"id": upload.id, "url": f"{base}/uploads/{upload.public_id}"}
 
 
 @app.get("/uploads/{identifier}")
-def serve_upload(identifier: str, db: Session = Depends(get_db)):
-    upload = db.query(models.Upload).filter(models.Upload.public_id == identifier).first()
-    if not upload:
-        try:
-            upload = db.query(models.Upload).filter(models.Upload.id == int(identifier)).first()
-        except (ValueError, TypeError):
-            pass
-    if not upload:
+def serve_upload(
+    identifier: str,
+    request: Request,
+    w: Optional[int] = Query(None, ge=1, le=4096, description="Display width in px; serves the closest resized variant"),
+    db: Session = Depends(get_db),
+):
+    """Serve an uploaded image from the blob store.
+
+    Metadata comes from an in-process cache (no DB connection once warm) and
+    the bytes are streamed from disk by FileResponse, which also handles
+    Range requests. The content hash is a strong ETag. With `?w=` the
+    closest pre-rendered WebP/JPEG variant is served instead when one
+    exists (services/image_variants.py). While it is still rendering the
+    original stands in with a short max-age, so the ?w= URL picks up the
+    variant once it is there.
+    """
+    meta = blob_store.lookup(db, identifier)
+    if meta is None:
         raise HTTPException(404, "Not found")
-    return Response(
-        content=upload.data,
-        media_type=upload.content_type,
-        headers={"Cache-Control": "public, max-age=31536000"},
-    )
+    cache_control = "public, max-age=31536000, immutable"
+    if w is not None:
+        variant = image_variants.lookup(meta.sha256, meta.content_type, w, request.headers.get("accept", ""))
+        if variant is image_variants.PENDING:
+            cache_control = "public, max-age=60"
+        elif variant is not None:
+            path, media_type, width = variant
+            headers = {
+                "Cache-Control": cache_control,
+                "ETag": f'"{meta.sha256}-{width}-{path.suffix[1:]}"',
+                "Vary": "Accept",
+            }
+            if request.headers.get("if-none-match") == headers["ETag"]:
+                return Response(status_code=304, headers=headers)
+            return FileResponse(path, media_type=media_type, headers=headers)
+    headers = {"Cache-Control": cache_control, "ETag": f'"{meta.sha256}"'}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    store = blob_store.get_store()
+    path = store.path(meta.sha256)
+    if path is not None:
+        return FileResponse(path, media_type=meta.content_type, headers=headers)
+    data = store.read(meta.sha256) or blob_store.restore_blob(db, meta)
+    if data is None:
+        logger.error(f"Upload id={meta.id} points at missing blob {meta.sha256}")
+        raise HTTPException(404, "Not found")
+    return Response(content=data, media_type=meta.content_type, headers=headers)
 
 
 @app.get("/admin/tips")
@@ -7218,6 +7332,7 @@ def admin_create_shop_item(body: ShopItemCreate, db: Session = Depends(get_db),
     item = models.ShopItem(**body.dict())
     db.add(item)
     db.commit()
+    response_cache.invalidate("shop")
     db.refresh(item)
     return {
         "id": item.id, "item_key": item.item_key, "name": item.name,
@@ -7235,6 +7350,7 @@ def admin_update_shop_item(item_id: int, body: ShopItemUpdate, db: Session = Dep
     for field, value in body.dict(exclude_unset=True).items():
         setattr(item, field, value)
     db.commit()
+    response_cache.invalidate("shop")
     db.refresh(item)
     return {
         "id": item.id, "item_key": item.item_key, "name": item.name,
@@ -7251,6 +7367,7 @@ def admin_delete_shop_item(item_id: int, db: Session = Depends(get_db), _=Depend
         raise HTTPException(status_code=404, detail="Shop item not found")
     db.delete(item)
     db.commit()
+    response_cache.invalidate("shop")
     return {"deleted": True, "id": item_id}
 
 
@@ -7454,6 +7571,26 @@ def admin_update_prompt_cohort(db: Session = Depends(get_db), _=Depends(verify_a
     return _build_update_prompt_cohort(db)
 
 
+@app.get("/admin/telemetry/app-version")
+def admin_app_version_telemetry(_=Depends(verify_admin)):
+    """Write-behind buffer health for X-App-Version capture: pending rows,
+    oldest pending age, flush counts and lag."""
+    return app_version_telemetry.stats()
+
+
+@app.get("/admin/rate-limits")
+def admin_rate_limit_stats(_=Depends(verify_admin)):
+    """Rate limiter health for this worker: storage backend, allowed/blocked
+    hits per route, and expired-counter sweeps."""
+    return rate_limit_store.stats()
+
+
+@app.get("/admin/response-cache")
+def admin_response_cache_stats(_=Depends(verify_admin)):
+    """Public response cache for this worker: hits, misses, 304s, entries."""
+    return response_cache.stats()
+
+
 @app.post("/admin/users/backfill-app-version")
 async def admin_backfill_user_app_version(
     db: Session = Depends(get_db), _=Depends(verify_admin)
@@ -7664,8 +7801,6 @@ def admin_send_update_prompt(
         user_ids (list[int]): if provided, skip cohort selection and only send
             to these specific users (still respects template + cooldown).
     """
-    import time
-
     body = body or {}
     dry_run = bool(body.get("dry_run", False))
     include_unknown = bool(body.get("include_unknown", True))
@@ -7696,41 +7831,42 @@ def admin_send_update_prompt(
         }
 
     latest_v = cohort["latest_app_version"]
-    send_interval = float(os.getenv("EMAIL_SEND_INTERVAL", "0.35"))
-    sent_count = 0
     failed = 0
 
+    # One template lookup + compile for the whole cohort.
+    compiled = email_dispatch.compile_templates(db.query(models.EmailTemplate).filter(
+        models.EmailTemplate.template_key == UPDATE_PROMPT_TEMPLATE_KEY,
+        models.EmailTemplate.is_active == True,
+    ).all()).get(UPDATE_PROMPT_TEMPLATE_KEY)
+
     user_id_set = [u["id"] for u in users_payload]
     user_objs = {u.id: u for u in db.query(models.User).filter(models.User.id.in_(user_id_set)).all()} if user_id_set else {}
 
+    jobs: list[email_dispatch.EmailJob] = []
     for entry in users_payload:
         user = user_objs.get(entry["id"])
-        if not user or not user.email:
+        if not compiled or not user or not user.email:
             failed += 1
             continue
-        variables = {
+        jobs.append(email_dispatch.EmailJob(user.id, user.email, compiled, "update_prompt", {
             "name": user.username or "there",
             "current_version": entry.get("app_version") or "an older build",
             "latest_version": latest_v,
-        }
-        try:
-            ok = _send_template_email(UPDATE_PROMPT_TEMPLATE_KEY, user.email, variables, db)
-        except Exception as e:
-            logger.error(f"update-prompt send failed user={user.id}: {e}")
-            ok = False
-        if ok:
-            sent_count += 1
-        else:
-            failed += 1
-        time.sleep(send_interval)
+        }))
+    jobs.sort(key=lambda j: j.user_id)
+    result = email_dispatch.send_bulk(
+        db, jobs, scope=f"{UPDATE_PROMPT_TEMPLATE_KEY}:{datetime.utcnow().date().isoformat()}",
+    )
+    failed += result["failed"]
 
     return {
         "template_key": UPDATE_PROMPT_TEMPLATE_KEY,
         "latest_app_version": latest_v,
         "cooldown_days": cohort["cooldown_days"],
         "attempted": len(users_payload),
-        "sent": sent_count,
+        "sent": result["sent"],
         "failed": failed,
+        **({"stopped_early": result["stopped_early"]} if "stopped_early" in result else {}),
     }
 
 
@@ -7920,8 +8056,6 @@ def admin_campaign_metrics(db: Session = Depends(get_db), _=Depends(verify_admin
 @app.post("/admin/campaign-send/{cohort_key}")
 def admin_campaign_send(cohort_key: str, db: Session = Depends(get_db), _=Depends(verify_admin)):
     """Send the next eligible campaign drip per user (day-gated, in order)."""
-    import time
-
     if cohort_key not in CAMPAIGN_COHORTS:
         raise HTTPException(status_code=400, detail=f"Unknown cohort: {cohort_key}")
 
@@ -7977,14 +8111,9 @@ def admin_campaign_send(cohort_key: str, db: Session = Depends(get_db), _=Depend
     else:
         users = []
 
-    # Resend ~5 req/s — space bulk admin sends (same default as onboarding email cron).
-    send_interval = float(os.getenv("EMAIL_SEND_INTERVAL", "0.35"))
-
     now = datetime.utcnow()
-    sent_count = 0
     skipped = 0
     failed = 0
-    sent_by_template: dict[str, int] = {}
 
     user_ids = [u.id for u in users if u.email]
 
@@ -8009,7 +8138,14 @@ def admin_campaign_send(cohort_key: str, db: Session = Depends(get_db), _=Depend
         .group_by(models.UserBadge.user_id).all()
     )
 
-    for user in users:
+    # Each drop is parsed once; batches render per recipient on the dispatcher.
+    compiled = email_dispatch.compile_templates(db.query(models.EmailTemplate).filter(
+        models.EmailTemplate.template_key.in_(all_keys),
+        models.EmailTemplate.is_active == True,
+    ).all())
+
+    jobs: list[email_dispatch.EmailJob] = []
+    for user in sorted(users, key=lambda u: u.id):
         if not user.email:
             continue
         user_sent = sent_keys_by_user[user.id]
@@ -8017,32 +8153,29 @@ def admin_campaign_send(cohort_key: str, db: Session = Depends(get_db), _=Depend
         if not template_key:
             skipped += 1
             continue
-        name = user.username or "there"
-        variables = {
-            "name": name,
+        if template_key not in compiled:
+            failed += 1  # missing or deactivated template
+            continue
+        jobs.append(email_dispatch.EmailJob(user.id, user.email, compiled[template_key], cohort_key, {
+            "name": user.username or "there",
             "total_minutes": str(user.total_study_minutes or 0),
             "animals_count": str(animals_by_user.get(user.id, 0)),
             "streak": str(user.current_streak or 0),
             "longest_streak": str(user.longest_streak or 0),
             "sessions": str(user.total_sessions or 0),
             "badges": str(badges_by_user.get(user.id, 0)),
-        }
-        ok = _send_template_email(template_key, user.email, variables, db)
-        if ok:
-            sent_count += 1
-            sent_by_template[template_key] = sent_by_template.get(template_key, 0) + 1
-        else:
-            failed += 1
-        time.sleep(send_interval)
+        }))
+    result = email_dispatch.send_bulk(db, jobs, scope=f"campaign:{cohort_key}:{now.date().isoformat()}")
 
     return {
         "cohort": cohort_key,
         "drops": all_keys,
         "total_in_cohort": len(users),
-        "sent": sent_count,
+        "sent": result["sent"],
         "skipped_no_eligible_drop": skipped,
-        "failed": failed,
-        "sent_by_template": sent_by_template,
+        "failed": failed + result["failed"],
+        "sent_by_template": result["sent_by_template"],
+        **({"stopped_early": result["stopped_early"]} if "stopped_early" in result else {}),
     }
 
 
@@ -8100,107 +8233,31 @@ def _send_android_invite_email(email: str, db: Session | None = None) -> bool:
 # ── Onboarding Lifecycle Emails ───────────────────────────────────
 
 @app.post("/admin/onboarding-emails")
-def run_onboarding_emails(db: Session = Depends(get_db), _=Depends(verify_admin)):
-    """Trigger onboarding emails for users at key milestones. Run daily via cron."""
-    import time
-
-    import resend.exceptions as _resend_exc
-    resend_key = os.getenv("RESEND_API_KEY")
-    if not resend_key:
-        return {"error": "RESEND_API_KEY not set"}
-
-    send_interval = float(os.getenv("EMAIL_SEND_INTERVAL", "0.35"))
-    daily_cap = int(os.getenv("DAILY_EMAIL_CAP", "10000"))
-    now = datetime.utcnow()
-    sent = {"day3": 0, "day7": 0, "day14": 0, "day30": 0, "reengagement": 0}
-    total_sent = 0
-    stopped_early: str | None = None
-
-    milestone_templates = db.query(models.EmailTemplate).filter(
-        models.EmailTemplate.is_active == True,
-        models.EmailTemplate.trigger_day.isnot(None),
-    ).all()
-    reengagement_templates = db.query(models.EmailTemplate).filter(
-        models.EmailTemplate.is_active == True,
-        models.EmailTemplate.inactive_days.isnot(None),
-    ).order_by(models.EmailTemplate.id).all()
-
-    if not milestone_templates and not reengagement_templates:
-        return {"sent": sent, "total_users_checked": 0, "note": "No active templates"}
-
-    milestones = sorted(
-        [(t.trigger_day, t.template_key) for t in milestone_templates],
-        key=lambda x: x[0],
-    )
-
-    users = db.query(models.User).filter(
-        models.User.email_verified == True,
-        or_(models.User.is_archived == False, models.User.is_archived == None),
-    ).all()
-
-    for user in users:
-        if total_sent >= daily_cap:
-            stopped_early = f"daily_cap ({daily_cap}) reached"
-            break
-
-        if not user.created_at or not user.email:
-            continue
-        days_since_signup = (now - user.created_at).days
-        last_active_days = (now - user.last_study_date).days if user.last_study_date else None
-        name = user.username or "there"
-        animals_count = db.query(func.count(models.UserAnimal.id)).filter(
-            models.UserAnimal.user_id == user.id
-        ).scalar() or 0
-        badges_count = db.query(func.count(models.UserBadge.id)).filter(
-            models.UserBadge.user_id == user.id
-        ).scalar() or 0
-
-        variables = {
-            "name": name,
-            "total_minutes": str(user.total_study_minutes or 0),
-            "animals_count": str(animals_count),
-            "streak": str(user.current_streak or 0),
-            "longest_streak": str(user.longest_streak or 0),
-            "sessions": str(user.total_sessions or 0),
-            "badges": str(badges_count),
-        }
+def run_onboarding_emails(
+    restart: bool = False,
+    db: Session = Depends(get_db),
+    _=Depends(verify_admin),
+):
+    """Trigger onboarding emails for users at key milestones. Run daily via cron.
 
-        sent_keys = {el.template_key for el in db.query(models.EmailLog.template_key).filter(
-            models.EmailLog.user_id == user.id
-        ).all()}
+    Resumes today's run if it was interrupted and is a no-op once it has
+    completed; `restart=true` starts a fresh run.
+    """
+    run_key = f"onboarding:{datetime.utcnow().isoformat(timespec='seconds')}" if restart else None
+    return _run_onboarding_emails(db, run_key)
 
-        try:
-            for trigger_day, tkey in milestones:
-                if days_since_signup >= trigger_day and tkey not in sent_keys:
-                    if _send_template_email(tkey, user.email, variables, db):
-                        label = f"day{trigger_day}"
-                        if label in sent:
-                            sent[label] += 1
-                        total_sent += 1
-                        sent_keys.add(tkey)
-                        time.sleep(send_interval)
-                        break
-                    time.sleep(send_interval)
-
-            if reengagement_templates and last_active_days is not None and days_since_signup > 3:
-                matched = _match_reengagement(reengagement_templates, user, last_active_days, sent_keys)
-                if matched:
-                    if _send_template_email(matched.template_key, user.email, variables, db):
-                        sent["reengagement"] += 1
-                        total_sent += 1
-                    time.sleep(send_interval)
-
-        except _resend_exc.RateLimitError:
-            stopped_early = "Resend RateLimitError — daily quota exhausted"
-            logger.warning(f"admin/onboarding-emails: {stopped_early} after {total_sent} sends")
-            break
-        except Exception as e:
-            logger.error(f"Failed to send onboarding email to {user.email}: {e}")
 
-    result: dict = {"sent": sent, "total_sent": total_sent, "total_users_checked": len(users)}
-    if stopped_early:
-        result["stopped_early"] = stopped_early
-    return result
+@app.get("/admin/onboarding-emails/runs")
+def list_onboarding_email_runs(
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_db),
+    _=Depends(verify_admin),
+):
+    """Progress of recent bulk email runs (sent/failed/total, resume checkpoint)."""
+    runs = db.query(models.EmailDispatchRun).order_by(
+        models.EmailDispatchRun.started_at.desc()
+    ).limit(limit).all()
+    return [email_dispatch.summary(r) for r in runs]
 
 
 # ╔═════════════════════════════════════════════════════════════════╗
@@ -8214,14 +8271,8 @@ def run_onboarding_emails(db: Session = Depends(get_db), _=Depends(verify_admin)
 
 
 
-def _push_variables_for_user(db: Session, user: models.User, extra: dict | None = None) -> dict:
-    """Build the {placeholder} dict shared across all push templates."""
-    animals_count = db.query(func.count(models.UserAnimal.id)).filter(
-        models.UserAnimal.user_id == user.id
-    ).scalar() or 0
-    badges_count = db.query(func.count(models.UserBadge.id)).filter(
-        models.UserBadge.user_id == user.id
-    ).scalar() or 0
+def _push_variables(user: models.User, animals_count: int, badges_count: int, extra: dict | None = None) -> dict:
+    """The {placeholder} dict shared across all push templates."""
     return {
         "name": user.username or "there",
         "total_minutes": str(user.total_study_minutes or 0),
@@ -8234,6 +8285,34 @@ def _push_variables_for_user(db: Session, user: models.User, extra: dict | None
     }
 
 
+def _push_variables_for_user(db: Session, user: models.User, extra: dict | None = None) -> dict:
+    animals_count = db.query(func.count(models.UserAnimal.id)).filter(
+        models.UserAnimal.user_id == user.id
+    ).scalar() or 0
+    badges_count = db.query(func.count(models.UserBadge.id)).filter(
+        models.UserBadge.user_id == user.id
+    ).scalar() or 0
+    return _push_variables(user, animals_count, badges_count, extra)
+
+
+def _push_variables_for_users(db: Session, users: list[models.User]) -> dict[int, dict]:
+    """Bulk `_push_variables_for_user`: two grouped counts for any number of users."""
+    if not users:
+        return {}
+    ids = [u.id for u in users]
+    animals = dict(
+        db.query(models.UserAnimal.user_id, func.count(models.UserAnimal.id))
+        .filter(models.UserAnimal.user_id.in_(ids))
+        .group_by(models.UserAnimal.user_id).all()
+    )
+    badges = dict(
+        db.query(models.UserBadge.user_id, func.count(models.UserBadge.id))
+        .filter(models.UserBadge.user_id.in_(ids))
+        .group_by(models.UserBadge.user_id).all()
+    )
+    return {u.id: _push_variables(u, animals.get(u.id, 0), badges.get(u.id, 0)) for u in users}
+
+
 def _safe_send_push(template_key: str, user: models.User, db: Session, extra_vars: dict | None = None) -> None:
     """Fire-and-forget helper for inline event hooks. Never raises."""
     if not user or not user.push_token:
@@ -8247,6 +8326,9 @@ def _safe_send_push(template_key: str, user: models.User, db: Session, extra_var
         logger.error(f"Inline push send failed (template={template_key}, user={user.id}): {e}")
 
 
+session_pipeline.configure(send_push=_safe_send_push)
+
+
 # ── User-facing endpoints ────────────────────────────────────────
 
 class PushTokenRegister(BaseModel):
@@ -8592,10 +8674,11 @@ def admin_push_metrics(
     ).all()
 
     by_category: dict[str, dict[str, int]] = {}
-    totals = {"sent": 0, "failed": 0, "dropped": 0}
+    # 'delivered' = confirmed by an Expo receipt (or a device-logged local push).
+    totals = {"sent": 0, "delivered": 0, "failed": 0, "dropped": 0}
     for cat, status, count in rows:
         cat_key = cat or "uncategorised"
-        by_category.setdefault(cat_key, {"sent": 0, "failed": 0, "dropped": 0})
+        by_category.setdefault(cat_key, {"sent": 0, "delivered": 0, "failed": 0, "dropped": 0})
         by_category[cat_key][status] = (by_category[cat_key].get(status) or 0) + count
         if status in totals:
             totals[status] += count
@@ -8798,60 +8881,85 @@ def _run_lifecycle_pushes(db: Session) -> dict:
     De-duped via PushLog: a user only ever gets a given template once. Mirrors
     the email lifecycle logic but operates on push prefs (notif_marketing for
     'campaign' templates, notif_reminders for 're-engagement' templates).
+
+    Eligibility is one UNION ALL query — per template, the users past its
+    day threshold anti-joined against the PushLog sent set — so the cost
+    doesn't scale with users × queries. Each user then gets at most one
+    lifecycle push (lowest trigger_day first) and one re-engagement push
+    (lowest inactive_days first) per run, variables are bulk-loaded, and the
+    lot goes out through the batched sender.
     """
     now = datetime.utcnow()
     sent_counts: dict[str, int] = {}
 
-    lifecycle_tmpls = db.query(models.PushTemplate).filter(
+    tmpls = db.query(models.PushTemplate).filter(
         models.PushTemplate.is_active == True,  # noqa: E712
-        models.PushTemplate.trigger_day.isnot(None),
-    ).order_by(models.PushTemplate.trigger_day).all()
-    reengagement_tmpls = db.query(models.PushTemplate).filter(
-        models.PushTemplate.is_active == True,  # noqa: E712
-        models.PushTemplate.inactive_days.isnot(None),
-    ).order_by(models.PushTemplate.inactive_days).all()
+        or_(
+            models.PushTemplate.trigger_day.isnot(None),
+            models.PushTemplate.inactive_days.isnot(None),
+        ),
+    ).all()
+    lifecycle_tmpls = sorted((t for t in tmpls if t.trigger_day is not None), key=lambda t: t.trigger_day)
+    reengagement_tmpls = sorted((t for t in tmpls if t.inactive_days is not None), key=lambda t: t.inactive_days)
     if not lifecycle_tmpls and not reengagement_tmpls:
         return {"sent": sent_counts, "checked": 0, "note": "no_templates"}
 
     archived_filter = or_(models.User.is_archived == False, models.User.is_archived == None)  # noqa: E712
-    users = db.query(models.User).filter(
-        archived_filter, models.User.push_token.isnot(None),
-    ).all()
+    base_filter = (archived_filter, models.User.push_token.isnot(None), models.User.created_at.isnot(None))
+    checked = db.query(func.count(models.User.id)).filter(*base_filter).scalar() or 0
+
+    def _not_sent(template_key: str):
+        return ~exists().where(
+            models.PushLog.user_id == models.User.id,
+            models.PushLog.template_key == template_key,
+            push_service.was_attempted(),
+        )
 
-    for user in users:
-        if not user.created_at:
-            continue
-        days_since_signup = (now - user.created_at).days
-        last_active_days = (now - user.last_study_date).days if user.last_study_date else None
+    selects = []
+    for kind, group in (("lifecycle", lifecycle_tmpls), ("reengagement", reengagement_tmpls)):
+        for tmpl in group:
+            if kind == "lifecycle":
+                window = (models.User.created_at <= now - timedelta(days=tmpl.trigger_day),)
+            else:
+                # Quiet for inactive_days, and not a brand-new signup.
+                window = (
+                    models.User.created_at <= now - timedelta(days=4),
+                    models.User.last_study_date.isnot(None),
+                    models.User.last_study_date <= now - timedelta(days=tmpl.inactive_days),
+                )
+            selects.append(
+                select(
+                    models.User.id,
+                    literal(kind).label("kind"),
+                    literal(tmpl.template_key).label("template_key"),
+                ).where(*base_filter, *window, _not_sent(tmpl.template_key))
+            )
+    candidates: dict[int, dict[str, set[str]]] = {}
+    for user_id, kind, template_key in db.execute(union_all(*selects)).all():
+        candidates.setdefault(user_id, {}).setdefault(kind, set()).add(template_key)
+    if not candidates:
+        return {"sent": sent_counts, "checked": checked}
 
-        sent_keys = {pl.template_key for pl in db.query(models.PushLog.template_key).filter(
-            models.PushLog.user_id == user.id,
-            models.PushLog.template_key.isnot(None),
-            models.PushLog.status.in_(["sent", "delivered"]),
-        ).distinct().all()}
+    users = db.query(models.User).filter(models.User.id.in_(list(candidates))).all()
+    variables = _push_variables_for_users(db, users)
 
-        variables = _push_variables_for_user(db, user)
-
-        # 1) Lifecycle: at most one trigger_day push per run, in order.
-        for tmpl in lifecycle_tmpls:
-            if days_since_signup >= tmpl.trigger_day and tmpl.template_key not in sent_keys:
-                result = push_service.send_template_to_user(db, user, tmpl.template_key, variables)
-                if result.get("ok"):
-                    sent_counts[tmpl.template_key] = sent_counts.get(tmpl.template_key, 0) + 1
-                    sent_keys.add(tmpl.template_key)
-                    break  # one per user per run
-        # 2) Re-engagement: only if user has been quiet long enough.
-        if last_active_days is not None and days_since_signup > 3:
-            for tmpl in reengagement_tmpls:
-                if (last_active_days >= tmpl.inactive_days
-                        and tmpl.template_key not in sent_keys):
-                    result = push_service.send_template_to_user(db, user, tmpl.template_key, variables)
-                    if result.get("ok"):
-                        sent_counts[tmpl.template_key] = sent_counts.get(tmpl.template_key, 0) + 1
-                        sent_keys.add(tmpl.template_key)
-                        break  # one re-engagement per run
-
-    return {"sent": sent_counts, "checked": len(users)}
+    sends = []
+    for user in users:
+        eligible = candidates[user.id]
+        chosen: set[str] = set()
+        for kind, group in (("lifecycle", lifecycle_tmpls), ("reengagement", reengagement_tmpls)):
+            keys = eligible.get(kind, set()) - chosen
+            for tmpl in group:
+                if tmpl.template_key in keys and push_service.can_receive(user, tmpl.category):
+                    sends.append((user, tmpl, variables[user.id]))
+                    chosen.add(tmpl.template_key)
+                    break  # one per kind per user per run
+
+    result = push_service.send_templates(db, sends)
+    for (_, tmpl, _), outcome in zip(sends, result["results"]):
+        if outcome["ok"]:
+            sent_counts[tmpl.template_key] = sent_counts.get(tmpl.template_key, 0) + 1
+    return {"sent": sent_counts, "checked": checked, "failed": result["failed"]}
 
 
 def _cron_lifecycle_pushes():
@@ -8869,6 +8977,12 @@ def _cron_lifecycle_pushes():
         _db.close()
 
 
+@app.post("/admin/push/receipts-poll")
+def admin_poll_push_receipts(db: Session = Depends(get_db), _=Depends(verify_admin)):
+    """Manual trigger for the Expo receipts poll (idempotent)."""
+    return push_service.poll_receipts(db)
+
+
 @app.post("/admin/push/lifecycle-run")
 def admin_run_lifecycle_pushes(db: Session = Depends(get_db), _=Depends(verify_admin)):
     """Manual trigger for lifecycle pushes (idempotent, safe to call repeatedly)."""
@@ -8877,18 +8991,21 @@ def admin_run_lifecycle_pushes(db: Session = Depends(get_db), _=Depends(verify_a
 
 # Public endpoint so the app can fetch shop items dynamically
 @app.get("/shop/items")
-def get_shop_items(db: Session = Depends(get_db)):
-    items = db.query(models.ShopItem).filter(models.ShopItem.is_active == True).order_by(models.ShopItem.category, models.ShopItem.id).all()
-    return [{
-        "id": i.item_key,
-        "name": i.name,
-        "emoji": i.emoji,
-        "imageKey": i.image_key,
-        "description": i.description,
-        "price": i.price,
-        "category": i.category,
-        "rarity": i.rarity,
-    } for i in items]
+def get_shop_items(request: Request, db: Session = Depends(get_db)):
+    def build():
+        items = db.query(models.ShopItem).filter(models.ShopItem.is_active == True).order_by(models.ShopItem.category, models.ShopItem.id).all()
+        return [{
+            "id": i.item_key,
+            "name": i.name,
+            "emoji": i.emoji,
+            "imageKey": i.image_key,
+            "description": i.description,
+            "price": i.price,
+            "category": i.category,
+            "rarity": i.rarity,
+        } for i in items]
+
+    return response_cache.respond(request, "shop", build)
 
 
 # ── Country Data Cleanup ─────────────────────────────────────────
@@ -9205,6 +9322,7 @@ def admin_cleanup_countries(
             still_junk_users.append(f"{user.username or f'#{user.id}'}: '{current}'")
 
     db.commit()
+    response_cache.invalidate("geography")
 
     country_rows = (
         db.query(models.User.country, func.count(models.User.id))
@@ -9257,56 +9375,77 @@ def admin_schools_audit(
     db: Session = Depends(get_db),
     _=Depends(verify_admin),
 ):
-    """Read-only: surface duplicate school names and messy country values."""
-    schools = db.query(models.School).all()
-    total = len(schools)
+    """Read-only: surface duplicate school names and messy country values.
+
+    The bundled school tables are large, so this reads them twice through a
+    server-side cursor instead of loading every School: the first pass only
+    counts per normalized key, the second collects variant rows for the
+    groups that make the response."""
+    S = models.School
+    by_pair: dict[tuple[str, str], int] = {}
+    by_name: dict[str, int] = {}
+    first_country: dict[str, str] = {}
+    multi_country: set[str] = set()
+    total = 0
+    for name, country in streaming.rows(db, select(S.name, S.country).order_by(S.id)):
+        total += 1
+        norm_name = _normalize_school_name(name)
+        key = (norm_name, (country or "").strip().lower())
+        by_pair[key] = by_pair.get(key, 0) + 1
+        by_name[norm_name] = by_name.get(norm_name, 0) + 1
+        if first_country.setdefault(norm_name, (country or "").strip()) != (country or "").strip():
+            multi_country.add(norm_name)
 
     # Group by normalized (name, country) to find duplicates
-    groups: dict[tuple[str, str], list[models.School]] = {}
-    for s in schools:
-        key = (_normalize_school_name(s.name), (s.country or "").strip().lower())
-        groups.setdefault(key, []).append(s)
-
-    duplicate_groups: list[dict] = []
-    for (norm_name, norm_country), rows in groups.items():
-        if len(rows) < 2:
-            continue
-        duplicate_groups.append({
-            "normalized_name": norm_name,
-            "normalized_country": norm_country,
-            "count": len(rows),
-            "variants": [
-                {
-                    "id": r.id,
-                    "name": r.name,
-                    "city": r.city,
-                    "region": r.region,
-                    "country": r.country,
-                }
-                for r in rows
-            ],
-        })
-    duplicate_groups.sort(key=lambda g: g["count"], reverse=True)
+    duplicate_keys = sorted((k for k, n in by_pair.items() if n >= 2), key=lambda k: by_pair[k], reverse=True)
+    top_keys = set(duplicate_keys[:50])
+    total_dupe_rows = sum(by_pair[k] - 1 for k in duplicate_keys)
 
     # Also detect "near-duplicates" across different country values (likely same
     # school with different country spellings, e.g. "UK" vs "United Kingdom")
-    by_name_only: dict[str, list[models.School]] = {}
-    for s in schools:
-        by_name_only.setdefault(_normalize_school_name(s.name), []).append(s)
-    cross_country_dupes: list[dict] = []
-    for norm_name, rows in by_name_only.items():
-        distinct_countries = {(r.country or "").strip() for r in rows}
-        if len(distinct_countries) > 1 and len(rows) >= 2:
-            cross_country_dupes.append({
-                "normalized_name": norm_name,
-                "count": len(rows),
-                "countries": sorted(distinct_countries),
-                "variants": [
-                    {"id": r.id, "name": r.name, "country": r.country, "city": r.city}
-                    for r in rows
-                ],
+    cross_names = sorted(
+        (n for n in by_name if n in multi_country),
+        key=lambda n: by_name[n], reverse=True,
+    )
+    top_cross = set(cross_names[:30])
+    del first_country, multi_country
+
+    variants: dict[tuple[str, str], list[dict]] = {k: [] for k in top_keys}
+    cross_variants: dict[str, list[dict]] = {n: [] for n in top_cross}
+    for r in streaming.rows(db, select(S.id, S.name, S.city, S.region, S.country).order_by(S.id)):
+        norm_name = _normalize_school_name(r.name)
+        key = (norm_name, (r.country or "").strip().lower())
+        if key in variants:
+            variants[key].append({
+                "id": r.id,
+                "name": r.name,
+                "city": r.city,
+                "region": r.region,
+                "country": r.country,
             })
-    cross_country_dupes.sort(key=lambda g: g["count"], reverse=True)
+        if norm_name in cross_variants:
+            cross_variants[norm_name].append(
+                {"id": r.id, "name": r.name, "country": r.country, "city": r.city}
+            )
+
+    duplicate_groups = [
+        {
+            "normalized_name": k[0],
+            "normalized_country": k[1],
+            "count": by_pair[k],
+            "variants": variants[k],
+        }
+        for k in duplicate_keys[:50]
+    ]
+    cross_country_dupes = [
+        {
+            "normalized_name": n,
+            "count": by_name[n],
+            "countries": sorted({(v["country"] or "").strip() for v in cross_variants[n]}),
+            "variants": cross_variants[n],
+        }
+        for n in cross_names[:30]
+    ]
 
     # Country distribution + junk
     country_rows = (
@@ -9321,18 +9460,16 @@ def admin_schools_audit(
         if not c or c not in known_countries:
             junk_countries.append({"country": c, "schools": n})
 
-    total_dupe_rows = sum(g["count"] - 1 for g in duplicate_groups)
-
     return {
         "total_schools": total,
-        "duplicate_groups": len(duplicate_groups),
+        "duplicate_groups": len(duplicate_keys),
         "duplicate_rows_removable": total_dupe_rows,
-        "cross_country_groups": len(cross_country_dupes),
+        "cross_country_groups": len(cross_names),
         "junk_country_values": len(junk_countries),
         "country_distribution": [{"country": r[0], "schools": r[1]} for r in country_rows],
         "junk_countries": junk_countries,
-        "top_duplicates": duplicate_groups[:50],
-        "cross_country_duplicates": cross_country_dupes[:30],
+        "top_duplicates": duplicate_groups,
+        "cross_country_duplicates": cross_country_dupes,
     }
 
 
@@ -9347,7 +9484,9 @@ def admin_schools_similar(
 
     Uses difflib.SequenceMatcher on normalised names.  Returns clusters where
     at least two distinct raw strings are above `threshold` similarity (0-1).
-    Only includes schools with at least `min_users` users.
+    Only includes schools with at least `min_users` users.  Clustering runs
+    through services/school_clusters.py, which only scores candidate pairs
+    that can still reach the threshold.
     """
     from difflib import SequenceMatcher
 
@@ -9365,22 +9504,11 @@ def admin_schools_similar(
 
     def _cluster_entries(entries):
         """Greedy single-linkage clustering within a list of (raw, cnt, norm) tuples."""
-        clusters = []
-        assigned = [False] * len(entries)
-        for i, (raw_i, cnt_i, norm_i) in enumerate(entries):
-            if assigned[i]:
-                continue
-            cluster = [(raw_i, cnt_i, norm_i)]
-            assigned[i] = True
-            for j, (raw_j, cnt_j, norm_j) in enumerate(entries):
-                if assigned[j] or i == j:
-                    continue
-                if norm_i == norm_j or _sim(norm_i, norm_j) >= threshold:
-                    cluster.append((raw_j, cnt_j, norm_j))
-                    assigned[j] = True
-            if len(cluster) > 1:
-                clusters.append(cluster)
-        return clusters
+        norms = [norm for _, _, norm in entries]
+        return [
+            [entries[i] for i in members]
+            for members in school_clusters.cluster(norms, threshold)
+        ]
 
     # Group entries by country, then cluster within each country.
     by_country: dict[str, list[tuple[str, int, str]]] = {}
@@ -9507,6 +9635,7 @@ def admin_schools_cleanup(
                             f"{u.username or f'#{u.id}'}: '{u.school}' → '{canonical.name}'"
                         )
                     u.school = canonical.name
+                    leaderboard_service.sync_user(db, u)
                     user_schools_renamed += 1
 
             merged_groups.append({
@@ -9523,6 +9652,7 @@ def admin_schools_cleanup(
         db.rollback()
     else:
         db.commit()
+        school_search.refresh(db)
 
     # Post-cleanup country distribution
     country_rows = (
@@ -10073,17 +10203,17 @@ def admin_research_survey_responses(
     survey = db.query(models.ResearchSurvey).filter(models.ResearchSurvey.id == survey_id).first()
     if not survey:
         raise HTTPException(status_code=404, detail="Survey not found")
-    rows = (
-        db.query(models.ResearchSurveyResponse)
-        .filter(models.ResearchSurveyResponse.survey_id == survey_id)
-        .order_by(models.ResearchSurveyResponse.submitted_at.desc())
+    R = models.ResearchSurveyResponse
+    page = (
+        select(R.id, R.assignment_id, R.user_id, R.question_id, R.answer_json, R.submitted_at)
+        .where(R.survey_id == survey_id)
+        .order_by(R.submitted_at.desc())
         .limit(limit)
-        .all()
     )
-    return {
-        "survey_id": survey_id,
-        "responses": [
-            {
+
+    def responses():
+        for r in streaming.rows(db, page):
+            yield {
                 "id": r.id,
                 "assignment_id": r.assignment_id,
                 "user_id": r.user_id,
@@ -10091,9 +10221,8 @@ def admin_research_survey_responses(
                 "answer": _json.loads(r.answer_json) if r.answer_json else None,
                 "submitted_at": r.submitted_at.isoformat() if r.submitted_at else None,
             }
-            for r in rows
-        ],
-    }
+
+    return streaming.json_response([("survey_id", survey_id), ("responses", responses())])
 
 
 # ── Test Runner (admin only) ──────────────────────────────────────────────────
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Text, LargeBinary, UniqueConstraint, JSON
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Boolean, ForeignKey, Text, LargeBinary, UniqueConstraint, Index, JSON
+from sqlalchemy import func
 from sqlalchemy.orm import relationship, synonym
 from datetime import datetime
 from uuid import uuid4
@@ -297,6 +298,13 @@ class User(Base):
     friendships = relationship("Friendship", foreign_keys="Friendship.user_id", back_populates="user")
 
 
+# Every authenticated request used to resolve its user with
+# `lower(email) = ?`; this keeps that fallback (pre-`uid` tokens, login) indexed.
+Index("ix_users_email_lower", func.lower(User.email))
+# Default sort of the admin user list; /admin/users pages by keyset on it.
+Index("ix_users_created_at_id", User.created_at, User.id)
+
+
 class Task(Base):
     __tablename__ = "tasks"
     
@@ -323,7 +331,7 @@ class StudySession(Base):
     duration_minutes = Column(Integer, nullable=False)
     coins_earned = Column(Integer, nullable=False)
     subject_id = Column(Integer, ForeignKey("subjects.id"), nullable=True)
-    started_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, default=datetime.utcnow, index=True)
     completed_at = Column(DateTime, nullable=True)
     # Set when the row was finalised by the server-side reaper (Gap 2 fix)
     # rather than by an explicit /sessions/{id}/complete from the client.
@@ -510,6 +518,10 @@ class GroupMember(Base):
 class GroupMessage(Base):
     """Chat message in a study group"""
     __tablename__ = "group_messages"
+    __table_args__ = (
+        # Chat pages and after_id polls seek and sort by id within one group.
+        Index("ix_group_messages_group_id_id", "group_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     group_id = Column(Integer, ForeignKey("study_groups.id"))
@@ -551,6 +563,57 @@ class FeedReaction(Base):
     user = relationship("User")
 
 
+class FeedReactionCounter(Base):
+    """Unseen-reaction counter per user, polled by GET /feed/reactions/new.
+
+    Maintained by `crud.add_reaction` and reset when the poll delivers; see
+    services/reaction_inbox.py. `version` doubles as the poll's ETag.
+    """
+    __tablename__ = "feed_reaction_counters"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    unseen = Column(Integer, nullable=False, default=0, server_default="0")
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
+class FeedTimelineEntry(Base):
+    """One activity event in one recipient's feed (fan-out on write).
+
+    Written by `services.feed_timeline.fan_out` when the event is created,
+    so GET /feed is a range scan on (owner_id, event_id). `author_id` and
+    `created_at` are copied from the event for unfriend cleanup and pruning.
+    """
+    __tablename__ = "feed_timeline_entries"
+    __table_args__ = (
+        UniqueConstraint("owner_id", "event_id", name="uq_feed_timeline_entry"),
+        Index("ix_feed_timeline_entries_owner_author", "owner_id", "author_id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    event_id = Column(Integer, ForeignKey("activity_events.id", ondelete="CASCADE"), nullable=False, index=True)
+    author_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class FeedTimelineBackfill(Base):
+    """Pending copy of `author_id`'s recent events into `owner_id`'s feed.
+
+    Queued when a friendship is accepted and drained on the owner's next
+    feed read, see `services.feed_timeline`.
+    """
+    __tablename__ = "feed_timeline_backfills"
+    __table_args__ = (
+        UniqueConstraint("owner_id", "author_id", name="uq_feed_timeline_backfill"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    author_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
 class ShopItem(Base):
     """Shop items (accessories & decorations) manageable via admin"""
     __tablename__ = "shop_items"
@@ -569,14 +632,21 @@ class ShopItem(Base):
 
 
 class Upload(Base):
-    """Uploaded images stored in DB"""
+    """Uploaded image metadata; the bytes live in the blob store.
+
+    `sha256` is the content address in services/blob_store.py. `data` is
+    only set on legacy rows that predate the blob store and haven't been
+    moved out yet.
+    """
     __tablename__ = "uploads"
 
     id = Column(Integer, primary_key=True, index=True)
     public_id = Column(String, unique=True, index=True, default=lambda: str(uuid4()))
     filename = Column(String, nullable=False)
     content_type = Column(String, nullable=False)
-    data = Column(LargeBinary, nullable=False)
+    data = Column(LargeBinary, nullable=True)
+    sha256 = Column(String(64), nullable=True, index=True)
+    size = Column(Integer, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
@@ -719,6 +789,77 @@ class EmailLog(Base):
     complained = Column(Boolean, default=False)
 
 
+class EmailDispatchRun(Base):
+    """Progress + resume checkpoint for one bulk email run (services/email_dispatch.py).
+
+    `last_user_id` only advances once every email for users up to it has been
+    sent and logged, so a restarted run picks up after it without re-sending.
+    """
+    __tablename__ = "email_dispatch_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    run_key = Column(String(64), unique=True, nullable=False, index=True)  # e.g. onboarding:2026-10-17
+    status = Column(String(20), nullable=False, default="running")  # running | completed | stopped
+    total = Column(Integer, nullable=False, default=0)
+    sent = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    counts = Column(JSON, nullable=False, default=dict)  # sends per label (day3, reengagement, …)
+    last_user_id = Column(Integer, nullable=False, default=0)
+    note = Column(String, nullable=True)
+    started_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class RateLimitCounter(Base):
+    """One slowapi/limits counter window, shared by every web worker
+    (services/rate_limit_store.py). Expired rows are swept in batches."""
+    __tablename__ = "rate_limit_counters"
+
+    key = Column(String(255), primary_key=True)  # LIMITER/<ip>/<route>/<limit>/<window>
+    count = Column(Integer, nullable=False, default=0)
+    expires_at = Column(Float, nullable=False, index=True)  # unix seconds
+
+
+class MetricsSnapshot(Base):
+    """Precomputed dashboard payload, one row per key (services/metrics_snapshot.py).
+
+    `dirty_at` is set when something changes already-closed days (archiving
+    a user); the next refresh then rebuilds every bucket.
+    """
+    __tablename__ = "metrics_snapshot"
+
+    key = Column(String(64), primary_key=True)  # e.g. admin_overview
+    payload = Column(JSON, nullable=False, default=dict)
+    computed_at = Column(DateTime, nullable=False)
+    full_rebuild_at = Column(DateTime, nullable=False)
+    build_ms = Column(Integer, nullable=False, default=0)
+    dirty_at = Column(DateTime, nullable=True)
+
+
+class MetricsCounter(Base):
+    """Live headline counter: rebased by each snapshot refresh, bumped by
+    write paths in between (services/metrics_snapshot.py)."""
+    __tablename__ = "metrics_counters"
+
+    name = Column(String(64), primary_key=True)  # e.g. total_sessions
+    value = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class CohortRetentionCell(Base):
+    """One settled cell of the /admin/cohorts/retention matrix
+    (services/cohort_retention.py). Only written once both the cohort's
+    signup bucket and the period's activity bucket have closed."""
+    __tablename__ = "cohort_retention_cells"
+
+    granularity = Column(String(8), primary_key=True)  # daily | weekly
+    cohort_date = Column(Date, primary_key=True)  # signup bucket start
+    period = Column(Integer, primary_key=True)
+    size = Column(Integer, nullable=False)  # cohort size
+    active = Column(Integer, nullable=False)
+
+
 class PushTemplate(Base):
     """Configurable push notification templates (lifecycle, campaigns, reminders).
 
@@ -1029,3 +1170,132 @@ class FeedbackUpvote(Base):
     feedback_id = Column(Integer, ForeignKey("user_feedback.id"), nullable=False, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class LeaderboardStanding(Base):
+    """Precomputed leaderboard score, one row per (user, period).
+
+    `period_key` is 'all_time' or the ISO date of the UTC Monday that
+    starts the week ('2026-10-12'). `school_key` mirrors
+    `lower(trim(users.school))` so the school board is an index range scan
+    instead of loading every user at the school into Python.
+
+    Maintained incrementally by `crud._finalize_session` (which the stale
+    session reaper also goes through); `services.leaderboard.rebuild_standings`
+    recomputes everything from `users` + `study_sessions`.
+    """
+    __tablename__ = "leaderboard_standings"
+    __table_args__ = (
+        UniqueConstraint("user_id", "period_key", name="uq_leaderboard_standing"),
+        Index("ix_leaderboard_standings_period_minutes", "period_key", "minutes"),
+        Index("ix_leaderboard_standings_period_school_minutes", "period_key", "school_key", "minutes"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    period_key = Column(String(16), nullable=False)
+    school_key = Column(String(255), nullable=True)
+    minutes = Column(Integer, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
+class UserDailyMinutes(Base):
+    """Study minutes rolled up per (user, UTC day, subject).
+
+    `subject_id` is 0 for sessions without a subject so the unique key holds
+    (no FK for that reason). Only completed, non-abandoned sessions count,
+    bucketed by `completed_at`.
+
+    Maintained by `crud._finalize_session` (also used by the reaper) and
+    `crud.abandon_study_session`; `services.daily_minutes.rebuild`
+    recomputes rows from `study_sessions` and `check` reports drift.
+    """
+    __tablename__ = "user_daily_minutes"
+    __table_args__ = (
+        UniqueConstraint("user_id", "day", "subject_id", name="uq_user_daily_minutes"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    day = Column(Date, nullable=False)
+    subject_id = Column(Integer, nullable=False, default=0, server_default="0")
+    minutes = Column(Integer, nullable=False, default=0, server_default="0")
+    sessions = Column(Integer, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
+class UserBadgeProgress(Base):
+    """Per-user counters that `crud.check_badges` evaluates instead of
+    scanning the user's whole session / animal / friendship history.
+
+    One row per user, created lazily from source tables the first time
+    badges are checked (`services.badge_progress.build_progress`) and then
+    kept current by the mutation paths: `_finalize_session`, the hatch
+    flows, `name_animal`, friend accept/remove/block and group
+    join/leave/edit. The JSON maps are keyed by stringified ids.
+    """
+    __tablename__ = "user_badge_progress"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+
+    # Sessions (credited completions only — abandoned rows earn nothing)
+    sessions_completed = Column(Integer, nullable=False, default=0, server_default="0")
+    early_sessions = Column(Integer, nullable=False, default=0, server_default="0")  # completed before 08:00 UTC
+    night_sessions = Column(Integer, nullable=False, default=0, server_default="0")  # completed 22:00 UTC or later
+    last_completed_at = Column(DateTime, nullable=True)
+    last_gap_days = Column(Integer, nullable=False, default=0, server_default="0")  # gap between the last two completions
+    week_start = Column(DateTime, nullable=True)  # UTC Monday the week_* fields refer to
+    week_days = Column(Integer, nullable=False, default=0, server_default="0")  # bitmask of weekday() values
+    week_subject_ids = Column(JSON, nullable=False, default=list)
+    subject_minutes = Column(JSON, nullable=False, default=dict)  # {subject_id: minutes}
+    distinct_subjects = Column(Integer, nullable=False, default=0, server_default="0")
+    max_subject_minutes = Column(Integer, nullable=False, default=0, server_default="0")
+
+    # Animals
+    total_animals = Column(Integer, nullable=False, default=0, server_default="0")
+    species_counts = Column(JSON, nullable=False, default=dict)  # {animal_id: hatches}
+    unique_animals = Column(Integer, nullable=False, default=0, server_default="0")
+    max_species_count = Column(Integer, nullable=False, default=0, server_default="0")
+    hatch_day = Column(DateTime, nullable=True)  # UTC midnight hatches_on_day refers to
+    hatches_on_day = Column(Integer, nullable=False, default=0, server_default="0")
+    has_rare = Column(Boolean, nullable=False, default=False, server_default="0")
+    has_legendary = Column(Boolean, nullable=False, default=False, server_default="0")
+    named_animals = Column(Integer, nullable=False, default=0, server_default="0")
+
+    # Social
+    friend_count = Column(Integer, nullable=False, default=0, server_default="0")
+    group_minutes = Column(JSON, nullable=False, default=dict)  # {group_id: minutes toward that group}
+    max_group_minutes = Column(Integer, nullable=False, default=0, server_default="0")
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
+class SessionFollowup(Base):
+    """Outbox row for the side effects of completing a study session.
+
+    Written in the same transaction as the coin/streak credit
+    (`crud._finalize_session`) and drained by `services.session_pipeline`
+    on worker threads: badge evaluation, activity-feed events and the
+    badge push. `result` records which steps have finished so a retry
+    never repeats a completed one; `result["new_badges"]` is what
+    GET /sessions/{id}/followup returns to the client.
+    """
+    __tablename__ = "session_followups"
+    __table_args__ = (
+        Index("ix_session_followups_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(Integer, ForeignKey("study_sessions.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    session_hour = Column(Integer, nullable=True)
+    session_minutes = Column(Integer, nullable=False, default=0)
+    hatched_animal_name = Column(String, nullable=True)
+    status = Column(String(16), nullable=False, default="pending", server_default="pending")  # pending, running, done, failed
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    next_attempt_at = Column(DateTime, nullable=True)
+    locked_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    result = Column(JSON, nullable=False, default=dict)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    completed_at = Column(DateTime, nullable=True)
@@ -225,6 +225,17 @@ class StudySessionWithHatchResponse(BaseModel):
     session: StudySessionResponse
     hatched_animal: Optional[AnimalResponse] = None
     new_badges: Optional[List[BadgeInfo]] = None
+    # True when badge evaluation hadn't finished within the response budget;
+    # poll GET /sessions/{id}/followup for `new_badges`.
+    badges_pending: bool = False
+
+
+class SessionFollowupResponse(BaseModel):
+    """Background side effects of a completed session (badges, feed, push)."""
+    session_id: int
+    status: str  # pending, running, done, failed
+    badges_ready: bool
+    new_badges: List[BadgeInfo] = []
 
 
 class PendingHatchEntry(BaseModel):
@@ -370,6 +381,13 @@ class LeaderboardEntry(BaseModel):
     profile_pic_url: Optional[str] = None
 
 
+class LeaderboardRankResponse(BaseModel):
+    scope: str
+    period: str
+    rank: Optional[int] = None
+    total_study_minutes: int = 0
+
+
 # ============ Study Group Schemas ============
 
 class GroupCreate(BaseModel):
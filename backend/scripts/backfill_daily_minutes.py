@@ -0,0 +1,64 @@
+"""Backfill or verify the `user_daily_minutes` rollup.
+
+Why: /stats, the daily study cap and group goal progress read per-day
+minutes from `user_daily_minutes` (services/daily_minutes.py) instead of
+scanning `study_sessions`. The alembic migration backfills the table once;
+this script re-runs that backfill and checks the rollup for drift.
+
+Usage (Railway shell):
+    /opt/venv/bin/python -m scripts.backfill_daily_minutes            # check only
+    /opt/venv/bin/python -m scripts.backfill_daily_minutes --rebuild  # rebuild everything
+    /opt/venv/bin/python -m scripts.backfill_daily_minutes --repair   # rebuild drifted users
+    /opt/venv/bin/python -m scripts.backfill_daily_minutes --user 42 --rebuild
+
+Required env:
+    DATABASE_URL               already set on Railway
+
+Idempotent: a rebuild deletes and re-derives the affected users' rows.
+Exits 1 when a check finds drift that was not repaired.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Make `backend/` importable when running as `python -m scripts.backfill_daily_minutes`
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent))
+
+from database import SessionLocal  # noqa: E402
+from services import daily_minutes  # noqa: E402
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--user", type=int, action="append", dest="user_ids",
+                        help="limit to this user id (repeatable)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--rebuild", action="store_true", help="recompute rows from study_sessions")
+    mode.add_argument("--repair", action="store_true", help="rebuild only users whose rows drifted")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.rebuild:
+            print(f"[daily_minutes] Rebuilt: {daily_minutes.rebuild(db, args.user_ids)}")
+            return 0
+
+        report = daily_minutes.check(db, args.user_ids)
+        print(f"[daily_minutes] Check: {json.dumps(report, indent=2)}")
+        if report["ok"]:
+            return 0
+        if args.repair:
+            print(f"[daily_minutes] Repairing {len(report['user_ids'])} users")
+            print(f"[daily_minutes] Rebuilt: {daily_minutes.rebuild(db, report['user_ids'])}")
+            return 0
+        return 1
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
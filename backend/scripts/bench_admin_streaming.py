@@ -0,0 +1,149 @@
+"""Peak Python memory of the large admin reports, streamed vs buffered.
+
+Why: /admin/geography, /public/geography, /admin/sessions, /admin/feedback,
+/admin/research/surveys/{id}/responses and /admin/schools/audit used to
+build their whole result as a Python list before FastAPI serialized it.
+Peak RSS during those calls is what got the container OOM-restarted. They
+now stream through services/streaming.py.
+
+This seeds a throwaway SQLite database, calls each endpoint function
+directly, and records the tracemalloc peak twice:
+
+- streamed: chunks are consumed and dropped, as the ASGI server does.
+- buffered: chunks are joined and parsed back into one object. That is the
+  list-of-dicts plus rendered body the old handlers held at once.
+
+For the audit, the comparison is with the old first step, which loaded every
+School row as an ORM object.
+
+Usage:
+    python -m scripts.bench_admin_streaming [--users 20000] [--sessions 200000]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent))
+_DB = Path(tempfile.mkdtemp(prefix="bench-streaming-")) / "bench.db"
+os.environ["DATABASE_URL"] = f"sqlite:///{_DB}"
+os.environ.setdefault("SECRET_KEY", "bench-secret-key-bench-secret-key-32")
+
+import anyio  # noqa: E402
+
+import main  # noqa: E402
+import models  # noqa: E402
+from database import Base, SessionLocal, engine  # noqa: E402
+
+
+def _seed(db, users: int, sessions: int) -> int:
+    errors: list[str] = []
+    for filename, country in [("uk_schools.json", "United Kingdom"), ("india_schools.json", None),
+                              ("srilanka_schools.json", None)]:
+        main._seed_schools_from_json(db, str(HERE.parent / filename), country, errors)
+    names = [n for (n,) in db.query(models.School.name).limit(5000)]
+    rng = random.Random(0)
+    now = datetime(2026, 10, 1)
+    db.bulk_insert_mappings(models.User, [
+        {"email": f"bench{i}@example.com", "username": f"bench{i}", "hashed_password": "x",
+         "school": rng.choice(names), "city": f"City {i % 300}", "country": rng.choice(["UK", "India", "Sri Lanka"]),
+         "created_at": now - timedelta(minutes=i)}
+        for i in range(users)
+    ])
+    db.bulk_insert_mappings(models.StudySession, [
+        {"user_id": rng.randint(1, users), "duration_minutes": 25, "coins_earned": 10,
+         "started_at": now - timedelta(seconds=i)}
+        for i in range(sessions)
+    ])
+    db.bulk_insert_mappings(models.UserFeedback, [
+        {"feedback_type": "bug", "title": f"Report {i}", "message": "x" * 400, "status": "new",
+         "user_id": rng.randint(1, users), "created_at": now, "updated_at": now}
+        for i in range(1000)
+    ])
+    survey = models.ResearchSurvey(survey_key="bench", title="Bench")
+    db.add(survey)
+    db.flush()
+    db.bulk_insert_mappings(models.ResearchSurveyResponse, [
+        {"survey_id": survey.id, "assignment_id": i, "user_id": rng.randint(1, users), "question_id": 1,
+         "answer_json": json.dumps("an answer"), "submitted_at": now}
+        for i in range(5000)
+    ])
+    db.commit()
+    return survey.id
+
+
+def _peak(fn) -> tuple[int, int]:
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    size = fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak, size
+
+
+def _streamed(make_response):
+    async def consume():
+        n = 0
+        async for chunk in make_response().body_iterator:
+            n += len(chunk)
+        return n
+    return anyio.run(consume)
+
+
+def _buffered(make_response):
+    async def collect():
+        parts = [chunk async for chunk in make_response().body_iterator]
+        body = "".join(parts)
+        json.loads(body)
+        return len(body)
+    return anyio.run(collect)
+
+
+def main_() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--sessions", type=int, default=200000)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    survey_id = _seed(db, args.users, args.sessions)
+    print(f"users={args.users} sessions={args.sessions} schools={db.query(models.School).count()}")
+
+    reports = {
+        "/admin/geography": lambda: main.admin_geography(db=db, _=None),
+        "/public/geography": lambda: main.public_geography(db=db),
+        "/admin/sessions (all)": lambda: main.admin_sessions(limit=args.sessions, offset=0, db=db, _=None),
+        "/admin/feedback": lambda: main.admin_list_feedback(
+            status=None, feedback_type=None, q=None, limit=1000, db=db, _=None),
+        "/admin/research/…/responses": lambda: main.admin_research_survey_responses(
+            survey_id=survey_id, limit=5000, db=db, _=None),
+    }
+    print(f"{'endpoint':<30}{'body MB':>9}{'streamed MB':>13}{'buffered MB':>13}")
+    for name, make in reports.items():
+        _streamed(make)  # warm statement caches so neither run pays for them
+        streamed, size = _peak(lambda: _streamed(make))
+        db.expunge_all()
+        buffered, _ = _peak(lambda: _buffered(make))
+        db.expunge_all()
+        print(f"{name:<30}{size / 2**20:>9.1f}{streamed / 2**20:>13.1f}{buffered / 2**20:>13.1f}")
+
+    main.admin_schools_audit(db=db, _=None)
+    audit, _ = _peak(lambda: len(json.dumps(main.admin_schools_audit(db=db, _=None))))
+    db.expunge_all()
+    legacy, _ = _peak(lambda: len(db.query(models.School).all()))
+    db.expunge_all()
+    print(f"{'/admin/schools/audit':<30}{'':>9}{audit / 2**20:>13.1f}{legacy / 2**20:>13.1f}  (legacy: load every School)")
+    db.close()
+
+
+if __name__ == "__main__":
+    main_()
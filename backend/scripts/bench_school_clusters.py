@@ -0,0 +1,68 @@
+"""Benchmark the /admin/schools/similar clustering engine on the bundled
+school lists.
+
+Why: the endpoint used to compare every pair of names with
+difflib.SequenceMatcher. services/school_clusters.py only scores the pairs
+that can still reach the threshold. This script times it at the full
+uk_schools.json / india_schools.json / srilanka_schools.json sizes. It also
+checks that it returns exactly the clusters of the pairwise loop. Pairwise
+on 25k names takes hours, so that check runs on a random sample (--sample)
+and the full pairwise time is extrapolated from it (it is quadratic).
+
+Usage:
+    python -m scripts.bench_school_clusters [--threshold 0.82] [--sample 1500]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+# Make `backend/` importable when running as `python -m scripts.bench_school_clusters`
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent))
+
+from main import _normalize_school_name  # noqa: E402
+from services.school_clusters import cluster, cluster_pairwise  # noqa: E402
+
+FILES = ["uk_schools.json", "india_schools.json", "srilanka_schools.json"]
+
+
+def _names(filename: str) -> list[str]:
+    rows = json.loads((HERE.parent / filename).read_text())
+    return list(dict.fromkeys(_normalize_school_name(r["name"]) for r in rows))
+
+
+def _timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threshold", type=float, default=0.82)
+    parser.add_argument("--sample", type=int, default=1500)
+    args = parser.parse_args()
+
+    print(f"threshold={args.threshold}  sample={args.sample}")
+    print(f"{'file':<24}{'names':>7}{'clusters':>10}{'engine':>10}{'pairwise (est.)':>18}  sample identical")
+    for filename in FILES:
+        names = _names(filename)
+        clusters, engine_s = _timed(cluster, names, args.threshold)
+
+        sample = random.Random(0).sample(names, min(args.sample, len(names)))
+        fast, _ = _timed(cluster, sample, args.threshold)
+        slow, slow_s = _timed(cluster_pairwise, sample, args.threshold)
+        pairwise_est = slow_s * (len(names) / len(sample)) ** 2
+        print(
+            f"{filename:<24}{len(names):>7}{len(clusters):>10}{engine_s:>9.2f}s{pairwise_est:>17.0f}s"
+            f"  {'yes' if fast == slow else 'NO'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Move legacy `uploads.data` bytes into the blob store.
+
+Why: GET /uploads/{id} now streams files from services/blob_store.py. Rows
+written before that still carry their bytes in Postgres. Serving one copies
+it into the store but keeps the bytes; this script is the only thing that
+clears `uploads.data`, one row at a time after the blob reads back with the
+right hash, so the `uploads` table stops carrying megabytes per row.
+
+Usage (Railway shell):
+    /opt/venv/bin/python -m scripts.migrate_uploads_to_blobs             # move everything
+    /opt/venv/bin/python -m scripts.migrate_uploads_to_blobs --dry-run   # count only
+    /opt/venv/bin/python -m scripts.migrate_uploads_to_blobs --restore   # copy bytes back (before a downgrade)
+
+Required env:
+    DATABASE_URL               already set on Railway
+    BLOB_STORE_DIR             the same persistent volume the web service uses
+
+Idempotent: rows are processed in id order in small batches, each batch
+committed on its own, and rows already moved are skipped.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+# Make `backend/` importable when running as `python -m scripts.migrate_uploads_to_blobs`
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent))
+
+import models  # noqa: E402
+from database import SessionLocal  # noqa: E402
+from services import blob_store  # noqa: E402
+
+
+def _batches(db, condition, batch_size: int):
+    last_id = 0
+    while True:
+        rows = (
+            db.query(models.Upload)
+            .filter(condition, models.Upload.id > last_id)
+            .order_by(models.Upload.id.asc())
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            return
+        # Read before yielding: the caller commits and expunges the batch.
+        last_id = rows[-1].id
+        yield rows
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=50)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--dry-run", action="store_true", help="only count rows still holding bytes")
+    mode.add_argument("--restore", action="store_true", help="copy blob bytes back into uploads.data")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.dry_run:
+            pending = db.query(models.Upload.id).filter(models.Upload.data.isnot(None)).count()
+            print(f"[uploads] {pending} rows still hold bytes in the database")
+            return 0
+
+        store = blob_store.get_store()
+        moved = missing = 0
+        if args.restore:
+            for rows in _batches(db, models.Upload.data.is_(None), args.batch_size):
+                for upload in rows:
+                    data = store.read(upload.sha256) if upload.sha256 else None
+                    if data is None:
+                        missing += 1
+                        continue
+                    upload.data = data
+                    moved += 1
+                db.commit()
+                db.expunge_all()
+            print(f"[uploads] Restored {moved} rows, {missing} missing blobs")
+            return 1 if missing else 0
+
+        for rows in _batches(db, models.Upload.data.isnot(None), args.batch_size):
+            for upload in rows:
+                if blob_store.move_to_store(db, upload, clear=True):
+                    moved += 1
+                else:
+                    missing += 1
+            db.commit()
+            db.expunge_all()
+            print(f"[uploads] Moved {moved} rows so far")
+        print(f"[uploads] Done: moved {moved} rows, {missing} failed verification")
+        return 1 if missing else 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""Write-behind buffer for X-App-Version / X-App-Build telemetry.
+
+`auth._capture_app_version_from_headers` used to `db.commit()` the users row
+from inside the auth dependency whenever the headers differed from what was
+stored. That is rare on a normal day, but right after a release every user's
+first request does it — a burst of single-row hot writes exactly when
+traffic peaks.
+
+Now the auth path only calls `record()`, which drops
+(user_id, app_version, app_build, seen_at) into an in-process dict keyed by
+user id (last write wins, so a chatty client costs one slot, not one per
+request). A scheduler job calls `flush()` every few seconds and applies the
+whole batch as one executemany UPDATE in a single transaction.
+
+Semantics match the old inline write:
+- a NULL/missing header never clears a stored value;
+- `app_version_updated_at` only moves when the version actually changes
+  (the admin "outdated cohort" keys off it), and is stamped with the time
+  the header was first seen, not the flush time.
+
+Losing the buffer on a crash is acceptable — the next request from the same
+client re-records it. Counters are exposed via `stats()` for
+GET /admin/telemetry/app-version.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import bindparam, case, func, or_, update
+from sqlalchemy.orm import Session
+
+import models
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL_SECONDS = int(os.getenv("APP_VERSION_FLUSH_SECONDS", "5"))
+# Hard cap on distinct users waiting for a flush. Past this, new users are
+# dropped (and counted) rather than growing memory without bound — they will
+# be recorded again on their next request.
+MAX_PENDING = int(os.getenv("APP_VERSION_MAX_PENDING", "50000"))
+
+_lock = threading.Lock()
+# user_id → (app_version, app_build, seen_at, enqueued_monotonic)
+_pending: dict[int, tuple[Optional[str], Optional[str], datetime, float]] = {}
+_stats: dict = {
+    "recorded": 0,
+    "dropped": 0,
+    "flushes": 0,
+    "failed_flushes": 0,
+    "rows_flushed": 0,
+    "last_flush_at": None,
+    "last_flush_rows": 0,
+    "last_flush_ms": 0,
+    "last_flush_lag_seconds": 0.0,
+    "max_flush_lag_seconds": 0.0,
+}
+
+
+def record(user_id: int, app_version: Optional[str], app_build: Optional[str]) -> None:
+    """Queue a version/build observation. Never touches the database."""
+    if not app_version and not app_build:
+        return
+    now = datetime.utcnow()
+    with _lock:
+        prev = _pending.get(user_id)
+        if prev is None:
+            if len(_pending) >= MAX_PENDING:
+                _stats["dropped"] += 1
+                return
+            _pending[user_id] = (app_version, app_build, now, time.monotonic())
+        else:
+            prev_version, prev_build, seen_at, enqueued = prev
+            if app_version and app_version != prev_version:
+                seen_at = now
+            _pending[user_id] = (
+                app_version or prev_version, app_build or prev_build, seen_at, enqueued,
+            )
+        _stats["recorded"] += 1
+
+
+def pending(user_id: int) -> Optional[tuple[Optional[str], Optional[str]]]:
+    """(app_version, app_build) queued for a user, if any."""
+    with _lock:
+        entry = _pending.get(user_id)
+    return (entry[0], entry[1]) if entry else None
+
+
+def _drain() -> dict[int, tuple[Optional[str], Optional[str], datetime, float]]:
+    global _pending
+    with _lock:
+        batch, _pending = _pending, {}
+    return batch
+
+
+def _requeue(batch: dict) -> None:
+    with _lock:
+        for uid, entry in batch.items():
+            if uid not in _pending and len(_pending) < MAX_PENDING:
+                _pending[uid] = entry
+
+
+def _update_statement():
+    users = models.User.__table__
+    new_version = bindparam("new_version")
+    return (
+        update(users)
+        .where(users.c.id == bindparam("uid"))
+        .values(
+            app_version=func.coalesce(new_version, users.c.app_version),
+            app_build=func.coalesce(bindparam("new_build"), users.c.app_build),
+            app_version_updated_at=case(
+                (
+                    new_version.isnot(None)
+                    & or_(users.c.app_version.is_(None), users.c.app_version != new_version),
+                    bindparam("seen_at"),
+                ),
+                else_=users.c.app_version_updated_at,
+            ),
+        )
+    )
+
+
+def flush(db: Session) -> int:
+    """Apply every queued observation in one transaction. Returns the number
+    of users written. On failure the batch is put back for the next run."""
+    batch = _drain()
+    if not batch:
+        return 0
+    started = time.monotonic()
+    oldest = min(entry[3] for entry in batch.values())
+    params = [
+        {"uid": uid, "new_version": version, "new_build": build, "seen_at": seen_at}
+        for uid, (version, build, seen_at, _enqueued) in batch.items()
+    ]
+    try:
+        db.execute(_update_statement(), params)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        _requeue(batch)
+        with _lock:
+            _stats["failed_flushes"] += 1
+        logger.warning(f"App version flush failed ({len(batch)} rows requeued): {e}")
+        return 0
+
+    finished = time.monotonic()
+    lag = round(finished - oldest, 3)
+    with _lock:
+        _stats["flushes"] += 1
+        _stats["rows_flushed"] += len(batch)
+        _stats["last_flush_at"] = datetime.utcnow().isoformat()
+        _stats["last_flush_rows"] = len(batch)
+        _stats["last_flush_ms"] = int((finished - started) * 1000)
+        _stats["last_flush_lag_seconds"] = lag
+        _stats["max_flush_lag_seconds"] = max(_stats["max_flush_lag_seconds"], lag)
+    return len(batch)
+
+
+def stats() -> dict:
+    """Counters plus the age of the oldest unflushed observation."""
+    now = time.monotonic()
+    with _lock:
+        out = dict(_stats)
+        out["pending"] = len(_pending)
+        out["oldest_pending_seconds"] = (
+            round(now - min(e[3] for e in _pending.values()), 3) if _pending else 0.0
+        )
+    out["flush_interval_seconds"] = FLUSH_INTERVAL_SECONDS
+    out["max_pending"] = MAX_PENDING
+    return out
+
+
+def reset() -> None:
+    """Drop the buffer and zero the counters (tests)."""
+    with _lock:
+        _pending.clear()
+        for key in _stats:
+            _stats[key] = None if key == "last_flush_at" else 0
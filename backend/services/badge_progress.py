@@ -0,0 +1,371 @@
+"""Precomputed per-user badge progress (`user_badge_progress`).
+
+`crud.check_badges` runs after every session completion. It used to load
+every `StudySession` a user ever had just to count early-morning and
+late-night ones, then run separate aggregates over animals, duplicates,
+rarities, subjects, friendships and groups — so completion latency grew
+with how long someone had been studying.
+
+Now every history-dependent badge input lives on one row per user:
+
+    sessions        early/night counts, last completion + gap, this week's
+                    weekdays and subjects, per-subject minutes
+    animals         totals, per-species counts, today's hatches, rarity flags,
+                    nicknamed count
+    social          accepted friend count, minutes contributed per group
+
+Lifecycle
+---------
+- `get_progress` builds the row from source tables the first time a user's
+  badges are checked (one-off cost, same queries the old code ran every
+  time), so no backfill is needed at deploy.
+- Every mutation path calls one of the `record_*` / `*_friend*` /
+  `*group*` hooks below. Hooks only touch users who already have a row —
+  users without one are rebuilt from source on their next check, which
+  already includes the mutation.
+- `build_progress` is also the repair tool: delete a row (or call it
+  directly) to recompute from scratch.
+
+None of these functions commit; the caller owns the transaction.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import case, extract, func
+from sqlalchemy.orm import Session
+
+import models
+from services.leaderboard import week_start
+
+logger = logging.getLogger(__name__)
+
+EARLY_HOUR = 8   # completed before 08:00 UTC → dawn_patrol
+NIGHT_HOUR = 22  # completed at/after 22:00 UTC → moonlight_scholar
+RARE_TIERS = ("rare", "epic")
+
+
+def _day(dt: datetime) -> datetime:
+    return datetime(dt.year, dt.month, dt.day)
+
+
+def _existing(db: Session, user_id: int) -> Optional[models.UserBadgeProgress]:
+    return db.get(models.UserBadgeProgress, user_id)
+
+
+# ─── Read path ───────────────────────────────────────────────────────────
+
+def get_progress(db: Session, user_id: int) -> models.UserBadgeProgress:
+    """Return the user's progress row, building it from source if missing."""
+    row = _existing(db, user_id)
+    if row is None:
+        row = build_progress(db, user_id)
+    return row
+
+
+def week_days(row: models.UserBadgeProgress, now: Optional[datetime] = None) -> set[int]:
+    """weekday() values studied in the current UTC week."""
+    if row.week_start != week_start(now):
+        return set()
+    return {d for d in range(7) if row.week_days & (1 << d)}
+
+
+def week_subject_count(row: models.UserBadgeProgress, now: Optional[datetime] = None) -> int:
+    if row.week_start != week_start(now):
+        return 0
+    return len(row.week_subject_ids or [])
+
+
+def hatches_today(row: models.UserBadgeProgress, now: Optional[datetime] = None) -> int:
+    today = _day(now or datetime.utcnow())
+    return row.hatches_on_day if row.hatch_day == today else 0
+
+
+# ─── Rebuild from source ─────────────────────────────────────────────────
+
+def _group_minutes_from_source(db: Session, user_id: int, group: models.StudyGroup) -> int:
+    q = db.query(func.coalesce(func.sum(models.StudySession.duration_minutes), 0)).filter(
+        models.StudySession.user_id == user_id,
+        models.StudySession.completed_at >= group.created_at,
+        models.StudySession.abandoned_at.is_(None),
+    )
+    if group.subject_id:
+        q = q.filter(models.StudySession.subject_id == group.subject_id)
+    return int(q.scalar() or 0)
+
+
+def build_progress(db: Session, user_id: int) -> models.UserBadgeProgress:
+    """(Re)compute a user's row from study_sessions, user_animals,
+    friendships and group_members. Does not commit."""
+    row = _existing(db, user_id)
+    if row is None:
+        row = models.UserBadgeProgress(user_id=user_id)
+        db.add(row)
+        # Session.get() doesn't see pending objects; flush so later hooks in
+        # the same transaction find this row instead of building a second.
+        db.flush()
+
+    credited = (
+        models.StudySession.user_id == user_id,
+        models.StudySession.completed_at.isnot(None),
+        models.StudySession.abandoned_at.is_(None),
+    )
+    hour = extract("hour", models.StudySession.completed_at)
+    total, early, night = db.query(
+        func.count(models.StudySession.id),
+        func.coalesce(func.sum(case((hour < EARLY_HOUR, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((hour >= NIGHT_HOUR, 1), else_=0)), 0),
+    ).filter(*credited).one()
+    row.sessions_completed = int(total or 0)
+    row.early_sessions = int(early or 0)
+    row.night_sessions = int(night or 0)
+
+    last_two = [
+        ts for (ts,) in db.query(models.StudySession.completed_at)
+        .filter(*credited)
+        .order_by(models.StudySession.completed_at.desc())
+        .limit(2)
+        .all()
+    ]
+    row.last_completed_at = last_two[0] if last_two else None
+    row.last_gap_days = (last_two[0] - last_two[1]).days if len(last_two) == 2 else 0
+
+    start = week_start()
+    this_week = db.query(models.StudySession.completed_at, models.StudySession.subject_id).filter(
+        *credited, models.StudySession.completed_at >= start,
+    ).all()
+    row.week_start = start
+    row.week_days = 0
+    for ts, _sid in this_week:
+        row.week_days |= 1 << ts.weekday()
+    row.week_subject_ids = sorted({sid for _ts, sid in this_week if sid is not None})
+
+    per_subject = db.query(
+        models.StudySession.subject_id,
+        func.coalesce(func.sum(models.StudySession.duration_minutes), 0),
+    ).filter(*credited, models.StudySession.subject_id.isnot(None)).group_by(
+        models.StudySession.subject_id,
+    ).all()
+    _set_subject_minutes(row, {str(sid): int(mins or 0) for sid, mins in per_subject})
+
+    per_species = db.query(models.UserAnimal.animal_id, func.count(models.UserAnimal.id)).filter(
+        models.UserAnimal.user_id == user_id,
+    ).group_by(models.UserAnimal.animal_id).all()
+    _set_species_counts(row, {str(aid): int(n) for aid, n in per_species})
+
+    today = _day(datetime.utcnow())
+    row.hatch_day = today
+    row.hatches_on_day = db.query(func.count(models.UserAnimal.id)).filter(
+        models.UserAnimal.user_id == user_id,
+        models.UserAnimal.hatched_at >= today,
+    ).scalar() or 0
+    rarities = {
+        r for (r,) in db.query(models.Animal.rarity)
+        .join(models.UserAnimal, models.UserAnimal.animal_id == models.Animal.id)
+        .filter(models.UserAnimal.user_id == user_id)
+        .distinct()
+        .all()
+        if r
+    }
+    row.has_rare = any(t in rarities for t in RARE_TIERS)
+    row.has_legendary = "legendary" in rarities
+    row.named_animals = db.query(func.count(models.UserAnimal.id)).filter(
+        models.UserAnimal.user_id == user_id,
+        models.UserAnimal.nickname.isnot(None),
+    ).scalar() or 0
+
+    row.friend_count = _count_friends(db, user_id)
+
+    groups = (
+        db.query(models.StudyGroup)
+        .join(models.GroupMember, models.GroupMember.group_id == models.StudyGroup.id)
+        .filter(models.GroupMember.user_id == user_id)
+        .all()
+    )
+    _set_group_minutes(row, {str(g.id): _group_minutes_from_source(db, user_id, g) for g in groups})
+    return row
+
+
+# ─── Sessions ────────────────────────────────────────────────────────────
+
+def record_session(db: Session, user_id: int, session: models.StudySession) -> None:
+    """Credit a finalised session. Call from `_finalize_session` before commit."""
+    row = _existing(db, user_id)
+    if row is None:
+        return
+    completed = session.completed_at or datetime.utcnow()
+    minutes = int(session.duration_minutes or 0)
+
+    row.sessions_completed = (row.sessions_completed or 0) + 1
+    if completed.hour < EARLY_HOUR:
+        row.early_sessions = (row.early_sessions or 0) + 1
+    if completed.hour >= NIGHT_HOUR:
+        row.night_sessions = (row.night_sessions or 0) + 1
+    if row.last_completed_at is not None:
+        row.last_gap_days = (completed - row.last_completed_at).days
+    row.last_completed_at = completed
+
+    start = week_start(completed)
+    if row.week_start != start:
+        row.week_start = start
+        row.week_days = 0
+        row.week_subject_ids = []
+    row.week_days = (row.week_days or 0) | (1 << completed.weekday())
+
+    if session.subject_id is not None:
+        if session.subject_id not in (row.week_subject_ids or []):
+            row.week_subject_ids = sorted([*(row.week_subject_ids or []), session.subject_id])
+        subjects = dict(row.subject_minutes or {})
+        key = str(session.subject_id)
+        subjects[key] = subjects.get(key, 0) + minutes
+        _set_subject_minutes(row, subjects)
+
+    memberships = (
+        db.query(models.StudyGroup.id, models.StudyGroup.subject_id, models.StudyGroup.created_at)
+        .join(models.GroupMember, models.GroupMember.group_id == models.StudyGroup.id)
+        .filter(models.GroupMember.user_id == user_id)
+        .all()
+    )
+    if memberships:
+        per_group = dict(row.group_minutes or {})
+        for gid, subject_id, created_at in memberships:
+            if subject_id and subject_id != session.subject_id:
+                continue
+            if created_at and completed < created_at:
+                continue
+            per_group[str(gid)] = per_group.get(str(gid), 0) + minutes
+        _set_group_minutes(row, per_group)
+
+
+def reverse_session(db: Session, user_id: int) -> None:
+    """A credited session was abandoned after the fact. Streak gaps and
+    weekday bits can't be un-applied piecemeal, so rebuild the row (only if
+    the user has one) the way `build_progress` would. Rare: only sessions
+    the reaper credited before the abandon landed get here."""
+    if _existing(db, user_id) is not None:
+        build_progress(db, user_id)
+
+
+def _set_subject_minutes(row: models.UserBadgeProgress, subjects: dict) -> None:
+    row.subject_minutes = subjects
+    row.distinct_subjects = len(subjects)
+    row.max_subject_minutes = max(subjects.values(), default=0)
+
+
+# ─── Animals ─────────────────────────────────────────────────────────────
+
+def record_hatch(
+    db: Session,
+    user_id: int,
+    animal: models.Animal,
+    hatched_at: Optional[datetime] = None,
+) -> None:
+    """Count a new `UserAnimal` row. Call wherever one is added."""
+    row = _existing(db, user_id)
+    if row is None:
+        return
+    species = dict(row.species_counts or {})
+    key = str(animal.id)
+    species[key] = species.get(key, 0) + 1
+    _set_species_counts(row, species)
+
+    day = _day(hatched_at or datetime.utcnow())
+    if row.hatch_day != day:
+        row.hatch_day = day
+        row.hatches_on_day = 0
+    row.hatches_on_day = (row.hatches_on_day or 0) + 1
+
+    if animal.rarity in RARE_TIERS:
+        row.has_rare = True
+    if animal.rarity == "legendary":
+        row.has_legendary = True
+
+
+def record_nickname(db: Session, user_id: int, was_named: bool, is_named: bool) -> None:
+    if was_named == is_named:
+        return
+    row = _existing(db, user_id)
+    if row is None:
+        return
+    row.named_animals = max(0, (row.named_animals or 0) + (1 if is_named else -1))
+
+
+def _set_species_counts(row: models.UserBadgeProgress, species: dict) -> None:
+    row.species_counts = species
+    row.total_animals = sum(species.values())
+    row.unique_animals = len(species)
+    row.max_species_count = max(species.values(), default=0)
+
+
+# ─── Friends ─────────────────────────────────────────────────────────────
+
+def _count_friends(db: Session, user_id: int) -> int:
+    return db.query(func.count(models.Friendship.id)).filter(
+        models.Friendship.status == "accepted",
+        (models.Friendship.user_id == user_id) | (models.Friendship.friend_id == user_id),
+    ).scalar() or 0
+
+
+def adjust_friends(db: Session, user_ids: Iterable[int], delta: int) -> None:
+    """+1 on accept, -1 on unfriend, for both sides of the friendship."""
+    for uid in set(user_ids):
+        row = _existing(db, uid)
+        if row is not None:
+            row.friend_count = max(0, (row.friend_count or 0) + delta)
+
+
+def refresh_friend_count(db: Session, user_ids: Iterable[int]) -> None:
+    """Recount after bulk friendship deletes (block, account deletion)."""
+    for uid in set(user_ids):
+        row = _existing(db, uid)
+        if row is not None:
+            row.friend_count = _count_friends(db, uid)
+
+
+# ─── Groups ──────────────────────────────────────────────────────────────
+
+def _set_group_minutes(row: models.UserBadgeProgress, per_group: dict) -> None:
+    row.group_minutes = per_group
+    row.max_group_minutes = max(per_group.values(), default=0)
+
+
+def record_group_joined(db: Session, user_id: int, group: models.StudyGroup) -> None:
+    """Seed the contribution a new member already has (sessions since the
+    group was created count toward its goal)."""
+    row = _existing(db, user_id)
+    if row is None:
+        return
+    per_group = dict(row.group_minutes or {})
+    per_group[str(group.id)] = _group_minutes_from_source(db, user_id, group)
+    _set_group_minutes(row, per_group)
+
+
+def record_group_left(db: Session, user_ids: Iterable[int], group_id: int) -> None:
+    """Member left / was removed, or the group was deleted."""
+    key = str(group_id)
+    for uid in set(user_ids):
+        row = _existing(db, uid)
+        if row is not None and key in (row.group_minutes or {}):
+            per_group = dict(row.group_minutes)
+            per_group.pop(key)
+            _set_group_minutes(row, per_group)
+
+
+def refresh_group(db: Session, group: models.StudyGroup) -> None:
+    """Recompute every member's contribution after the group's subject
+    changes. Groups cap at 10 members, so this is at most 10 aggregates."""
+    member_ids = [
+        uid for (uid,) in db.query(models.GroupMember.user_id)
+        .filter(models.GroupMember.group_id == group.id)
+        .all()
+    ]
+    for uid in member_ids:
+        record_group_joined(db, uid, group)
+
+
+def delete_user(db: Session, user_id: int) -> None:
+    db.query(models.UserBadgeProgress).filter(
+        models.UserBadgeProgress.user_id == user_id,
+    ).delete(synchronize_session=False)
@@ -0,0 +1,278 @@
+"""Content-addressed blob storage for uploaded images.
+
+Uploads (profile pictures, admin images, feedback attachments) used to live
+in `uploads.data`. Every GET /uploads/{id} pulled the whole BLOB through
+SQLAlchemy while holding a pooled DB connection, just to copy up to 5 MB of
+bytes into a Response.
+
+Now the bytes live in a blob store keyed by their SHA-256, and the
+`uploads` row only carries metadata (`sha256`, `size`, `content_type`).
+Identical uploads are stored once. Serving is a FileResponse straight from
+disk (Range requests and sendfile/pathsend come for free), with the hash as
+a strong ETag.
+
+Backends
+--------
+BLOB_STORE_BACKEND selects the backend; only `local` exists today:
+
+    local   files under BLOB_STORE_DIR, sharded as ab/cd/abcdef….
+            Defaults to <RAILWAY_VOLUME_MOUNT_PATH>/blob_store when a volume
+            is attached, else ./blob_store. On Railway the directory must
+            be on the mounted volume (the container filesystem is wiped on
+            every deploy). Otherwise the app still boots, but
+            `check_config()` logs it at startup and every upload or serve
+            raises `BlobStoreMisconfigured` (a 503) instead of writing to
+            disk that disappears.
+
+An S3-compatible backend only needs to implement `BlobStore`; `path()`
+returning None makes callers fall back to `read()`.
+
+Legacy rows that still have `data` are copied into the store the first time
+they are served, but keep their bytes: only
+`scripts/migrate_uploads_to_blobs.py` clears `data`, and only after reading
+the blob back and checking its hash. Until then a blob that went missing is
+rewritten from the row.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+import models
+
+logger = logging.getLogger(__name__)
+
+# Upload metadata is immutable once written, so lookups by public id are
+# cached in-process: a warm avatar fetch needs no DB connection at all.
+META_CACHE_MAX_ENTRIES = int(os.getenv("UPLOAD_META_CACHE_MAX_ENTRIES", "10000"))
+
+
+def sha256_hex(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class BlobStore:
+    """Minimal interface every backend implements."""
+
+    def put(self, data: bytes) -> str:
+        """Store `data` (if not already present) and return its SHA-256 key."""
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def read(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def path(self, key: str) -> Optional[Path]:
+        """Local filesystem path for zero-copy serving, if the backend has one."""
+        return None
+
+
+class LocalBlobStore(BlobStore):
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / key[2:4] / key
+
+    def put(self, data: bytes) -> str:
+        key = sha256_hex(data)
+        dest = self._path(key)
+        if dest.exists():
+            return key
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file in the same directory and rename, so a reader
+        # never sees a half-written blob and concurrent writers of the same
+        # content simply race to an identical file.
+        fd, tmp = tempfile.mkstemp(dir=dest.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp, dest)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        return key
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).is_file()
+
+    def read(self, key: str) -> Optional[bytes]:
+        try:
+            return self._path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def path(self, key: str) -> Optional[Path]:
+        p = self._path(key)
+        return p if p.is_file() else None
+
+
+_store: Optional[BlobStore] = None
+_store_lock = threading.Lock()
+
+
+class BlobStoreMisconfigured(RuntimeError):
+    """The store would land on ephemeral disk; uploads are refused."""
+
+
+def store_dir() -> str:
+    """Directory of the local backend. Raises on Railway unless it is on
+    the mounted volume, rather than losing every upload on the next deploy."""
+    volume = os.getenv("RAILWAY_VOLUME_MOUNT_PATH")
+    configured = os.getenv("BLOB_STORE_DIR") or (os.path.join(volume, "blob_store") if volume else None)
+    if os.getenv("RAILWAY_ENVIRONMENT"):
+        if not configured or not volume or not Path(configured).resolve().is_relative_to(Path(volume).resolve()):
+            raise BlobStoreMisconfigured(
+                "BLOB_STORE_DIR must be on a mounted Railway volume (RAILWAY_VOLUME_MOUNT_PATH); "
+                "the container filesystem is wiped on every deploy"
+            )
+    return configured or "./blob_store"
+
+
+def check_config() -> bool:
+    """Startup check: log loudly, but don't crash the process, when uploads
+    are going to be refused. The rest of the API keeps working."""
+    try:
+        logger.info(f"Blob store: {store_dir()}")
+        return True
+    except BlobStoreMisconfigured as e:
+        logger.critical(f"Uploads DISABLED: {e}")
+        return False
+
+
+def get_store() -> BlobStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                backend = os.getenv("BLOB_STORE_BACKEND", "local").lower()
+                if backend != "local":
+                    raise RuntimeError(f"Unknown BLOB_STORE_BACKEND: {backend}")
+                _store = LocalBlobStore(store_dir())
+    return _store
+
+
+# ─── Upload rows ─────────────────────────────────────────────────────────
+
+def create_upload(db: Session, data: bytes, filename: str, content_type: str) -> models.Upload:
+    """Store the bytes and insert an `uploads` row pointing at them. Commits."""
+    key = get_store().put(data)
+    upload = models.Upload(
+        filename=filename, content_type=content_type,
+        sha256=key, size=len(data), data=None,
+    )
+    db.add(upload)
+    db.commit()
+    db.refresh(upload)
+    return upload
+
+
+def move_to_store(db: Session, upload: models.Upload, clear: bool = False) -> bool:
+    """Copy a legacy row's `data` into the blob store.
+
+    With `clear`, `data` is then dropped, but only if the stored blob reads
+    back with the right hash. Returns False if the row had nothing to copy,
+    or `clear` was asked for and the blob didn't verify. Does not commit.
+    """
+    if upload.data is None:
+        return False
+    store = get_store()
+    upload.sha256 = store.put(upload.data)
+    upload.size = len(upload.data)
+    if clear:
+        stored = store.read(upload.sha256)
+        if stored is None or sha256_hex(stored) != upload.sha256:
+            logger.error(f"Blob for upload id={upload.id} did not verify; keeping its bytes in the DB")
+            return False
+        upload.data = None
+    return True
+
+
+def restore_blob(db: Session, meta: "UploadMeta") -> Optional[bytes]:
+    """Rewrite a missing blob from the row's `data`, if it still has it."""
+    data = db.query(models.Upload.data).filter(models.Upload.id == meta.id).scalar()
+    if data is None or sha256_hex(data) != meta.sha256:
+        return None
+    get_store().put(data)
+    logger.warning(f"Rewrote missing blob {meta.sha256} from upload id={meta.id}")
+    return data
+
+
+class UploadMeta:
+    __slots__ = ("id", "public_id", "content_type", "sha256", "size")
+
+    def __init__(self, id: int, public_id: str, content_type: str, sha256: str, size: Optional[int]):
+        self.id = id
+        self.public_id = public_id
+        self.content_type = content_type
+        self.sha256 = sha256
+        self.size = size
+
+
+_meta_cache: "OrderedDict[str, UploadMeta]" = OrderedDict()
+_meta_lock = threading.Lock()
+
+
+def _cache_put(identifier: str, meta: UploadMeta) -> None:
+    with _meta_lock:
+        _meta_cache[identifier] = meta
+        _meta_cache.move_to_end(identifier)
+        while len(_meta_cache) > META_CACHE_MAX_ENTRIES:
+            _meta_cache.popitem(last=False)
+
+
+def clear_cache() -> None:
+    with _meta_lock:
+        _meta_cache.clear()
+
+
+def lookup(db: Session, identifier: str) -> Optional[UploadMeta]:
+    """Resolve a public id (or legacy numeric id) to blob metadata.
+
+    Legacy rows without a blob yet are copied to the blob store on the way;
+    their `data` stays until the migration script has verified the copy.
+    """
+    with _meta_lock:
+        meta = _meta_cache.get(identifier)
+        if meta is not None:
+            _meta_cache.move_to_end(identifier)
+            return meta
+
+    cols = (
+        models.Upload.id, models.Upload.public_id, models.Upload.content_type,
+        models.Upload.sha256, models.Upload.size,
+    )
+    row = db.query(*cols).filter(models.Upload.public_id == identifier).first()
+    if row is None:
+        try:
+            row = db.query(*cols).filter(models.Upload.id == int(identifier)).first()
+        except (ValueError, TypeError):
+            pass
+    if row is None:
+        return None
+
+    upload_id, public_id, content_type, key, size = row
+    if key is None:
+        upload = db.get(models.Upload, upload_id)
+        if not move_to_store(db, upload):
+            return None
+        db.commit()
+        key, size = upload.sha256, upload.size
+        logger.info(f"Copied upload id={upload_id} to blob store on read")
+
+    meta = UploadMeta(upload_id, public_id, content_type, key, size)
+    _cache_put(identifier, meta)
+    return meta
@@ -0,0 +1,181 @@
+"""Cohort × period retention matrix for GET /admin/cohorts/retention.
+
+The endpoint used to pull every user in range and every session they
+started, pass the user ids back as a literal `IN (…)` list, and bucket both
+sides in Python. Each request therefore paid for the whole session history
+of the window. A weekly chart with a launch-date floor re-read months of
+sessions just to redraw cohorts whose numbers were settled long ago.
+
+`matrix()` now works like this:
+
+- Cells are computed in SQL. One grouped query joins users to their
+  sessions and counts distinct users per (signup bucket, activity bucket),
+  with the buckets computed in the database (`_bucket`). Days are
+  `date(ts)` / `CAST(ts AS DATE)`. Weeks start on Monday, via
+  `date(ts, 'weekday 0', '-6 days')` on SQLite and `date_trunc('week', ts)`
+  on Postgres. A second grouped query gives cohort sizes.
+- Closed cells are stored in `cohort_retention_cells`, one row per
+  (granularity, cohort, period). A cell is closed once its activity bucket
+  ended more than a day ago. A cohort's size is stored on its period-0 row,
+  which closes when signups for that bucket are over. Those numbers can no
+  longer change, so they're written once and then served from the table.
+  The queries only read activity from the earliest cell that isn't cached
+  yet. In steady state that's the current week, whatever the date range.
+- Archiving, reactivating or deleting a user changes past cohorts, so
+  those write paths call `invalidate()`, which drops the cache.
+
+Semantics match the original loop: archived users (is_archived true or
+NULL) are excluded, and only periods that have started are reported.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import Date, cast, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+import models
+
+PERIOD_DAYS = {"daily": 1, "weekly": 7}
+# Sessions land in the bucket of their started_at; give late syncs a day.
+CLOSE_AFTER_DAYS = 1
+
+_cells = models.CohortRetentionCell.__table__
+
+
+def bucket_start(d: date, granularity: str) -> date:
+    return d - timedelta(days=d.weekday()) if granularity == "weekly" else d
+
+
+def _bucket(db: Session, col, granularity: str):
+    if db.get_bind().dialect.name == "postgresql":
+        if granularity == "weekly":
+            return cast(func.date_trunc("week", col), Date)
+        return cast(col, Date)
+    if granularity == "weekly":
+        return func.date(col, "weekday 0", "-6 days")
+    return func.date(col)
+
+
+def _as_date(value) -> date:
+    # date on Postgres, 'YYYY-MM-DD' on SQLite.
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+def _closed(bucket: date, period_days: int, today: date) -> bool:
+    return bucket + timedelta(days=period_days + CLOSE_AFTER_DAYS) <= today
+
+
+def matrix(
+    db: Session,
+    granularity: str,
+    earliest: date,
+    period_count: int,
+    today: date,
+) -> dict[date, tuple[int, list[int]]]:
+    """{cohort bucket: (size, [active users in period 0, 1, …])} for every
+    cohort bucket from `earliest` through today's. Periods stop at the
+    first one that hasn't started yet."""
+    period_days = PERIOD_DAYS[granularity]
+    cohort_keys = []
+    b = bucket_start(earliest, granularity)
+    while b <= today:
+        cohort_keys.append(b)
+        b += timedelta(days=period_days)
+    if not cohort_keys:
+        return {}
+
+    cached: dict[date, dict[int, int]] = defaultdict(dict)
+    sizes: dict[date, int] = {}
+    for cohort_date, period, size, active in db.query(
+        models.CohortRetentionCell.cohort_date,
+        models.CohortRetentionCell.period,
+        models.CohortRetentionCell.size,
+        models.CohortRetentionCell.active,
+    ).filter(
+        models.CohortRetentionCell.granularity == granularity,
+        models.CohortRetentionCell.cohort_date >= cohort_keys[0],
+    ):
+        cached[cohort_date][period] = active
+        if period == 0:
+            sizes[cohort_date] = size
+
+    # Earliest activity bucket / cohort we can't answer from the cache.
+    activity_from: Optional[date] = None
+    sizes_from: Optional[date] = None
+    for cohort in cohort_keys:
+        if cohort not in sizes and sizes_from is None:
+            sizes_from = cohort
+        for p in range(period_count):
+            target = cohort + timedelta(days=period_days * p)
+            if target > today:
+                break
+            if p not in cached.get(cohort, {}):
+                activity_from = target if activity_from is None else min(activity_from, target)
+                break
+
+    if sizes_from is not None:
+        signup = _bucket(db, models.User.created_at, granularity)
+        for bucket, n in (
+            db.query(signup, func.count(models.User.id))
+            .filter(
+                models.User.is_archived == False,  # noqa: E712
+                models.User.created_at >= datetime.combine(sizes_from, datetime.min.time()),
+            )
+            .group_by(signup)
+        ):
+            sizes[_as_date(bucket)] = n
+        for cohort in cohort_keys:
+            if cohort >= sizes_from:
+                sizes.setdefault(cohort, 0)
+
+    fresh: dict[tuple[date, date], int] = {}
+    if activity_from is not None:
+        signup = _bucket(db, models.User.created_at, granularity)
+        activity = _bucket(db, models.StudySession.started_at, granularity)
+        for cohort, active_bucket, n in (
+            db.query(signup, activity, func.count(func.distinct(models.User.id)))
+            .join(models.StudySession, models.StudySession.user_id == models.User.id)
+            .filter(
+                models.User.is_archived == False,  # noqa: E712
+                models.User.created_at >= datetime.combine(cohort_keys[0], datetime.min.time()),
+                models.StudySession.started_at >= datetime.combine(activity_from, datetime.min.time()),
+            )
+            .group_by(signup, activity)
+        ):
+            fresh[(_as_date(cohort), _as_date(active_bucket))] = n
+
+    out: dict[date, tuple[int, list[int]]] = {}
+    to_cache = []
+    for cohort in cohort_keys:
+        size = sizes.get(cohort, 0)
+        row = []
+        for p in range(period_count):
+            target = cohort + timedelta(days=period_days * p)
+            if target > today:
+                break
+            if p in cached.get(cohort, {}):
+                row.append(cached[cohort][p])
+                continue
+            active = fresh.get((cohort, target), 0)
+            row.append(active)
+            if _closed(target, period_days, today) and _closed(cohort, period_days, today):
+                to_cache.append({
+                    "granularity": granularity, "cohort_date": cohort, "period": p,
+                    "size": size, "active": active,
+                })
+        out[cohort] = (size, row)
+
+    if to_cache:
+        insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+        db.execute(insert(_cells).on_conflict_do_nothing(), to_cache)
+        db.commit()
+    return out
+
+
+def invalidate(db: Session) -> None:
+    """Drop every cached cell. Joins the caller's transaction."""
+    db.execute(_cells.delete())
@@ -0,0 +1,287 @@
+"""Per-user daily study-minute rollup (`user_daily_minutes`).
+
+/stats, the daily 12-hour cap and group goal progress all used to
+re-aggregate raw `study_sessions` rows — a cost that grows with every session
+a user has ever logged. Instead we keep one row per
+(user, UTC day, subject):
+
+    user_id | day        | subject_id | minutes | sessions
+    --------+------------+------------+---------+---------
+         42 | 2026-10-12 |          0 |      50 |        2
+         42 | 2026-10-12 |          7 |      25 |        1
+
+`subject_id = 0` means "no subject" (a NULL would defeat the unique key).
+Only credited sessions count: completed and not abandoned, bucketed by the
+UTC date of `completed_at` — the same rule the leaderboard standings use.
+
+Write path
+----------
+- `record_session` runs inside `crud._finalize_session`, in the same
+  transaction as the coin/streak credit, so /complete, the legacy
+  POST /sessions and the stale-session reaper all keep the rollup current.
+- `reverse_session` runs inside `crud.abandon_study_session` when a row the
+  reaper had already credited is abandoned afterwards.
+- `rebuild` recomputes rows from source tables (all users, or a subset).
+  `check` reports rows that disagree with `study_sessions`. Both are exposed
+  through `scripts/backfill_daily_minutes.py` and the admin endpoints.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import date, datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import models
+
+logger = logging.getLogger(__name__)
+
+NO_SUBJECT = 0
+
+
+def _subject_key(subject_id: Optional[int]) -> int:
+    return int(subject_id) if subject_id else NO_SUBJECT
+
+
+def _credited_sessions(db: Session, *columns):
+    """Query over completed, non-abandoned `study_sessions`."""
+    return db.query(*columns).filter(
+        models.StudySession.completed_at.isnot(None),
+        models.StudySession.abandoned_at.is_(None),
+    )
+
+
+def _apply(db: Session, user_id: int, day: date, subject_id: Optional[int], minutes: int, sessions: int) -> None:
+    key = _subject_key(subject_id)
+    row = (
+        db.query(models.UserDailyMinutes)
+        .filter(
+            models.UserDailyMinutes.user_id == user_id,
+            models.UserDailyMinutes.day == day,
+            models.UserDailyMinutes.subject_id == key,
+        )
+        .first()
+    )
+    if row is None:
+        row = models.UserDailyMinutes(
+            user_id=user_id, day=day, subject_id=key, minutes=0, sessions=0,
+        )
+        db.add(row)
+    row.minutes = max(0, int(row.minutes or 0) + minutes)
+    row.sessions = max(0, int(row.sessions or 0) + sessions)
+
+
+# ─── Write path ──────────────────────────────────────────────────────────
+
+def record_session(db: Session, session: models.StudySession) -> None:
+    """Credit a just-finalised session to its (user, day, subject) row.
+
+    Does not commit — the caller owns the transaction.
+    """
+    if session.completed_at is None:
+        return
+    _apply(
+        db, session.user_id, session.completed_at.date(), session.subject_id,
+        int(session.duration_minutes or 0), 1,
+    )
+
+
+def reverse_session(db: Session, session: models.StudySession) -> None:
+    """Undo `record_session` for a credited row that is now abandoned.
+
+    Does not commit.
+    """
+    if session.completed_at is None:
+        return
+    _apply(
+        db, session.user_id, session.completed_at.date(), session.subject_id,
+        -int(session.duration_minutes or 0), -1,
+    )
+
+
+def delete_user(db: Session, user_id: int) -> None:
+    """Drop every rollup row for a hard-deleted account. Does not commit."""
+    db.query(models.UserDailyMinutes).filter(
+        models.UserDailyMinutes.user_id == user_id,
+    ).delete(synchronize_session=False)
+
+
+# ─── Read path ───────────────────────────────────────────────────────────
+
+def minutes_on(db: Session, user_id: int, day: Optional[date] = None) -> int:
+    """Total minutes credited to `user_id` on `day` (default: today, UTC)."""
+    day = day or datetime.utcnow().date()
+    total = (
+        db.query(func.coalesce(func.sum(models.UserDailyMinutes.minutes), 0))
+        .filter(
+            models.UserDailyMinutes.user_id == user_id,
+            models.UserDailyMinutes.day == day,
+        )
+        .scalar()
+    )
+    return int(total or 0)
+
+
+def minutes_by_day(db: Session, user_id: int, start: date, end: Optional[date] = None) -> dict[date, int]:
+    """{day: minutes} for `start <= day <= end`, all subjects combined.
+    Days with no study are absent."""
+    q = db.query(
+        models.UserDailyMinutes.day,
+        func.sum(models.UserDailyMinutes.minutes),
+    ).filter(
+        models.UserDailyMinutes.user_id == user_id,
+        models.UserDailyMinutes.day >= start,
+    )
+    if end is not None:
+        q = q.filter(models.UserDailyMinutes.day <= end)
+    rows = q.group_by(models.UserDailyMinutes.day).all()
+    return {_as_date(d): int(mins or 0) for d, mins in rows}
+
+
+def minutes_by_subject(db: Session, user_id: int) -> dict[int, int]:
+    """{subject_id: all-time minutes} for sessions that had a subject."""
+    rows = (
+        db.query(
+            models.UserDailyMinutes.subject_id,
+            func.sum(models.UserDailyMinutes.minutes),
+        )
+        .filter(
+            models.UserDailyMinutes.user_id == user_id,
+            models.UserDailyMinutes.subject_id != NO_SUBJECT,
+        )
+        .group_by(models.UserDailyMinutes.subject_id)
+        .all()
+    )
+    return {sid: int(mins or 0) for sid, mins in rows}
+
+
+def _as_date(value) -> date:
+    # SQLite hands back aggregated DATE columns as ISO strings.
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+# ─── Maintenance ─────────────────────────────────────────────────────────
+
+def _source_rows(db: Session, user_ids: Optional[list[int]]) -> dict[tuple, tuple[int, int]]:
+    """{(user_id, day, subject_key): (minutes, sessions)} from study_sessions."""
+    day_col = func.date(models.StudySession.completed_at)
+    q = _credited_sessions(
+        db,
+        models.StudySession.user_id,
+        day_col,
+        models.StudySession.subject_id,
+        func.coalesce(func.sum(models.StudySession.duration_minutes), 0),
+        func.count(models.StudySession.id),
+    )
+    if user_ids is not None:
+        q = q.filter(models.StudySession.user_id.in_(user_ids))
+    rows = q.group_by(models.StudySession.user_id, day_col, models.StudySession.subject_id).all()
+
+    out: dict[tuple, tuple[int, int]] = {}
+    for uid, day, sid, mins, n in rows:
+        key = (uid, _as_date(day), _subject_key(sid))
+        prev_m, prev_n = out.get(key, (0, 0))
+        # subject_id NULL and 0 both land on NO_SUBJECT — merge them.
+        out[key] = (prev_m + int(mins or 0), prev_n + int(n or 0))
+    return out
+
+
+def _rollup_rows(db: Session, user_ids: Optional[list[int]]) -> dict[tuple, tuple[int, int]]:
+    q = db.query(
+        models.UserDailyMinutes.user_id,
+        models.UserDailyMinutes.day,
+        models.UserDailyMinutes.subject_id,
+        models.UserDailyMinutes.minutes,
+        models.UserDailyMinutes.sessions,
+    )
+    if user_ids is not None:
+        q = q.filter(models.UserDailyMinutes.user_id.in_(user_ids))
+    return {
+        (uid, _as_date(day), sid): (int(mins or 0), int(n or 0))
+        for uid, day, sid, mins, n in q.all()
+    }
+
+
+def rebuild(db: Session, user_ids: Optional[Iterable[int]] = None) -> dict:
+    """Recompute rollup rows from `study_sessions`. Commits.
+
+    `user_ids=None` rebuilds every user; otherwise only the listed accounts.
+    """
+    ids = None if user_ids is None else list(user_ids)
+    q = db.query(models.UserDailyMinutes)
+    if ids is not None:
+        q = q.filter(models.UserDailyMinutes.user_id.in_(ids))
+    deleted = q.delete(synchronize_session=False)
+
+    source = _source_rows(db, ids)
+    db.bulk_insert_mappings(models.UserDailyMinutes, [
+        {"user_id": uid, "day": day, "subject_id": sid, "minutes": mins, "sessions": n}
+        for (uid, day, sid), (mins, n) in source.items()
+    ])
+    db.commit()
+    result = {
+        "deleted_rows": deleted,
+        "inserted_rows": len(source),
+        "users": len({uid for uid, _, _ in source}),
+    }
+    logger.info(f"Daily minutes rollup rebuilt: {result}")
+    return result
+
+
+def check(db: Session, user_ids: Optional[Iterable[int]] = None, sample: int = 50) -> dict:
+    """Compare the rollup against `study_sessions` without changing anything.
+
+    Returns counts of missing / extra / mismatched rows, the affected user
+    ids, and up to `sample` example differences.
+    """
+    ids = None if user_ids is None else list(user_ids)
+    expected = _source_rows(db, ids)
+    actual = _rollup_rows(db, ids)
+
+    diffs = []
+    missing = extra = mismatched = 0
+    for key in expected.keys() | actual.keys():
+        want = expected.get(key, (0, 0))
+        have = actual.get(key)
+        if have is None:
+            if want == (0, 0):
+                continue
+            missing += 1
+        elif key not in expected:
+            # Rows reversed down to zero are harmless leftovers.
+            if have == (0, 0):
+                continue
+            extra += 1
+        elif have != want:
+            mismatched += 1
+        else:
+            continue
+        diffs.append((key, want, have or (0, 0)))
+
+    diffs.sort(key=lambda d: (d[0][0], d[0][1], d[0][2]))
+    return {
+        "ok": not diffs,
+        "rows_checked": len(expected.keys() | actual.keys()),
+        "missing": missing,
+        "extra": extra,
+        "mismatched": mismatched,
+        "user_ids": sorted({key[0] for key, _, _ in diffs}),
+        "sample": [
+            {
+                "user_id": uid, "day": day.isoformat(), "subject_id": sid,
+                "expected_minutes": want[0], "expected_sessions": want[1],
+                "rollup_minutes": have[0], "rollup_sessions": have[1],
+            }
+            for (uid, day, sid), want, have in diffs[:max(0, sample)]
+        ],
+    }
+
+
+def has_rollup(db: Session) -> bool:
+    return db.query(models.UserDailyMinutes.id).first() is not None
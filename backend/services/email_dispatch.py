@@ -0,0 +1,462 @@
+"""Rate-limited, resumable bulk email dispatch via Resend's batch API.
+
+The daily onboarding/re-engagement run used to walk every verified user in
+one thread, send with `_send_template_email` and `time.sleep(0.35)` after
+each send — ~3 sends/s, one commit per EmailLog row, and a large run could
+take hours and overlap the 10:00 push cron. Campaign sends had the same
+shape, re-running `_render_template`'s `str.replace` over the whole HTML
+body once per variable per recipient.
+
+Callers now resolve the whole send up front (cohort selection and template
+variables in a handful of set-based queries, see `_onboarding_email_jobs`
+in main.py) and hand over a list of `EmailJob`s ordered by user id:
+
+- Each EmailTemplate is parsed once into a `CompiledEmail`; every job for
+  that template shares it and renders in a single pass over its segments.
+- Jobs are packed into batches of up to `BatchSender.max_batch` (100 for
+  Resend) and rendered on a worker right before their batch is submitted,
+  so only in-flight batches are ever held as HTML.
+- Batches go out through a `BatchSender` — `ResendBatchSender` in
+  production, anything speaking the same HTTP API (a local fake server in
+  tests) via RESEND_API_URL. Every request first takes a token from one
+  shared `TokenBucket` at RESEND_RATE_PER_SEC (default 5 — Resend's limit,
+  which counts batch requests, not emails).
+- Results are settled on the caller's thread in order. Each batch's
+  EmailLog rows go in with one INSERT and one commit.
+
+`dispatch` adds a checkpoint for the daily run: progress lives in an
+`EmailDispatchRun` row keyed by `run_key`, and `last_user_id` only advances
+past a batch once it and every batch before it are logged, so when the
+process restarts mid-run the caller resumes with users after it. Batches
+carry an idempotency key derived from their recipients, so Resend drops a
+batch resent after a crash, or retried after a timeout it had in fact
+accepted.
+
+A per-second 429 from Resend is retried with backoff; a daily-quota 429 (or
+one that persists) stops the run ("stopped"). Batches already in flight on
+other workers are still settled and logged. A batch that still fails after
+its retry leaves the run "stopped" at the checkpoint before it, so resuming
+today's run retries it under the same run key instead of tomorrow's run
+picking those users up again.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Iterator, Optional
+
+import httpx
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+import models
+
+logger = logging.getLogger(__name__)
+
+RATE_PER_SEC = float(os.getenv("RESEND_RATE_PER_SEC", "5"))
+WORKERS = int(os.getenv("EMAIL_DISPATCH_WORKERS", "2"))
+RATE_LIMIT_RETRIES = 3
+FAILED_BATCH_RETRIES = 1
+DEFAULT_FROM = "Endura <onboarding@resend.dev>"
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `acquire` blocks until a token is free."""
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = capacity
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                # Tolerance: refills computed from float clocks land a hair
+                # under 1.0 and would otherwise spin on sub-ns sleeps.
+                if self._tokens >= 1 - 1e-9:
+                    self._tokens = max(0.0, self._tokens - 1)
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+
+
+_limiter: Optional[TokenBucket] = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter() -> TokenBucket:
+    """Process-wide bucket so concurrent sends share Resend's budget."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = TokenBucket(RATE_PER_SEC)
+        return _limiter
+
+
+class QuotaExhausted(Exception):
+    """Resend's daily quota is used up (or it keeps rate limiting us)."""
+
+
+# ─── Templates ───────────────────────────────────────────────────────────
+
+_PLACEHOLDER = re.compile(r"\{([A-Za-z0-9_]+)\}")
+
+
+class CompiledTemplate:
+    """A {placeholder} string split once into literal and variable segments.
+
+    Unknown placeholders are left as-is, like main._render_template.
+    """
+    __slots__ = ("_parts",)
+
+    def __init__(self, text: str):
+        # re.split with one group alternates literal, name, literal, ...
+        self._parts = _PLACEHOLDER.split(text or "")
+
+    def render(self, variables: dict) -> str:
+        parts = self._parts
+        out = [parts[0]]
+        for i in range(1, len(parts), 2):
+            name = parts[i]
+            out.append(str(variables[name]) if name in variables else "{" + name + "}")
+            out.append(parts[i + 1])
+        return "".join(out)
+
+
+class CompiledEmail:
+    __slots__ = ("template_key", "subject", "html")
+
+    def __init__(self, template_key: str, subject: str, html: str):
+        self.template_key = template_key
+        self.subject = CompiledTemplate(subject)
+        self.html = CompiledTemplate(html)
+
+
+def compile_templates(templates) -> dict[str, CompiledEmail]:
+    """{template_key: CompiledEmail} for EmailTemplate rows."""
+    return {t.template_key: CompiledEmail(t.template_key, t.subject, t.body_html) for t in templates}
+
+
+class EmailJob:
+    """One templated email to one user."""
+    __slots__ = ("user_id", "email", "template", "label", "variables")
+
+    def __init__(self, user_id: int, email: str, template: CompiledEmail, label: str, variables: dict):
+        self.user_id = user_id
+        self.email = email
+        self.template = template
+        self.label = label
+        self.variables = variables
+
+    @property
+    def template_key(self) -> str:
+        return self.template.template_key
+
+
+# ─── Senders ─────────────────────────────────────────────────────────────
+
+class BatchSender:
+    """Submits up to `max_batch` messages in one request."""
+    max_batch = 100
+
+    def send(self, messages: list[dict], idempotency_key: Optional[str] = None) -> list[Optional[str]]:
+        """Return one provider message id per message, in order. Raise
+        QuotaExhausted to stop the caller; any other error fails the batch."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class ResendBatchSender(BatchSender):
+    """POST /emails/batch on the Resend API (or RESEND_API_URL)."""
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        limiter: Optional[TokenBucket] = None,
+        timeout: float = 20.0,
+    ):
+        self.api_key = api_key or os.getenv("RESEND_API_KEY", "")
+        self.base_url = (base_url or os.getenv("RESEND_API_URL", "https://api.resend.com")).rstrip("/")
+        self.limiter = limiter or get_limiter()
+        self._client = httpx.Client(timeout=timeout)
+
+    def close(self) -> None:
+        self._client.close()
+
+    def send(self, messages: list[dict], idempotency_key: Optional[str] = None) -> list[Optional[str]]:
+        headers = {"Authorization": f"Bearer {self.api_key}"}
+        if idempotency_key:
+            headers["Idempotency-Key"] = idempotency_key
+        for attempt in range(RATE_LIMIT_RETRIES):
+            self.limiter.acquire()
+            resp = self._client.post(f"{self.base_url}/emails/batch", json=messages, headers=headers)
+            if resp.status_code != 429:
+                break
+            try:
+                name = resp.json().get("name")
+            except ValueError:
+                name = None
+            if name == "daily_quota_exceeded" or attempt == RATE_LIMIT_RETRIES - 1:
+                raise QuotaExhausted(name or "rate_limit_exceeded")
+            time.sleep(1.0 * (attempt + 1))
+        resp.raise_for_status()
+        data = resp.json().get("data") or []
+        return [d.get("id") if isinstance(d, dict) else None for d in data]
+
+
+def _batches(jobs: list[EmailJob], size: int) -> Iterator[list[EmailJob]]:
+    """Id-ordered batches of at most `size` jobs that never split one user's
+    jobs (a checkpoint boundary always falls between users)."""
+    batch: list[EmailJob] = []
+    i = 0
+    while i < len(jobs):
+        j = i
+        while j < len(jobs) and jobs[j].user_id == jobs[i].user_id:
+            j += 1
+        group = jobs[i:j]
+        if batch and len(batch) + len(group) > size:
+            yield batch
+            batch = []
+        batch.extend(group)
+        i = j
+    if batch:
+        yield batch
+
+
+def _idempotency_key(scope: str, batch: list[EmailJob]) -> str:
+    digest = hashlib.sha256(
+        "|".join(f"{j.user_id}:{j.template_key}" for j in batch).encode()
+    ).hexdigest()
+    return f"{scope}/{digest[:32]}"[:256]
+
+
+def _send_batches(
+    jobs: list[EmailJob],
+    *,
+    scope: str,
+    sender: BatchSender,
+    budget: Optional[int] = None,
+    workers: Optional[int] = None,
+) -> Iterator[tuple[list[EmailJob], str, list]]:
+    """Render + submit batches on a worker pool; yield (batch, outcome,
+    results) for every batch, in order. outcome is sent | failed | capped |
+    quota | skipped, and results is [(resend_id, subject), ...] for sent
+    batches. After the first capped/quota batch, batches no worker has
+    started are skipped, but ones already in flight are settled and yielded
+    like any other — they may well have been sent."""
+    sender_from = os.getenv("RESEND_FROM", DEFAULT_FROM)
+    remaining = [budget if budget is not None else len(jobs)]
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def _work(batch: list[EmailJob]):
+        if stop.is_set():
+            return "skipped", []
+        with lock:
+            # The cap is a safety ceiling, enforced per whole batch.
+            if remaining[0] < len(batch):
+                stop.set()
+                return "capped", []
+            remaining[0] -= len(batch)
+        rendered = [(j.template.subject.render(j.variables), j.template.html.render(j.variables)) for j in batch]
+        messages = [
+            {"from": sender_from, "to": [j.email], "subject": subject, "html": html}
+            for j, (subject, html) in zip(batch, rendered)
+        ]
+        key = _idempotency_key(scope, batch)
+        for attempt in range(FAILED_BATCH_RETRIES + 1):
+            try:
+                ids = sender.send(messages, idempotency_key=key)
+                break
+            except QuotaExhausted:
+                stop.set()
+                return "quota", []
+            except Exception as e:
+                # Same key on the retry: if Resend did accept the first
+                # request (say it timed out on our side) it drops this one.
+                logger.error(f"Email batch {scope} ({len(batch)} msgs) failed (attempt {attempt + 1}): {e}")
+        else:
+            return "failed", []
+        ids = list(ids) + [None] * (len(batch) - len(ids))
+        return "sent", [(rid, subject) for rid, (subject, _) in zip(ids, rendered)]
+
+    pool = ThreadPoolExecutor(max_workers=workers or WORKERS, thread_name_prefix="email-dispatch")
+    try:
+        batches = list(_batches(jobs, sender.max_batch))
+        futures = [pool.submit(_work, batch) for batch in batches]
+        for batch, fut in zip(batches, futures):
+            outcome, results = fut.result()
+            yield batch, outcome, results
+    finally:
+        stop.set()
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _log_rows(batch: list[EmailJob], results: list) -> list[dict]:
+    return [
+        {
+            "user_id": j.user_id, "email": j.email, "template_key": j.template_key,
+            "subject": subject, "resend_message_id": resend_id,
+        }
+        for j, (resend_id, subject) in zip(batch, results)
+    ]
+
+
+_STOP_NOTES = {
+    "quota": "Resend rate limit — daily quota exhausted",
+}
+
+
+def send_bulk(
+    db: Session,
+    jobs: list[EmailJob],
+    *,
+    scope: str,
+    sender: Optional[BatchSender] = None,
+    workers: Optional[int] = None,
+) -> dict:
+    """One-off bulk send (admin campaigns). Logs each batch in one commit.
+
+    Returns {sent, failed, sent_by_template, stopped_early?}.
+    """
+    own_sender = sender is None
+    sender = sender or ResendBatchSender()
+    sent = failed = 0
+    by_template: dict[str, int] = {}
+    result: dict = {}
+    try:
+        for batch, outcome, results in _send_batches(jobs, scope=scope, sender=sender, workers=workers):
+            if outcome == "sent":
+                db.execute(insert(models.EmailLog), _log_rows(batch, results))
+                db.commit()
+                sent += len(batch)
+                for j in batch:
+                    by_template[j.template_key] = by_template.get(j.template_key, 0) + 1
+            elif outcome == "failed":
+                failed += len(batch)
+            elif outcome != "skipped":
+                result.setdefault("stopped_early", _STOP_NOTES.get(outcome, outcome))
+    finally:
+        if own_sender:
+            sender.close()
+    result.update(sent=sent, failed=failed, sent_by_template=by_template)
+    return result
+
+
+# ─── Resumable runs ──────────────────────────────────────────────────────
+
+def begin(db: Session, run_key: str) -> models.EmailDispatchRun:
+    """Load the run for `run_key`, or start it. Commits."""
+    run = db.query(models.EmailDispatchRun).filter(
+        models.EmailDispatchRun.run_key == run_key
+    ).first()
+    if run is None:
+        run = models.EmailDispatchRun(run_key=run_key, status="running", counts={})
+        db.add(run)
+        db.commit()
+        db.refresh(run)
+    elif run.status == "running" and run.last_user_id:
+        logger.info(f"Email run {run_key}: resuming after user {run.last_user_id}")
+    return run
+
+
+def summary(run: models.EmailDispatchRun) -> dict:
+    return {
+        "run_key": run.run_key,
+        "status": run.status,
+        "total": run.total,
+        "sent": run.sent,
+        "failed": run.failed,
+        "counts": dict(run.counts or {}),
+        "last_user_id": run.last_user_id,
+        "note": run.note,
+        "started_at": run.started_at.isoformat() if run.started_at else None,
+        "updated_at": run.updated_at.isoformat() if run.updated_at else None,
+        "finished_at": run.finished_at.isoformat() if run.finished_at else None,
+    }
+
+
+def dispatch(
+    db: Session,
+    run: models.EmailDispatchRun,
+    jobs: list[EmailJob],
+    *,
+    cap: int,
+    sender: Optional[BatchSender] = None,
+    workers: Optional[int] = None,
+) -> dict:
+    """Send `jobs` (sorted by user_id, all after run.last_user_id) and
+    checkpoint `run` as batches complete. Returns `summary(run)`."""
+    own_sender = sender is None
+    sender = sender or ResendBatchSender()
+    # Batches that failed on an earlier attempt sit behind the checkpoint,
+    # so they are in `jobs` again.
+    run.failed = 0
+    run.total = run.sent + len(jobs)
+    db.commit()
+
+    started = time.monotonic()
+    note: Optional[str] = None
+    # The checkpoint may only advance while every batch so far was sent.
+    contiguous = True
+    try:
+        for batch, outcome, results in _send_batches(
+            jobs, scope=run.run_key, sender=sender, budget=cap - run.sent, workers=workers,
+        ):
+            if outcome == "sent":
+                db.execute(insert(models.EmailLog), _log_rows(batch, results))
+                counts = dict(run.counts or {})
+                for j in batch:
+                    counts[j.label] = counts.get(j.label, 0) + 1
+                run.counts = counts
+                run.sent += len(batch)
+                if contiguous:
+                    run.last_user_id = batch[-1].user_id
+            elif outcome == "failed":
+                run.failed += len(batch)
+                contiguous = False
+            else:
+                contiguous = False
+                if outcome != "skipped" and note is None:
+                    note = f"daily_cap ({cap}) reached" if outcome == "capped" else _STOP_NOTES.get(outcome, outcome)
+                continue
+            db.commit()
+            logger.info(
+                f"Email run {run.run_key}: {run.sent + run.failed}/{run.total} "
+                f"(sent={run.sent} failed={run.failed}) {time.monotonic() - started:.0f}s"
+            )
+    finally:
+        if own_sender:
+            sender.close()
+
+    if note is None and run.failed:
+        note = f"{run.failed} emails failed; resume the run to retry them"
+    run.status = "stopped" if note else "completed"
+    run.note = note
+    run.finished_at = datetime.utcnow()
+    db.commit()
+    if note:
+        logger.warning(f"Email run {run.run_key} stopped early: {note}")
+    return summary(run)
@@ -0,0 +1,217 @@
+"""Per-recipient activity feed timelines (fan-out on write).
+
+GET /feed used to load every friendship and friend row, the caller's block
+list, and then run `user_id IN (friend_ids) ORDER BY created_at` over the
+whole `activity_events` table — cost grew with friend count and with global
+event volume.
+
+Instead each event id is appended to the timeline of every friend who can
+see it when the event is written:
+
+    feed_timeline_entries (owner_id, event_id, author_id, created_at)
+
+and a feed page is an index range scan on (owner_id, event_id) plus a LIMIT.
+Event ids are monotonic, so `before_id` is a stable cursor.
+
+Write path
+----------
+- `fan_out` runs inside `crud._create_event` (and POST /tips/send), in the
+  same transaction as the event. Recipients who blocked the author are
+  skipped, so block filtering happens once, at write time.
+- `queue_backfill` runs when a friendship is accepted. The next time either
+  user reads their feed, `_drain_backfills` copies the other's recent events
+  into their timeline — new friends see history without the accept request
+  paying for it.
+- `remove_pair` drops both users' entries for each other on unfriend/block.
+- `prune` deletes entries older than KEEP_DAYS; run from the daily cron.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+
+logger = logging.getLogger(__name__)
+
+# How many of a new friend's past events are copied into a timeline.
+BACKFILL_EVENTS = 50
+
+# Timeline entries older than this are pruned. Nobody scrolls back further.
+KEEP_DAYS = 90
+
+
+def _friend_ids(db: Session, user_id: int) -> set[int]:
+    rows = (
+        db.query(models.Friendship.user_id, models.Friendship.friend_id)
+        .filter(
+            models.Friendship.status == "accepted",
+            or_(models.Friendship.user_id == user_id, models.Friendship.friend_id == user_id),
+        )
+        .all()
+    )
+    return {b if a == user_id else a for a, b in rows}
+
+
+def _blocker_ids(db: Session, author_id: int) -> set[int]:
+    """Users who blocked `author_id` and so must not see their events."""
+    return {
+        bid for (bid,) in db.query(models.UserBlock.blocker_id)
+        .filter(models.UserBlock.blocked_id == author_id)
+        .all()
+    }
+
+
+# ─── Write path ──────────────────────────────────────────────────────────
+
+def fan_out(db: Session, event: models.ActivityEvent) -> int:
+    """Append a flushed event to each eligible friend's timeline.
+
+    Returns the number of timelines written. Does not commit.
+    """
+    recipients = _friend_ids(db, event.user_id) - _blocker_ids(db, event.user_id)
+    recipients.discard(event.user_id)
+    if not recipients:
+        return 0
+    created_at = event.created_at or datetime.utcnow()
+    db.bulk_insert_mappings(models.FeedTimelineEntry, [
+        {
+            "owner_id": rid, "event_id": event.id,
+            "author_id": event.user_id, "created_at": created_at,
+        }
+        for rid in recipients
+    ])
+    return len(recipients)
+
+
+def queue_backfill(db: Session, user_a: int, user_b: int) -> None:
+    """Schedule each user's recent events into the other's timeline.
+
+    Does not commit.
+    """
+    for owner_id, author_id in ((user_a, user_b), (user_b, user_a)):
+        exists = db.query(models.FeedTimelineBackfill.id).filter(
+            models.FeedTimelineBackfill.owner_id == owner_id,
+            models.FeedTimelineBackfill.author_id == author_id,
+        ).first()
+        if not exists:
+            db.add(models.FeedTimelineBackfill(owner_id=owner_id, author_id=author_id))
+
+
+def remove_pair(db: Session, user_a: int, user_b: int) -> None:
+    """Forget what two users saw of each other (unfriend / block).
+
+    Does not commit.
+    """
+    for model, owner_col, author_col in (
+        (models.FeedTimelineEntry, models.FeedTimelineEntry.owner_id, models.FeedTimelineEntry.author_id),
+        (models.FeedTimelineBackfill, models.FeedTimelineBackfill.owner_id, models.FeedTimelineBackfill.author_id),
+    ):
+        db.query(model).filter(
+            or_(
+                (owner_col == user_a) & (author_col == user_b),
+                (owner_col == user_b) & (author_col == user_a),
+            )
+        ).delete(synchronize_session=False)
+
+
+def delete_user(db: Session, user_id: int) -> None:
+    """Drop a hard-deleted account's timeline and its appearances in others'.
+
+    Does not commit.
+    """
+    db.query(models.FeedTimelineEntry).filter(
+        or_(models.FeedTimelineEntry.owner_id == user_id, models.FeedTimelineEntry.author_id == user_id)
+    ).delete(synchronize_session=False)
+    db.query(models.FeedTimelineBackfill).filter(
+        or_(models.FeedTimelineBackfill.owner_id == user_id, models.FeedTimelineBackfill.author_id == user_id)
+    ).delete(synchronize_session=False)
+
+
+def _drain_backfills(db: Session, owner_id: int) -> None:
+    pending = (
+        db.query(models.FeedTimelineBackfill)
+        .filter(models.FeedTimelineBackfill.owner_id == owner_id)
+        .all()
+    )
+    if not pending:
+        return
+    blocked = {
+        bid for (bid,) in db.query(models.UserBlock.blocked_id)
+        .filter(models.UserBlock.blocker_id == owner_id)
+        .all()
+    }
+    for job in pending:
+        if job.author_id not in blocked:
+            events = (
+                db.query(models.ActivityEvent.id, models.ActivityEvent.created_at)
+                .filter(models.ActivityEvent.user_id == job.author_id)
+                .order_by(models.ActivityEvent.id.desc())
+                .limit(BACKFILL_EVENTS)
+                .all()
+            )
+            have = {
+                eid for (eid,) in db.query(models.FeedTimelineEntry.event_id).filter(
+                    models.FeedTimelineEntry.owner_id == owner_id,
+                    models.FeedTimelineEntry.event_id.in_([eid for eid, _ in events] or [0]),
+                ).all()
+            }
+            db.bulk_insert_mappings(models.FeedTimelineEntry, [
+                {
+                    "owner_id": owner_id, "event_id": eid,
+                    "author_id": job.author_id, "created_at": created_at or datetime.utcnow(),
+                }
+                for eid, created_at in events
+                if eid not in have
+            ])
+        db.delete(job)
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent read of the same feed drained the queue first.
+        db.rollback()
+
+
+# ─── Read path ───────────────────────────────────────────────────────────
+
+def page(
+    db: Session,
+    owner_id: int,
+    limit: int = 30,
+    before_id: Optional[int] = None,
+) -> list[tuple[models.ActivityEvent, Optional[str]]]:
+    """Newest-first (event, author username) pairs from `owner_id`'s
+    timeline, strictly older than `before_id` when given. Archived authors
+    are hidden."""
+    _drain_backfills(db, owner_id)
+    q = (
+        db.query(models.ActivityEvent, models.User.username)
+        .join(models.FeedTimelineEntry, models.FeedTimelineEntry.event_id == models.ActivityEvent.id)
+        .outerjoin(models.User, models.User.id == models.ActivityEvent.user_id)
+        .filter(
+            models.FeedTimelineEntry.owner_id == owner_id,
+            or_(models.User.is_archived == False, models.User.is_archived == None),  # noqa: E712
+        )
+    )
+    if before_id is not None:
+        q = q.filter(models.FeedTimelineEntry.event_id < before_id)
+    return q.order_by(models.FeedTimelineEntry.event_id.desc()).limit(limit).all()
+
+
+# ─── Maintenance ─────────────────────────────────────────────────────────
+
+def prune(db: Session, keep_days: int = KEEP_DAYS) -> int:
+    """Delete timeline entries older than `keep_days`. Commits."""
+    cutoff = datetime.utcnow() - timedelta(days=max(1, keep_days))
+    deleted = (
+        db.query(models.FeedTimelineEntry)
+        .filter(models.FeedTimelineEntry.created_at < cutoff)
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted
@@ -0,0 +1,253 @@
+"""Resized WebP/JPEG variants of uploaded images, served by /uploads/{id}?w=.
+
+Profile pictures are uploaded at up to 5 MB and every leaderboard, feed and
+friends list renders them at avatar size — the leaderboard alone pulls up
+to 100 of them. Serving the original bytes was most of our egress.
+
+On upload (`schedule`) a small thread pool renders each width in WIDTHS as
+WebP and JPEG from the blob-store original. `lookup` maps a requested width
+to the smallest variant at least that wide (or the original when the
+request is larger than every variant / than the image itself) and picks
+WebP when the client's Accept header allows it. A missing variant is queued
+and `lookup` returns PENDING: the original is served for that request, with
+a short max-age so the ?w= URL isn't cached as the full-size image.
+
+Variants are a cache, not data: they live under IMAGE_VARIANT_DIR (default
+<BLOB_STORE_DIR>/variants) with a disk budget of IMAGE_VARIANT_CACHE_MB.
+Least-recently-served files are evicted past the budget and regenerated on
+demand.
+
+Pillow is optional: without it `AVAILABLE` is False and every request gets
+the original.
+"""
+from __future__ import annotations
+
+import io
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from services import blob_store
+
+try:
+    from PIL import Image, ImageOps
+    AVAILABLE = True
+except ImportError:  # pragma: no cover - Pillow is in requirements.txt
+    Image = ImageOps = None
+    AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+WIDTHS = (64, 128, 512)
+RESIZABLE_TYPES = {"image/png", "image/jpeg", "image/webp"}
+WORKERS = int(os.getenv("IMAGE_VARIANT_WORKERS", "2"))
+CACHE_BYTES = int(os.getenv("IMAGE_VARIANT_CACHE_MB", "512")) * 1024 * 1024
+INLINE = os.getenv("IMAGE_VARIANTS_INLINE", "0") == "1"
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+_FORMATS = {"webp": ("WEBP", "image/webp"), "jpg": ("JPEG", "image/jpeg")}
+
+# `lookup` result while the variant is being rendered.
+PENDING = object()
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_in_flight: set[str] = set()
+_in_flight_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="image-variants")
+        return _executor
+
+
+class _VariantCache:
+    """Directory of rendered variants with an LRU byte budget.
+
+    Recency is the file mtime, bumped on every hit, so it survives restarts.
+    """
+
+    def __init__(self, root: Path, budget: int):
+        self.root = root
+        self.budget = budget
+        self._lock = threading.Lock()
+        self._total: Optional[int] = None
+
+    def path(self, sha: str, width: int, ext: str) -> Path:
+        return self.root / sha[:2] / f"{sha}-{width}.{ext}"
+
+    def marker(self, sha: str) -> Path:
+        """Tiny file holding the original's width, written once variants
+        are rendered. Never evicted."""
+        return self.root / sha[:2] / f"{sha}.orig"
+
+    def original_width(self, sha: str) -> Optional[int]:
+        try:
+            return int(self.marker(sha).read_text() or 0)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def hit(self, path: Path) -> bool:
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _scan(self) -> int:
+        total = 0
+        for p in self.root.rglob("*"):
+            if p.is_file():
+                total += p.stat().st_size
+        return total
+
+    def put(self, path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            if self._total is None:
+                self._total = self._scan()
+            else:
+                self._total += len(data)
+            if self._total > self.budget:
+                self._evict()
+
+    def _evict(self) -> None:
+        files = sorted(
+            (
+                p for p in self.root.rglob("*")
+                if p.is_file() and not p.name.startswith(".tmp-") and p.suffix != ".orig"
+            ),
+            key=lambda p: p.stat().st_mtime,
+        )
+        # Trim to 90% so eviction doesn't rerun on every write at the edge.
+        target = int(self.budget * 0.9)
+        for p in files:
+            if self._total <= target:
+                break
+            try:
+                size = p.stat().st_size
+                p.unlink()
+                self._total -= size
+            except FileNotFoundError:
+                continue
+
+
+_cache: Optional[_VariantCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> _VariantCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                default = Path(blob_store.store_dir()) / "variants"
+                root = Path(os.getenv("IMAGE_VARIANT_DIR", str(default)))
+                _cache = _VariantCache(root, CACHE_BYTES)
+    return _cache
+
+
+def _render(img, width: int, fmt: str) -> bytes:
+    copy = img.copy()
+    copy.thumbnail((width, width * 4))
+    if fmt == "JPEG" and copy.mode != "RGB":
+        background = Image.new("RGB", copy.size, (255, 255, 255))
+        rgba = copy.convert("RGBA")
+        background.paste(rgba, mask=rgba.split()[-1])
+        copy = background
+    out = io.BytesIO()
+    if fmt == "WEBP":
+        copy.save(out, fmt, quality=WEBP_QUALITY, method=4)
+    else:
+        copy.save(out, fmt, quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def generate(sha: str) -> int:
+    """Render every variant of blob `sha` that is smaller than the original.
+    Returns the number of files written."""
+    cache = get_cache()
+    data = blob_store.get_store().read(sha)
+    if data is None:
+        return 0
+    with Image.open(io.BytesIO(data)) as src:
+        img = ImageOps.exif_transpose(src)
+        img.load()
+    written = 0
+    for width in WIDTHS:
+        if width >= img.width:
+            continue
+        for ext, (fmt, _mime) in _FORMATS.items():
+            path = cache.path(sha, width, ext)
+            if path.exists():
+                continue
+            cache.put(path, _render(img, width, fmt))
+            written += 1
+    cache.put(cache.marker(sha), str(img.width).encode())
+    return written
+
+
+def _run(sha: str) -> None:
+    try:
+        generate(sha)
+    except Exception as e:
+        logger.warning(f"Image variant generation failed for {sha}: {e}")
+        # Width 0 = "always serve the original", so an undecodable upload
+        # isn't retried on every request.
+        try:
+            get_cache().put(get_cache().marker(sha), b"0")
+        except OSError:
+            pass
+    finally:
+        with _in_flight_lock:
+            _in_flight.discard(sha)
+
+
+def schedule(sha: Optional[str], content_type: str) -> None:
+    """Queue variant generation for an uploaded image (no-op for GIFs and
+    when Pillow is missing). Never blocks the request unless INLINE."""
+    if not AVAILABLE or not sha or content_type not in RESIZABLE_TYPES:
+        return
+    with _in_flight_lock:
+        if sha in _in_flight:
+            return
+        _in_flight.add(sha)
+    if INLINE:
+        _run(sha)
+    else:
+        _get_executor().submit(_run, sha)
+
+
+def lookup(
+    sha: str, content_type: str, width: int, accept: str = "",
+):
+    """(path, media_type, variant_width) of the variant to serve for a
+    request of `width` px, None when the original is the right answer, or
+    PENDING when the variant has been queued and the original stands in."""
+    if not AVAILABLE or content_type not in RESIZABLE_TYPES or width > WIDTHS[-1]:
+        return None
+    cache = get_cache()
+    target = next(w for w in WIDTHS if w >= width)
+    ext = "webp" if "image/webp" in (accept or "") else "jpg"
+    path = cache.path(sha, target, ext)
+    if cache.hit(path):
+        return path, _FORMATS[ext][1], target
+    original_width = cache.original_width(sha)
+    if original_width is not None and target >= original_width:
+        # The original is no wider than the variant would be.
+        return None
+    # Not rendered yet, or evicted since.
+    schedule(sha, content_type)
+    return PENDING
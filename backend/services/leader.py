@@ -0,0 +1,164 @@
+"""Leader election for the scheduler worker.
+
+The cron jobs (onboarding emails, lifecycle pushes, app-rank sync, stale
+session reaper, ...) used to run in a BackgroundScheduler inside the
+Uvicorn process, so a second web worker or replica meant every job ran
+twice. They now run in `python -m worker`, and every instance of that
+worker competes for one `LeaderLock`; only the holder starts the
+scheduler, the others wait as hot standbys.
+
+- Postgres: a session-level `pg_try_advisory_lock` held on a dedicated
+  connection. It is released by the server when that connection dies, so
+  a crashed leader never blocks a standby for long. `is_held` pings the
+  connection; a failed ping means the lock may already belong to someone
+  else and the leader must stand down.
+- Anything else (SQLite in dev): an exclusive `flock` on a lockfile next to
+  the database (or SCHEDULER_LOCK_FILE). The kernel drops it when the
+  process exits.
+
+`run_as_leader` is the loop around it: try to take the lock, call `start`
+once it's ours, call `stop` if it's lost, and retry every `check_every`
+seconds until `stop_event` is set.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from typing import Callable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes: single instance, no locking
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+CHECK_INTERVAL_SECONDS = int(os.getenv("LEADER_CHECK_SECONDS", "15"))
+DEFAULT_NAME = "endura-scheduler"
+
+
+def _advisory_key(name: str) -> int:
+    """Stable signed 64-bit key for pg_try_advisory_lock."""
+    return int.from_bytes(hashlib.sha256(name.encode()).digest()[:8], "big", signed=True)
+
+
+def _default_lock_path(engine: Engine, name: str) -> str:
+    override = os.getenv("SCHEDULER_LOCK_FILE")
+    if override:
+        return override
+    db_path = engine.url.database if engine.url.get_backend_name() == "sqlite" else None
+    if db_path and db_path != ":memory:":
+        return f"{os.path.abspath(db_path)}.{name}.lock"
+    return os.path.join(tempfile.gettempdir(), f"{name}.lock")
+
+
+class LeaderLock:
+    """Non-blocking, process-wide lock; see module docstring."""
+
+    def __init__(self, engine: Engine, name: str = DEFAULT_NAME, lock_path: Optional[str] = None):
+        self.name = name
+        self._engine = engine
+        self._postgres = engine.url.get_backend_name() == "postgresql"
+        self._lock_path = lock_path or (None if self._postgres else _default_lock_path(engine, name))
+        self._conn: Optional[Connection] = None
+        self._fd: Optional[int] = None
+
+    @property
+    def held(self) -> bool:
+        return self._conn is not None or self._fd is not None
+
+    def try_acquire(self) -> bool:
+        if self.held:
+            return True
+        return self._acquire_pg() if self._postgres else self._acquire_file()
+
+    def is_held(self) -> bool:
+        """True while we still own the lock. Pings Postgres."""
+        if self._conn is None:
+            return self._fd is not None
+        try:
+            self._conn.execute(text("SELECT 1"))
+            return True
+        except Exception as e:
+            logger.warning(f"Leader lock {self.name}: connection lost ({e})")
+            self._drop_conn()
+            return False
+
+    def release(self) -> None:
+        if self._conn is not None:
+            try:
+                self._conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": _advisory_key(self.name)})
+            except Exception:
+                pass  # closing the connection releases it anyway
+            self._drop_conn()
+        if self._fd is not None:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+    def _acquire_pg(self) -> bool:
+        conn = self._engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        try:
+            got = conn.execute(
+                text("SELECT pg_try_advisory_lock(:k)"), {"k": _advisory_key(self.name)}
+            ).scalar()
+        except Exception as e:
+            logger.warning(f"Leader lock {self.name}: acquire failed ({e})")
+            got = False
+        if not got:
+            conn.close()
+            return False
+        self._conn = conn
+        return True
+
+    def _acquire_file(self) -> bool:
+        fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                return False
+        self._fd = fd
+        return True
+
+    def _drop_conn(self) -> None:
+        try:
+            self._conn.close()
+        except Exception:
+            pass
+        self._conn = None
+
+
+def run_as_leader(
+    lock: LeaderLock,
+    start: Callable[[], None],
+    stop: Callable[[], None],
+    stop_event: threading.Event,
+    check_every: float = CHECK_INTERVAL_SECONDS,
+) -> None:
+    """Block until `stop_event` is set, running `start`/`stop` as
+    leadership is gained and lost."""
+    leading = False
+    try:
+        while not stop_event.is_set():
+            if leading and not lock.is_held():
+                logger.warning(f"Leader lock {lock.name}: lost leadership, stopping jobs")
+                stop()
+                leading = False
+            if not leading and lock.try_acquire():
+                logger.info(f"Leader lock {lock.name}: acquired (pid {os.getpid()}), starting jobs")
+                start()
+                leading = True
+            stop_event.wait(check_every)
+    finally:
+        if leading:
+            stop()
+        lock.release()
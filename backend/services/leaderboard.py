@@ -0,0 +1,330 @@
+"""Materialized leaderboard standings (global, per-school, weekly, all-time).
+
+The leaderboard endpoints used to rebuild rankings on every request: the
+school board loaded every user at a school into Python and sorted them, and
+the weekly boards ran a GROUP BY over the whole week of `study_sessions`.
+Both costs grow with total users, not with page size.
+
+Instead we keep one `leaderboard_standings` row per (user, period):
+
+    period_key = 'all_time'     → mirrors users.total_study_minutes
+    period_key = '2026-10-12'   → minutes completed in the week starting
+                                  that UTC Monday
+
+Rows carry a denormalised `school_key` (lower/trimmed `users.school`) so every
+board is an index range scan on (period_key[, school_key], minutes) followed
+by a LIMIT — O(limit) — plus a COUNT for the caller's own rank.
+
+Write path
+----------
+- `record_session` runs inside `crud._finalize_session`, in the same
+  transaction as the coin/streak credit, so both the client /complete path and
+  the stale-session reaper keep standings current.
+- `sync_user` re-derives a user's school key and all-time minutes after edits
+  that bypass sessions (profile school change, admin minute override, school
+  cleanup renames).
+- `rebuild_standings` recomputes everything from source tables. Run once after
+  the migration, and from POST /admin/leaderboard/rebuild if drift is ever
+  suspected.
+- `prune_standings` drops weekly rows past KEEP_WEEKS; the scheduler runs it
+  daily (main._cron_prune_leaderboard_standings).
+
+No Redis: Postgres already gives us ordered index scans, and a single source
+of truth survives deploys and multiple workers.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import and_, case, func, or_
+from sqlalchemy.orm import Session
+
+import models
+
+logger = logging.getLogger(__name__)
+
+ALL_TIME = "all_time"
+WEEK = "week"
+
+# Weekly rows older than this are deleted by `prune_standings`. Nothing reads
+# past weeks today; a couple of months of history is kept for debugging.
+KEEP_WEEKS = 8
+
+_SCHOOL_KEY_MAX = 255
+
+
+def week_start(now: Optional[datetime] = None) -> datetime:
+    """Midnight UTC of the Monday that starts the week containing `now`."""
+    now = now or datetime.utcnow()
+    return datetime(now.year, now.month, now.day) - timedelta(days=now.weekday())
+
+
+def period_key(period: str, now: Optional[datetime] = None) -> str:
+    """Map the public `period` query value to a standings `period_key`."""
+    if period == WEEK:
+        return week_start(now).date().isoformat()
+    return ALL_TIME
+
+
+def school_key(school: Optional[str]) -> Optional[str]:
+    """Same normalisation the school board has always used: trim + lower."""
+    key = (school or "").strip().lower()
+    return key[:_SCHOOL_KEY_MAX] if key else None
+
+
+def _active_user_clause():
+    return or_(models.User.is_archived == False, models.User.is_archived == None)  # noqa: E712
+
+
+def _get_or_create(db: Session, user_id: int, key: str, school: Optional[str]) -> models.LeaderboardStanding:
+    row = (
+        db.query(models.LeaderboardStanding)
+        .filter(
+            models.LeaderboardStanding.user_id == user_id,
+            models.LeaderboardStanding.period_key == key,
+        )
+        .first()
+    )
+    if row is None:
+        row = models.LeaderboardStanding(
+            user_id=user_id, period_key=key, school_key=school, minutes=0,
+        )
+        db.add(row)
+    return row
+
+
+# ─── Write path ──────────────────────────────────────────────────────────
+
+def record_session(
+    db: Session,
+    user: models.User,
+    duration_minutes: int,
+    completed_at: Optional[datetime] = None,
+) -> None:
+    """Credit a finalised session to the user's all-time and weekly rows.
+
+    Expects `user.total_study_minutes` to already include this session.
+    Does not commit — the caller owns the transaction.
+    """
+    sk = school_key(user.school)
+
+    all_time = _get_or_create(db, user.id, ALL_TIME, sk)
+    all_time.minutes = int(user.total_study_minutes or 0)
+    all_time.school_key = sk
+
+    weekly = _get_or_create(db, user.id, period_key(WEEK, completed_at), sk)
+    weekly.minutes = int(weekly.minutes or 0) + int(duration_minutes or 0)
+    weekly.school_key = sk
+
+
+def reverse_session(db: Session, session: models.StudySession) -> None:
+    """Take a credited session that is now abandoned back out of its weekly
+    row, as `rebuild_standings` would. All-time mirrors
+    `users.total_study_minutes`, which abandoning leaves alone. Does not
+    commit."""
+    if session.completed_at is None:
+        return
+    minutes = int(session.duration_minutes or 0)
+    db.query(models.LeaderboardStanding).filter(
+        models.LeaderboardStanding.user_id == session.user_id,
+        models.LeaderboardStanding.period_key == period_key(WEEK, session.completed_at),
+    ).update(
+        {models.LeaderboardStanding.minutes: case(
+            (models.LeaderboardStanding.minutes > minutes, models.LeaderboardStanding.minutes - minutes),
+            else_=0,
+        )},
+        synchronize_session=False,
+    )
+
+
+def sync_user(db: Session, user: models.User) -> None:
+    """Refresh a user's school key and all-time minutes. Does not commit."""
+    sk = school_key(user.school)
+    db.query(models.LeaderboardStanding).filter(
+        models.LeaderboardStanding.user_id == user.id,
+    ).update({models.LeaderboardStanding.school_key: sk}, synchronize_session=False)
+    all_time = _get_or_create(db, user.id, ALL_TIME, sk)
+    all_time.minutes = int(user.total_study_minutes or 0)
+    all_time.school_key = sk
+
+
+def delete_user(db: Session, user_id: int) -> None:
+    """Drop every standing for a hard-deleted account. Does not commit."""
+    db.query(models.LeaderboardStanding).filter(
+        models.LeaderboardStanding.user_id == user_id,
+    ).delete(synchronize_session=False)
+
+
+# ─── Read path ───────────────────────────────────────────────────────────
+
+def top(
+    db: Session,
+    period: str = ALL_TIME,
+    school: Optional[str] = None,
+    limit: int = 100,
+) -> list[tuple[models.User, int]]:
+    """Top `limit` active users for a period, optionally scoped to a school
+    key. Ties break on user id so pages are stable between requests."""
+    q = (
+        db.query(models.User, models.LeaderboardStanding.minutes)
+        .join(models.LeaderboardStanding, models.LeaderboardStanding.user_id == models.User.id)
+        .filter(
+            models.LeaderboardStanding.period_key == period_key(period),
+            _active_user_clause(),
+        )
+    )
+    if school is not None:
+        q = q.filter(models.LeaderboardStanding.school_key == school)
+    rows = (
+        q.order_by(models.LeaderboardStanding.minutes.desc(), models.LeaderboardStanding.user_id.asc())
+        .limit(limit)
+        .all()
+    )
+    return [(u, int(mins or 0)) for u, mins in rows]
+
+
+def minutes_for(db: Session, user_ids: Iterable[int], period: str = WEEK) -> dict[int, int]:
+    """{user_id: minutes} for an explicit set of users (friends board)."""
+    ids = list(user_ids)
+    if not ids:
+        return {}
+    rows = (
+        db.query(models.LeaderboardStanding.user_id, models.LeaderboardStanding.minutes)
+        .filter(
+            models.LeaderboardStanding.period_key == period_key(period),
+            models.LeaderboardStanding.user_id.in_(ids),
+        )
+        .all()
+    )
+    return {uid: int(mins or 0) for uid, mins in rows}
+
+
+def rank_of(
+    db: Session,
+    user: models.User,
+    period: str = ALL_TIME,
+    school: Optional[str] = None,
+) -> tuple[Optional[int], int]:
+    """Return (rank, minutes) for `user` on a board, using the same ordering
+    as `top`. Rank is None when the user has no standing for the period."""
+    key = period_key(period)
+    mine = (
+        db.query(models.LeaderboardStanding.minutes)
+        .filter(
+            models.LeaderboardStanding.user_id == user.id,
+            models.LeaderboardStanding.period_key == key,
+        )
+        .scalar()
+    )
+    if mine is None:
+        return None, 0
+    q = (
+        db.query(func.count(models.LeaderboardStanding.id))
+        .join(models.User, models.User.id == models.LeaderboardStanding.user_id)
+        .filter(
+            models.LeaderboardStanding.period_key == key,
+            _active_user_clause(),
+            or_(
+                models.LeaderboardStanding.minutes > mine,
+                and_(
+                    models.LeaderboardStanding.minutes == mine,
+                    models.LeaderboardStanding.user_id < user.id,
+                ),
+            ),
+        )
+    )
+    if school is not None:
+        q = q.filter(models.LeaderboardStanding.school_key == school)
+    ahead = q.scalar() or 0
+    return int(ahead) + 1, int(mine or 0)
+
+
+# ─── Maintenance ─────────────────────────────────────────────────────────
+
+def has_standings(db: Session) -> bool:
+    return (
+        db.query(models.LeaderboardStanding.id)
+        .filter(models.LeaderboardStanding.period_key == ALL_TIME)
+        .first()
+        is not None
+    )
+
+
+def prune_standings(db: Session, keep_weeks: int = KEEP_WEEKS) -> int:
+    """Delete weekly rows older than `keep_weeks`. Does not commit.
+
+    ISO dates sort lexically, and 'all_time' is excluded explicitly.
+    """
+    cutoff = (week_start() - timedelta(weeks=max(1, keep_weeks))).date().isoformat()
+    return (
+        db.query(models.LeaderboardStanding)
+        .filter(
+            models.LeaderboardStanding.period_key != ALL_TIME,
+            models.LeaderboardStanding.period_key < cutoff,
+        )
+        .delete(synchronize_session=False)
+    )
+
+
+def rebuild_standings(db: Session) -> dict:
+    """Recompute all-time and current-week standings from source tables.
+
+    All-time comes from `users.total_study_minutes`; the current week from
+    completed, non-abandoned `study_sessions`. Commits.
+    """
+    start = week_start()
+    week_key = start.date().isoformat()
+
+    db.query(models.LeaderboardStanding).filter(
+        models.LeaderboardStanding.period_key.in_([ALL_TIME, week_key]),
+    ).delete(synchronize_session=False)
+
+    users = db.query(
+        models.User.id, models.User.school, models.User.total_study_minutes,
+    ).all()
+    schools = {uid: school_key(school) for uid, school, _ in users}
+    db.bulk_insert_mappings(models.LeaderboardStanding, [
+        {
+            "user_id": uid,
+            "period_key": ALL_TIME,
+            "school_key": schools[uid],
+            "minutes": int(mins or 0),
+        }
+        for uid, _school, mins in users
+    ])
+
+    weekly = (
+        db.query(
+            models.StudySession.user_id,
+            func.coalesce(func.sum(models.StudySession.duration_minutes), 0),
+        )
+        .filter(
+            models.StudySession.completed_at >= start,
+            models.StudySession.abandoned_at.is_(None),
+        )
+        .group_by(models.StudySession.user_id)
+        .all()
+    )
+    db.bulk_insert_mappings(models.LeaderboardStanding, [
+        {
+            "user_id": uid,
+            "period_key": week_key,
+            "school_key": schools.get(uid),
+            "minutes": int(mins or 0),
+        }
+        for uid, mins in weekly
+        if uid in schools
+    ])
+
+    pruned = prune_standings(db)
+    db.commit()
+    result = {
+        "all_time_rows": len(users),
+        "week_rows": sum(1 for uid, _ in weekly if uid in schools),
+        "week_key": week_key,
+        "pruned_rows": pruned,
+    }
+    logger.info(f"Leaderboard standings rebuilt: {result}")
+    return result
@@ -0,0 +1,426 @@
+"""Precomputed numbers for GET /admin/overview.
+
+`admin_overview` used to run ~40 COUNT/SUM queries on every dashboard load,
+plus three more per day since April 1 for the activity charts — several
+hundred by autumn. Most of them also carried every archived user id as a
+literal `NOT IN (…)` list. Opening the dashboard pinned pooled connections
+for seconds while app traffic waited.
+
+The payload is now computed off the request path and stored as one JSON row
+in `metrics_snapshot`:
+
+- `refresh()` runs every SNAPSHOT_INTERVAL_MINUTES in the leader worker.
+  It is incremental. Daily, weekly and monthly buckets that closed before
+  the previous snapshot (less REOPEN_DAYS of slack) are copied forward.
+  Only the open ones are re-read, with one ranged GROUP BY per table.
+  Headline totals are one conditional-aggregate query per table, covering
+  total, last 7 days and archived-excluded together.
+- A full rebuild runs at least every FULL_REBUILD_HOURS. It also runs on the
+  next refresh after `mark_dirty()`: archiving a user changes days that were
+  already closed.
+- Archived users are excluded with a NOT EXISTS / outer join on
+  users.is_archived, never with a list of ids.
+- Signups and session writes `bump()` the headline users / sessions /
+  minutes counters in an in-process buffer. Every web worker folds its
+  buffer into `metrics_counters` every few seconds (`flush_counters`), and
+  each refresh rebases the counters on the totals it just computed. Those
+  three numbers therefore stay current between refreshes. A write that
+  lands while a refresh is running can be off by one until the next
+  refresh.
+
+`load()` returns the latest payload plus its age. Tests set
+METRICS_SNAPSHOT_INLINE=1, so every read does a synchronous full rebuild.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import bindparam, case, exists, func, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+import models
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_KEY = "admin_overview"
+SNAPSHOT_INTERVAL_MINUTES = int(os.getenv("METRICS_SNAPSHOT_INTERVAL_MINUTES", "5"))
+FULL_REBUILD_HOURS = int(os.getenv("METRICS_SNAPSHOT_FULL_REBUILD_HOURS", "24"))
+FLUSH_INTERVAL_SECONDS = int(os.getenv("METRICS_COUNTER_FLUSH_SECONDS", "5"))
+INLINE = os.getenv("METRICS_SNAPSHOT_INLINE", "0") == "1"
+# Sessions are bucketed by started_at, so a timer that runs past midnight or
+# syncs late still lands on a day before the snapshot; keep one day open.
+REOPEN_DAYS = 1
+
+# Headline numbers kept live by write paths between refreshes.
+COUNTERS = ("total_users", "total_sessions", "total_study_minutes")
+
+_snapshots = models.MetricsSnapshot.__table__
+_counters = models.MetricsCounter.__table__
+
+
+def _not_archived(user_col):
+    """Rows whose user isn't archived — an anti-join, not an id list."""
+    return ~exists().where(models.User.id == user_col, models.User.is_archived == True)
+
+
+def _day_key(value) -> str:
+    # func.date() is a 'YYYY-MM-DD' string on SQLite and a date on Postgres.
+    return str(value)[:10]
+
+
+def _sum_if(condition, value=1):
+    return func.coalesce(func.sum(case((condition, value), else_=0)), 0)
+
+
+# ─── Engagement sources ──────────────────────────────────────────────────
+# (name, id column, timestamp column, owning user column, filters,
+#  exclude archived from the headline total). Feed reactions have always
+# counted archived users in the total but not in the chart.
+
+def _engagement_sources():
+    return [
+        ("friendships", models.Friendship.id, models.Friendship.created_at, models.Friendship.user_id,
+         [models.Friendship.status == "accepted"], True),
+        ("groups_created", models.StudyGroup.id, models.StudyGroup.created_at, models.StudyGroup.creator_id,
+         [], True),
+        ("feed_reactions", models.FeedReaction.id, models.FeedReaction.created_at, models.FeedReaction.user_id,
+         [], False),
+        ("user_subjects", models.UserSubject.id, models.UserSubject.added_at, models.UserSubject.user_id,
+         [], True),
+        ("tasks_created", models.Task.id, models.Task.created_at, models.Task.user_id,
+         [], True),
+        ("tip_views", models.TipView.id, models.TipView.viewed_at, models.TipView.user_id,
+         [], True),
+        ("tip_likes", models.TipView.id, models.TipView.viewed_at, models.TipView.user_id,
+         [models.TipView.liked == True], True),
+        ("tip_saves", models.TipView.id, models.TipView.saved_at, models.TipView.user_id,
+         [models.TipView.saved == True], True),
+    ]
+
+
+# ─── Totals ──────────────────────────────────────────────────────────────
+
+def _totals(db: Session, now: datetime) -> dict:
+    week_ago = now - timedelta(days=7)
+    month_ago = now - timedelta(days=30)
+    User, Session_ = models.User, models.StudySession
+    real = models.User.is_archived.isnot(True)
+
+    total_users, archived_users, active_7d, signups_7d, signups_30d = db.query(
+        func.count(User.id),
+        _sum_if(User.is_archived == True),
+        _sum_if(User.last_study_date >= week_ago),
+        _sum_if(User.created_at >= week_ago),
+        _sum_if(User.created_at >= month_ago),
+    ).one()
+
+    sessions, minutes, real_sessions, real_minutes = (
+        db.query(
+            func.count(Session_.id),
+            func.coalesce(func.sum(Session_.duration_minutes), 0),
+            _sum_if(real),
+            _sum_if(real, Session_.duration_minutes),
+        )
+        .select_from(Session_)
+        .outerjoin(User, User.id == Session_.user_id)
+        .one()
+    )
+    animals, real_animals = (
+        db.query(func.count(models.UserAnimal.id), _sum_if(real))
+        .select_from(models.UserAnimal)
+        .outerjoin(User, User.id == models.UserAnimal.user_id)
+        .one()
+    )
+    donated, donation_count, real_donated, real_donation_count = (
+        db.query(
+            func.coalesce(func.sum(models.Donation.amount), 0),
+            func.count(models.Donation.id),
+            _sum_if(real, models.Donation.amount),
+            _sum_if(real),
+        )
+        .select_from(models.Donation)
+        .outerjoin(User, User.id == models.Donation.user_id)
+        .one()
+    )
+
+    out = {
+        "total_users": total_users,
+        "archived_users": int(archived_users),
+        "real_users": total_users - int(archived_users),
+        "active_users_7d": int(active_7d),
+        "signups_7d": int(signups_7d),
+        "signups_30d": int(signups_30d),
+        "total_sessions": sessions,
+        "total_study_minutes": int(minutes),
+        "total_animals_hatched": animals,
+        "total_donated": float(donated),
+        "total_donation_count": donation_count,
+        "real_sessions": int(real_sessions),
+        "real_study_minutes": int(real_minutes),
+        "real_animals_hatched": int(real_animals),
+        "real_donated": float(real_donated),
+        "real_donation_count": int(real_donation_count),
+    }
+    for name, id_col, ts_col, user_col, filters, exclude_total in _engagement_sources():
+        q = db.query(func.count(id_col), _sum_if(ts_col >= week_ago)).filter(*filters)
+        if exclude_total:
+            q = q.filter(_not_archived(user_col))
+        total, last_7d = q.one()
+        out[f"total_{name}"] = total
+        out[f"{name}_7d"] = int(last_7d)
+    return out
+
+
+# ─── Daily / weekly / monthly series ─────────────────────────────────────
+
+def _merge_daily(previous: Optional[list[dict]], fresh: dict[str, dict], date_keys: list[str],
+                 since_key: str, zero: dict) -> list[dict]:
+    """Closed days from the previous snapshot, open days from `fresh`."""
+    kept = {row["date"]: row for row in previous or [] if row["date"] < since_key}
+    return [
+        kept.get(k, {"date": k, **zero}) if k < since_key else {"date": k, **fresh.get(k, zero)}
+        for k in date_keys
+    ]
+
+
+def _merge_buckets(previous: Optional[list[dict]], fresh: dict[date, set], since: date) -> list[dict]:
+    kept = [row for row in previous or [] if row["date"] < since.isoformat()]
+    return kept + [
+        {"date": start.strftime("%Y-%m-%d"), "count": len(users)}
+        for start, users in sorted(fresh.items())
+        if start >= since
+    ]
+
+
+def _series(db: Session, now: datetime, since: date, previous: Optional[dict]) -> dict:
+    apr1 = datetime(now.year, 4, 1)
+    num_days = (now - apr1).days + 1
+    date_keys = [(apr1 + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(num_days)]
+    since_key = since.isoformat()
+    previous = previous or {}
+    out: dict = {}
+
+    # Signups + eventual activation: activation changes for old cohorts
+    # whenever someone studies for the first time, so this is always read
+    # in full (one grouped query over users since apr1).
+    User, Session_ = models.User, models.StudySession
+    day = func.date(User.created_at)
+    activated = exists().where(Session_.user_id == User.id)
+    signups: dict[str, dict] = {}
+    activations: dict[str, dict] = {}
+    for k, signed, act in (
+        db.query(day, func.count(User.id), _sum_if(activated))
+        .filter(User.created_at >= apr1, User.is_archived.isnot(True))
+        .group_by(day)
+    ):
+        signups[_day_key(k)] = {"count": signed}
+        activations[_day_key(k)] = {"count": int(act)}
+    out["daily_signups"] = _merge_daily(None, signups, date_keys, "", {"count": 0})
+    out["daily_signups_activated"] = _merge_daily(None, activations, date_keys, "", {"count": 0})
+
+    # Study activity. Daily buckets reopen at `since`; weekly / monthly
+    # distinct-user buckets reopen at the start of the week / month that
+    # contains it, so a reopened bucket is always recounted in full.
+    since_dt = datetime.combine(since, datetime.min.time())
+    week_since = since - timedelta(days=since.weekday())
+    month_since = since.replace(day=1)
+    read_from = max(apr1, datetime.combine(min(week_since, month_since), datetime.min.time()))
+
+    day = func.date(Session_.started_at)
+    active: dict[str, dict] = {}
+    sessions: dict[str, dict] = {}
+    for k, users, count, minutes in (
+        db.query(
+            day,
+            func.count(func.distinct(Session_.user_id)),
+            func.count(Session_.id),
+            func.coalesce(func.sum(Session_.duration_minutes), 0),
+        )
+        .filter(Session_.started_at >= max(apr1, since_dt))
+        .group_by(day)
+    ):
+        active[_day_key(k)] = {"count": users}
+        sessions[_day_key(k)] = {"sessions": count, "minutes": int(minutes)}
+    out["daily_active"] = _merge_daily(previous.get("daily_active"), active, date_keys, since_key, {"count": 0})
+    out["daily_sessions"] = _merge_daily(
+        previous.get("daily_sessions"), sessions, date_keys, since_key, {"sessions": 0, "minutes": 0},
+    )
+
+    weekly: dict[date, set] = defaultdict(set)
+    monthly: dict[date, set] = defaultdict(set)
+    for user_id, k in (
+        db.query(Session_.user_id, day)
+        .filter(Session_.started_at >= read_from, Session_.user_id.isnot(None))
+        .distinct()
+    ):
+        d = date.fromisoformat(_day_key(k))
+        weekly[d - timedelta(days=d.weekday())].add(user_id)
+        monthly[d.replace(day=1)].add(user_id)
+    out["weekly_active"] = _merge_buckets(previous.get("weekly_active"), weekly, week_since)
+    out["monthly_active"] = _merge_buckets(previous.get("monthly_active"), monthly, month_since)
+
+    for name, _id_col, ts_col, user_col, filters, _ in _engagement_sources():
+        day = func.date(ts_col)
+        counts = {
+            _day_key(k): {"count": n}
+            for k, n in db.query(day, func.count())
+            .filter(*filters, ts_col >= max(apr1, since_dt), _not_archived(user_col))
+            .group_by(day)
+        }
+        key = f"daily_{name}"
+        out[key] = _merge_daily(previous.get(key), counts, date_keys, since_key, {"count": 0})
+    return out
+
+
+def compute(db: Session, now: datetime, funnel: Callable[[Session], dict],
+            previous: Optional[dict] = None, since: Optional[date] = None) -> dict:
+    """The full /admin/overview payload. With `previous` and `since`, series
+    buckets before `since` are copied from `previous` instead of re-read."""
+    apr1 = date(now.year, 4, 1)
+    if previous is None or since is None or since < apr1:
+        previous, since = None, apr1
+    payload = _totals(db, now)
+    payload.update(_series(db, now, since, previous))
+    payload["funnel"] = funnel(db)
+    return payload
+
+
+# ─── Snapshot storage ────────────────────────────────────────────────────
+
+def _upsert(db: Session, table, index_col, values: dict, set_: dict):
+    insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    stmt = insert(table).values(**values)
+    db.execute(stmt.on_conflict_do_update(index_elements=[index_col], set_=set_))
+
+
+def _series_start(payload: dict) -> Optional[str]:
+    rows = payload.get("daily_signups") or []
+    return rows[0]["date"] if rows else None
+
+
+def refresh(db: Session, funnel: Callable[[Session], dict], full: bool = False) -> models.MetricsSnapshot:
+    """Recompute and store the snapshot (incrementally unless `full`, the
+    snapshot is dirty or the last full rebuild is too old), then rebase
+    the live counters on it."""
+    started = time.monotonic()
+    now = datetime.utcnow()
+    row = db.get(models.MetricsSnapshot, SNAPSHOT_KEY)
+    full = (
+        full or row is None or row.dirty_at is not None
+        or row.full_rebuild_at <= now - timedelta(hours=FULL_REBUILD_HOURS)
+    )
+    previous = None if full else row.payload
+    apr1_key = date(now.year, 4, 1).isoformat()
+    if previous is not None and _series_start(previous) not in (None, apr1_key):
+        previous, full = None, True  # new year: the series restart on April 1
+    since = None if full else (row.computed_at - timedelta(days=REOPEN_DAYS)).date()
+
+    payload = compute(db, now, funnel, previous=previous, since=since)
+    build_ms = int((time.monotonic() - started) * 1000)
+    full_rebuild_at = now if full else row.full_rebuild_at
+    _upsert(
+        db, _snapshots, _snapshots.c.key,
+        values={"key": SNAPSHOT_KEY, "payload": payload, "computed_at": now,
+                "full_rebuild_at": full_rebuild_at, "build_ms": build_ms, "dirty_at": None},
+        set_={
+            "payload": payload, "computed_at": now, "full_rebuild_at": full_rebuild_at,
+            "build_ms": build_ms,
+            # Keep a dirty mark that arrived while this rebuild was running.
+            "dirty_at": case((_snapshots.c.dirty_at > now, _snapshots.c.dirty_at), else_=None),
+        },
+    )
+    for name in COUNTERS:
+        _upsert(
+            db, _counters, _counters.c.name,
+            values={"name": name, "value": payload[name], "updated_at": now},
+            set_={"value": payload[name], "updated_at": now},
+        )
+    db.commit()
+    logger.info(f"Metrics snapshot refreshed ({'full' if full else 'incremental'}) in {build_ms}ms")
+    db.expire_all()
+    return db.get(models.MetricsSnapshot, SNAPSHOT_KEY)
+
+
+def mark_dirty(db: Session) -> None:
+    """Force the next refresh to rebuild every bucket. Joins the caller's
+    transaction."""
+    db.execute(
+        update(_snapshots).where(_snapshots.c.key == SNAPSHOT_KEY).values(dirty_at=datetime.utcnow())
+    )
+
+
+def load(db: Session, funnel: Callable[[Session], dict], refresh_now: bool = False) -> dict:
+    """Latest snapshot with live counters applied and its freshness. Builds
+    it synchronously the first time (or always, with INLINE)."""
+    row = db.get(models.MetricsSnapshot, SNAPSHOT_KEY)
+    if row is None or INLINE or refresh_now:
+        row = refresh(db, funnel, full=INLINE)
+    payload = dict(row.payload)
+    for name, value in db.query(models.MetricsCounter.name, models.MetricsCounter.value).filter(
+        models.MetricsCounter.name.in_(COUNTERS)
+    ):
+        payload[name] = value
+    payload["real_users"] = payload["total_users"] - payload["archived_users"]
+    now = datetime.utcnow()
+    payload["snapshot"] = {
+        "computed_at": row.computed_at.isoformat(),
+        "age_seconds": round((now - row.computed_at).total_seconds(), 1),
+        "full_rebuild_at": row.full_rebuild_at.isoformat(),
+        "build_ms": row.build_ms,
+        "refresh_interval_minutes": SNAPSHOT_INTERVAL_MINUTES,
+    }
+    return payload
+
+
+# ─── Write-path counters ─────────────────────────────────────────────────
+
+_lock = threading.Lock()
+_pending: dict[str, int] = defaultdict(int)
+
+
+def bump(name: str, delta: int = 1) -> None:
+    """Add to a live counter. In-process only; never touches the database."""
+    if delta:
+        with _lock:
+            _pending[name] += delta
+
+
+def flush_counters(db: Session) -> int:
+    """Fold this process's buffered deltas into metrics_counters in one
+    statement. Counters that don't exist yet are skipped: the first refresh
+    creates them from the real totals. Returns the counters touched."""
+    global _pending
+    with _lock:
+        batch, _pending = _pending, defaultdict(int)
+    batch = {name: delta for name, delta in batch.items() if delta}
+    if not batch:
+        return 0
+    try:
+        db.execute(
+            update(_counters)
+            .where(_counters.c.name == bindparam("counter"))
+            .values(value=_counters.c.value + bindparam("delta"), updated_at=datetime.utcnow()),
+            [{"counter": name, "delta": delta} for name, delta in batch.items()],
+        )
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        with _lock:
+            for name, delta in batch.items():
+                _pending[name] += delta
+        logger.warning(f"Metrics counter flush failed ({len(batch)} counters requeued): {e}")
+        return 0
+    return len(batch)
+
+
+def reset() -> None:
+    """Drop buffered deltas (tests)."""
+    with _lock:
+        _pending.clear()
@@ -19,18 +19,34 @@ Design
   We validate cheaply, anything else is dropped early with status='dropped'.
 - DeviceNotRegistered errors auto-clear the user's push_token so we stop
   spamming dead devices and they can re-register on next install.
-- We deliberately do NOT verify Expo receipts in real time (would require a
-  separate poll job). Tickets with status='ok' are stored as 'sent'. Add a
-  receipts cron job later if you want true delivery confirmation.
+- Tickets with status='ok' are stored as 'sent'. `poll_receipts` (cron, every
+  15 min) later asks Expo for the receipts and moves those rows to
+  'delivered' or 'failed', clearing tokens Expo reports as dead. Both set
+  `expo_receipt_id`, so a receipt failure still counts as an attempt in
+  `was_attempted()`: Expo accepted the push, and once-per-user templates
+  aren't re-sent because a device was briefly unreachable.
+
+Delivery engine
+---------------
+One process-wide keep-alive `httpx.Client` (HTTP/2 when `h2` is installed)
+is shared by every send, so a broadcast reuses a single connection instead
+of a TLS handshake per batch. `send_batch` fans batches of MAX_BATCH out
+over at most PUSH_MAX_IN_FLIGHT concurrent requests; the network runs on
+worker threads while the DB session stays on the caller's thread, and each
+batch's PushLog rows (plus dead-token clears) land in one commit.
 """
 from __future__ import annotations
 
 import logging
+import os
 import re
-from datetime import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
 from typing import Any, Iterable, Optional
 
 import httpx
+from sqlalchemy import insert, or_, update
 from sqlalchemy.orm import Session
 
 import models
@@ -41,6 +57,17 @@ EXPO_PUSH_URL = "https://exp.host/--/api/v2/push/send"
 EXPO_RECEIPTS_URL = "https://exp.host/--/api/v2/push/getReceipts"
 TOKEN_RE = re.compile(r"^Expo(nentPushToken)?\[[A-Za-z0-9_-]+\]$")
 MAX_BATCH = 100
+MAX_RECEIPT_IDS = 1000  # Expo's cap per getReceipts request
+MAX_IN_FLIGHT = int(os.getenv("PUSH_MAX_IN_FLIGHT", "4"))
+# Receipts show up ~15 min after the ticket and Expo keeps them for 24h.
+RECEIPT_MIN_AGE = timedelta(minutes=15)
+RECEIPT_MAX_AGE = timedelta(hours=24)
+
+try:
+    import h2  # noqa: F401
+    HTTP2 = True
+except ImportError:  # pragma: no cover - h2 is in requirements.txt
+    HTTP2 = False
 
 
 # ─── Categories ──────────────────────────────────────────────────────────
@@ -79,6 +106,19 @@ def _user_can_receive(user: models.User, category: str) -> tuple[bool, str | Non
     return True, None
 
 
+def can_receive(user: models.User, category: str) -> bool:
+    return _user_can_receive(user, category)[0]
+
+
+def was_attempted():
+    """PushLog rows that count as "already sent" for once-per-user
+    templates: accepted by Expo, whatever its receipt later said."""
+    return or_(
+        models.PushLog.status.in_(["sent", "delivered"]),
+        models.PushLog.expo_receipt_id.isnot(None),
+    )
+
+
 def _render(template: models.PushTemplate, variables: dict) -> tuple[str, str]:
     """Render {placeholder} variables into title/body. Mirrors EmailTemplate logic."""
     title = template.title or ""
@@ -92,6 +132,45 @@ def _render(template: models.PushTemplate, variables: dict) -> tuple[str, str]:
 
 # ─── Low-level send ──────────────────────────────────────────────────────
 
+_client: Optional[httpx.Client] = None
+_client_lock = threading.Lock()
+
+
+def _get_client() -> httpx.Client:
+    """Process-wide keep-alive client. httpx.Client is thread-safe, so the
+    batch workers share its connection pool."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = httpx.Client(
+                    http2=HTTP2,
+                    timeout=10.0,
+                    limits=httpx.Limits(
+                        max_connections=MAX_IN_FLIGHT,
+                        max_keepalive_connections=MAX_IN_FLIGHT,
+                    ),
+                    headers={
+                        "accept": "application/json",
+                        "accept-encoding": "gzip, deflate",
+                        "content-type": "application/json",
+                    },
+                )
+    return _client
+
+
+def close_client() -> None:
+    """Close the shared client (app shutdown; tests)."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            try:
+                _client.close()
+            except Exception:
+                pass
+            _client = None
+
+
 def _post_to_expo(messages: list[dict]) -> list[dict]:
     """POST a batch (≤100) to Expo. Returns the per-message ticket array.
 
@@ -100,15 +179,9 @@ def _post_to_expo(messages: list[dict]) -> list[dict]:
     """
     if not messages:
         return []
-    headers = {
-        "accept": "application/json",
-        "accept-encoding": "gzip, deflate",
-        "content-type": "application/json",
-    }
-    with httpx.Client(timeout=10.0) as client:
-        resp = client.post(EXPO_PUSH_URL, json=messages, headers=headers)
-        resp.raise_for_status()
-        payload = resp.json()
+    resp = _get_client().post(EXPO_PUSH_URL, json=messages)
+    resp.raise_for_status()
+    payload = resp.json()
     data = payload.get("data") if isinstance(payload, dict) else payload
     if data is None:
         return []
@@ -117,8 +190,19 @@ def _post_to_expo(messages: list[dict]) -> list[dict]:
     return list(data)
 
 
-def _log(
-    db: Session,
+def _fetch_receipts(ticket_ids: list[str]) -> dict[str, dict]:
+    """POST ticket ids (≤1000) to Expo's receipts endpoint. Returns
+    {ticket_id: receipt}; tickets whose receipt isn't ready are absent."""
+    if not ticket_ids:
+        return {}
+    resp = _get_client().post(EXPO_RECEIPTS_URL, json={"ids": ticket_ids})
+    resp.raise_for_status()
+    payload = resp.json()
+    data = payload.get("data") if isinstance(payload, dict) else None
+    return data if isinstance(data, dict) else {}
+
+
+def _log_row(
     *,
     user_id: int | None,
     push_token: str | None,
@@ -130,20 +214,26 @@ def _log(
     expo_ticket_id: str | None = None,
     error_code: str | None = None,
     error_message: str | None = None,
-) -> None:
+) -> dict:
+    """Column values for one PushLog row. Every row carries the same keys so
+    a list of them can go straight into one executemany INSERT."""
+    return {
+        "user_id": user_id,
+        "push_token": push_token,
+        "template_key": template_key,
+        "category": category,
+        "title": title,
+        "body": body,
+        "expo_ticket_id": expo_ticket_id,
+        "status": status,
+        "error_code": error_code,
+        "error_message": (error_message or "")[:500] if error_message else None,
+    }
+
+
+def _log(db: Session, **fields) -> None:
     try:
-        db.add(models.PushLog(
-            user_id=user_id,
-            push_token=push_token,
-            template_key=template_key,
-            category=category,
-            title=title,
-            body=body,
-            expo_ticket_id=expo_ticket_id,
-            status=status,
-            error_code=error_code,
-            error_message=(error_message or "")[:500] if error_message else None,
-        ))
+        db.add(models.PushLog(**_log_row(**fields)))
         db.commit()
     except Exception as e:
         # Never let a logging failure break the caller. Rollback so the parent
@@ -155,6 +245,37 @@ def _log(
             pass
 
 
+def _write_batch(db: Session, rows: list[dict], dead: Optional[list[tuple[int, str]]] = None) -> bool:
+    """Insert a batch of PushLog rows and clear dead tokens in one commit.
+
+    `dead` is (user_id, token) pairs; a token is only cleared if the user
+    hasn't registered a new one since the send.
+    """
+    try:
+        if rows:
+            db.execute(insert(models.PushLog), rows)
+        if dead:
+            db.execute(
+                update(models.User)
+                .where(
+                    models.User.id.in_({uid for uid, _ in dead}),
+                    models.User.push_token.in_({tok for _, tok in dead}),
+                )
+                .values(push_token=None, push_token_updated_at=datetime.utcnow())
+            )
+        db.commit()
+        if dead:
+            logger.info(f"Cleared {len(dead)} dead push_token(s)")
+        return True
+    except Exception as e:
+        logger.error(f"PushLog batch write failed ({len(rows)} rows): {e}")
+        try:
+            db.rollback()
+        except Exception:
+            pass
+        return False
+
+
 def _handle_device_not_registered(db: Session, user: models.User) -> None:
     """When Expo says the token is dead, clear it so we stop sending."""
     try:
@@ -169,6 +290,34 @@ def _handle_device_not_registered(db: Session, user: models.User) -> None:
             pass
 
 
+def _message(
+    token: str, title: str, body: str, category: str,
+    template_key: str | None, deep_link: str | None, data: dict | None,
+) -> dict:
+    data_payload: dict[str, Any] = {"category": category, **(data or {})}
+    if template_key:
+        data_payload["template_key"] = template_key
+    if deep_link:
+        data_payload["deep_link"] = deep_link
+    msg: dict[str, Any] = {
+        "to": token,
+        "title": title[:80],
+        "body": body[:220],
+        "sound": "default",
+        "priority": "high",
+        "data": data_payload,
+    }
+    if category == "badge":
+        msg["badge"] = 1  # bump app icon badge
+    return msg
+
+
+def _ticket_error(ticket: Any) -> tuple[str | None, str | None]:
+    if not isinstance(ticket, dict):
+        return None, None
+    return (ticket.get("details") or {}).get("error"), ticket.get("message")
+
+
 # ─── Public API ──────────────────────────────────────────────────────────
 
 def send_to_user(
@@ -195,22 +344,7 @@ def send_to_user(
         )
         return {"ok": False, "status": "dropped", "reason": reason}
 
-    data_payload: dict[str, Any] = {"category": category, **(data or {})}
-    if template_key:
-        data_payload["template_key"] = template_key
-    if deep_link:
-        data_payload["deep_link"] = deep_link
-    msg: dict[str, Any] = {
-        "to": user.push_token,
-        "title": title[:80],
-        "body": body[:220],
-        "sound": "default",
-        "priority": "high",
-        "data": data_payload,
-    }
-    if category == "badge":
-        msg["badge"] = 1  # bump app icon badge
-
+    msg = _message(user.push_token, title, body, category, template_key, deep_link, data)
     try:
         tickets = _post_to_expo([msg])
     except Exception as e:
@@ -231,8 +365,7 @@ def send_to_user(
         )
         return {"ok": True, "status": "sent", "ticket_id": ticket.get("id")}
 
-    err = (ticket.get("details") or {}).get("error") if isinstance(ticket, dict) else None
-    msg_err = ticket.get("message") if isinstance(ticket, dict) else None
+    err, msg_err = _ticket_error(ticket)
     _log(
         db, user_id=user.id, push_token=user.push_token, template_key=template_key,
         category=category, title=title, body=body, status="failed",
@@ -269,7 +402,7 @@ def send_template_to_user(
         already = db.query(models.PushLog.id).filter(
             models.PushLog.user_id == user.id,
             models.PushLog.template_key == template_key,
-            models.PushLog.status == "sent",
+            was_attempted(),
         ).first()
         if already:
             return {"ok": False, "status": "dropped", "reason": "already_sent"}
@@ -285,6 +418,176 @@ def send_template_to_user(
     )
 
 
+class PushItem:
+    """One outgoing push for `send_batch`: an already-rendered title/body
+    addressed to a user.
+
+    The user's id and token are captured at construction so batch workers
+    and post-commit logging never touch the (expired, thread-bound) ORM row.
+    """
+    __slots__ = (
+        "user", "user_id", "push_token", "title", "body",
+        "category", "template_key", "deep_link", "data",
+    )
+
+    def __init__(
+        self,
+        user: models.User,
+        title: str,
+        body: str,
+        *,
+        category: str = "marketing",
+        template_key: str | None = None,
+        deep_link: str | None = None,
+        data: dict | None = None,
+    ):
+        self.user = user
+        self.user_id = user.id
+        self.push_token = user.push_token
+        self.title = title
+        self.body = body
+        self.category = category
+        self.template_key = template_key
+        self.deep_link = deep_link
+        self.data = data
+
+    def message(self) -> dict:
+        return _message(
+            self.push_token, self.title, self.body, self.category,
+            self.template_key, self.deep_link, self.data,
+        )
+
+    def log_row(self, status: str, **extra) -> dict:
+        return _log_row(
+            user_id=self.user_id, push_token=self.push_token,
+            template_key=self.template_key, category=self.category,
+            title=self.title, body=self.body, status=status, **extra,
+        )
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_IN_FLIGHT, thread_name_prefix="expo-push")
+        return _executor
+
+
+def _settle(chunk: list[PushItem], tickets: list[dict], error: Exception | None):
+    """Turn one batch's tickets into (log rows, dead tokens, per-item results)."""
+    rows: list[dict] = []
+    dead: list[tuple[int, str]] = []
+    results: list[dict] = []
+    if error is not None:
+        for item in chunk:
+            rows.append(item.log_row("failed", error_code="network_error", error_message=str(error)))
+            results.append({"ok": False, "status": "failed", "reason": "network_error"})
+        return rows, dead, results
+    for i, item in enumerate(chunk):
+        ticket = tickets[i] if i < len(tickets) else {}
+        if ticket.get("status") == "ok":
+            rows.append(item.log_row("sent", expo_ticket_id=ticket.get("id")))
+            results.append({"ok": True, "status": "sent", "ticket_id": ticket.get("id")})
+            continue
+        err, msg_err = _ticket_error(ticket)
+        if not ticket:
+            err = "missing_ticket"  # Expo returned fewer tickets than messages
+        rows.append(item.log_row("failed", error_code=err, error_message=msg_err))
+        results.append({"ok": False, "status": "failed", "reason": err or msg_err})
+        if err == "DeviceNotRegistered":
+            dead.append((item.user_id, item.push_token))
+    return rows, dead, results
+
+
+def send_batch(db: Session, items: Iterable[PushItem]) -> dict:
+    """Send many pushes. Returns aggregate counts plus per-item `results`
+    aligned with `items`.
+
+    Items failing the prefs check are logged as dropped without touching the
+    network. The rest go out in batches of MAX_BATCH, up to MAX_IN_FLIGHT
+    at once; each batch's PushLog rows are written in a single commit as it
+    completes. Network errors fail that batch only. The caller's transaction
+    is committed before the first request so no connection is held open
+    while waiting on Expo.
+    """
+    items = list(items)
+    results: list[Optional[dict]] = [None] * len(items)
+    dropped_rows: list[dict] = []
+    eligible: list[tuple[int, PushItem]] = []
+    for idx, item in enumerate(items):
+        allowed, reason = _user_can_receive(item.user, item.category)
+        if allowed:
+            eligible.append((idx, item))
+        else:
+            dropped_rows.append(item.log_row("dropped", error_code=reason))
+            results[idx] = {"ok": False, "status": "dropped", "reason": reason}
+    _write_batch(db, dropped_rows)
+
+    chunks = [eligible[i:i + MAX_BATCH] for i in range(0, len(eligible), MAX_BATCH)]
+    # Build payloads here: workers only see plain dicts.
+    payloads = [[it.message() for _, it in chunk] for chunk in chunks]
+
+    def _post(i):
+        return _post_to_expo(payloads[i])
+
+    def _outcomes():
+        if len(chunks) == 1:
+            # Nothing to overlap; skip the pool hop.
+            try:
+                yield chunks[0], _post(0), None
+            except Exception as e:
+                yield chunks[0], [], e
+            return
+        futures = {_get_executor().submit(_post, i): chunk for i, chunk in enumerate(chunks)}
+        for fut in as_completed(futures):
+            try:
+                yield futures[fut], fut.result(), None
+            except Exception as e:
+                yield futures[fut], [], e
+
+    sent = failed = 0
+    for chunk, tickets, error in _outcomes():
+        if error is not None:
+            logger.error(f"Expo push batch failed ({len(chunk)} msgs): {error}")
+        rows, dead, chunk_results = _settle([it for _, it in chunk], tickets, error)
+        _write_batch(db, rows, dead)
+        for (idx, _), res in zip(chunk, chunk_results):
+            results[idx] = res
+            if res["ok"]:
+                sent += 1
+            else:
+                failed += 1
+
+    drops = len(dropped_rows)
+    return {
+        "sent": sent, "failed": failed, "dropped": drops,
+        "total": sent + failed + drops, "results": results,
+    }
+
+
+def send_templates(
+    db: Session,
+    sends: Iterable[tuple[models.User, models.PushTemplate, dict]],
+) -> dict:
+    """Render already-loaded templates per user and `send_batch` them.
+
+    For bulk jobs that resolved their (user, template, variables) triples up
+    front; avoids `send_template_to_user`'s per-call template lookup.
+    """
+    items = []
+    for user, tmpl, variables in sends:
+        title, body = _render(tmpl, variables)
+        items.append(PushItem(
+            user, title, body, category=tmpl.category,
+            template_key=tmpl.template_key, deep_link=tmpl.deep_link,
+        ))
+    return send_batch(db, items)
+
+
 def broadcast_to_users(
     db: Session,
     users: Iterable[models.User],
@@ -296,70 +599,86 @@ def broadcast_to_users(
     deep_link: str | None = None,
     data: dict | None = None,
 ) -> dict:
-    """Batch-send to many users. Returns aggregate counts.
+    """Send the same push to many users via `send_batch`. Returns aggregate
+    counts."""
+    result = send_batch(db, (
+        PushItem(
+            u, title, body, category=category, template_key=template_key,
+            deep_link=deep_link, data=data,
+        )
+        for u in users
+    ))
+    result.pop("results")
+    return result
 
-    Splits into chunks of 100 (Expo's max batch size). Drops users who fail
-    the prefs check before hitting the network. Logs every attempt.
-    """
-    eligible: list[models.User] = []
-    drops = 0
-    for u in users:
-        allowed, reason = _user_can_receive(u, category)
-        if allowed:
-            eligible.append(u)
-        else:
-            drops += 1
-            _log(
-                db, user_id=u.id, push_token=u.push_token, template_key=template_key,
-                category=category, title=title, body=body, status="dropped",
-                error_code=reason,
-            )
-    if not eligible:
-        return {"sent": 0, "dropped": drops, "failed": 0, "total": drops}
-
-    sent = 0
-    failed = 0
-    for i in range(0, len(eligible), MAX_BATCH):
-        chunk = eligible[i:i + MAX_BATCH]
-        messages = [{
-            "to": u.push_token,
-            "title": title[:80],
-            "body": body[:220],
-            "sound": "default",
-            "priority": "high",
-            "data": {"category": category, **(data or {}), **({"deep_link": deep_link} if deep_link else {})},
-        } for u in chunk]
 
+# ─── Receipts ────────────────────────────────────────────────────────────
+
+def poll_receipts(db: Session, now: datetime | None = None) -> dict:
+    """Resolve 'sent' PushLog rows against Expo's push receipts.
+
+    Rows between RECEIPT_MIN_AGE and RECEIPT_MAX_AGE old whose receipt
+    hasn't been recorded are looked up MAX_RECEIPT_IDS at a time. 'ok'
+    receipts become 'delivered'; errors become 'failed' with the error code
+    (still `was_attempted()`, via expo_receipt_id), and DeviceNotRegistered
+    clears the user's token. Receipts Expo hasn't
+    produced yet are retried on the next run. One commit per lookup.
+    """
+    now = now or datetime.utcnow()
+    pending = (
+        db.query(
+            models.PushLog.id, models.PushLog.expo_ticket_id,
+            models.PushLog.user_id, models.PushLog.push_token,
+        )
+        .filter(
+            models.PushLog.status == "sent",
+            models.PushLog.expo_ticket_id.isnot(None),
+            models.PushLog.expo_receipt_id.is_(None),
+            models.PushLog.sent_at <= now - RECEIPT_MIN_AGE,
+            models.PushLog.sent_at >= now - RECEIPT_MAX_AGE,
+        )
+        .order_by(models.PushLog.id)
+        .all()
+    )
+    counts = {"checked": len(pending), "delivered": 0, "failed": 0, "pending": 0}
+    for i in range(0, len(pending), MAX_RECEIPT_IDS):
+        chunk = pending[i:i + MAX_RECEIPT_IDS]
         try:
-            tickets = _post_to_expo(messages)
+            receipts = _fetch_receipts([row.expo_ticket_id for row in chunk])
         except Exception as e:
-            logger.error(f"Expo broadcast batch failed ({len(chunk)} msgs): {e}")
-            for u in chunk:
-                failed += 1
-                _log(
-                    db, user_id=u.id, push_token=u.push_token, template_key=template_key,
-                    category=category, title=title, body=body, status="failed",
-                    error_code="network_error", error_message=str(e),
-                )
-            continue
-
-        for u, ticket in zip(chunk, tickets):
-            if ticket.get("status") == "ok":
-                sent += 1
-                _log(
-                    db, user_id=u.id, push_token=u.push_token, template_key=template_key,
-                    category=category, title=title, body=body, status="sent",
-                    expo_ticket_id=ticket.get("id"),
-                )
+            logger.error(f"Expo receipts lookup failed ({len(chunk)} ids): {e}")
+            counts["pending"] += len(pending) - i
+            break
+
+        delivered: list[dict] = []
+        failures: list[dict] = []
+        dead: list[tuple[int, str]] = []
+        for row in chunk:
+            receipt = receipts.get(row.expo_ticket_id)
+            if receipt is None:
+                counts["pending"] += 1
+            elif receipt.get("status") == "ok":
+                delivered.append({"id": row.id, "status": "delivered", "expo_receipt_id": row.expo_ticket_id})
             else:
-                failed += 1
-                err = (ticket.get("details") or {}).get("error") if isinstance(ticket, dict) else None
-                _log(
-                    db, user_id=u.id, push_token=u.push_token, template_key=template_key,
-                    category=category, title=title, body=body, status="failed",
-                    error_code=err, error_message=ticket.get("message"),
-                )
-                if err == "DeviceNotRegistered":
-                    _handle_device_not_registered(db, u)
-
-    return {"sent": sent, "failed": failed, "dropped": drops, "total": sent + failed + drops}
+                err, msg_err = _ticket_error(receipt)
+                failures.append({
+                    "id": row.id, "status": "failed", "expo_receipt_id": row.expo_ticket_id,
+                    "error_code": err, "error_message": (msg_err or "")[:500] or None,
+                })
+                if err == "DeviceNotRegistered" and row.user_id and row.push_token:
+                    dead.append((row.user_id, row.push_token))
+        try:
+            # Bulk UPDATE by primary key: one executemany per shape.
+            if delivered:
+                db.execute(update(models.PushLog), delivered)
+            if failures:
+                db.execute(update(models.PushLog), failures)
+        except Exception as e:
+            logger.error(f"PushLog receipt update failed: {e}")
+            db.rollback()
+            continue
+        if not _write_batch(db, [], dead):
+            continue
+        counts["delivered"] += len(delivered)
+        counts["failed"] += len(failures)
+    return counts
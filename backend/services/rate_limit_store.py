@@ -0,0 +1,235 @@
+"""Shared storage for slowapi rate limits.
+
+`Limiter(key_func=get_remote_address)` used slowapi's default in-memory
+storage, so a limit like `30/hour` on /sessions/{id}/complete was really
+30/hour *per Uvicorn worker*, and every deploy reset it. Limits now live
+somewhere all workers share:
+
+- `endura-db://` (default) — `DBStorage` below, counters in the
+  `rate_limit_counters` table of whatever DATABASE_URL points at.
+- Anything `limits` understands, via RATE_LIMIT_STORAGE_URI — e.g.
+  `redis://host:6379/0` (needs the `redis` package) or `memory://`.
+
+The limiter uses the sliding-window-counter strategy: each limit keeps two
+fixed-window counters (current and previous) and weighs the previous one by
+how much of it still overlaps the window. `DBStorage` implements it on top of
+one atomic upsert per hit — `INSERT … ON CONFLICT DO UPDATE … RETURNING`,
+which restarts a counter in place once it has expired — so concurrent
+workers never lose increments.
+
+Expired rows are not deleted on the request path one by one: at most once
+per SWEEP_INTERVAL_SECONDS, whichever request gets there first deletes all
+of them in one statement.
+
+`stats()` reports per-route allowed/blocked counts for this process (GET
+/admin/rate-limits), plus sweep totals.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import defaultdict
+from math import floor
+from typing import Optional
+
+from limits.storage import SlidingWindowCounterSupport, Storage
+from limits.storage.base import TimestampedSlidingWindow
+from sqlalchemy import case, delete, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+import models
+
+STORAGE_URI = os.getenv("RATE_LIMIT_STORAGE_URI") or "endura-db://"
+SWEEP_INTERVAL_SECONDS = 60
+
+_table = models.RateLimitCounter.__table__
+
+_metrics_lock = threading.Lock()
+_allowed: dict[str, int] = defaultdict(int)
+_blocked: dict[str, int] = defaultdict(int)
+_sweeps = {"runs": 0, "deleted": 0, "last_at": None}
+
+
+_GRANULARITIES = {"second", "minute", "hour", "day", "month", "year"}
+
+
+def _route(key: str) -> str:
+    # LIMITER/<client>/<route path>/<amount>/<multiples>/<granularity>[/<window>];
+    # the route path itself contains slashes.
+    parts = key.split("/")
+    for i in range(len(parts) - 1, 4, -1):
+        if parts[i] in _GRANULARITIES:
+            return "/".join(parts[2:i - 2]) or key
+    return key
+
+
+def _record(key: str, allowed: bool) -> None:
+    with _metrics_lock:
+        (_allowed if allowed else _blocked)[_route(key)] += 1
+
+
+def stats() -> dict:
+    with _metrics_lock:
+        routes = {
+            route: {"allowed": _allowed.get(route, 0), "blocked": _blocked.get(route, 0)}
+            for route in sorted(set(_allowed) | set(_blocked))
+        }
+        return {"storage": STORAGE_URI.split("://", 1)[0], "routes": routes, "sweeps": dict(_sweeps)}
+
+
+def reset_stats() -> None:
+    with _metrics_lock:
+        _allowed.clear()
+        _blocked.clear()
+        _sweeps.update(runs=0, deleted=0, last_at=None)
+
+
+class DBStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    """`limits` storage backed by the rate_limit_counters table."""
+
+    STORAGE_SCHEME = ["endura-db"]
+
+    def __init__(
+        self,
+        uri: Optional[str] = None,
+        wrap_exceptions: bool = False,
+        engine: Optional[Engine] = None,
+        **_,
+    ):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions)
+        if engine is None:
+            from database import engine
+        self._engine = engine
+        self._insert = postgresql.insert if engine.dialect.name == "postgresql" else sqlite.insert
+        self._sweep_lock = threading.Lock()
+        self._next_sweep = 0.0
+
+    @property
+    def base_exceptions(self):
+        return SQLAlchemyError
+
+    # ── Counters ──
+
+    def incr(self, key: str, expiry: float, amount: int = 1) -> int:
+        now = time.time()
+        self._maybe_sweep(now)
+        stmt = self._insert(_table).values(key=key, count=amount, expires_at=now + expiry)
+        expired = _table.c.expires_at <= now
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[_table.c.key],
+            set_={
+                "count": case((expired, amount), else_=_table.c.count + amount),
+                "expires_at": case((expired, now + expiry), else_=_table.c.expires_at),
+            },
+        ).returning(_table.c.count)
+        with self._engine.begin() as conn:
+            return conn.execute(stmt).scalar_one()
+
+    def decr(self, key: str, amount: int = 1) -> None:
+        with self._engine.begin() as conn:
+            conn.execute(
+                update(_table)
+                .where(_table.c.key == key, _table.c.count >= amount)
+                .values(count=_table.c.count - amount)
+            )
+
+    def _counts(self, *keys: str) -> dict[str, tuple[int, float]]:
+        """{key: (count, expires_at)} for keys whose window hasn't expired."""
+        with self._engine.connect() as conn:
+            rows = conn.execute(
+                select(_table.c.key, _table.c.count, _table.c.expires_at).where(
+                    _table.c.key.in_(keys), _table.c.expires_at > time.time()
+                )
+            ).all()
+        return {k: (c, e) for k, c, e in rows}
+
+    def get(self, key: str) -> int:
+        return self._counts(key).get(key, (0, 0.0))[0]
+
+    def get_expiry(self, key: str) -> float:
+        return self._counts(key).get(key, (0, time.time()))[1]
+
+    def clear(self, key: str) -> None:
+        with self._engine.begin() as conn:
+            conn.execute(delete(_table).where(_table.c.key == key))
+
+    def check(self) -> bool:
+        try:
+            with self._engine.connect() as conn:
+                conn.execute(select(1))
+            return True
+        except SQLAlchemyError:
+            return False
+
+    def reset(self) -> Optional[int]:
+        with self._engine.begin() as conn:
+            return conn.execute(delete(_table)).rowcount
+
+    # ── Sliding window counter (same arithmetic as limits' MemoryStorage) ──
+
+    def _window(self, previous_key: str, current_key: str, expiry: int, now: float) -> tuple[int, float, int, float]:
+        counts = self._counts(previous_key, current_key)
+        previous_count = counts.get(previous_key, (0, 0.0))[0]
+        current_count = counts.get(current_key, (0, 0.0))[0]
+        previous_ttl = (1 - (((now - expiry) / expiry) % 1)) * expiry if previous_count else 0.0
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return previous_count, previous_ttl, current_count, current_ttl
+
+    def acquire_sliding_window_entry(self, key: str, limit: int, expiry: int, amount: int = 1) -> bool:
+        if amount > limit:
+            _record(key, False)
+            return False
+        now = time.time()
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        previous_count, previous_ttl, current_count, _ = self._window(previous_key, current_key, expiry, now)
+        weight = previous_count * previous_ttl / expiry
+        if floor(weight + current_count) + amount > limit:
+            _record(key, False)
+            return False
+        # Counters live for two windows so the next one can still weigh it.
+        current_count = self.incr(current_key, 2 * expiry, amount=amount)
+        if floor(weight + current_count) > limit:
+            # Another worker won the race for the last slot.
+            self.decr(current_key, amount)
+            _record(key, False)
+            return False
+        _record(key, True)
+        return True
+
+    def get_sliding_window(self, key: str, expiry: int) -> tuple[int, float, int, float]:
+        now = time.time()
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        return self._window(previous_key, current_key, expiry, now)
+
+    def clear_sliding_window(self, key: str, expiry: int) -> None:
+        previous_key, current_key = self.sliding_window_keys(key, expiry, time.time())
+        with self._engine.begin() as conn:
+            conn.execute(delete(_table).where(_table.c.key.in_([previous_key, current_key])))
+
+    # ── Expiry ──
+
+    def _maybe_sweep(self, now: float) -> None:
+        if now < self._next_sweep or not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            if now < self._next_sweep:
+                return
+            self._next_sweep = now + SWEEP_INTERVAL_SECONDS
+            self.sweep(now)
+        finally:
+            self._sweep_lock.release()
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Delete every expired counter in one statement."""
+        with self._engine.begin() as conn:
+            deleted = conn.execute(
+                delete(_table).where(_table.c.expires_at <= (now or time.time()))
+            ).rowcount
+        with _metrics_lock:
+            _sweeps["runs"] += 1
+            _sweeps["deleted"] += deleted
+            _sweeps["last_at"] = time.time()
+        return deleted
@@ -0,0 +1,74 @@
+"""Per-user "unseen reactions" counter behind GET /feed/reactions/new.
+
+Every app polls that endpoint on a timer and almost every poll finds
+nothing. It used to run a friendship check, load the caller's last 30 days
+of events and scan `feed_reactions` each time. Instead one
+`feed_reaction_counters` row per user holds:
+
+    unseen   friends' reactions on my events I haven't been shown yet
+    version  bumped on every change, used as the poll's ETag
+
+`record_reaction` maintains it inside `crud.add_reaction`, so a poll is a
+single primary-key read — or a 304 when the client's If-None-Match still
+matches — and the full payload is only built when `unseen > 0`.
+"""
+from __future__ import annotations
+
+from typing import Optional
+
+from sqlalchemy import case
+from sqlalchemy.orm import Session
+
+import models
+
+
+def etag(counter: Optional[models.FeedReactionCounter]) -> str:
+    return f'W/"r{counter.version if counter else 0}"'
+
+
+def get(db: Session, user_id: int) -> Optional[models.FeedReactionCounter]:
+    return db.get(models.FeedReactionCounter, user_id)
+
+
+def record_reaction(db: Session, owner_id: int, new_unseen: bool) -> None:
+    """A friend reacted to (or changed their reaction on) one of `owner_id`'s
+    events. `new_unseen` is True when that added an unseen reaction row.
+
+    Does not commit.
+    """
+    Counter = models.FeedReactionCounter
+    bump = {Counter.version: Counter.version + 1}
+    if new_unseen:
+        bump[Counter.unseen] = Counter.unseen + 1
+    updated = db.query(Counter).filter(Counter.user_id == owner_id).update(
+        bump, synchronize_session=False,
+    )
+    if not updated:
+        db.add(Counter(user_id=owner_id, unseen=1 if new_unseen else 0, version=1))
+
+
+def mark_delivered(db: Session, owner_id: int, observed_unseen: int) -> None:
+    """Subtract the count the poll started from, after marking rows seen.
+
+    Reactions that land mid-poll keep the counter above zero, so the next
+    poll picks them up (or finds them already delivered and settles the
+    counter at zero). Does not commit.
+    """
+    Counter = models.FeedReactionCounter
+    db.query(Counter).filter(Counter.user_id == owner_id).update(
+        {
+            Counter.unseen: case(
+                (Counter.unseen > observed_unseen, Counter.unseen - observed_unseen),
+                else_=0,
+            ),
+            Counter.version: Counter.version + 1,
+        },
+        synchronize_session=False,
+    )
+
+
+def delete_user(db: Session, user_id: int) -> None:
+    """Drop the counter for a hard-deleted account. Does not commit."""
+    db.query(models.FeedReactionCounter).filter(
+        models.FeedReactionCounter.user_id == user_id,
+    ).delete(synchronize_session=False)
@@ -0,0 +1,157 @@
+"""Cached public responses with ETags for catalog and marketing reads.
+
+/animals, /shop/items and /subjects are fetched on every app launch.
+/public/geography, /public/client-config and /donations/community-stats are
+fetched on every website load. Each call used to check out a DB connection
+to re-read data that changes a few times a month.
+
+`respond()` keeps the encoded body per (path, query string) in a bounded
+TTL + LRU map in this process, the same shape as auth's token cache:
+
+- Every response carries a strong ETag (a hash of the body) and
+  `Cache-Control: public, max-age=…`. A matching `If-None-Match` gets a
+  bodyless 304.
+- The handler's `build` callable only runs on a miss. A `Depends(get_db)`
+  session doesn't check out a connection until its first query, so a hit
+  never touches the pool.
+- Writes call `invalidate(tag)` after they commit, e.g. "animals" after
+  /admin/animals, or after a session hatches a species that crud created
+  on demand. Entries are tagged by endpoint, and a build that raced
+  an invalidation is not stored. Invalidation only reaches this worker. The
+  other workers pick the change up when their copy expires, which is why
+  TTL_SECONDS is minutes, not hours. Data that changes without any
+  invalidating write relies on the TTL alone: new users' schools on
+  /public/geography, and the rolling "this month" window on the donation
+  stats.
+
+Tests call `reset()` between cases.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, NamedTuple, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300"))
+MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+# How long browsers / the CDN may reuse a response without revalidating.
+CLIENT_MAX_AGE = int(os.getenv("RESPONSE_CACHE_CLIENT_MAX_AGE", "60"))
+
+
+class _Entry(NamedTuple):
+    tag: str
+    expires_at: float
+    body: bytes
+    etag: str
+
+
+_lock = threading.Lock()
+_entries: "OrderedDict[tuple, _Entry]" = OrderedDict()
+_generations: dict[str, int] = defaultdict(int)
+_adapters: dict[Any, TypeAdapter] = {}
+_stats = {"hits": 0, "misses": 0, "not_modified": 0}
+
+
+def _key(request: Request) -> tuple:
+    return request.url.path, tuple(sorted(request.query_params.multi_items()))
+
+
+def _encode(value: Any, model: Any) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, str):
+        return value.encode()
+    if model is not None:
+        # Same validation + serialisation FastAPI applies for response_model.
+        adapter = _adapters.get(model)
+        if adapter is None:
+            adapter = _adapters[model] = TypeAdapter(model)
+        return adapter.dump_json(adapter.validate_python(value, from_attributes=True))
+    return json.dumps(
+        jsonable_encoder(value), ensure_ascii=False, allow_nan=False, separators=(",", ":"),
+    ).encode()
+
+
+def _matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison.
+    return any(t.strip().removeprefix("W/") == etag for t in if_none_match.split(","))
+
+
+def respond(
+    request: Request,
+    tag: str,
+    build: Callable[[], Any],
+    *,
+    model: Any = None,
+    ttl: Optional[float] = None,
+) -> Response:
+    """The cached response for this request, built with `build()` on a miss.
+    `build` may return pre-encoded JSON (str/bytes), or a value that is
+    encoded like FastAPI would (through `model` when given)."""
+    key = _key(request)
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and entry.expires_at > now:
+            _entries.move_to_end(key)
+            _stats["hits"] += 1
+        else:
+            entry = None
+            _stats["misses"] += 1
+            generation = _generations[tag]
+
+    if entry is None:
+        body = _encode(build(), model)
+        entry = _Entry(
+            tag=tag,
+            expires_at=now + (TTL_SECONDS if ttl is None else ttl),
+            body=body,
+            etag='"%s"' % hashlib.sha256(body).hexdigest()[:32],
+        )
+        with _lock:
+            if MAX_ENTRIES > 0 and _generations[tag] == generation:
+                _entries[key] = entry
+                _entries.move_to_end(key)
+                while len(_entries) > MAX_ENTRIES:
+                    _entries.popitem(last=False)
+
+    headers = {"ETag": entry.etag, "Cache-Control": f"public, max-age={CLIENT_MAX_AGE}"}
+    if _matches(request.headers.get("if-none-match"), entry.etag):
+        with _lock:
+            _stats["not_modified"] += 1
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type="application/json", headers=headers)
+
+
+def invalidate(*tags: str) -> None:
+    """Drop this worker's cached responses for `tags`."""
+    with _lock:
+        for tag in tags:
+            _generations[tag] += 1
+        for key in [k for k, e in _entries.items() if e.tag in tags]:
+            del _entries[key]
+
+
+def stats() -> dict:
+    with _lock:
+        return {**_stats, "entries": len(_entries)}
+
+
+def reset() -> None:
+    with _lock:
+        _entries.clear()
+        _generations.clear()
+        for k in _stats:
+            _stats[k] = 0
@@ -0,0 +1,208 @@
+"""Fuzzy clustering of school names for GET /admin/schools/similar.
+
+The endpoint groups the school strings users typed (within one country) so
+an admin can spot typos and variants. The original pass was a greedy
+single-linkage loop: every unassigned name seeds a cluster and pulls in each
+later unassigned name whose `SequenceMatcher(None, seed, name).ratio()`
+clears the threshold. That is a pure-Python ratio call for almost every
+pair — fine for a few hundred strings, hours for the ~25k distinct names in
+uk_schools.json.
+
+`cluster()` returns exactly the same clusters, in two stages:
+
+- Blocking. `ratio()` is 2·M/T, where M is the number of matched characters
+  and T the combined length. M can't exceed the characters the two strings
+  share as multisets, which is what `quick_ratio()` measures. For a given
+  seed and candidate length, the threshold therefore fixes a minimum number
+  of shared characters. Every name is stored as bitsets over all names, one
+  per "k-th occurrence of character c" token. A seed's shared-character
+  count against *every* name is then a bit-sliced sum of its tokens' bitsets.
+  That takes a few dozen big-integer operations per seed, and a bit-sliced
+  ≥ comparison per candidate length yields the candidates. Nothing that
+  could reach the threshold is dropped, so no pair is lost the way MinHash
+  / LSH buckets would lose some.
+- Scoring. The matched blocks are a common subsequence, so M is also at
+  most the longest common subsequence. A bit-parallel LCS (one big-integer
+  add per seed character) rejects ~90% of the candidates the character
+  counts let through, at a fraction of the cost of `ratio()`. Survivors get
+  the real `ratio()`, in the same (seed, candidate) direction and index
+  order as the original loop.
+
+`cluster_pairwise()` is the original loop, kept as the reference for tests
+and scripts/bench_school_clusters.py.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from difflib import SequenceMatcher
+from typing import Optional
+
+
+def cluster_pairwise(norms: list[str], threshold: float) -> list[list[int]]:
+    """Greedy single-linkage over every pair. Returns clusters of ≥2 indices,
+    seed first."""
+    clusters = []
+    assigned = [False] * len(norms)
+    for i, norm_i in enumerate(norms):
+        if assigned[i]:
+            continue
+        members = [i]
+        assigned[i] = True
+        for j, norm_j in enumerate(norms):
+            if assigned[j] or i == j:
+                continue
+            if norm_i == norm_j or SequenceMatcher(None, norm_i, norm_j).ratio() >= threshold:
+                members.append(j)
+                assigned[j] = True
+        if len(members) > 1:
+            clusters.append(members)
+    return clusters
+
+
+def _min_matches(total: int, threshold: float) -> Optional[int]:
+    """Fewest matched characters M for which difflib's ratio (2·M/T, 1.0
+    when both strings are empty) reaches `threshold`; None if none does."""
+    if not threshold > 0:  # includes NaN: let the exact check decide
+        return 0
+    if threshold > 1:
+        return None
+    if total == 0:
+        return 0
+    m = max(0, int(threshold * total / 2) - 1)
+    while 2.0 * m / total < threshold:
+        m += 1
+        if 2 * m > total:
+            return None
+    return m
+
+
+def _bitset(indices: list[int], n: int) -> int:
+    buf = bytearray((n + 7) // 8)
+    for i in indices:
+        buf[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buf, "little")
+
+
+def _add(slices: list[int], bits: int) -> None:
+    """Add one to the bit-sliced counter of every index set in `bits`."""
+    for k, s in enumerate(slices):
+        slices[k] = s ^ bits
+        bits &= s
+        if not bits:
+            return
+    slices.append(bits)
+
+
+def _at_least(slices: list[int], value: int, full: int) -> int:
+    """Indices whose bit-sliced counter is ≥ value."""
+    if value <= 0:
+        return full
+    if value >> len(slices):
+        return 0
+    greater, equal = 0, full
+    for k in range(len(slices) - 1, -1, -1):
+        if (value >> k) & 1:
+            equal &= slices[k]
+        else:
+            greater |= equal & slices[k]
+    return greater | equal
+
+
+def _char_positions(text: str) -> dict[str, int]:
+    pos: dict[str, int] = defaultdict(int)
+    for k, ch in enumerate(text):
+        pos[ch] |= 1 << k
+    return dict(pos)
+
+
+def _lcs(a: str, b_positions: dict[str, int], b_len: int) -> int:
+    """Length of the longest common subsequence (Hyyrö's bit-vector LCS)."""
+    mask = (1 << b_len) - 1
+    v = mask
+    for ch in a:
+        u = v & b_positions.get(ch, 0)
+        v = ((v + u) | (v - u)) & mask
+    return b_len - v.bit_count()
+
+
+def cluster(norms: list[str], threshold: float) -> list[list[int]]:
+    """Same result as `cluster_pairwise(norms, threshold)`."""
+    n = len(norms)
+    if n < 2:
+        return []
+    full = (1 << n) - 1
+
+    token_ids: dict[tuple[str, int], list[int]] = defaultdict(list)
+    length_ids: dict[int, list[int]] = defaultdict(list)
+    same_ids: dict[str, list[int]] = defaultdict(list)
+    tokens: list[list[tuple[str, int]]] = []
+    for i, norm in enumerate(norms):
+        seen: dict[str, int] = defaultdict(int)
+        toks = []
+        for ch in norm:
+            toks.append((ch, seen[ch]))
+            seen[ch] += 1
+        for tok in toks:
+            token_ids[tok].append(i)
+        tokens.append(toks)
+        length_ids[len(norm)].append(i)
+        same_ids[norm].append(i)
+    occ = {tok: _bitset(ids, n) for tok, ids in token_ids.items()}
+    by_length = {length: _bitset(ids, n) for length, ids in length_ids.items()}
+    same = {norm: _bitset(ids, n) for norm, ids in same_ids.items() if len(ids) > 1}
+
+    windows: dict[int, list[tuple[int, int]]] = {}
+
+    def _window(lx: int) -> list[tuple[int, int]]:
+        """(min shared characters, names of those lengths) for a seed of length lx."""
+        if lx not in windows:
+            by_need: dict[int, int] = defaultdict(int)
+            for ly, bits in by_length.items():
+                need = _min_matches(lx + ly, threshold)
+                if need is not None and need <= min(lx, ly):
+                    by_need[need] |= bits
+            windows[lx] = sorted(by_need.items())
+        return windows[lx]
+
+    positions: dict[int, dict[str, int]] = {}
+
+    def _similar(seed: str, j: int) -> bool:
+        other = norms[j]
+        if seed == other:
+            return True
+        pos = positions.get(j)
+        if pos is None:
+            pos = positions[j] = _char_positions(other)
+        need = _min_matches(len(seed) + len(other), threshold)
+        if need is None or _lcs(seed, pos, len(other)) < need:
+            return False
+        return SequenceMatcher(None, seed, other).ratio() >= threshold
+
+    clusters = []
+    alive = full  # unassigned; always a subset of the indices after the seed
+    for i, seed in enumerate(norms):
+        bit = 1 << i
+        if not alive & bit:
+            continue
+        alive ^= bit
+        if not alive:
+            break
+        slices: list[int] = []
+        for tok in tokens[i]:
+            _add(slices, occ[tok])
+        candidates = same.get(seed, 0)
+        for need, lengths in _window(len(seed)):
+            candidates |= _at_least(slices, need, full) & lengths
+        candidates &= alive
+
+        members = [i]
+        while candidates:
+            low = candidates & -candidates
+            candidates ^= low
+            j = low.bit_length() - 1
+            if _similar(seed, j):
+                members.append(j)
+                alive ^= low
+        if len(members) > 1:
+            clusters.append(members)
+    return clusters
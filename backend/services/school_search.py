@@ -0,0 +1,244 @@
+"""In-memory autocomplete index for GET /schools/search.
+
+The endpoint used to run `name ILIKE '%q%' ORDER BY name LIMIT 20` over the
+~50k UK / India / Sri Lanka / university rows in `schools`. A leading-
+wildcard ILIKE can't use the B-tree on `name`, so every onboarding keystroke
+was a sequential scan, and results came back alphabetically rather than by
+relevance.
+
+`SchoolIndex` is built once from the table and answers from memory:
+
+- Names are normalised (casefold, accents and punctuation stripped) and
+  split into tokens. A sorted (token, school) list answers token-prefix
+  queries with two bisects, so "john st" finds "St John's School".
+- A trigram → schools posting list answers substring queries ("ford" in
+  "Oxford") by intersecting the query's trigrams and verifying the hits.
+- Results rank by match quality (name starts with the query, then every
+  query token prefixes a name token, then plain substring), then by how
+  many users already picked that school, then shorter names first.
+
+The index is built at startup in the background and rebuilt by
+/schools/seed, /schools/seed-additional and /admin/schools/cleanup (each web
+worker also rebuilds once it is older than SCHOOL_INDEX_TTL_SECONDS, which
+picks up other workers' edits and new popularity counts). Until the first
+build finishes, `search` falls back to the ILIKE query, which the
+pg_trgm GIN index on schools.name serves on Postgres.
+
+Tests set SCHOOL_INDEX_INLINE=1 so the index builds synchronously.
+"""
+from __future__ import annotations
+
+import heapq
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import models
+
+logger = logging.getLogger(__name__)
+
+TTL_SECONDS = int(os.getenv("SCHOOL_INDEX_TTL_SECONDS", "3600"))
+INLINE = os.getenv("SCHOOL_INDEX_INLINE", "0") == "1"
+MIN_QUERY = 2
+DEFAULT_LIMIT = 20
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+# Rank tiers
+_STARTS_WITH, _TOKEN_PREFIX, _SUBSTRING = 0, 1, 2
+
+
+def normalize(text: Optional[str]) -> str:
+    """'St. John’s  Académie' → 'st john s academie'."""
+    if not text:
+        return ""
+    folded = unicodedata.normalize("NFKD", text.casefold())
+    folded = "".join(c for c in folded if not unicodedata.combining(c))
+    return _NON_ALNUM.sub(" ", folded).strip()
+
+
+def _trigrams(norm: str) -> set[str]:
+    return {norm[i:i + 3] for i in range(len(norm) - 2)}
+
+
+class SchoolIndex:
+    """Immutable once built; searches need no locking."""
+
+    def __init__(self, rows, popularity: Optional[dict[str, int]] = None):
+        """rows: (name, city, region, country) tuples. popularity: user
+        counts keyed by `normalize(name)`."""
+        popularity = popularity or {}
+        self.schools: list[tuple] = []
+        self._norm: list[str] = []
+        self._pop = array("i")
+        pairs: list[tuple[str, int]] = []
+        grams: dict[str, list[int]] = defaultdict(list)
+        for name, city, region, country in rows:
+            norm = normalize(name)
+            if not norm:
+                continue
+            i = len(self.schools)
+            self.schools.append((name, city, region, country or ""))
+            self._norm.append(norm)
+            self._pop.append(popularity.get(norm, 0))
+            pairs.extend((tok, i) for tok in set(norm.split()))
+            for g in _trigrams(norm):
+                grams[g].append(i)
+        pairs.sort()
+        self._tokens = [t for t, _ in pairs]
+        self._token_docs = array("i", (i for _, i in pairs))
+        self._grams = {g: array("i", ids) for g, ids in grams.items()}
+        self.built_at = time.time()
+
+    def __len__(self) -> int:
+        return len(self.schools)
+
+    def _prefix_docs(self, prefix: str) -> set[int]:
+        lo = bisect_left(self._tokens, prefix)
+        hi = bisect_left(self._tokens, prefix + "\uffff", lo)
+        return set(self._token_docs[lo:hi])
+
+    def _token_matches(self, tokens: list[str]) -> set[int]:
+        docs: Optional[set[int]] = None
+        # Longest token first: it is the most selective.
+        for tok in sorted(tokens, key=len, reverse=True):
+            found = self._prefix_docs(tok)
+            docs = found if docs is None else docs & found
+            if not docs:
+                return set()
+        return docs or set()
+
+    def _substring_matches(self, norm_q: str) -> set[int]:
+        postings = sorted((self._grams.get(g) for g in _trigrams(norm_q)), key=lambda p: len(p) if p else 0)
+        if not postings or postings[0] is None:
+            return set()
+        docs = set(postings[0])
+        for p in postings[1:]:
+            docs.intersection_update(p)
+            if not docs:
+                return docs
+        return {i for i in docs if norm_q in self._norm[i]}
+
+    def search(self, q: str, limit: int = DEFAULT_LIMIT) -> list[dict]:
+        norm_q = normalize(q)
+        if len(norm_q) < MIN_QUERY:
+            return []
+        tier: dict[int, int] = {}
+        for i in self._token_matches(norm_q.split()):
+            tier[i] = _STARTS_WITH if self._norm[i].startswith(norm_q) else _TOKEN_PREFIX
+        if len(tier) < limit and len(norm_q) >= 3:
+            for i in self._substring_matches(norm_q):
+                tier.setdefault(i, _SUBSTRING)
+        best = heapq.nsmallest(
+            limit, tier,
+            key=lambda i: (tier[i], -self._pop[i], len(self._norm[i]), self._norm[i]),
+        )
+        return [_as_result(self.schools[i]) for i in best]
+
+
+def _as_result(school: tuple) -> dict:
+    name, city, region, country = school
+    return {"name": name, "city": city, "region": region, "country": country}
+
+
+# ─── Process-wide index ──────────────────────────────────────────────────
+
+_index: Optional[SchoolIndex] = None
+_build_lock = threading.Lock()
+
+
+def build(db: Session) -> SchoolIndex:
+    rows = db.query(
+        models.School.name, models.School.city, models.School.region, models.School.country,
+    ).yield_per(5000)
+    popularity: dict[str, int] = defaultdict(int)
+    for school, n in (
+        db.query(models.User.school, func.count(models.User.id))
+        .filter(models.User.school.isnot(None), models.User.school != "")
+        .group_by(models.User.school)
+    ):
+        popularity[normalize(school)] += n
+    return SchoolIndex(rows, popularity)
+
+
+def refresh(db: Session) -> SchoolIndex:
+    """Rebuild from the table and swap it in."""
+    global _index
+    with _build_lock:
+        started = time.monotonic()
+        idx = build(db)
+        _index = idx
+    logger.info(f"School index: {len(idx)} schools in {time.monotonic() - started:.2f}s")
+    return idx
+
+
+_building = False
+_building_lock = threading.Lock()
+
+
+def _refresh_in_background() -> None:
+    global _building
+    with _building_lock:
+        if _building:
+            return
+        _building = True
+
+    def _run():
+        global _building
+        from database import SessionLocal
+        db = SessionLocal()
+        try:
+            refresh(db)
+        except Exception as e:
+            logger.error(f"School index build failed: {e}", exc_info=True)
+        finally:
+            db.close()
+            with _building_lock:
+                _building = False
+
+    threading.Thread(target=_run, name="school-index", daemon=True).start()
+
+
+def warm() -> None:
+    """Startup hook: build the index without blocking boot."""
+    if _index is None:
+        _refresh_in_background()
+
+
+def reset() -> None:
+    global _index
+    _index = None
+
+
+def _db_search(db: Session, q: str, limit: int) -> list[dict]:
+    rows = db.query(models.School).filter(
+        models.School.name.ilike(f"%{q}%")
+    ).order_by(models.School.name).limit(limit).all()
+    return [
+        {"name": s.name, "city": s.city, "region": s.region, "country": s.country}
+        for s in rows
+    ]
+
+
+def search(db: Session, q: str, limit: int = DEFAULT_LIMIT) -> list[dict]:
+    if not q or len(q.strip()) < MIN_QUERY:
+        return []
+    idx = _index
+    if idx is None and INLINE:
+        idx = refresh(db)
+    if idx is None:
+        _refresh_in_background()
+        return _db_search(db, q.strip(), limit)
+    if time.time() - idx.built_at > TTL_SECONDS:
+        _refresh_in_background()
+    return idx.search(q, limit)
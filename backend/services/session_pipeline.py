@@ -0,0 +1,313 @@
+"""Post-completion pipeline for study sessions (DB outbox + worker threads).
+
+POST /sessions/{id}/complete used to do everything inline before
+responding: badge evaluation, up to three activity-feed commits, and a
+blocking HTTP call to Expo for the badge push. A slow Expo response went
+straight into the p99 of our most important write endpoint.
+
+Now only coins/streak/hatch stay on the request path. `_finalize_session`
+writes a `session_followups` row in the same transaction as the credit
+(`enqueue`), so the follow-up work is durable even if the process dies
+right after the commit. The endpoint then hands the row to a small thread
+pool (`dispatch`) and waits a short, bounded time for the badge step only
+(`wait_for_badges`) so most clients still get `new_badges` in the
+response. When the budget runs out the response says `badges_pending` and
+the client polls GET /sessions/{id}/followup.
+
+Each job runs three steps, recording progress in `result` so a retry never
+repeats a finished step:
+
+    1. badges  — crud.check_badges (signals waiting requests when done)
+    2. events  — crud.create_session_event (friend feed)
+    3. push    — badge-earned push for the first new badge
+
+Failures back off exponentially and give up after MAX_ATTEMPTS. `sweep`
+(scheduler, every SWEEP_INTERVAL_SECONDS) re-dispatches due retries,
+reclaims jobs stuck in 'running' after a crash, and prunes old rows.
+
+Tests set SESSION_PIPELINE_INLINE=1 so jobs run synchronously on the
+request thread and assertions stay deterministic.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+import models
+
+logger = logging.getLogger(__name__)
+
+WORKERS = int(os.getenv("SESSION_PIPELINE_WORKERS", "4"))
+BADGE_WAIT_MS = int(os.getenv("SESSION_BADGE_WAIT_MS", "800"))
+MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 5
+STALE_LOCK_SECONDS = 300
+SWEEP_INTERVAL_SECONDS = 30
+KEEP_DONE_DAYS = 7
+INLINE = os.getenv("SESSION_PIPELINE_INLINE", "0") == "1"
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+# job id → Event set once the badge step has finished (or given up)
+_badge_ready: dict[int, threading.Event] = {}
+_badge_ready_lock = threading.Lock()
+
+# Wired by main.py at import: (template_key, user, db, extra_vars) -> None.
+_send_push: Optional[Callable] = None
+
+
+def configure(send_push: Callable) -> None:
+    global _send_push
+    _send_push = send_push
+
+
+def _session_factory() -> Session:
+    from database import SessionLocal
+    return SessionLocal()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="session-pipeline")
+        return _executor
+
+
+# ─── Request path ────────────────────────────────────────────────────────
+
+def enqueue(
+    db: Session,
+    session: models.StudySession,
+    hatched_animal: Optional[models.Animal] = None,
+) -> models.SessionFollowup:
+    """Add the outbox row for a just-finalised session. Does not commit."""
+    job = models.SessionFollowup(
+        session_id=session.id,
+        user_id=session.user_id,
+        session_hour=session.completed_at.hour if session.completed_at else None,
+        session_minutes=session.duration_minutes or 0,
+        hatched_animal_name=hatched_animal.name if hatched_animal else None,
+        status=PENDING,
+        result={},
+    )
+    db.add(job)
+    return job
+
+
+def followup_for_session(db: Session, session_id: int, user_id: int) -> Optional[models.SessionFollowup]:
+    return (
+        db.query(models.SessionFollowup)
+        .filter(
+            models.SessionFollowup.session_id == session_id,
+            models.SessionFollowup.user_id == user_id,
+        )
+        .order_by(models.SessionFollowup.id.desc())
+        .first()
+    )
+
+
+def dispatch(job_id: int, track: bool = True) -> None:
+    """Start a committed job. Inline in tests, on the pool otherwise.
+    `track` registers the job for `wait_for_badges`."""
+    if track:
+        with _badge_ready_lock:
+            _badge_ready.setdefault(job_id, threading.Event())
+    if INLINE:
+        run_job(job_id)
+        return
+    try:
+        _get_executor().submit(run_job, job_id)
+    except RuntimeError as e:
+        # Interpreter shutting down — the sweep picks it up after restart.
+        logger.warning(f"Session followup {job_id} not dispatched: {e}")
+        _signal(job_id)
+
+
+def wait_for_badges(db: Session, job_id: int, timeout_ms: Optional[int] = None) -> Optional[list[str]]:
+    """Block up to `timeout_ms` for the badge step. Returns the newly
+    awarded badge ids, or None if they are not ready yet."""
+    with _badge_ready_lock:
+        ready = _badge_ready.get(job_id)
+    if ready is not None:
+        ready.wait((BADGE_WAIT_MS if timeout_ms is None else timeout_ms) / 1000)
+    job = (
+        db.query(models.SessionFollowup)
+        .populate_existing()
+        .filter(models.SessionFollowup.id == job_id)
+        .first()
+    )
+    if job is None or "new_badges" not in (job.result or {}):
+        return None
+    return list(job.result["new_badges"])
+
+
+def _signal(job_id: int) -> None:
+    with _badge_ready_lock:
+        ready = _badge_ready.pop(job_id, None)
+    if ready is not None:
+        ready.set()
+
+
+# ─── Worker ──────────────────────────────────────────────────────────────
+
+def _claim(db: Session, job_id: int, now: datetime) -> bool:
+    claimed = (
+        db.query(models.SessionFollowup)
+        .filter(
+            models.SessionFollowup.id == job_id,
+            models.SessionFollowup.status == PENDING,
+            or_(
+                models.SessionFollowup.next_attempt_at.is_(None),
+                models.SessionFollowup.next_attempt_at <= now,
+            ),
+        )
+        .update(
+            {
+                models.SessionFollowup.status: RUNNING,
+                models.SessionFollowup.locked_at: now,
+                models.SessionFollowup.attempts: models.SessionFollowup.attempts + 1,
+            },
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+    return bool(claimed)
+
+
+def _save_step(db: Session, job: models.SessionFollowup, **updates) -> dict:
+    result = {**(job.result or {}), **updates}
+    job.result = result
+    db.commit()
+    return result
+
+
+def _run_steps(db: Session, job: models.SessionFollowup) -> None:
+    import crud
+
+    result = dict(job.result or {})
+    if "new_badges" not in result:
+        # Awards and the marker land in one commit: a crash in between must
+        # not leave badges granted with no record of which ones this
+        # session earned (the retry would find them "already" owned).
+        badges = crud.check_badges(
+            db, job.user_id,
+            session_hour=job.session_hour,
+            session_minutes=job.session_minutes,
+            commit=False,
+        )
+        result = _save_step(db, job, new_badges=badges)
+    _signal(job.id)
+
+    if not result.get("events_done"):
+        crud.create_session_event(db, job.user_id, job.session_minutes, job.hatched_animal_name)
+        result = _save_step(db, job, events_done=True)
+
+    if not result.get("push_done"):
+        badges = result.get("new_badges") or []
+        if badges and _send_push is not None:
+            # One push per session, even if several badges landed at once.
+            user = db.get(models.User, job.user_id)
+            badge_def = crud.BADGE_MAP.get(badges[0]) or {}
+            if user is not None:
+                _send_push(
+                    "push_badge_earned", user, db,
+                    extra_vars={
+                        "badge_name": badge_def.get("name", "a new badge"),
+                        "badge_emoji": badge_def.get("emoji", "🏅"),
+                    },
+                )
+        _save_step(db, job, push_done=True)
+
+
+def run_job(job_id: int) -> None:
+    """Claim and run one job. Safe to call for a job another worker owns —
+    the claim simply fails."""
+    db = _session_factory()
+    try:
+        now = datetime.utcnow()
+        if not _claim(db, job_id, now):
+            return
+        job = db.get(models.SessionFollowup, job_id)
+        try:
+            _run_steps(db, job)
+            job.status = DONE
+            job.completed_at = datetime.utcnow()
+            job.last_error = None
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            job = db.get(models.SessionFollowup, job_id)
+            job.last_error = str(e)[:1000]
+            if job.attempts >= MAX_ATTEMPTS:
+                job.status = FAILED
+                logger.error(f"Session followup {job_id} failed permanently: {e}", exc_info=True)
+            else:
+                job.status = PENDING
+                job.next_attempt_at = datetime.utcnow() + timedelta(
+                    seconds=BACKOFF_BASE_SECONDS * (2 ** (job.attempts - 1)),
+                )
+                logger.warning(f"Session followup {job_id} attempt {job.attempts} failed: {e}")
+            db.commit()
+    except Exception as e:
+        logger.error(f"Session followup {job_id} crashed: {e}", exc_info=True)
+        db.rollback()
+    finally:
+        _signal(job_id)
+        db.close()
+
+
+def sweep(db: Session, limit: int = 200) -> dict:
+    """Re-dispatch due retries, reclaim stale 'running' jobs, prune old rows."""
+    now = datetime.utcnow()
+    reclaimed = (
+        db.query(models.SessionFollowup)
+        .filter(
+            models.SessionFollowup.status == RUNNING,
+            models.SessionFollowup.locked_at < now - timedelta(seconds=STALE_LOCK_SECONDS),
+        )
+        .update({models.SessionFollowup.status: PENDING}, synchronize_session=False)
+    )
+    pruned = (
+        db.query(models.SessionFollowup)
+        .filter(
+            models.SessionFollowup.status.in_([DONE, FAILED]),
+            models.SessionFollowup.created_at < now - timedelta(days=KEEP_DONE_DAYS),
+        )
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    due = [
+        jid for (jid,) in db.query(models.SessionFollowup.id)
+        .filter(
+            models.SessionFollowup.status == PENDING,
+            or_(
+                models.SessionFollowup.next_attempt_at.is_(None),
+                models.SessionFollowup.next_attempt_at <= now,
+            ),
+        )
+        .order_by(models.SessionFollowup.id.asc())
+        .limit(limit)
+        .all()
+    ]
+    for jid in due:
+        dispatch(jid, track=False)
+    return {"dispatched": len(due), "reclaimed": reclaimed, "pruned": pruned}
+
+
+def delete_user(db: Session, user_id: int) -> None:
+    db.query(models.SessionFollowup).filter(
+        models.SessionFollowup.user_id == user_id,
+    ).delete(synchronize_session=False)
@@ -0,0 +1,116 @@
+"""Constant-memory streamed responses (CSV, NDJSON, JSON) for large reports.
+
+Large exports shouldn't materialise the whole result set, either as ORM
+objects or as the encoded body. `partitions()` reads a query through a
+server-side cursor (`yield_per` → psycopg2 named cursor on Postgres) one
+chunk at a time. The endpoint turns each chunk into dicts, and `encode()`
+writes them out as text. The finished chunk is then dropped, so the worker
+holds at most one chunk at a time, however many rows the export covers.
+StreamingResponse sends each piece as it is produced.
+
+Admin reports that keep their JSON shape go through `json_response()`. It
+writes a `{"key": value, ..., "rows": [...]}` object piece by piece:
+scalar fields are dumped straight away, and any iterator field is written as
+an array, one chunk of rows at a time. A field can also be a zero-argument
+callable. It is called only when the encoder reaches it, so totals that
+depend on a streamed array can be placed after the array in the output.
+"""
+from __future__ import annotations
+
+import csv
+import io
+import json
+from collections.abc import Iterator
+from typing import Any, Iterable, Optional
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+CHUNK_ROWS = 1000
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def partitions(db: Session, stmt, size: Optional[int] = None) -> Iterator[list]:
+    """ORM entities from `stmt` in lists of at most `size` (default
+    CHUNK_ROWS), read through a server-side cursor."""
+    result = db.execute(stmt.execution_options(yield_per=size or CHUNK_ROWS))
+    try:
+        yield from result.scalars().partitions()
+    finally:
+        result.close()
+
+
+def rows(db: Session, stmt, size: Optional[int] = None) -> Iterator:
+    """Result rows of `stmt` one at a time, fetched through a server-side
+    cursor `size` (default CHUNK_ROWS) at a time."""
+    result = db.execute(stmt.execution_options(yield_per=size or CHUNK_ROWS))
+    try:
+        for chunk in result.partitions():
+            yield from chunk
+    finally:
+        result.close()
+
+
+def _dumps(value: Any) -> str:
+    # Same settings as starlette's JSONResponse.
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=str)
+
+
+def json_object(fields: Iterable[tuple[str, Any]]) -> Iterator[str]:
+    """Encode `fields` as one JSON object, streaming iterator values as
+    arrays and calling callables only when their turn comes."""
+    yield "{"
+    for i, (key, value) in enumerate(fields):
+        head = ("," if i else "") + _dumps(key) + ":"
+        if callable(value):
+            value = value()
+        if not isinstance(value, Iterator):
+            yield head + _dumps(value)
+            continue
+        buf = [head, "["]
+        for n, item in enumerate(value):
+            buf.append(("," if n else "") + _dumps(item))
+            if len(buf) >= CHUNK_ROWS:
+                yield "".join(buf)
+                buf.clear()
+        buf.append("]")
+        yield "".join(buf)
+    yield "}"
+
+
+def json_response(fields: Iterable[tuple[str, Any]], **kwargs) -> StreamingResponse:
+    return StreamingResponse(json_object(fields), media_type="application/json", **kwargs)
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return value
+
+
+def encode(chunks: Iterable[list[dict]], fmt: str) -> Iterator[str]:
+    """One text block per chunk. CSV takes its header from the first row's
+    keys; an empty export is an empty body."""
+    if fmt == "ndjson":
+        for rows in chunks:
+            if rows:
+                yield "".join(json.dumps(r, default=str) + "\n" for r in rows)
+        return
+    writer = None
+    buf = io.StringIO()
+    for rows in chunks:
+        for r in rows:
+            if writer is None:
+                writer = csv.DictWriter(buf, fieldnames=list(r))
+                writer.writeheader()
+            writer.writerow({k: _csv_value(v) for k, v in r.items()})
+        if buf.tell():
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
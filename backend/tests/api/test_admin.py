@@ -539,6 +539,66 @@ class TestAdminUsers:
         bad = client.get("/admin/users?archived_filter=yes", headers=admin_headers())
         assert bad.status_code == 400
 
+    @pytest.mark.parametrize("sort,order", [
+        ("created_at", "desc"), ("username", "asc"), ("last_study_date", "desc"), ("last_study_date", "asc"),
+    ])
+    def test_cursor_pages_cover_every_user_once(self, client, db, sort, order):
+        from datetime import datetime
+        for i in range(7):
+            u = make_user(db, f"page{i}@example.com", username=f"page{i}")
+            u.created_at = datetime(2026, 1, 1 + i % 3)  # ties broken by id
+            u.last_study_date = datetime(2026, 2, 1 + i) if i % 2 else None
+        db.commit()
+        expected = client.get(f"/admin/users?sort={sort}&order={order}", headers=admin_headers()).json()
+
+        seen, cursor = [], None
+        while True:
+            url = f"/admin/users?sort={sort}&order={order}&limit=3&count=none"
+            page = client.get(url + (f"&cursor={cursor}" if cursor else ""), headers=admin_headers()).json()
+            assert page["total"] is None
+            seen += [u["id"] for u in page["users"]]
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+        assert seen == [u["id"] for u in expected["users"]]
+        assert expected["total"] == 7 and expected["next_cursor"] is None
+
+    def test_cursor_must_match_sort(self, client, db):
+        for i in range(3):
+            make_user(db, f"cur{i}@example.com", username=f"cur{i}")
+        cursor = client.get("/admin/users?limit=1", headers=admin_headers()).json()["next_cursor"]
+        assert client.get(f"/admin/users?sort=username&cursor={cursor}", headers=admin_headers()).status_code == 400
+        assert client.get("/admin/users?cursor=not-a-cursor", headers=admin_headers()).status_code == 400
+        assert client.get("/admin/users?count=maybe", headers=admin_headers()).status_code == 400
+        estimate = client.get("/admin/users?count=estimate", headers=admin_headers()).json()
+        assert (estimate["total"], estimate["total_is_estimate"]) == (3, True)
+
+    @pytest.mark.parametrize("fmt", ["csv", "ndjson"])
+    def test_export_streams_every_user(self, client, db, monkeypatch, fmt):
+        import csv
+        import io
+        import json
+        from services import streaming
+        monkeypatch.setattr(streaming, "CHUNK_ROWS", 2)
+        for i in range(5):
+            make_user(db, f"exp{i}@example.com", username=f"exp{i}")
+        listed = client.get("/admin/users?sort=username&order=asc", headers=admin_headers()).json()["users"]
+
+        r = client.get(f"/admin/users/export?format={fmt}&sort=username&order=asc", headers=admin_headers())
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith(streaming.MEDIA_TYPES[fmt].split(";")[0])
+        if fmt == "csv":
+            rows = list(csv.DictReader(io.StringIO(r.text)))
+            assert [row["username"] for row in rows] == [u["username"] for u in listed]
+            assert rows[0]["is_archived"] == "false"
+        else:
+            rows = [json.loads(line) for line in r.text.splitlines()]
+            assert rows == listed
+
+    def test_export_rejects_unknown_format(self, client):
+        r = client.get("/admin/users/export?format=xlsx", headers=admin_headers())
+        assert r.status_code == 400
+
 
 class TestAdminFeedback:
     def test_feedback_list_filtered_by_status(self, client, alice, alice_headers):
@@ -852,6 +912,109 @@ class TestAdminProductTests:
         assert patched["cohort_started_at"].startswith(floor[:19])
 
 
+class TestAdminBulkEmail:
+    """Campaign and update-prompt sends go out through Resend's batch API."""
+
+    def test_campaign_send_batches_next_drop_per_user(self, client, db, fake_resend):
+        from datetime import datetime, timedelta
+        import models
+
+        fresh = [make_user(db, f"unv{i}@example.com", "password123", f"unv{i}", verified=False) for i in range(2)]
+        older = make_user(db, "unv_old@example.com", "password123", "unv_old", verified=False)
+        older.created_at = datetime.utcnow() - timedelta(days=4)
+        db.add(models.EmailLog(user_id=older.id, email=older.email, template_key="campaign_verify_email"))
+        db.commit()
+
+        r = client.post("/admin/campaign-send/verify_email", headers=admin_headers())
+        assert r.status_code == 200, r.text
+        j = r.json()
+        assert (j["sent"], j["failed"], j["skipped_no_eligible_drop"]) == (3, 0, 0)
+        assert j["sent_by_template"] == {"campaign_verify_email": 2, "campaign_verify_email_2": 1}
+
+        assert len(fake_resend.requests) == 1
+        by_email = {m["to"][0]: m for m in fake_resend.messages}
+        assert set(by_email) == {u.email for u in fresh} | {older.email}
+        assert "{name}" not in by_email[fresh[0].email]["html"]
+        logged = db.query(models.EmailLog).filter(models.EmailLog.resend_message_id.isnot(None)).count()
+        assert logged == 3
+
+    def test_update_prompt_send(self, client, db, alice, fake_resend):
+        r = client.post("/admin/email-update-prompt/send", json={}, headers=admin_headers())
+        assert r.status_code == 200, r.text
+        j = r.json()
+        assert (j["attempted"], j["sent"], j["failed"]) == (1, 1, 0)
+        msg, = fake_resend.messages
+        assert msg["to"] == [alice.email]
+        assert "alice" in msg["subject"]
+        # Cooldown: the logged send keeps alice out of the next run.
+        assert client.post("/admin/email-update-prompt/send", json={}, headers=admin_headers()).json()["attempted"] == 0
+
+    def test_quota_exhaustion_is_reported(self, client, db, alice, fake_resend):
+        fake_resend.quota_exceeded = True
+        j = client.post("/admin/email-update-prompt/send", json={}, headers=admin_headers()).json()
+        assert j["sent"] == 0
+        assert "quota" in j["stopped_early"]
+
+
+class TestAdminStreamedReports:
+    def test_sessions_carry_author_and_subject(self, client, db):
+        from datetime import datetime, timedelta
+        import models
+        u = make_user(db, "sess@example.com", username=None)
+        subject = db.query(models.Subject).first()
+        for i in range(3):
+            db.add(models.StudySession(
+                user_id=u.id, duration_minutes=25, coins_earned=10, subject_id=subject.id if i else None,
+                started_at=datetime(2026, 5, 1) + timedelta(hours=i),
+            ))
+        db.commit()
+
+        data = client.get("/admin/sessions?limit=2", headers=admin_headers()).json()
+        assert data["total"] == 3
+        assert [(s["username"], s["subject"]) for s in data["sessions"]] == [
+            ("sess@example.com", subject.display_name), ("sess@example.com", subject.display_name),
+        ]
+        assert data["sessions"][0]["started_at"] == "2026-05-01T02:00:00"
+
+    def test_schools_audit_groups_duplicates(self, client, db):
+        import models
+        db.add_all([
+            models.School(name="Kingswood Academy", country="UK"),
+            models.School(name="kingswood  academy.", country="UK", city="Bath"),
+            models.School(name="Kingswood Academy", country="United Kingdom"),
+            models.School(name="Delhi Public School", country="India"),
+            models.School(name="Delhi Public School", country="india"),
+            models.School(name="Delhi Public School", country="Narnia"),
+        ])
+        db.commit()
+
+        data = client.get("/admin/schools/audit", headers=admin_headers()).json()
+        assert data["total_schools"] == 6
+        assert (data["duplicate_groups"], data["duplicate_rows_removable"]) == (2, 2)
+        assert [(g["normalized_name"], g["count"]) for g in data["top_duplicates"]] == [
+            ("kingswood academy", 2), ("delhi public school", 2),
+        ]
+        assert [v["city"] for v in data["top_duplicates"][0]["variants"]] == [None, "Bath"]
+        assert data["cross_country_groups"] == 2
+        assert [g["countries"] for g in data["cross_country_duplicates"]] == [
+            ["UK", "United Kingdom"], ["India", "Narnia", "india"],
+        ]
+        assert len(data["cross_country_duplicates"][1]["variants"]) == 3
+        assert {"country": "Narnia", "schools": 1} in data["junk_countries"]
+
+    def test_public_geography_totals_follow_streamed_schools(self, client, db):
+        import models
+        for i, school in enumerate(["Shown High", "Hidden High", "Shown High"]):
+            u = make_user(db, f"geo{i}@example.com", username=f"geo{i}")
+            u.school, u.country = school, "UK"
+        db.add(models.SchoolDisplay(name_key="hidden high", school_name="Hidden High", tier="hidden"))
+        db.commit()
+
+        data = client.get("/public/geography").json()
+        assert (data["total_schools"], data["total_schools_hidden"]) == (1, 1)
+        assert data["schools"] == [{"school": "Shown High", "city": None, "country": "UK", "tier": "tier3"}]
+
+
 class TestAdminAuthRequired:
     """Spot-check that ALL admin routes require the key."""
     ADMIN_ROUTES = [
@@ -859,6 +1022,7 @@ class TestAdminAuthRequired:
         ("GET", "/admin/funnel?scope=all"),
         ("GET", "/admin/funnel/segments"),
         ("GET", "/admin/users"),
+        ("GET", "/admin/users/export"),
         ("GET", "/admin/feedback"),
         ("GET", "/admin/push/templates"),
         ("GET", "/admin/push/opt-in-funnel"),
@@ -3,7 +3,8 @@
 Background: app_version was previously only captured during push registration,
 so users who declined push permission stayed on NULL forever. The new capture
 hook in `auth.get_current_user` reads the headers on every authenticated
-request and opportunistically updates the user row.
+request and queues changes in `services.app_version_telemetry`, which a
+scheduler job flushes to the users table in batches. Tests flush explicitly.
 
 These tests cover the four cases that matter:
   1. Headers present → user row populated
@@ -13,7 +14,8 @@ These tests cover the four cases that matter:
 """
 
 import pytest
-from tests.conftest import jwt_headers
+from services import app_version_telemetry
+from tests.conftest import jwt_headers, make_user, admin_headers
 
 
 @pytest.fixture(autouse=True)
@@ -21,11 +23,14 @@ def _no_email(mock_resend):
     pass
 
 
-def _me(client, headers, extra=None):
+def _me(client, headers, extra=None, db=None):
     h = dict(headers)
     if extra:
         h.update(extra)
-    return client.get("/auth/me", headers=h)
+    resp = client.get("/auth/me", headers=h)
+    if db is not None:
+        app_version_telemetry.flush(db)
+    return resp
 
 
 def test_app_version_headers_persisted_on_first_call(client, alice, db):
@@ -38,7 +43,7 @@ def test_app_version_headers_persisted_on_first_call(client, alice, db):
     resp = _me(client, jwt_headers(alice.email), {
         "X-App-Version": "1.0.5",
         "X-App-Build": "28",
-    })
+    }, db=db)
     assert resp.status_code == 200
 
     db.refresh(alice)
@@ -53,7 +58,7 @@ def test_no_write_when_headers_unchanged(client, alice, db):
     _me(client, jwt_headers(alice.email), {
         "X-App-Version": "1.0.5",
         "X-App-Build": "28",
-    })
+    }, db=db)
     db.refresh(alice)
     first_ts = alice.app_version_updated_at
     assert first_ts is not None
@@ -61,7 +66,7 @@ def test_no_write_when_headers_unchanged(client, alice, db):
     _me(client, jwt_headers(alice.email), {
         "X-App-Version": "1.0.5",
         "X-App-Build": "28",
-    })
+    }, db=db)
     db.refresh(alice)
     assert alice.app_version_updated_at == first_ts, (
         "Second call with identical headers should NOT update the timestamp"
@@ -75,7 +80,7 @@ def test_version_bump_updates_row_and_timestamp(client, alice, db):
     _me(client, jwt_headers(alice.email), {
         "X-App-Version": "1.0.4",
         "X-App-Build": "27",
-    })
+    }, db=db)
     db.refresh(alice)
     old_ts = alice.app_version_updated_at
     assert alice.app_version == "1.0.4"
@@ -84,7 +89,7 @@ def test_version_bump_updates_row_and_timestamp(client, alice, db):
     _me(client, jwt_headers(alice.email), {
         "X-App-Version": "1.0.5",
         "X-App-Build": "28",
-    })
+    }, db=db)
     db.refresh(alice)
     assert alice.app_version == "1.0.5"
     assert alice.app_build == "28"
@@ -98,7 +103,7 @@ def test_missing_headers_does_not_break_request(client, alice, db):
     alice.app_build = "1"
     db.commit()
 
-    resp = _me(client, jwt_headers(alice.email))
+    resp = _me(client, jwt_headers(alice.email), db=db)
     assert resp.status_code == 200
 
     db.refresh(alice)
@@ -112,9 +117,58 @@ def test_header_value_truncated_to_20_chars(client, alice, db):
     long_version = "1.0.5" + ("x" * 100)
     resp = _me(client, jwt_headers(alice.email), {
         "X-App-Version": long_version,
-    })
+    }, db=db)
     assert resp.status_code == 200
 
     db.refresh(alice)
     assert alice.app_version is not None
     assert len(alice.app_version) <= 20
+
+
+def test_auth_path_does_not_write_until_flush(client, alice, db):
+    """The request itself must not commit the users row — the write happens
+    in the batched flush."""
+    _me(client, jwt_headers(alice.email), {"X-App-Version": "2.0.0"})
+    db.refresh(alice)
+    assert alice.app_version is None
+    assert app_version_telemetry.pending(alice.id) == ("2.0.0", None)
+
+    assert app_version_telemetry.flush(db) == 1
+    db.refresh(alice)
+    assert alice.app_version == "2.0.0"
+    assert app_version_telemetry.pending(alice.id) is None
+
+
+def test_flush_batches_many_users(client, alice, bob, db):
+    carol = make_user(db, "carol@example.com", "password123", "carol")
+    for user, version in ((alice, "2.0.0"), (bob, "2.0.1"), (carol, "2.0.2")):
+        _me(client, jwt_headers(user.email), {"X-App-Version": version, "X-App-Build": "40"})
+
+    assert app_version_telemetry.flush(db) == 3
+    for user, version in ((alice, "2.0.0"), (bob, "2.0.1"), (carol, "2.0.2")):
+        db.refresh(user)
+        assert (user.app_version, user.app_build) == (version, "40")
+    stats = app_version_telemetry.stats()
+    assert stats["flushes"] == 1
+    assert stats["rows_flushed"] == 3
+    assert stats["pending"] == 0
+
+
+def test_build_only_change_keeps_version_timestamp(client, alice, db):
+    _me(client, jwt_headers(alice.email), {"X-App-Version": "1.0.5", "X-App-Build": "28"}, db=db)
+    db.refresh(alice)
+    first_ts = alice.app_version_updated_at
+
+    _me(client, jwt_headers(alice.email), {"X-App-Version": "1.0.5", "X-App-Build": "29"}, db=db)
+    db.refresh(alice)
+    assert alice.app_build == "29"
+    assert alice.app_version == "1.0.5"
+    assert alice.app_version_updated_at == first_ts
+
+
+def test_admin_stats_endpoint(client, alice, db):
+    _me(client, jwt_headers(alice.email), {"X-App-Version": "3.1.0"})
+    resp = client.get("/admin/telemetry/app-version", headers=admin_headers())
+    assert resp.status_code == 200
+    assert resp.json()["pending"] == 1
+    assert resp.json()["oldest_pending_seconds"] >= 0
@@ -0,0 +1,95 @@
+"""
+API tests for the token → user resolution cache in auth.py.
+"""
+import pytest
+from unittest.mock import patch
+
+import auth
+from auth import _TokenCache, create_access_token, token_cache
+from tests.conftest import jwt_headers, admin_headers
+
+
+ME_URL = "/auth/me"
+
+
+@pytest.fixture(autouse=True)
+def _no_email(mock_resend):
+    pass
+
+
+class TestTokenCache:
+    def test_repeat_request_served_from_cache(self, client, alice, alice_headers):
+        assert client.get(ME_URL, headers=alice_headers).status_code == 200
+        with patch.object(auth.jwt, "decode", side_effect=AssertionError("decoded twice")):
+            resp = client.get(ME_URL, headers=alice_headers)
+        assert resp.status_code == 200
+        assert resp.json()["id"] == alice.id
+
+    def test_logout_revokes_cached_token(self, client, alice, alice_headers):
+        assert client.get(ME_URL, headers=alice_headers).status_code == 200
+        assert client.post("/auth/logout", headers=alice_headers).status_code == 200
+        assert client.get(ME_URL, headers=alice_headers).status_code == 401
+
+    def test_out_of_band_token_bump_still_rejected(self, client, alice, alice_headers, db):
+        assert client.get(ME_URL, headers=alice_headers).status_code == 200
+        alice.token_version = 5
+        db.commit()
+        assert client.get(ME_URL, headers=alice_headers).status_code == 401
+
+    def test_archive_revokes_cached_token(self, client, alice, alice_headers):
+        assert client.get(ME_URL, headers=alice_headers).status_code == 200
+        resp = client.delete(f"/admin/users/{alice.id}", headers=admin_headers())
+        assert resp.status_code == 200
+        assert client.get(ME_URL, headers=alice_headers).status_code in (401, 403)
+
+    def test_uid_claim_resolves_user(self, client, alice):
+        token = create_access_token({"sub": alice.email.upper(), "tv": 0, "uid": alice.id})
+        resp = client.get(ME_URL, headers={"Authorization": f"Bearer {token}"})
+        assert resp.status_code == 200
+        assert resp.json()["id"] == alice.id
+
+    def test_uid_claim_for_other_user_falls_back_to_email(self, client, alice, bob):
+        token = create_access_token({"sub": alice.email, "tv": 0, "uid": bob.id})
+        resp = client.get(ME_URL, headers={"Authorization": f"Bearer {token}"})
+        assert resp.status_code == 200
+        assert resp.json()["id"] == alice.id
+
+    def test_login_token_carries_uid(self, client, alice):
+        resp = client.post("/auth/login", json={"email": alice.email, "password": "password123"})
+        assert resp.status_code == 200
+        payload = auth.jwt.decode(resp.json()["access_token"], auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
+        assert payload["uid"] == alice.id
+
+    def test_successful_auth_populates_cache(self, client, alice, alice_headers):
+        client.get(ME_URL, headers=alice_headers)
+        assert len(token_cache) == 1
+
+    def test_failed_auth_not_cached(self, client, alice):
+        client.get(ME_URL, headers=jwt_headers(alice.email, token_version=3))
+        assert len(token_cache) == 0
+
+
+class TestTokenCacheBounds:
+    def test_lru_eviction(self):
+        cache = _TokenCache(ttl_seconds=60, max_entries=2)
+        cache.put("a", 1, 0, "a@e.test")
+        cache.put("b", 2, 0, "b@e.test")
+        cache.get("a")
+        cache.put("c", 3, 0, "c@e.test")
+        assert cache.get("b") is None
+        assert cache.get("a") == (1, 0, "a@e.test")
+        assert len(cache) == 2
+
+    def test_expiry_respects_token_exp(self):
+        cache = _TokenCache(ttl_seconds=60, max_entries=10)
+        cache.put("a", 1, 0, "a@e.test", token_exp=0)
+        assert cache.get("a") is None
+
+    def test_invalidate_user_drops_all_tokens(self):
+        cache = _TokenCache(ttl_seconds=60, max_entries=10)
+        cache.put("phone", 1, 0, "a@e.test")
+        cache.put("tablet", 1, 0, "a@e.test")
+        cache.put("other", 2, 0, "b@e.test")
+        cache.invalidate_user(1)
+        assert cache.get("phone") is None and cache.get("tablet") is None
+        assert cache.get("other") is not None
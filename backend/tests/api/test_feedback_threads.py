@@ -3,6 +3,8 @@ Tests for Intercom-style feedback threads (admin replies, user inbox, read state
 """
 from __future__ import annotations
 
+import time
+
 import pytest
 from unittest.mock import patch
 
@@ -89,6 +91,10 @@ class TestAdminFeedbackReply:
             json={"message": "Thanks for the report!"},
             headers=admin_headers(),
         )
+        # Delivery runs on a background thread; give it a moment.
+        deadline = time.monotonic() + 2
+        while not mock_push_service.post.called and time.monotonic() < deadline:
+            time.sleep(0.01)
         assert mock_push_service.post.called
 
     def test_admin_reply_emails_anon_with_email(
@@ -0,0 +1,136 @@
+"""
+API tests for the materialized leaderboards (/leaderboard/global,
+/leaderboard/school, /leaderboard/me) backed by leaderboard_standings.
+"""
+from datetime import datetime, timedelta
+
+import crud
+import models
+from services import leaderboard as leaderboard_service
+from tests.conftest import make_user, jwt_headers, admin_headers
+
+
+def _study(db, user, minutes):
+    crud.create_study_session(db, user.id, minutes)
+
+
+class TestGlobalLeaderboard:
+    def test_session_completion_updates_global_board(self, client, alice, bob, alice_headers, db):
+        _study(db, alice, 30)
+        _study(db, bob, 60)
+
+        rows = client.get("/leaderboard/global", headers=alice_headers).json()
+        assert [r["user_id"] for r in rows[:2]] == [bob.id, alice.id]
+        assert rows[0]["total_study_minutes"] == 60
+        assert rows[0]["rank"] == 1
+
+    def test_new_user_appears_with_zero_minutes(self, client, alice, alice_headers):
+        rows = client.get("/leaderboard/global", headers=alice_headers).json()
+        me = next(r for r in rows if r["user_id"] == alice.id)
+        assert me["total_study_minutes"] == 0
+
+    def test_archived_users_excluded(self, client, alice, bob, alice_headers, db):
+        _study(db, bob, 90)
+        bob.is_archived = True
+        db.commit()
+
+        rows = client.get("/leaderboard/global", headers=alice_headers).json()
+        assert bob.id not in {r["user_id"] for r in rows}
+
+    def test_weekly_board_only_counts_this_week(self, client, alice, bob, alice_headers, db):
+        _study(db, alice, 20)
+        # Bob's minutes were earned in an earlier week.
+        last_week = leaderboard_service.period_key("week", datetime.utcnow() - timedelta(days=7))
+        db.add(models.LeaderboardStanding(user_id=bob.id, period_key=last_week, minutes=500))
+        db.commit()
+
+        rows = client.get("/leaderboard/global?period=week", headers=alice_headers).json()
+        assert [r["user_id"] for r in rows] == [alice.id]
+        assert rows[0]["total_study_minutes"] == 20
+
+
+class TestSchoolLeaderboard:
+    def test_school_board_scoped_and_case_insensitive(self, client, alice, bob, alice_headers, db):
+        carol = make_user(db, "carol@example.com", "password123", "carol")
+        client.put("/user/profile", json={"school": "Springfield High"}, headers=alice_headers)
+        client.put("/user/profile", json={"school": "  springfield high "}, headers=jwt_headers(bob.email))
+        client.put("/user/profile", json={"school": "Shelbyville"}, headers=jwt_headers(carol.email))
+        _study(db, bob, 45)
+        _study(db, carol, 300)
+
+        rows = client.get("/leaderboard/school", headers=alice_headers).json()
+        assert [r["user_id"] for r in rows] == [bob.id, alice.id]
+
+    def test_school_change_moves_existing_standings(self, client, alice, alice_headers, db):
+        _study(db, alice, 25)
+        client.put("/user/profile", json={"school": "Old School"}, headers=alice_headers)
+        client.put("/user/profile", json={"school": "New School"}, headers=alice_headers)
+
+        rows = client.get("/leaderboard/school?period=week", headers=alice_headers).json()
+        assert [r["user_id"] for r in rows] == [alice.id]
+        assert rows[0]["total_study_minutes"] == 25
+
+    def test_no_school_returns_empty(self, client, alice, alice_headers):
+        assert client.get("/leaderboard/school", headers=alice_headers).json() == []
+
+
+class TestMyRank:
+    def test_rank_outside_top_page(self, client, alice, alice_headers, db):
+        for i in range(3):
+            u = make_user(db, f"rank{i}@e.test", "password123", f"rank{i}")
+            _study(db, u, 100 + i)
+        _study(db, alice, 10)
+
+        resp = client.get("/leaderboard/me?scope=global", headers=alice_headers)
+        assert resp.status_code == 200
+        assert resp.json()["rank"] == 4
+        assert resp.json()["total_study_minutes"] == 10
+
+    def test_school_rank_without_school(self, client, alice, alice_headers):
+        resp = client.get("/leaderboard/me?scope=school", headers=alice_headers)
+        assert resp.status_code == 200
+        assert resp.json()["rank"] is None
+
+    def test_invalid_scope_rejected(self, client, alice_headers):
+        resp = client.get("/leaderboard/me?scope=galaxy", headers=alice_headers)
+        assert resp.status_code == 422
+
+
+class TestRebuild:
+    def test_rebuild_matches_incremental(self, client, alice, bob, alice_headers, db):
+        _study(db, alice, 30)
+        _study(db, bob, 15)
+        before = client.get("/leaderboard/global?period=week", headers=alice_headers).json()
+
+        resp = client.post("/admin/leaderboard/rebuild", headers=admin_headers())
+        assert resp.status_code == 200
+        assert resp.json()["week_rows"] == 2
+
+        after = client.get("/leaderboard/global?period=week", headers=alice_headers).json()
+        assert before == after
+
+    def test_reaper_credits_standings(self, client, alice, alice_headers, db, mock_resend):
+        stale = models.StudySession(
+            user_id=alice.id, duration_minutes=25, coins_earned=0,
+            started_at=datetime.utcnow() - timedelta(hours=2),
+        )
+        db.add(stale)
+        db.commit()
+
+        assert crud.reap_stale_sessions(db)["reaped"] == 1
+        rank, minutes = leaderboard_service.rank_of(db, alice, period="week")
+        assert (rank, minutes) == (1, 25)
+
+    def test_daily_prune_drops_old_weeks(self, alice, db):
+        import main
+
+        long_ago = datetime.utcnow() - timedelta(weeks=leaderboard_service.KEEP_WEEKS + 2)
+        old = leaderboard_service.period_key("week", long_ago)
+        db.add(models.LeaderboardStanding(user_id=alice.id, period_key=old, minutes=40))
+        _study(db, alice, 30)
+
+        main._cron_prune_leaderboard_standings()
+        db.expire_all()
+        keys = {k for (k,) in db.query(models.LeaderboardStanding.period_key).filter_by(user_id=alice.id)}
+        assert old not in keys
+        assert {leaderboard_service.ALL_TIME, leaderboard_service.period_key("week")} <= keys
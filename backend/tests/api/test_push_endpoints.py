@@ -2,6 +2,8 @@
 API tests for push notification endpoints.
 PUSH-01 through PUSH-09 from the test plan.
 """
+from datetime import datetime, timedelta
+
 import pytest
 import models
 from tests.conftest import make_user
@@ -166,3 +168,71 @@ class TestAdminPushEndpoints:
                            headers=admin_headers())
         # Should succeed (even if push service is mocked)
         assert resp.status_code in (200, 202)
+
+
+
+class TestLifecyclePushes:
+    """Runs against the seeded templates in push_seeds.py."""
+
+    def _user(self, db, name, signup_days, quiet_days=None):
+        u = make_user(db, f"{name}@example.com", "password123", name)
+        u.push_token = f"ExponentPushToken[{name}]"
+        u.notification_enabled = True
+        u.created_at = datetime.utcnow() - timedelta(days=signup_days)
+        if quiet_days is not None:
+            u.last_study_date = datetime.utcnow() - timedelta(days=quiet_days)
+        db.commit()
+        return u
+
+    def _run(self, client):
+        from tests.conftest import admin_headers
+        resp = client.post("/admin/push/lifecycle-run", headers=admin_headers())
+        assert resp.status_code == 200, resp.text
+        return resp.json()
+
+    def test_one_per_kind_per_run_and_deduped(self, client, db, mock_push_service):
+        veteran = self._user(db, "veteran", signup_days=2, quiet_days=4)
+        newbie = self._user(db, "newbie", signup_days=0)
+        mock_push_service.post.return_value.json.return_value = {
+            "data": [{"status": "ok", "id": "t1"}, {"status": "ok", "id": "t2"}]
+        }
+
+        first = self._run(client)
+        assert first["checked"] == 2
+        assert first["sent"] == {"push_day1_welcome": 1}  # signed up < 4 days ago: no re-engagement
+        log = db.query(models.PushLog).filter_by(user_id=veteran.id).one()
+        assert log.title == "Welcome to Endura, veteran! 🌿"
+        assert db.query(models.PushLog).filter_by(user_id=newbie.id).count() == 0
+
+        veteran.created_at = datetime.utcnow() - timedelta(days=10)
+        db.commit()
+        mock_push_service.post.reset_mock()
+        second = self._run(client)
+        assert second["sent"] == {"push_day2_first_timer": 1, "push_reengage_3d": 1}
+        assert mock_push_service.post.call_count == 1  # both in one Expo batch
+        body = db.query(models.PushLog.body).filter_by(template_key="push_reengage_3d").scalar()
+        assert body.startswith("0-day streak")
+
+    def test_skips_templates_the_user_opted_out_of(self, client, db, mock_push_service):
+        u = self._user(db, "optout", signup_days=10, quiet_days=8)
+        u.notif_marketing_enabled = False
+        db.commit()
+
+        assert self._run(client)["sent"] == {"push_reengage_3d": 1}
+        assert db.query(models.PushLog).filter_by(user_id=u.id, status="dropped").count() == 0
+
+    def test_receipt_failure_is_not_resent(self, client, db, mock_push_service):
+        u = self._user(db, "flaky", signup_days=2)
+        db.add_all([
+            # Expo accepted it; the device was unreachable when the receipt came back.
+            models.PushLog(user_id=u.id, template_key="push_day1_welcome", status="failed",
+                           expo_ticket_id="t-old", expo_receipt_id="t-old", error_code="MessageRateExceeded"),
+            # Never accepted by Expo at all: still eligible.
+            models.PushLog(user_id=u.id, template_key="push_day2_first_timer", status="failed",
+                           error_code="network_error"),
+        ])
+        u.created_at = datetime.utcnow() - timedelta(days=3)
+        db.commit()
+        mock_push_service.post.return_value.json.return_value = {"data": [{"status": "ok", "id": "t1"}]}
+
+        assert self._run(client)["sent"] == {"push_day2_first_timer": 1}
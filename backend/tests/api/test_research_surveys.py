@@ -67,3 +67,8 @@ def test_research_consent_and_submit_flow(client, alice, alice_headers):
     assert nxt3.status_code == 200
     assert nxt3.json()["survey"] is None
 
+
+    responses = client.get(f"/admin/research/surveys/{survey_id}/responses", headers=admin_headers())
+    assert responses.status_code == 200
+    (row,) = responses.json()["responses"]
+    assert (row["question_id"], row["user_id"], row["answer"]) == (question_id, alice.id, "4")
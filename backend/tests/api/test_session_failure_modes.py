@@ -360,10 +360,8 @@ class TestReaperRecoveryNotification:
 
         with patch("services.push.httpx.Client") as MockClient, \
              patch("main._send_template_email") as mock_email:
-            mock_instance = MagicMock()
+            mock_instance = MockClient.return_value
             mock_instance.post.return_value = mock_resp
-            MockClient.return_value.__enter__ = lambda s: mock_instance
-            MockClient.return_value.__exit__ = MagicMock(return_value=False)
 
             resp = client.post(
                 "/admin/sessions/reap-stale",
@@ -404,9 +402,7 @@ class TestReaperRecoveryNotification:
         with patch("services.push.httpx.Client") as MockClient, \
              patch("main._send_template_email", return_value=True) as mock_email:
             # Push path must NOT hit the wire — no token means we never POST.
-            mock_instance = MagicMock()
-            MockClient.return_value.__enter__ = lambda s: mock_instance
-            MockClient.return_value.__exit__ = MagicMock(return_value=False)
+            mock_instance = MockClient.return_value
 
             resp = client.post(
                 "/admin/sessions/reap-stale",
@@ -448,9 +444,7 @@ class TestReaperRecoveryNotification:
 
         with patch("services.push.httpx.Client") as MockClient, \
              patch("main._send_template_email") as mock_email:
-            mock_instance = MagicMock()
-            MockClient.return_value.__enter__ = lambda s: mock_instance
-            MockClient.return_value.__exit__ = MagicMock(return_value=False)
+            mock_instance = MockClient.return_value
 
             resp = client.post(
                 "/admin/sessions/reap-stale",
@@ -485,9 +479,7 @@ class TestReaperRecoveryNotification:
 
         with patch("services.push.httpx.Client") as MockClient, \
              patch("main._send_template_email") as mock_email:
-            mock_instance = MagicMock()
-            MockClient.return_value.__enter__ = lambda s: mock_instance
-            MockClient.return_value.__exit__ = MagicMock(return_value=False)
+            mock_instance = MockClient.return_value
 
             client.post(
                 "/admin/sessions/reap-stale",
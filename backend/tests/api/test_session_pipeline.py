@@ -0,0 +1,172 @@
+"""
+API tests for the session completion outbox (services/session_pipeline.py):
+badges still returned inline, GET /sessions/{id}/followup, retry/backoff
+and the sweep.
+"""
+import time
+from datetime import datetime, timedelta
+
+import crud
+import models
+from services import session_pipeline
+
+
+def _start(client, headers, minutes=25):
+    return client.post("/sessions/start", json={"duration_minutes": minutes}, headers=headers).json()["session_id"]
+
+
+def _complete(client, headers, sid, minutes=25):
+    return client.post(f"/sessions/{sid}/complete", json={"duration_minutes": minutes}, headers=headers)
+
+
+class TestInlineFollowup:
+    def test_complete_returns_badges_and_marks_job_done(self, client, alice, alice_headers, db):
+        sid = _start(client, alice_headers)
+        data = _complete(client, alice_headers, sid).json()
+        assert "first_steps" in [b["id"] for b in data["new_badges"]]
+        assert data["badges_pending"] is False
+
+        job = session_pipeline.followup_for_session(db, sid, alice.id)
+        assert job.status == session_pipeline.DONE
+        assert job.result["events_done"] and job.result["push_done"]
+
+    def test_legacy_post_sessions_uses_pipeline(self, client, alice, alice_headers, db):
+        data = client.post("/sessions", json={"duration_minutes": 25}, headers=alice_headers).json()
+        assert data["badges_pending"] is False
+        job = session_pipeline.followup_for_session(db, data["session"]["id"], alice.id)
+        assert job is not None and job.status == session_pipeline.DONE
+
+    def test_followup_endpoint(self, client, alice, alice_headers, bob_headers):
+        sid = _start(client, alice_headers)
+        _complete(client, alice_headers, sid)
+
+        resp = client.get(f"/sessions/{sid}/followup", headers=alice_headers)
+        assert resp.status_code == 200
+        body = resp.json()
+        assert body["status"] == "done" and body["badges_ready"] is True
+        assert "first_steps" in [b["id"] for b in body["new_badges"]]
+        # Not visible to other users.
+        assert client.get(f"/sessions/{sid}/followup", headers=bob_headers).status_code == 404
+
+
+class TestRetry:
+    def test_failed_step_backs_off_without_repeating_badges(self, client, alice, alice_headers, db, monkeypatch):
+        def boom(*args, **kwargs):
+            raise RuntimeError("feed down")
+
+        monkeypatch.setattr(crud, "create_session_event", boom)
+        sid = _start(client, alice_headers)
+        data = _complete(client, alice_headers, sid).json()
+        # Credit and badges are unaffected by the feed failure.
+        assert "first_steps" in [b["id"] for b in data["new_badges"]]
+
+        job = session_pipeline.followup_for_session(db, sid, alice.id)
+        db.refresh(job)
+        assert job.status == session_pipeline.PENDING
+        assert job.attempts == 1
+        assert job.next_attempt_at > datetime.utcnow()
+        assert "feed down" in job.last_error
+
+        monkeypatch.undo()
+        calls = []
+        monkeypatch.setattr(crud, "check_badges", lambda *a, **k: calls.append(1) or [])
+        job.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        db.commit()
+        assert session_pipeline.sweep(db)["dispatched"] == 1
+
+        db.refresh(job)
+        assert job.status == session_pipeline.DONE
+        assert job.attempts == 2
+        assert calls == []
+        assert job.result["new_badges"] == [b["id"] for b in data["new_badges"]]
+
+    def test_badges_and_marker_commit_together(self, client, alice, alice_headers, db, monkeypatch):
+        real_save_step = session_pipeline._save_step
+
+        def crash_before_marker(db_, job, **updates):
+            if "new_badges" in updates:
+                raise RuntimeError("worker died")
+            return real_save_step(db_, job, **updates)
+
+        monkeypatch.setattr(session_pipeline, "_save_step", crash_before_marker)
+        sid = _start(client, alice_headers)
+        _complete(client, alice_headers, sid)
+
+        job = session_pipeline.followup_for_session(db, sid, alice.id)
+        db.refresh(job)
+        assert job.status == session_pipeline.PENDING
+        assert "new_badges" not in (job.result or {})
+        # The awards rolled back with the marker.
+        assert db.query(models.UserBadge).filter(models.UserBadge.user_id == alice.id).count() == 0
+
+        monkeypatch.undo()
+        job.next_attempt_at = None
+        db.commit()
+        session_pipeline.sweep(db)
+        db.refresh(job)
+        assert job.status == session_pipeline.DONE
+        assert "first_steps" in job.result["new_badges"]
+
+    def test_gives_up_after_max_attempts(self, client, alice, alice_headers, db, monkeypatch):
+        monkeypatch.setattr(crud, "create_session_event", lambda *a, **k: 1 / 0)
+        sid = _start(client, alice_headers)
+        _complete(client, alice_headers, sid)
+        job = session_pipeline.followup_for_session(db, sid, alice.id)
+        for _ in range(session_pipeline.MAX_ATTEMPTS - 1):
+            job.next_attempt_at = None
+            db.commit()
+            session_pipeline.sweep(db)
+            db.refresh(job)
+        assert job.status == session_pipeline.FAILED
+        assert job.attempts == session_pipeline.MAX_ATTEMPTS
+
+    def test_sweep_reclaims_stale_running_job(self, client, alice, alice_headers, db):
+        sid = _start(client, alice_headers)
+        _complete(client, alice_headers, sid)
+        job = session_pipeline.followup_for_session(db, sid, alice.id)
+        # Simulate a worker that died before the feed step.
+        job.status = session_pipeline.RUNNING
+        job.locked_at = datetime.utcnow() - timedelta(seconds=session_pipeline.STALE_LOCK_SECONDS + 5)
+        job.result = {"new_badges": []}
+        db.commit()
+
+        result = session_pipeline.sweep(db)
+        assert result["reclaimed"] == 1
+        db.refresh(job)
+        assert job.status == session_pipeline.DONE
+        assert job.result["events_done"] is True
+
+
+class TestAsyncDispatch:
+    def test_slow_push_does_not_block_response(self, client, alice, alice_headers, db, monkeypatch):
+        monkeypatch.setattr(session_pipeline, "INLINE", False)
+        monkeypatch.setattr(session_pipeline, "_send_push", lambda *a, **k: time.sleep(1.5))
+
+        sid = _start(client, alice_headers)
+        started = time.monotonic()
+        data = _complete(client, alice_headers, sid).json()
+        assert time.monotonic() - started < 1.5
+        assert "first_steps" in [b["id"] for b in data["new_badges"]]
+
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            job = session_pipeline.followup_for_session(db, sid, alice.id)
+            db.refresh(job)
+            if job.status == session_pipeline.DONE:
+                break
+            time.sleep(0.05)
+        assert job.status == session_pipeline.DONE
+
+    def test_request_holds_no_transaction_while_waiting(self, client, alice, alice_headers, db, monkeypatch):
+        seen = []
+        real_wait = session_pipeline.wait_for_badges
+
+        def wait(session, job_id, timeout_ms=None):
+            seen.append(session.in_transaction())
+            return real_wait(session, job_id, timeout_ms)
+        monkeypatch.setattr(session_pipeline, "wait_for_badges", wait)
+
+        sid = _start(client, alice_headers)
+        data = _complete(client, alice_headers, sid).json()
+        assert seen == [False]
+        assert data["session"]["id"] == sid and data["badges_pending"] is False
@@ -4,6 +4,7 @@ SOCIAL-01 through SOCIAL-16 from the test plan.
 """
 import pytest
 import models
+import crud
 from tests.conftest import make_user, jwt_headers
 
 
@@ -160,6 +161,50 @@ class TestStudyGroups:
         assert db.query(models.GroupMessage).filter_by(group_id=group_id).count() == 0
 
 
+class TestGroupChat:
+    def _group_with_messages(self, client, headers, n):
+        group_id = client.post("/groups", json={"name": "Chat", "goal_minutes": 60},
+                               headers=headers).json()["id"]
+        sent = [
+            client.post(f"/groups/{group_id}/messages", json={"content": f"m{i}"}, headers=headers).json()
+            for i in range(n)
+        ]
+        return group_id, sent
+
+    def test_send_returns_author_fields(self, client, alice, alice_headers):
+        _, sent = self._group_with_messages(client, alice_headers, 1)
+        assert sent[0]["username"] == "alice"
+        assert sent[0]["user_id"] == alice.id
+        assert sent[0]["created_at"]
+
+    def test_latest_page_oldest_first(self, client, alice_headers):
+        group_id, _ = self._group_with_messages(client, alice_headers, 5)
+        rows = client.get(f"/groups/{group_id}/messages?limit=3", headers=alice_headers).json()
+        assert [r["content"] for r in rows] == ["m2", "m3", "m4"]
+        assert all(r["username"] == "alice" for r in rows)
+
+    def test_before_and_after_cursors(self, client, alice_headers):
+        group_id, sent = self._group_with_messages(client, alice_headers, 5)
+        ids = [m["id"] for m in sent]
+
+        older = client.get(f"/groups/{group_id}/messages?before_id={ids[3]}&limit=2",
+                           headers=alice_headers).json()
+        assert [r["id"] for r in older] == ids[1:3]
+
+        newer = client.get(f"/groups/{group_id}/messages?after_id={ids[1]}&limit=2",
+                           headers=alice_headers).json()
+        assert [r["id"] for r in newer] == ids[2:4]
+
+        caught_up = client.get(f"/groups/{group_id}/messages?after_id={ids[-1]}",
+                               headers=alice_headers).json()
+        assert caught_up == []
+
+    def test_both_cursors_rejected(self, client, alice_headers):
+        group_id, _ = self._group_with_messages(client, alice_headers, 1)
+        resp = client.get(f"/groups/{group_id}/messages?before_id=5&after_id=1", headers=alice_headers)
+        assert resp.status_code == 400
+
+
 class TestLeaderboard:
     def test_leaderboard_endpoint_returns_list(self, client, alice_headers):
         """SOCIAL-14: Leaderboard returns a list."""
@@ -362,3 +407,81 @@ class TestFeed:
         resp = client.post(f"/feed/{event.id}/react",
                            json={"reaction": "fire"}, headers=bob_headers)
         assert resp.status_code == 200
+
+
+    def _befriend(self, client, db, alice, bob, alice_headers, bob_headers):
+        client.post("/friends/request", json={"friend_username": "bob"}, headers=alice_headers)
+        pending = db.query(models.Friendship).filter_by(user_id=alice.id, friend_id=bob.id).first()
+        assert client.post(f"/friends/accept/{pending.id}", headers=bob_headers).status_code == 200
+
+    def test_new_friend_history_backfilled(self, client, alice, bob, alice_headers, bob_headers, db):
+        """Events from before the friendship show up once it's accepted."""
+        crud.create_session_event(db, bob.id, 25)
+        assert client.get("/feed", headers=alice_headers).json() == []
+
+        self._befriend(client, db, alice, bob, alice_headers, bob_headers)
+        feed = client.get("/feed", headers=alice_headers).json()
+        assert [e["username"] for e in feed] == ["bob"]
+        assert db.query(models.FeedTimelineBackfill).filter_by(owner_id=alice.id).count() == 0
+
+    def test_feed_pages_with_before_id(self, client, alice, bob, alice_headers, bob_headers, db):
+        self._befriend(client, db, alice, bob, alice_headers, bob_headers)
+        for minutes in (10, 20, 30):
+            crud.create_session_event(db, bob.id, minutes)
+
+        first = client.get("/feed?limit=2", headers=alice_headers).json()
+        assert ["30-minute" in e["description"] for e in first] == [True, False]
+        rest = client.get(f"/feed?limit=2&before_id={first[-1]['id']}", headers=alice_headers).json()
+        assert len(rest) == 1 and "10-minute" in rest[0]["description"]
+
+    def test_reaction_poll_counter_and_etag(self, client, alice, bob, alice_headers, bob_headers, db):
+        self._befriend(client, db, alice, bob, alice_headers, bob_headers)
+        crud.create_session_event(db, alice.id, 25)
+        event = db.query(models.ActivityEvent).filter_by(user_id=alice.id).first()
+
+        empty = client.get("/feed/reactions/new", headers=alice_headers)
+        assert empty.status_code == 200 and empty.json() == []
+        etag = empty.headers["etag"]
+        not_modified = client.get("/feed/reactions/new",
+                                  headers={**alice_headers, "If-None-Match": etag})
+        assert not_modified.status_code == 304
+
+        client.post(f"/feed/{event.id}/react", json={"reaction": "fire"}, headers=bob_headers)
+        assert db.get(models.FeedReactionCounter, alice.id).unseen == 1
+        resp = client.get("/feed/reactions/new", headers={**alice_headers, "If-None-Match": etag})
+        assert resp.status_code == 200
+        assert [(r["sender_username"], r["reaction"]) for r in resp.json()] == [("bob", "fire")]
+
+        db.expire_all()
+        assert db.get(models.FeedReactionCounter, alice.id).unseen == 0
+        again = client.get("/feed/reactions/new", headers=alice_headers)
+        assert again.json() == []
+        assert again.headers["etag"] == resp.headers["etag"] != etag
+
+    def test_reaction_poll_failed_commit_sends_no_etag(self, client, alice, bob, alice_headers, bob_headers,
+                                                       db, monkeypatch):
+        self._befriend(client, db, alice, bob, alice_headers, bob_headers)
+        crud.create_session_event(db, alice.id, 25)
+        event = db.query(models.ActivityEvent).filter_by(user_id=alice.id).first()
+        client.post(f"/feed/{event.id}/react", json={"reaction": "fire"}, headers=bob_headers)
+
+        def failing_commit():
+            raise RuntimeError("db went away")
+        monkeypatch.setattr(db, "commit", failing_commit)
+        failed = client.get("/feed/reactions/new", headers=alice_headers)
+        assert failed.status_code == 200 and "etag" not in failed.headers
+        monkeypatch.undo()
+
+        retry = client.get("/feed/reactions/new", headers=alice_headers)
+        assert [r["reaction"] for r in retry.json()] == ["fire"]
+        assert "etag" in retry.headers
+
+    def test_block_clears_timeline(self, client, alice, bob, alice_headers, bob_headers, db):
+        self._befriend(client, db, alice, bob, alice_headers, bob_headers)
+        crud.create_session_event(db, bob.id, 25)
+        assert len(client.get("/feed", headers=alice_headers).json()) == 1
+
+        client.post(f"/block/{bob.id}", headers=alice_headers)
+        crud.create_session_event(db, bob.id, 25)
+        assert client.get("/feed", headers=alice_headers).json() == []
+        assert db.query(models.FeedTimelineEntry).filter_by(owner_id=alice.id).count() == 0
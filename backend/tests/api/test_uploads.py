@@ -0,0 +1,193 @@
+"""
+API tests for image uploads and GET /uploads/{id} — bytes live in the
+content-addressed blob store (services/blob_store.py), not in the DB.
+"""
+import io
+
+import pytest
+from PIL import Image
+
+import models
+from services import blob_store, image_variants
+
+
+PNG = (
+    b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR"
+    b"\x00\x00\x00\x01\x00\x00\x00\x01\x08\x06\x00\x00\x00\x1f\x15\xc4"
+    b"\x89\x00\x00\x00\rIDATx\x9cc\xfc\xff\xff?\x03\x00\x06\x00\x02\xfe"
+    b"\x97!\x9d\xb1\x00\x00\x00\x00IEND\xaeB`\x82"
+)
+
+
+def _upload_pic(client, headers, data=PNG):
+    resp = client.post(
+        "/auth/profile-pic",
+        files={"file": ("me.png", data, "image/png")},
+        headers=headers,
+    )
+    assert resp.status_code == 200, resp.text
+    return "/uploads/" + resp.json()["profile_pic_url"].rsplit("/uploads/", 1)[1]
+
+
+class TestUploadStorage:
+    def test_bytes_go_to_blob_store_and_dedupe(self, client, db, alice_headers, bob_headers):
+        _upload_pic(client, alice_headers)
+        _upload_pic(client, bob_headers)
+
+        rows = db.query(models.Upload).all()
+        assert len(rows) == 2
+        assert all(r.data is None for r in rows)
+        assert rows[0].sha256 == rows[1].sha256 == blob_store.sha256_hex(PNG)
+        assert blob_store.get_store().read(rows[0].sha256) == PNG
+
+    def test_legacy_row_copied_on_first_read_and_keeps_bytes(self, client, db):
+        legacy = models.Upload(filename="old.png", content_type="image/png", data=PNG + b"legacy")
+        db.add(legacy)
+        db.commit()
+
+        resp = client.get(f"/uploads/{legacy.public_id}")
+        assert resp.status_code == 200
+        assert resp.content == PNG + b"legacy"
+        db.refresh(legacy)
+        assert legacy.sha256 == blob_store.sha256_hex(PNG + b"legacy") and legacy.size == len(PNG) + 6
+        assert legacy.data == PNG + b"legacy"
+
+    def test_missing_blob_rewritten_from_kept_bytes(self, client, db):
+        legacy = models.Upload(filename="old.png", content_type="image/png", data=PNG + b"lost")
+        db.add(legacy)
+        db.commit()
+        assert client.get(f"/uploads/{legacy.public_id}").status_code == 200
+        db.refresh(legacy)
+        path = blob_store.get_store().path(legacy.sha256)
+        path.unlink()  # e.g. the container disk was replaced by a deploy
+
+        resp = client.get(f"/uploads/{legacy.public_id}")
+        assert resp.status_code == 200 and resp.content == PNG + b"lost"
+        assert path.is_file()
+
+    def test_migration_script_clears_only_verified_rows(self, db, monkeypatch):
+        from scripts import migrate_uploads_to_blobs
+
+        good = models.Upload(filename="a.png", content_type="image/png", data=PNG + b"good")
+        bad = models.Upload(filename="b.png", content_type="image/png", data=PNG + b"bad")
+        db.add_all([good, bad])
+        db.commit()
+        store = blob_store.get_store()
+        real_read = store.read
+        monkeypatch.setattr(store, "read", lambda key: None if key == blob_store.sha256_hex(PNG + b"bad") else real_read(key))
+        monkeypatch.setattr(migrate_uploads_to_blobs, "SessionLocal", lambda: db)
+        monkeypatch.setattr(db, "close", lambda: None)
+
+        good_id, bad_id = good.id, bad.id
+        assert migrate_uploads_to_blobs.main([]) == 1
+        good, bad = db.get(models.Upload, good_id), db.get(models.Upload, bad_id)
+        assert good.data is None and real_read(good.sha256) == PNG + b"good"
+        assert bad.data == PNG + b"bad"
+
+    def test_railway_without_volume_fails_closed(self, monkeypatch, tmp_path):
+        monkeypatch.setenv("RAILWAY_ENVIRONMENT", "production")
+        monkeypatch.delenv("RAILWAY_VOLUME_MOUNT_PATH", raising=False)
+        with pytest.raises(blob_store.BlobStoreMisconfigured):
+            blob_store.store_dir()
+        assert blob_store.check_config() is False
+        monkeypatch.setenv("RAILWAY_VOLUME_MOUNT_PATH", str(tmp_path))
+        monkeypatch.setenv("BLOB_STORE_DIR", "./blob_store")
+        with pytest.raises(blob_store.BlobStoreMisconfigured):
+            blob_store.store_dir()
+        monkeypatch.delenv("BLOB_STORE_DIR")
+        assert blob_store.store_dir() == str(tmp_path / "blob_store")
+        assert blob_store.check_config() is True
+
+    def test_misconfigured_store_refuses_uploads_with_503(self, client, alice_headers, monkeypatch):
+        url = _upload_pic(client, alice_headers)
+        blob_store.clear_cache()
+        monkeypatch.setattr(blob_store, "_store", None)
+        monkeypatch.setattr(image_variants, "_cache", None)
+        monkeypatch.setenv("RAILWAY_ENVIRONMENT", "production")
+        monkeypatch.delenv("RAILWAY_VOLUME_MOUNT_PATH", raising=False)
+
+        resp = client.post(
+            "/auth/profile-pic",
+            files={"file": ("me.png", PNG + b"x", "image/png")},
+            headers=alice_headers,
+        )
+        assert resp.status_code == 503
+        assert client.get(url).status_code == 503
+        # The rest of the API is unaffected.
+        assert client.get("/auth/me", headers=alice_headers).status_code == 200
+
+
+class TestServeUpload:
+    def test_etag_and_not_modified(self, client, alice_headers):
+        url = _upload_pic(client, alice_headers)
+        resp = client.get(url)
+        assert resp.status_code == 200
+        assert resp.content == PNG
+        assert resp.headers["content-type"] == "image/png"
+        assert resp.headers["etag"] == f'"{blob_store.sha256_hex(PNG)}"'
+
+        cached = client.get(url, headers={"If-None-Match": resp.headers["etag"]})
+        assert cached.status_code == 304
+        assert cached.content == b""
+
+    def test_range_request(self, client, alice_headers):
+        url = _upload_pic(client, alice_headers)
+        resp = client.get(url, headers={"Range": "bytes=0-7"})
+        assert resp.status_code == 206
+        assert resp.content == PNG[:8]
+
+    def test_unknown_upload_404(self, client):
+        assert client.get("/uploads/does-not-exist").status_code == 404
+
+
+def _photo(width=800, height=600):
+    out = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 80, 40)).save(out, "PNG")
+    return out.getvalue()
+
+
+class TestImageVariants:
+    def test_upload_renders_variants(self, client, db, alice_headers):
+        url = _upload_pic(client, alice_headers, _photo())
+        sha = db.query(models.Upload.sha256).scalar()
+        cache = image_variants.get_cache()
+        for width in image_variants.WIDTHS:
+            assert cache.path(sha, width, "webp").is_file()
+            assert cache.path(sha, width, "jpg").is_file()
+
+        resp = client.get(f"{url}?w=100", headers={"Accept": "image/webp,*/*"})
+        assert resp.status_code == 200
+        assert resp.headers["content-type"] == "image/webp"
+        assert resp.headers["vary"] == "Accept"
+        assert Image.open(io.BytesIO(resp.content)).size == (128, 96)
+
+        jpeg = client.get(f"{url}?w=64")
+        assert jpeg.headers["content-type"] == "image/jpeg"
+        assert Image.open(io.BytesIO(jpeg.content)).width == 64
+
+        cached = client.get(f"{url}?w=64", headers={"If-None-Match": jpeg.headers["etag"]})
+        assert cached.status_code == 304
+
+    def test_large_or_small_requests_get_original(self, client, alice_headers):
+        big = _upload_pic(client, alice_headers, _photo())
+        resp = client.get(f"{big}?w=1024")
+        assert resp.headers["content-type"] == "image/png"
+        assert "immutable" in resp.headers["cache-control"]  # final answer, not a stand-in
+
+        small = _upload_pic(client, alice_headers, _photo(100, 100))
+        resp = client.get(f"{small}?w=128", headers={"Accept": "image/webp"})
+        assert resp.headers["content-type"] == "image/png"
+
+    def test_evicted_variant_is_regenerated(self, client, db, alice_headers):
+        url = _upload_pic(client, alice_headers, _photo())
+        sha = db.query(models.Upload.sha256).scalar()
+        path = image_variants.get_cache().path(sha, 128, "jpg")
+        path.unlink()
+
+        first = client.get(f"{url}?w=128")
+        assert first.headers["content-type"] == "image/png"  # original while it renders
+        assert first.headers["cache-control"] == "public, max-age=60"
+        assert path.is_file()
+        second = client.get(f"{url}?w=128")
+        assert second.headers["content-type"] == "image/jpeg"
+        assert "immutable" in second.headers["cache-control"]
@@ -2,16 +2,27 @@
 Test configuration and shared fixtures.
 Sets env vars BEFORE any app code is imported so SQLite is used throughout.
 """
+import json
 import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 # Must be set before any app imports
 os.environ["DATABASE_URL"] = "sqlite:///./test_endura.db"
 os.environ["SECRET_KEY"] = "test-secret-key-for-testing-must-be-32-chars"
 os.environ["ADMIN_API_KEY"] = "test-admin-key"
 os.environ["RESEND_API_KEY"] = "test-resend-key"
+os.environ["RESEND_API_URL"] = "http://127.0.0.1:9"  # bulk sends never leave the box; see fake_resend
 os.environ["EVERY_ORG_WEBHOOK_TOKEN"] = "test-webhook-token"
 os.environ["POSTHOG_PERSONAL_API_KEY"] = "test-posthog-key"
 os.environ["SENTRY_DSN"] = ""  # disable Sentry in tests
+os.environ["SESSION_PIPELINE_INLINE"] = "1"  # run session follow-ups synchronously
+os.environ["BLOB_STORE_DIR"] = tempfile.mkdtemp(prefix="endura-blobs-")
+os.environ["IMAGE_VARIANTS_INLINE"] = "1"  # render upload variants synchronously
+os.environ["SCHOOL_INDEX_INLINE"] = "1"  # build the school search index on first use
+os.environ["METRICS_SNAPSHOT_INLINE"] = "1"  # rebuild the admin overview snapshot on every read
+os.environ["RUN_SCHEDULER_IN_WEB"] = "0"  # no cron jobs inside the TestClient app
 
 import pytest
 from fastapi.testclient import TestClient
@@ -22,7 +33,10 @@ from unittest.mock import patch, MagicMock
 from database import Base, get_db
 import models
 import crud
-from auth import get_password_hash, create_access_token
+from auth import get_password_hash, create_access_token, token_cache
+from services import app_version_telemetry, blob_store, metrics_snapshot, response_cache, school_search
+from services import push as push_service
+from services import email_dispatch
 
 # ---------------------------------------------------------------------------
 # Database engine shared across the test session
@@ -93,6 +107,15 @@ def db():
             except Exception:
                 pass
         session.commit()
+        # Cached token resolutions point at rows that were just deleted.
+        token_cache.clear()
+        app_version_telemetry.reset()
+        blob_store.clear_cache()
+        school_search.reset()
+        metrics_snapshot.reset()
+        response_cache.reset()
+        # Drop the shared Expo client so per-test httpx patches take effect.
+        push_service.close_client()
 
         # Seed subjects if missing (they're static but we check anyway)
         if session.query(models.Subject).count() == 0:
@@ -141,12 +164,16 @@ def client(db):
     # (static seed data is already present from the session-scoped fixture)
     original_startup = list(app.router.on_startup)
     app.router.on_startup.clear()
+    # Shutdown handlers flush buffers against the real SessionLocal
+    original_shutdown = list(app.router.on_shutdown)
+    app.router.on_shutdown.clear()
 
     with TestClient(app, raise_server_exceptions=True) as c:
         yield c
 
     # Restore startup handlers and state
     app.router.on_startup[:] = original_startup
+    app.router.on_shutdown[:] = original_shutdown
     app.dependency_overrides.clear()
     _main.limiter.enabled = True
 
@@ -219,9 +246,65 @@ def mock_push_service():
     mock_resp.json.return_value = {
         "data": [{"status": "ok", "id": "test-ticket-id"}]
     }
+    push_service.close_client()
     with patch("services.push.httpx.Client") as MockClient:
-        mock_instance = MagicMock()
+        mock_instance = MockClient.return_value
         mock_instance.post.return_value = mock_resp
-        MockClient.return_value.__enter__ = lambda s: mock_instance
-        MockClient.return_value.__exit__ = MagicMock(return_value=False)
         yield mock_instance
+    push_service.close_client()
+
+
+class FakeResend:
+    """Local stand-in for Resend's POST /emails/batch.
+
+    Records every request; set `quota_exceeded` to answer with the daily
+    quota 429 instead.
+    """
+
+    def __init__(self):
+        self.requests: list[dict] = []
+        self.quota_exceeded = False
+        self._lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with fake._lock:
+                    fake.requests.append({"path": self.path, "headers": dict(self.headers), "json": body})
+                    start = sum(len(r["json"]) for r in fake.requests[:-1])
+                if fake.quota_exceeded:
+                    status, payload = 429, {"name": "daily_quota_exceeded", "message": "quota"}
+                else:
+                    status, payload = 200, {"data": [{"id": f"re_{start + i}"} for i in range(len(body))]}
+                raw = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    @property
+    def messages(self) -> list[dict]:
+        return [m for r in self.requests for m in r["json"]]
+
+
+@pytest.fixture()
+def fake_resend(monkeypatch):
+    """Point bulk email dispatch at a local fake Resend batch API."""
+    fake = FakeResend()
+    thread = threading.Thread(target=fake.server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("RESEND_API_URL", fake.url)
+    monkeypatch.setattr(email_dispatch, "_limiter", email_dispatch.TokenBucket(10_000, capacity=10_000))
+    try:
+        yield fake
+    finally:
+        fake.server.shutdown()
+        fake.server.server_close()
@@ -0,0 +1,141 @@
+"""
+Unit tests for services/badge_progress.py — the per-user counters that
+crud.check_badges evaluates instead of scanning session/animal history.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+import models
+import crud
+from services import badge_progress
+from tests.conftest import make_user
+
+
+_COLUMNS = (
+    "sessions_completed", "early_sessions", "night_sessions", "last_gap_days",
+    "week_days", "week_subject_ids", "subject_minutes", "distinct_subjects",
+    "max_subject_minutes", "total_animals", "species_counts", "unique_animals",
+    "max_species_count", "hatches_on_day", "has_rare", "has_legendary",
+    "named_animals", "friend_count", "group_minutes", "max_group_minutes",
+)
+
+
+def _snapshot(row):
+    return {c: getattr(row, c) for c in _COLUMNS}
+
+
+def _rebuilt(db, user_id):
+    db.query(models.UserBadgeProgress).filter_by(user_id=user_id).delete()
+    db.commit()
+    return _snapshot(badge_progress.build_progress(db, user_id))
+
+
+def _subject(db, name):
+    subject = models.Subject(name=name, display_name=name.title(), is_default=True)
+    db.add(subject)
+    db.commit()
+    return subject
+
+
+class TestIncrementalMatchesRebuild:
+    def test_sessions_animals_and_friends(self, db):
+        user = make_user(db, "bp1@test.com", "password123", "bp1")
+        friend = make_user(db, "bp1f@test.com", "password123", "bp1f")
+        math = _subject(db, "bp_math")
+        art = _subject(db, "bp_art")
+        crud.check_badges(db, user.id)  # creates the row up front
+        assert db.get(models.UserBadgeProgress, user.id) is not None
+
+        crud.create_study_session(db, user.id, 30, subject_id=math.id)
+        crud.create_study_session(db, user.id, 45, subject_id=art.id, animal_name="Panda")
+        crud.create_study_session(db, user.id, 20, subject_id=math.id, animal_name="Panda")
+        ua = db.query(models.UserAnimal).filter_by(user_id=user.id).first()
+        crud.name_animal(db, ua.id, user.id, "Bao")
+        ok, _ = crud.send_friend_request(db, friend.id, user.username)
+        assert ok
+        req = db.query(models.Friendship).filter_by(friend_id=user.id).first()
+        assert crud.accept_friend_request(db, user.id, req.id)
+        db.commit()
+
+        incremental = _snapshot(db.get(models.UserBadgeProgress, user.id))
+        assert incremental["sessions_completed"] == 3
+        assert incremental["subject_minutes"] == {str(math.id): 50, str(art.id): 45}
+        assert incremental["max_species_count"] == 2
+        assert incremental["named_animals"] == 1
+        assert incremental["friend_count"] == 1
+        assert incremental == _rebuilt(db, user.id)
+
+    def test_group_contribution(self, db):
+        user = make_user(db, "bp2@test.com", "password123", "bp2")
+        crud.check_badges(db, user.id)
+        group = crud.create_group(db, user.id, "Squad", 500, None)
+        crud.create_study_session(db, user.id, 40)
+        crud.create_study_session(db, user.id, 25)
+        db.commit()
+
+        row = db.get(models.UserBadgeProgress, user.id)
+        assert row.group_minutes == {str(group.id): 65}
+        assert _snapshot(row) == _rebuilt(db, user.id)
+
+        crud.check_badges(db, user.id)
+        awarded = {b.badge_id for b in db.query(models.UserBadge).filter_by(user_id=user.id)}
+        assert "team_player" in awarded
+
+    def test_abandoned_sessions_do_not_count(self, db):
+        user = make_user(db, "bp3@test.com", "password123", "bp3")
+        session = crud.start_study_session(db, user.id, 25)
+        assert crud.abandon_study_session(db, session.id, user.id) == "ok"
+        assert badge_progress.build_progress(db, user.id).sessions_completed == 0
+
+
+class TestCheckBadgesReadsCounters:
+    def test_no_session_scan_once_row_exists(self, db):
+        user = make_user(db, "bp4@test.com", "password123", "bp4")
+        for _ in range(3):
+            crud.create_study_session(db, user.id, 10)
+        crud.check_badges(db, user.id)
+
+        statements = []
+
+        def _capture(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engine = db.get_bind()
+        event.listen(engine, "before_cursor_execute", _capture)
+        try:
+            crud.check_badges(db, user.id)
+        finally:
+            event.remove(engine, "before_cursor_execute", _capture)
+        assert not any("FROM study_sessions" in s for s in statements)
+        assert not any("FROM user_animals" in s for s in statements)
+
+    def test_dawn_patrol_from_counter(self, db):
+        user = make_user(db, "bp5@test.com", "password123", "bp5")
+        row = badge_progress.get_progress(db, user.id)
+        row.early_sessions = 5
+        db.commit()
+        crud.check_badges(db, user.id)
+        awarded = {b.badge_id for b in db.query(models.UserBadge).filter_by(user_id=user.id)}
+        assert "dawn_patrol" in awarded
+
+    def test_stale_week_is_ignored(self, db):
+        user = make_user(db, "bp6@test.com", "password123", "bp6")
+        row = badge_progress.get_progress(db, user.id)
+        row.week_start = row.week_start - timedelta(days=7)
+        row.week_days = (1 << 5) | (1 << 6)
+        assert badge_progress.week_days(row) == set()
+
+    def test_unfriend_decrements_both_sides(self, db):
+        a = make_user(db, "bp7a@test.com", "password123", "bp7a")
+        b = make_user(db, "bp7b@test.com", "password123", "bp7b")
+        crud.send_friend_request(db, a.id, b.username)
+        req = db.query(models.Friendship).filter_by(user_id=a.id).first()
+        crud.accept_friend_request(db, b.id, req.id)
+        badge_progress.get_progress(db, a.id)
+        badge_progress.get_progress(db, b.id)
+        db.commit()
+
+        assert crud.remove_friend(db, a.id, b.id)
+        assert db.get(models.UserBadgeProgress, a.id).friend_count == 0
+        assert db.get(models.UserBadgeProgress, b.id).friend_count == 0
@@ -0,0 +1,85 @@
+"""Unit tests for services/cohort_retention.py — /admin/cohorts/retention."""
+from datetime import date, datetime, timedelta
+
+import models
+from services import cohort_retention
+from tests.conftest import make_user, admin_headers
+
+
+def _session(db, user, started_at):
+    db.add(models.StudySession(
+        user_id=user.id, duration_minutes=25, coins_earned=10,
+        started_at=started_at, completed_at=started_at + timedelta(minutes=25),
+    ))
+    db.commit()
+
+
+def _signed_up(db, email, created_at):
+    u = make_user(db, email, username=email.split("@")[0])
+    u.created_at = created_at
+    db.commit()
+    return u
+
+
+class TestMatrix:
+    def test_weekly_buckets_start_on_monday(self, db):
+        today = date(2026, 3, 19)  # Thursday
+        u = _signed_up(db, "wk@example.com", datetime(2026, 3, 1, 23, 30))  # Sunday
+        _session(db, u, datetime(2026, 3, 2, 0, 5))  # Monday: next week
+        _session(db, u, datetime(2026, 3, 15, 9))  # Sunday, two weeks on
+
+        cells = cohort_retention.matrix(db, "weekly", date(2026, 2, 23), 8, today)
+        assert list(cells) == [date(2026, 2, 23), date(2026, 3, 2), date(2026, 3, 9), date(2026, 3, 16)]
+        assert cells[date(2026, 2, 23)] == (1, [0, 1, 1, 0])
+        assert cells[date(2026, 3, 16)] == (0, [0])
+
+    def test_closed_cells_are_served_from_cache(self, db):
+        today = datetime.utcnow().date()
+        cohort = today - timedelta(days=5)
+        u = _signed_up(db, "cache@example.com", datetime.combine(cohort, datetime.min.time()))
+        _session(db, u, datetime.combine(cohort + timedelta(days=1), datetime.min.time()))
+
+        first = cohort_retention.matrix(db, "daily", cohort, 6, today)
+        assert first[cohort] == (1, [0, 1, 0, 0, 0, 0])
+
+        # A backdated row on a settled day isn't recounted; today's is.
+        _session(db, u, datetime.combine(cohort + timedelta(days=2), datetime.min.time()))
+        _session(db, u, datetime.combine(today, datetime.min.time()))
+        assert cohort_retention.matrix(db, "daily", cohort, 6, today)[cohort] == (1, [0, 1, 0, 0, 0, 1])
+
+        cohort_retention.invalidate(db)
+        db.commit()
+        assert cohort_retention.matrix(db, "daily", cohort, 6, today)[cohort] == (1, [0, 1, 1, 0, 0, 1])
+
+    def test_archiving_a_user_drops_the_cache(self, client, db):
+        today = datetime.utcnow().date()
+        cohort = today - timedelta(days=4)
+        keep = _signed_up(db, "keep@example.com", datetime.combine(cohort, datetime.min.time()))
+        gone = _signed_up(db, "gone@example.com", datetime.combine(cohort, datetime.min.time()))
+        for u in (keep, gone):
+            _session(db, u, datetime.combine(cohort + timedelta(days=1), datetime.min.time()))
+
+        url = f"/admin/cohorts/retention?granularity=daily&start_date={cohort:%Y-%m-%d}"
+        before = client.get(url, headers=admin_headers()).json()["cohorts"][0]
+        assert (before["size"], before["retention"][1]["active"]) == (2, 2)
+        assert db.query(models.CohortRetentionCell).count() > 0
+
+        client.delete(f"/admin/users/{gone.id}", headers=admin_headers())
+        after = client.get(url, headers=admin_headers()).json()["cohorts"][0]
+        assert (after["size"], after["retention"][1]["active"]) == (1, 1)
+        assert after["retention"][1]["pct"] == 100.0
+
+    def test_bounce_archive_drops_the_cache(self, client, db, monkeypatch):
+        monkeypatch.delenv("RESEND_WEBHOOK_SECRET", raising=False)
+        cohort = datetime.utcnow().date() - timedelta(days=4)
+        bounced = _signed_up(db, "bounce@example.com", datetime.combine(cohort, datetime.min.time()))
+        _session(db, bounced, datetime.combine(cohort + timedelta(days=1), datetime.min.time()))
+
+        url = f"/admin/cohorts/retention?granularity=daily&start_date={cohort:%Y-%m-%d}"
+        assert client.get(url, headers=admin_headers()).json()["cohorts"][0]["size"] == 1
+
+        db.commit()  # the webhook writes through its own session
+        resp = client.post("/webhooks/resend", json={"type": "email.bounced", "data": {"email_id": "re_x", "to": bounced.email}})
+        assert resp.status_code == 200
+        assert db.query(models.CohortRetentionCell).count() == 0
+        assert all(c["size"] == 0 for c in client.get(url, headers=admin_headers()).json()["cohorts"])
@@ -0,0 +1,108 @@
+"""
+Unit tests for services/daily_minutes.py — the per-day rollup that /stats,
+the daily study cap and group goal progress read instead of study_sessions.
+"""
+from datetime import datetime, timedelta
+
+import models
+import crud
+from services import badge_progress, daily_minutes, leaderboard
+from tests.conftest import make_user
+
+
+def _subject(db, name):
+    subject = models.Subject(name=name, display_name=name.title(), is_default=True)
+    db.add(subject)
+    db.commit()
+    return subject
+
+
+def _reaped(db, user, minutes):
+    stale = models.StudySession(
+        user_id=user.id, duration_minutes=minutes, coins_earned=0,
+        started_at=datetime.utcnow() - timedelta(hours=2),
+    )
+    db.add(stale)
+    db.commit()
+    assert crud.reap_stale_sessions(db)["reaped"] == 1
+    return stale
+
+
+class TestRollupWritePath:
+    def test_finalize_credits_day_and_subject(self, db):
+        user = make_user(db, "dm1@test.com", "password123", "dm1")
+        math = _subject(db, "dm_math")
+        crud.create_study_session(db, user.id, 30, subject_id=math.id)
+        crud.create_study_session(db, user.id, 20)
+        crud.create_study_session(db, user.id, 10, subject_id=math.id)
+
+        assert daily_minutes.minutes_on(db, user.id) == 60
+        assert daily_minutes.minutes_by_subject(db, user.id) == {math.id: 40}
+        rows = db.query(models.UserDailyMinutes).filter_by(user_id=user.id).all()
+        assert sorted((r.subject_id, r.minutes, r.sessions) for r in rows) == [
+            (0, 20, 1), (math.id, 40, 2),
+        ]
+        assert daily_minutes.check(db, [user.id])["ok"]
+
+    def test_abandoning_a_reaped_session_reverses_it(self, db, mock_resend):
+        user = make_user(db, "dm2@test.com", "password123", "dm2")
+        stale = _reaped(db, user, 25)
+        assert daily_minutes.minutes_on(db, user.id) == 25
+
+        assert crud.abandon_study_session(db, stale.id, user.id) == "ok"
+        assert daily_minutes.minutes_on(db, user.id) == 0
+        assert daily_minutes.check(db, [user.id])["ok"]
+
+    def test_abandoning_a_reaped_session_reverses_standings_and_badges(self, db, mock_resend):
+        user = make_user(db, "dm6@test.com", "password123", "dm6")
+        badge_progress.get_progress(db, user.id)
+        db.commit()
+        stale = _reaped(db, user, 25)
+        week = leaderboard.period_key(leaderboard.WEEK)
+        standing = db.query(models.LeaderboardStanding).filter_by(user_id=user.id, period_key=week).one()
+        assert standing.minutes == 25
+        assert db.get(models.UserBadgeProgress, user.id).sessions_completed == 1
+
+        assert crud.abandon_study_session(db, stale.id, user.id) == "ok"
+        db.expire_all()
+        assert standing.minutes == 0
+        row = db.get(models.UserBadgeProgress, user.id)
+        assert (row.sessions_completed, row.last_completed_at, row.week_days) == (0, None, 0)
+
+    def test_plain_abandon_credits_nothing(self, db):
+        user = make_user(db, "dm3@test.com", "password123", "dm3")
+        started = crud.start_study_session(db, user.id, 25)
+        assert crud.abandon_study_session(db, started.id, user.id) == "ok"
+        assert daily_minutes.minutes_on(db, user.id) == 0
+
+
+class TestRollupMaintenance:
+    def test_check_reports_and_rebuild_repairs_drift(self, db):
+        user = make_user(db, "dm4@test.com", "password123", "dm4")
+        other = make_user(db, "dm5@test.com", "password123", "dm5")
+        crud.create_study_session(db, user.id, 30)
+        crud.create_study_session(db, other.id, 15)
+        db.query(models.UserDailyMinutes).filter_by(user_id=user.id).update({"minutes": 99})
+        db.commit()
+
+        report = daily_minutes.check(db)
+        assert not report["ok"]
+        assert report["mismatched"] == 1
+        assert report["user_ids"] == [user.id]
+
+        daily_minutes.rebuild(db, report["user_ids"])
+        assert daily_minutes.check(db)["ok"]
+        assert daily_minutes.minutes_on(db, user.id) == 30
+        assert daily_minutes.minutes_on(db, other.id) == 15
+
+    def test_stats_read_from_rollup(self, db):
+        user = make_user(db, "dm6@test.com", "password123", "dm6")
+        math = _subject(db, "dm_stats")
+        crud.create_study_session(db, user.id, 25, subject_id=math.id)
+        crud.create_study_session(db, user.id, 15)
+
+        stats = crud.get_user_stats(db, user.id)
+        today = datetime.utcnow().date()
+        assert stats["weekly_study_minutes"][today.weekday()] == 40
+        assert stats["monthly_study_minutes"][3] == 40
+        assert stats["study_minutes_by_subject"] == {"Dm_Stats": 25}
@@ -0,0 +1,235 @@
+"""
+Unit tests for services/email_dispatch.py — the rate-limited, resumable bulk
+sender behind the daily onboarding email run and admin campaigns.
+"""
+import threading
+from datetime import datetime, timedelta
+
+import models
+import main
+from services import email_dispatch
+from services.email_dispatch import EmailJob, TokenBucket, QuotaExhausted
+from tests.conftest import make_user
+
+
+class _FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestTokenBucket:
+    def test_paces_to_rate_after_burst(self):
+        clock = _FakeClock()
+        bucket = TokenBucket(5, capacity=1, clock=clock, sleep=clock.sleep)
+        for _ in range(11):
+            bucket.acquire()
+        # First token is free, then one every 200ms: 10 more in 2s.
+        assert abs(clock.now - 2.0) < 1e-9
+
+    def test_idle_time_refills_only_to_capacity(self):
+        clock = _FakeClock()
+        bucket = TokenBucket(5, capacity=2, clock=clock, sleep=clock.sleep)
+        clock.now = 60.0
+        bucket.acquire()
+        bucket.acquire()
+        assert clock.sleeps == []
+        bucket.acquire()
+        assert abs(clock.sleeps[-1] - 0.2) < 1e-9
+
+
+_EMAIL = email_dispatch.CompiledEmail("tmpl", "Hi {name}", "<p>{name}</p>")
+
+
+def _jobs(user_ids):
+    return [EmailJob(uid, f"u{uid}@test.com", _EMAIL, "day3", {"name": f"u{uid}"}) for uid in user_ids]
+
+
+class _Sender(email_dispatch.BatchSender):
+    """In-process BatchSender; `fail` is an exception to raise instead."""
+
+    def __init__(self, max_batch=100, fail=None):
+        self.max_batch = max_batch
+        self.fail = fail
+        self.batches = []
+
+    def send(self, messages, idempotency_key=None):
+        if self.fail:
+            raise self.fail
+        self.batches.append((messages, idempotency_key))
+        return [f"resend-{m['to'][0]}" for m in messages]
+
+
+class TestCompiledTemplate:
+    def test_renders_in_one_pass_and_keeps_unknown_placeholders(self):
+        t = email_dispatch.CompiledTemplate("Hi {name}, {streak} days! {unknown} {name}")
+        assert t.render({"name": "Ada", "streak": 3}) == "Hi Ada, 3 days! {unknown} Ada"
+
+    def test_matches_legacy_renderer(self):
+        tmpl = models.EmailTemplate(template_key="k", subject="{name}'s {n}", body_html="<b>{n}</b>{x}")
+        variables = {"name": "Bo", "n": "7"}
+        compiled = email_dispatch.compile_templates([tmpl])["k"]
+        assert (compiled.subject.render(variables), compiled.html.render(variables)) == \
+            main._render_template(tmpl, variables)
+
+
+class TestDispatch:
+    def test_batches_keep_a_users_jobs_together(self):
+        jobs = _jobs([1, 2, 2, 3, 3, 3, 4])
+        batches = [[j.user_id for j in b] for b in email_dispatch._batches(jobs, 3)]
+        assert batches == [[1, 2, 2], [3, 3, 3], [4]]
+
+    def test_sends_logs_in_bulk_and_checkpoints(self, db):
+        users = [make_user(db, f"ed{i}@test.com", "password123", f"ed{i}") for i in range(5)]
+        ids = sorted(u.id for u in users)
+        sender = _Sender(max_batch=2)
+
+        run = email_dispatch.begin(db, "test:run")
+        result = email_dispatch.dispatch(db, run, _jobs(ids), cap=100, sender=sender)
+
+        assert [len(m) for m, _ in sender.batches] == [2, 2, 1]
+        assert len({key for _, key in sender.batches}) == 3
+        assert sender.batches[0][0][0]["html"] == f"<p>u{ids[0]}</p>"
+        assert result["status"] == "completed"
+        assert (result["sent"], result["failed"], result["total"]) == (5, 0, 5)
+        assert result["last_user_id"] == ids[-1]
+        assert result["counts"] == {"day3": 5}
+        logs = db.query(models.EmailLog).order_by(models.EmailLog.user_id).all()
+        assert [l.resend_message_id for l in logs] == [f"resend-u{i}@test.com" for i in ids]
+        assert logs[0].subject == f"Hi u{ids[0]}"
+
+    def test_cap_stops_and_checkpoint_stays_before_unsent_users(self, db):
+        users = [make_user(db, f"cap{i}@test.com", "password123", f"cap{i}") for i in range(4)]
+        ids = sorted(u.id for u in users)
+        run = email_dispatch.begin(db, "test:cap")
+        result = email_dispatch.dispatch(db, run, _jobs(ids), cap=2, sender=_Sender(max_batch=1), workers=1)
+        assert result["status"] == "stopped"
+        assert result["sent"] == 2
+        assert result["last_user_id"] == ids[1]
+        assert "daily_cap" in result["note"]
+
+    def test_quota_exhaustion_stops_run(self, db):
+        user = make_user(db, "quota@test.com", "password123", "quota")
+        run = email_dispatch.begin(db, "test:quota")
+        result = email_dispatch.dispatch(db, run, _jobs([user.id]), cap=10, sender=_Sender(fail=QuotaExhausted()))
+        assert result["status"] == "stopped"
+        assert result["last_user_id"] == 0
+        assert db.query(models.EmailLog).count() == 0
+
+    def test_failed_batch_is_retried_once_and_holds_the_checkpoint(self, db):
+        users = [make_user(db, f"fail{i}@test.com", "password123", f"fail{i}") for i in range(2)]
+        ids = sorted(u.id for u in users)
+        keys = []
+
+        class Flaky(_Sender):
+            def send(self, messages, idempotency_key=None):
+                if messages[0]["to"] == [f"u{ids[0]}@test.com"]:
+                    keys.append(idempotency_key)
+                    raise RuntimeError("timeout")
+                return super().send(messages, idempotency_key)
+
+        run = email_dispatch.begin(db, "test:fail")
+        result = email_dispatch.dispatch(db, run, _jobs(ids), cap=10, sender=Flaky(max_batch=1), workers=1)
+        assert len(keys) == 2 and keys[0] == keys[1]
+        assert result["status"] == "stopped" and "failed" in result["note"]
+        # The later batch went out and is logged, but the checkpoint stays
+        # before the failed one so a resume retries it.
+        assert (result["sent"], result["failed"], result["last_user_id"]) == (1, 1, 0)
+        assert [l.user_id for l in db.query(models.EmailLog).all()] == [ids[1]]
+
+    def test_batches_in_flight_at_a_stop_are_logged(self, db):
+        users = [make_user(db, f"race{i}@test.com", "password123", f"race{i}") for i in range(2)]
+        ids = sorted(u.id for u in users)
+        second_sent = threading.Event()
+
+        class QuotaAfterOtherWorker(_Sender):
+            def send(self, messages, idempotency_key=None):
+                if messages[0]["to"] == [f"u{ids[0]}@test.com"]:
+                    assert second_sent.wait(5)
+                    raise QuotaExhausted()
+                ids_out = super().send(messages, idempotency_key)
+                second_sent.set()
+                return ids_out
+
+        run = email_dispatch.begin(db, "test:race")
+        result = email_dispatch.dispatch(
+            db, run, _jobs(ids), cap=10, sender=QuotaAfterOtherWorker(max_batch=1), workers=2,
+        )
+        assert result["status"] == "stopped"
+        assert (result["sent"], result["last_user_id"]) == (1, 0)
+        assert [l.user_id for l in db.query(models.EmailLog).all()] == [ids[1]]
+
+
+class TestResendBatchSender:
+    def test_posts_batches_with_idempotency_key(self, db, fake_resend):
+        users = [make_user(db, f"rb{i}@test.com", "password123", f"rb{i}") for i in range(3)]
+        jobs = _jobs(sorted(u.id for u in users))
+        result = email_dispatch.send_bulk(db, jobs, scope="test:bulk")
+
+        assert result == {"sent": 3, "failed": 0, "sent_by_template": {"tmpl": 3}}
+        req, = fake_resend.requests
+        assert req["path"] == "/emails/batch"
+        assert req["headers"]["Authorization"] == "Bearer test-resend-key"
+        assert req["headers"]["Idempotency-Key"].startswith("test:bulk/")
+        assert [m["to"] for m in req["json"]] == [[j.email] for j in jobs]
+        ids = {l.resend_message_id for l in db.query(models.EmailLog).all()}
+        assert ids == {"re_0", "re_1", "re_2"}
+
+    def test_daily_quota_stops_bulk_send(self, db, fake_resend):
+        user = make_user(db, "rbq@test.com", "password123", "rbq")
+        fake_resend.quota_exceeded = True
+        result = email_dispatch.send_bulk(db, _jobs([user.id]), scope="test:quota")
+        assert result["sent"] == 0
+        assert "quota" in result["stopped_early"]
+        assert db.query(models.EmailLog).count() == 0
+
+
+class TestOnboardingRun:
+    """The onboarding run against the seeded email templates (email_seeds.py)."""
+
+    def _user(self, db, name, signup_days, sessions=0, quiet_days=None):
+        u = make_user(db, f"{name}@example.com", "password123", name)
+        u.created_at = datetime.utcnow() - timedelta(days=signup_days)
+        u.total_sessions = sessions
+        if quiet_days is not None:
+            u.last_study_date = datetime.utcnow() - timedelta(days=quiet_days)
+        db.commit()
+        return u
+
+    def test_selects_one_milestone_and_one_reengagement(self, db):
+        a = self._user(db, "onb_a", signup_days=8, sessions=1, quiet_days=3)
+        b = self._user(db, "onb_b", signup_days=1)
+        jobs = main._onboarding_email_jobs(db, datetime.utcnow())
+        assert [(j.user_id, j.template_key, j.label) for j in jobs] == [
+            (a.id, "day_3", "day3"), (a.id, "reengagement", "reengagement"),
+        ]
+        assert jobs[0].variables["name"] == "onb_a"
+        assert b.id not in {j.user_id for j in jobs}
+
+    def test_run_is_daily_and_resumable(self, db, fake_resend):
+        a = self._user(db, "onb_c", signup_days=8)
+        first = main._run_onboarding_emails(db, "onboarding:test")
+        assert first["sent"] == 1 and first["status"] == "completed"
+        again = main._run_onboarding_emails(db, "onboarding:test")
+        assert again["note"] == "already completed"
+        assert len(fake_resend.messages) == 1
+        assert db.query(models.EmailLog).filter_by(user_id=a.id).count() == 1
+
+    def test_resume_skips_users_emailed_earlier_in_the_run(self, db, fake_resend):
+        a = self._user(db, "onb_d", signup_days=8)
+        run = email_dispatch.begin(db, "onboarding:resume")
+        # Crash after user a got day_3 logged but before the checkpoint moved.
+        db.add(models.EmailLog(user_id=a.id, email=a.email, template_key="day_3"))
+        run.sent = 1
+        db.commit()
+        result = main._run_onboarding_emails(db, "onboarding:resume")
+        assert result["status"] == "completed"
+        # day_7 is now due too, but not twice in one run.
+        assert db.query(models.EmailLog).filter_by(user_id=a.id).count() == 1
@@ -0,0 +1,111 @@
+"""
+Unit tests for crud.get_user_groups — the set-based GET /groups listing.
+Includes a query-count regression guard: the listing must stay at a fixed
+number of statements however many groups and members are involved.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func
+
+import models
+import crud
+from tests.conftest import make_user
+
+
+def _count_statements(db, fn):
+    statements = []
+
+    def _capture(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", _capture)
+    try:
+        result = fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", _capture)
+    return result, statements
+
+
+def _expected_minutes(db, user_id, group):
+    q = db.query(func.sum(models.StudySession.duration_minutes)).filter(
+        models.StudySession.user_id == user_id,
+        models.StudySession.completed_at >= group.created_at,
+    )
+    if group.subject_id:
+        q = q.filter(models.StudySession.subject_id == group.subject_id)
+    return q.scalar() or 0
+
+
+def _populate(db, owner, n_groups, n_members, tag):
+    subject = models.Subject(name=f"subj_{tag}", display_name=f"Subj {tag}", is_default=True)
+    db.add(subject)
+    db.commit()
+    for g in range(n_groups):
+        group = crud.create_group(
+            db, owner.id, f"G{tag}{g}", 100, None,
+            subject_id=subject.id if g % 2 else None,
+        )
+        for m in range(n_members - 1):
+            u = make_user(db, f"m{tag}_{g}_{m}@t.com", "password123", f"m{tag}_{g}_{m}")
+            crud.join_group(db, u.id, group.id)
+            crud.create_study_session(db, u.id, 10 + m, subject_id=subject.id if m % 2 else None)
+    crud.create_study_session(db, owner.id, 30, subject_id=subject.id)
+
+
+class TestGetUserGroups:
+    def test_minutes_match_per_member_sums(self, db):
+        owner = make_user(db, "gl_owner@t.com", "password123", "gl_owner")
+        _populate(db, owner, n_groups=3, n_members=4, tag="a")
+        # A session completed before the group existed doesn't count.
+        early = models.StudySession(
+            user_id=owner.id, duration_minutes=500, coins_earned=0,
+            completed_at=datetime.utcnow() - timedelta(days=30),
+        )
+        db.add(early)
+        db.commit()
+
+        groups = crud.get_user_groups(db, owner.id)
+        assert [g["name"] for g in groups] == ["Ga0", "Ga1", "Ga2"]
+        for g in groups:
+            group = db.get(models.StudyGroup, g["id"])
+            assert g["subject"] == (group.subject.display_name if group.subject_id else None)
+            for mb in g["members"]:
+                assert mb["minutes_contributed"] == _expected_minutes(db, mb["user_id"], group)
+                assert mb["username"]
+            assert g["total_minutes"] == sum(mb["minutes_contributed"] for mb in g["members"])
+            assert g["goal_met"] == (g["total_minutes"] >= 100)
+            assert g["members"][0]["user_id"] == owner.id
+            assert g["members"][0]["role"] == "admin"
+
+    def test_no_groups(self, db):
+        user = make_user(db, "gl_none@t.com", "password123", "gl_none")
+        assert crud.get_user_groups(db, user.id) == []
+
+    def test_constant_query_count(self, db):
+        small = make_user(db, "gl_small@t.com", "password123", "gl_small")
+        _populate(db, small, n_groups=1, n_members=2, tag="s")
+        large = make_user(db, "gl_large@t.com", "password123", "gl_large")
+        _populate(db, large, n_groups=5, n_members=10, tag="l")
+        small_id, large_id = small.id, large.id
+        db.expire_all()
+
+        small_groups, small_sql = _count_statements(db, lambda: crud.get_user_groups(db, small_id))
+        db.expire_all()
+        large_groups, large_sql = _count_statements(db, lambda: crud.get_user_groups(db, large_id))
+
+        assert len(small_groups) == 1 and len(large_groups) == 5
+        assert sum(len(g["members"]) for g in large_groups) == 50
+        assert len(small_sql) == len(large_sql) <= 4
+
+    def test_days_after_creation_come_from_rollup(self, db):
+        owner = make_user(db, "gl_old@t.com", "password123", "gl_old")
+        group = crud.create_group(db, owner.id, "Old group", 100, None)
+        # Created two days ago: today's sessions are whole-day rollup minutes.
+        group.created_at = datetime.utcnow() - timedelta(days=2)
+        db.commit()
+        crud.create_study_session(db, owner.id, 40)
+
+        [listed] = crud.get_user_groups(db, owner.id)
+        assert listed["members"][0]["minutes_contributed"] == 40
+        assert listed["total_minutes"] == _expected_minutes(db, owner.id, group) == 40
@@ -0,0 +1,91 @@
+"""Unit tests for services/leader.py — scheduler leader election."""
+import threading
+
+from sqlalchemy import create_engine
+
+import main
+from services import leader
+from services.leader import LeaderLock, run_as_leader
+
+
+def _engine(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path / 'leader.db'}")
+
+
+class TestLeaderLock:
+    def test_only_one_holder_until_release(self, tmp_path):
+        engine = _engine(tmp_path)
+        first, second = LeaderLock(engine), LeaderLock(engine)
+        assert first.try_acquire() is True
+        assert second.try_acquire() is False
+        assert first.is_held() and not second.is_held()
+
+        first.release()
+        assert second.try_acquire() is True
+        second.release()
+
+    def test_lockfile_sits_next_to_sqlite_db(self, tmp_path):
+        lock = LeaderLock(_engine(tmp_path), name="jobs")
+        assert lock._lock_path == str(tmp_path / "leader.db.jobs.lock")
+
+    def test_advisory_key_is_stable_signed_64_bit(self):
+        key = leader._advisory_key("endura-scheduler")
+        assert key == leader._advisory_key("endura-scheduler")
+        assert -(2 ** 63) <= key < 2 ** 63
+        assert key != leader._advisory_key("other")
+
+
+class _FlakyLock:
+    """Lock stub: acquires on the first try, then reports it lost once."""
+
+    name = "stub"
+
+    def __init__(self, stop_event):
+        self.stop_event = stop_event
+        self.checks = 0
+        self.released = False
+
+    def try_acquire(self):
+        return True
+
+    def is_held(self):
+        self.checks += 1
+        if self.checks >= 2:
+            self.stop_event.set()
+        return self.checks != 1
+
+    def release(self):
+        self.released = True
+
+
+class TestRunAsLeader:
+    def test_starts_stops_on_loss_and_reacquires(self):
+        stop_event = threading.Event()
+        lock = _FlakyLock(stop_event)
+        calls = []
+        run_as_leader(lock, lambda: calls.append("start"), lambda: calls.append("stop"), stop_event, check_every=0)
+        # start → lost → stop → re-acquire → start → shutdown → stop
+        assert calls == ["start", "stop", "start", "stop"]
+        assert lock.released
+
+    def test_standby_never_starts(self, tmp_path):
+        engine = _engine(tmp_path)
+        holder = LeaderLock(engine)
+        assert holder.try_acquire()
+        stop_event = threading.Event()
+        calls = []
+        timer = threading.Timer(0.05, stop_event.set)
+        timer.start()
+        run_as_leader(LeaderLock(engine), lambda: calls.append("start"), lambda: None, stop_event, check_every=0.01)
+        assert calls == []
+        holder.release()
+
+
+class TestSchedulerSplit:
+    def test_cluster_jobs_live_in_the_worker_scheduler(self):
+        scheduler = main.build_scheduler()
+        ids = {job.id for job in scheduler.get_jobs()}
+        assert {"onboarding_emails", "lifecycle_pushes", "reap_stale_sessions",
+                "sync_app_ranks_am", "sweep_session_followups", "prune_leaderboard_standings"} <= ids
+        # Per-process buffer: every web worker flushes its own.
+        assert "flush_app_versions" not in ids
@@ -0,0 +1,114 @@
+"""Unit tests for services/metrics_snapshot.py — the /admin/overview snapshot."""
+from datetime import datetime, timedelta
+
+import pytest
+
+import main
+import models
+from services import metrics_snapshot
+from tests.conftest import make_user, admin_headers
+
+
+@pytest.fixture()
+def snapshots(monkeypatch):
+    """Reads serve the stored snapshot instead of rebuilding every time."""
+    monkeypatch.setattr(metrics_snapshot, "INLINE", False)
+
+
+def _session(db, user, started_at, minutes=25):
+    db.add(models.StudySession(
+        user_id=user.id, duration_minutes=minutes, coins_earned=10,
+        started_at=started_at, completed_at=started_at + timedelta(minutes=minutes),
+    ))
+    db.commit()
+
+
+def _day(payload, key, when):
+    return next(row for row in payload[key] if row["date"] == when.strftime("%Y-%m-%d"))
+
+
+def _refresh(db, full=False):
+    return metrics_snapshot.refresh(db, main._overview_funnel, full=full).payload
+
+
+class TestRefresh:
+    def test_incremental_rereads_open_days_only(self, db, snapshots):
+        now = datetime.utcnow()
+        old = (now - timedelta(days=10)).replace(hour=12)
+        if old.month < 4:
+            pytest.skip("overview series start on April 1")
+        u = make_user(db, "inc@example.com", username="inc")
+        _session(db, u, old)
+        assert _day(_refresh(db), "daily_sessions", old)["sessions"] == 1
+
+        # A backdated row on a closed day is only picked up by a full rebuild;
+        # today's row is picked up straight away.
+        _session(db, u, old + timedelta(hours=1))
+        _session(db, u, now)
+        payload = _refresh(db)
+        assert _day(payload, "daily_sessions", old)["sessions"] == 1
+        assert _day(payload, "daily_sessions", now) == {"date": now.strftime("%Y-%m-%d"), "sessions": 1, "minutes": 25}
+        assert payload["total_sessions"] == 3  # totals are always exact
+
+        assert _day(_refresh(db, full=True), "daily_sessions", old)["sessions"] == 2
+
+    def test_archived_users_excluded_by_flag(self, db):
+        now = datetime.utcnow()
+        real = make_user(db, "real@example.com", username="real")
+        test = make_user(db, "test@example.com", username="test")
+        test.is_archived = True
+        db.commit()
+        _session(db, real, now, minutes=30)
+        _session(db, test, now, minutes=45)
+        db.add(models.Task(user_id=test.id, title="x"))
+        db.commit()
+
+        payload = _refresh(db, full=True)
+        assert (payload["total_sessions"], payload["real_sessions"]) == (2, 1)
+        assert (payload["total_study_minutes"], payload["real_study_minutes"]) == (75, 30)
+        assert (payload["total_users"], payload["real_users"]) == (2, 1)
+        assert payload["total_tasks_created"] == 0
+
+    def test_archiving_forces_full_rebuild(self, client, db, snapshots):
+        now = datetime.utcnow()
+        old = (now - timedelta(days=10)).replace(hour=12)
+        if old.month < 4:
+            pytest.skip("overview series start on April 1")
+        u = make_user(db, "arch@example.com", username="arch")
+        db.add(models.Task(user_id=u.id, title="x", created_at=old))
+        db.commit()
+        assert _day(_refresh(db), "daily_tasks_created", old)["count"] == 1
+
+        client.delete(f"/admin/users/{u.id}", headers=admin_headers())
+        db.expire_all()
+        assert db.get(models.MetricsSnapshot, metrics_snapshot.SNAPSHOT_KEY).dirty_at is not None
+        assert _day(_refresh(db), "daily_tasks_created", old)["count"] == 0
+        assert db.get(models.MetricsSnapshot, metrics_snapshot.SNAPSHOT_KEY).dirty_at is None
+
+
+class TestCounters:
+    def test_write_paths_keep_headline_counters_live(self, client, db, snapshots):
+        first = client.get("/admin/overview", headers=admin_headers()).json()
+        assert first["total_users"] == 0
+
+        u = make_user(db, "live@example.com", username="live")
+        started = main.crud.start_study_session(db, u.id, 25)
+        main.crud.complete_study_session_by_id(db, started.id, u.id, 40)
+        assert metrics_snapshot.flush_counters(db) == 3
+
+        data = client.get("/admin/overview", headers=admin_headers()).json()
+        assert (data["total_users"], data["real_users"]) == (1, 1)
+        assert (data["total_sessions"], data["total_study_minutes"]) == (1, 40)
+        # The snapshot itself is untouched until the next refresh.
+        assert data["daily_sessions"][-1]["sessions"] == 0
+        assert data["snapshot"]["computed_at"] == first["snapshot"]["computed_at"]
+
+        fresh = client.get("/admin/overview?refresh=true", headers=admin_headers()).json()
+        assert fresh["daily_sessions"][-1]["sessions"] == 1
+        assert fresh["total_study_minutes"] == 40
+
+    def test_flush_skips_counters_before_first_snapshot(self, db):
+        metrics_snapshot.bump("total_users")
+        metrics_snapshot.flush_counters(db)
+        assert db.query(models.MetricsCounter).count() == 0
+        assert metrics_snapshot.flush_counters(db) == 0
@@ -1,12 +1,13 @@
 """Unit tests for services/push.py — push service logic without real network calls."""
 import pytest
 from unittest.mock import patch, MagicMock
-from datetime import datetime
+from datetime import datetime, timedelta
 
 import models
 from services.push import (
     is_valid_expo_token, _user_can_receive, CATEGORY_PREF_COLUMN,
-    send_to_user,
+    send_to_user, send_batch, broadcast_to_users, poll_receipts,
+    PushItem, EXPO_RECEIPTS_URL,
 )
 from tests.conftest import make_user
 
@@ -126,3 +127,108 @@ class TestSendToUser:
         send_to_user(db, user, title="Test", body="Body", category="badge")
         db.refresh(user)
         assert user.push_token is None
+
+
+def _tickets_for(url, json=None, **_):
+    """Expo stub: one ticket per message; tokens containing 'dead' fail."""
+    resp = MagicMock()
+    resp.json.return_value = {"data": [
+        {"status": "error", "details": {"error": "DeviceNotRegistered"}, "message": "gone"}
+        if "dead" in m["to"] else {"status": "ok", "id": f"t-{m['to']}"}
+        for m in json
+    ]}
+    return resp
+
+
+def _users_with_tokens(db, n, prefix="bulk"):
+    users = []
+    for i in range(n):
+        u = make_user(db, f"{prefix}{i}@test.com", "password123", f"{prefix}{i}")
+        u.push_token = f"ExponentPushToken[{prefix}{i}]"
+        u.notification_enabled = True
+        users.append(u)
+    db.commit()
+    return users
+
+
+class TestBroadcast:
+    def test_batches_share_one_client_and_log_in_bulk(self, db, mock_push_service):
+        users = _users_with_tokens(db, 7)
+        users[3].push_token = "ExponentPushToken[dead3]"
+        users[5].notif_marketing_enabled = False
+        db.commit()
+        mock_push_service.post.side_effect = _tickets_for
+
+        with patch("services.push.MAX_BATCH", 2):
+            result = broadcast_to_users(db, users, title="Hi", body="There", category="campaign")
+
+        assert result == {"sent": 5, "failed": 1, "dropped": 1, "total": 7}
+        assert mock_push_service.post.call_count == 3  # 6 eligible / batches of 2
+        import services.push as push_module
+        assert push_module.httpx.Client.call_count == 1
+
+        statuses = sorted(s for (s,) in db.query(models.PushLog.status).all())
+        assert statuses == ["dropped", "failed"] + ["sent"] * 5
+        db.refresh(users[3])
+        assert users[3].push_token is None
+        db.refresh(users[0])
+        assert users[0].push_token is not None
+
+    def test_network_error_fails_only_that_batch(self, db, mock_push_service):
+        users = _users_with_tokens(db, 4)
+        bad_token = users[0].push_token
+
+        def flaky(url, json=None, **kw):
+            if any(m["to"] == bad_token for m in json):
+                raise RuntimeError("boom")
+            return _tickets_for(url, json=json)
+
+        mock_push_service.post.side_effect = flaky
+        with patch("services.push.MAX_BATCH", 2):
+            result = send_batch(db, [PushItem(u, "T", "B") for u in users])
+
+        assert (result["sent"], result["failed"]) == (2, 2)
+        assert [r["status"] for r in result["results"]] == ["failed", "failed", "sent", "sent"]
+        errors = {c for (c,) in db.query(models.PushLog.error_code).filter(models.PushLog.status == "failed")}
+        assert errors == {"network_error"}
+
+
+class TestPollReceipts:
+    def _log_sent(self, db, user, ticket, age_minutes):
+        db.add(models.PushLog(
+            user_id=user.id, push_token=user.push_token, status="sent",
+            expo_ticket_id=ticket, sent_at=datetime.utcnow() - timedelta(minutes=age_minutes),
+        ))
+        db.commit()
+
+    def test_marks_delivered_failed_and_clears_dead_tokens(self, db, mock_push_service):
+        ok_user, dead_user = _users_with_tokens(db, 2, prefix="rcpt")
+        self._log_sent(db, ok_user, "tok-ok", 30)
+        self._log_sent(db, dead_user, "tok-dead", 30)
+        self._log_sent(db, ok_user, "tok-later", 30)  # receipt not ready yet
+        self._log_sent(db, ok_user, "tok-fresh", 5)   # too young to poll
+        mock_push_service.post.return_value.json.return_value = {"data": {
+            "tok-ok": {"status": "ok"},
+            "tok-dead": {"status": "error", "message": "gone", "details": {"error": "DeviceNotRegistered"}},
+        }}
+
+        result = poll_receipts(db)
+
+        assert result == {"checked": 3, "delivered": 1, "failed": 1, "pending": 1}
+        url, = mock_push_service.post.call_args.args
+        assert url == EXPO_RECEIPTS_URL
+        assert sorted(mock_push_service.post.call_args.kwargs["json"]["ids"]) == ["tok-dead", "tok-later", "tok-ok"]
+        by_ticket = {l.expo_ticket_id: l for l in db.query(models.PushLog).all()}
+        assert by_ticket["tok-ok"].status == "delivered"
+        assert by_ticket["tok-dead"].status == "failed"
+        assert by_ticket["tok-dead"].error_code == "DeviceNotRegistered"
+        assert by_ticket["tok-later"].status == "sent"
+        db.refresh(dead_user)
+        db.refresh(ok_user)
+        assert dead_user.push_token is None
+        assert ok_user.push_token is not None
+
+        # Resolved rows are not polled again.
+        mock_push_service.post.reset_mock()
+        mock_push_service.post.return_value.json.return_value = {"data": {}}
+        assert poll_receipts(db)["checked"] == 1
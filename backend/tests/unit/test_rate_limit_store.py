@@ -0,0 +1,105 @@
+"""Unit tests for services/rate_limit_store.py — the shared slowapi storage."""
+import pytest
+from limits import parse
+from limits.strategies import SlidingWindowCounterRateLimiter
+from sqlalchemy import create_engine
+
+import main
+import models
+from services import rate_limit_store
+from services.rate_limit_store import DBStorage
+from tests.conftest import admin_headers
+
+
+@pytest.fixture()
+def engine(tmp_path):
+    eng = create_engine(f"sqlite:///{tmp_path / 'limits.db'}")
+    models.RateLimitCounter.__table__.create(eng)
+    rate_limit_store.reset_stats()
+    yield eng
+    eng.dispose()
+
+
+class _Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestCounters:
+    def test_incr_is_cumulative_and_restarts_after_expiry(self, engine, monkeypatch):
+        clock = _Clock(1_000.0)
+        monkeypatch.setattr(rate_limit_store.time, "time", clock)
+        store = DBStorage(engine=engine)
+        assert store.incr("k", 60) == 1
+        assert store.incr("k", 60, amount=2) == 3
+        assert store.get("k") == 3
+
+        clock.now += 61
+        assert store.get("k") == 0
+        assert store.incr("k", 60) == 1
+        assert store.get_expiry("k") == clock.now + 60
+
+    def test_sweep_deletes_only_expired(self, engine, monkeypatch):
+        clock = _Clock(1_000.0)
+        monkeypatch.setattr(rate_limit_store.time, "time", clock)
+        store = DBStorage(engine=engine)
+        store.incr("old", 10)
+        store.incr("new", 100)
+        clock.now += 50
+        assert store.sweep() == 1
+        assert store.get("new") == 1
+        assert rate_limit_store.stats()["sweeps"]["deleted"] == 1
+
+
+class TestSlidingWindow:
+    def test_workers_share_one_limit(self, engine):
+        # Two storages on one database stand in for two Uvicorn workers.
+        limit = parse("3/minute")
+        worker_a = SlidingWindowCounterRateLimiter(DBStorage(engine=engine))
+        worker_b = SlidingWindowCounterRateLimiter(DBStorage(engine=engine))
+        key = ("1.2.3.4", "/auth/login")
+        assert worker_a.hit(limit, *key)
+        assert worker_b.hit(limit, *key)
+        assert worker_a.hit(limit, *key)
+        assert not worker_b.hit(limit, *key)
+        assert worker_a.hit(limit, "5.6.7.8", "/auth/login")
+
+        routes = rate_limit_store.stats()["routes"]
+        assert routes["/auth/login"] == {"allowed": 4, "blocked": 1}
+
+    def test_previous_window_is_weighted(self, engine, monkeypatch):
+        clock = _Clock(600.0)  # start of a 60s window
+        monkeypatch.setattr(rate_limit_store.time, "time", clock)
+        limiter = SlidingWindowCounterRateLimiter(DBStorage(engine=engine))
+        limit = parse("4/minute")
+        for _ in range(4):
+            assert limiter.hit(limit, "ip", "route")
+        # 45s into the next window a quarter of the old count still applies.
+        clock.now = 705.0
+        assert limiter.hit(limit, "ip", "route")
+        assert limiter.hit(limit, "ip", "route")
+        assert limiter.hit(limit, "ip", "route")
+        assert not limiter.hit(limit, "ip", "route")
+
+
+class TestLimiterWiring:
+    def test_login_limit_uses_shared_store(self, client, db):
+        main.limiter.enabled = True
+        try:
+            codes = [
+                client.post("/auth/login", json={"email": "nobody@example.com", "password": "wrong-pass"}).status_code
+                for _ in range(11)
+            ]
+        finally:
+            main.limiter.enabled = False
+        assert codes[:10] == [401] * 10
+        assert codes[10] == 429
+        keys = [k for (k,) in db.query(models.RateLimitCounter.key).all()]
+        assert keys and all("/auth/login/" in k for k in keys)
+
+        stats = client.get("/admin/rate-limits", headers=admin_headers()).json()
+        assert stats["storage"] == "endura-db"
+        assert stats["routes"]["/auth/login"] == {"allowed": 10, "blocked": 1}
@@ -0,0 +1,76 @@
+"""Unit tests for services/response_cache.py — ETag'd public responses."""
+import pytest
+
+import crud
+import models
+from services import response_cache
+from tests.conftest import admin_headers
+
+
+class TestRespond:
+    def test_etag_and_not_modified(self, client):
+        first = client.get("/animals")
+        assert first.status_code == 200
+        etag = first.headers["etag"]
+        assert etag.startswith('"') and first.headers["cache-control"] == "public, max-age=60"
+
+        again = client.get("/animals", headers={"If-None-Match": f'"other", W/{etag}'})
+        assert again.status_code == 304 and again.content == b""
+        assert again.headers["etag"] == etag
+        assert client.get("/animals", headers={"If-None-Match": '"other"'}).json() == first.json()
+        assert response_cache.stats() == {"hits": 2, "misses": 1, "not_modified": 1, "entries": 1}
+
+    def test_matches_response_model_output(self, client, db):
+        names = sorted(a.name for a in db.query(models.Animal))
+        body = client.get("/animals").json()
+        assert sorted(a["name"] for a in body) == names
+        assert set(body[0]) == {"id", "name", "species", "rarity", "conservation_status", "description", "image_url"}
+        subjects = client.get("/subjects").json()
+        assert subjects and all(s["is_default"] for s in subjects)
+
+    def test_admin_writes_invalidate(self, client, db):
+        before = client.get("/animals").json()
+        db.add(models.Animal(name="Sneaky Sloth", species="x", rarity="common"))
+        db.commit()
+        assert client.get("/animals").json() == before  # served from cache
+
+        r = client.post("/admin/animals", json={"name": "Snow Leopard", "rarity": "rare"}, headers=admin_headers())
+        assert r.status_code == 200
+        names = {a["name"] for a in client.get("/animals").json()}
+        assert {"Sneaky Sloth", "Snow Leopard"} <= names
+
+    def test_species_created_by_a_session_invalidates(self, client, db, alice):
+        client.get("/animals")
+        crud.create_study_session(db, alice.id, 25, animal_name="Quokka Prime")
+        assert "Quokka Prime" in {a["name"] for a in client.get("/animals").json()}
+
+    def test_query_string_is_part_of_key_and_ttl_expires(self, client, monkeypatch):
+        client.get("/shop/items")
+        client.get("/shop/items?v=2")
+        assert response_cache.stats()["entries"] == 2
+
+        monkeypatch.setattr(response_cache, "TTL_SECONDS", 0)
+        response_cache.reset()
+        client.get("/shop/items")
+        client.get("/shop/items")
+        assert response_cache.stats()["misses"] == 2
+
+    def test_invalidation_during_build_is_not_stored(self, client):
+        from fastapi import Request
+
+        scope = {"type": "http", "method": "GET", "path": "/x", "query_string": b"", "headers": []}
+
+        def build():
+            response_cache.invalidate("t")
+            return {"v": 1}
+
+        response_cache.respond(Request(scope), "t", build)
+        assert response_cache.stats()["entries"] == 0
+        response_cache.respond(Request(scope), "t", lambda: {"v": 1})
+        assert response_cache.stats()["entries"] == 1
+
+    @pytest.mark.parametrize("header,expected", [
+        (None, False), ("*", True), ('"a"', True), ('W/"a"', True), ('"b", "a"', True), ('"b"', False),
+    ])
+    def test_if_none_match_parsing(self, header, expected):
+        assert response_cache._matches(header, '"a"') is expected
@@ -0,0 +1,84 @@
+"""Unit tests for services/school_clusters.py — /admin/schools/similar clustering."""
+import json
+import random
+from pathlib import Path
+
+import pytest
+
+from main import _normalize_school_name
+from services.school_clusters import _lcs, _char_positions, cluster, cluster_pairwise
+from tests.conftest import make_user, admin_headers
+
+BACKEND = Path(__file__).resolve().parents[2]
+
+
+def _bundled(filename, n, seed=7):
+    names = sorted({_normalize_school_name(s["name"]) for s in json.loads((BACKEND / filename).read_text())})
+    return random.Random(seed).sample(names, n)
+
+
+def _typos(rng, n):
+    """Names with typo-style variants, so clusters actually form."""
+    bases = ["st mary's primary school", "kingswood academy", "royal college colombo",
+             "delhi public school", "ucl", "a", ""]
+    out = []
+    for _ in range(n):
+        s = list(rng.choice(bases))
+        for _ in range(rng.randint(0, 3)):
+            op, k = rng.random(), rng.randint(0, len(s))
+            if op < 0.4:
+                s.insert(k, rng.choice("aeiost "))
+            elif s and op < 0.8:
+                del s[min(k, len(s) - 1)]
+            elif s:
+                s[min(k, len(s) - 1)] = rng.choice("xyz")
+        out.append("".join(s))
+    return out
+
+
+class TestCluster:
+    @pytest.mark.parametrize("threshold", [0.5, 0.7, 0.82, 0.9, 1.0])
+    def test_matches_pairwise_on_variants(self, threshold):
+        norms = _typos(random.Random(threshold), 300)
+        assert cluster(norms, threshold) == cluster_pairwise(norms, threshold)
+
+    @pytest.mark.parametrize("filename", ["uk_schools.json", "india_schools.json", "srilanka_schools.json"])
+    def test_matches_pairwise_on_bundled_schools(self, filename):
+        norms = _bundled(filename, 200)
+        # Same names with a dropped character, so every one has a partner.
+        norms += [n[:len(n) // 2] + n[len(n) // 2 + 1:] for n in norms[:60]]
+        assert cluster(norms, 0.82) == cluster_pairwise(norms, 0.82)
+
+    def test_edge_thresholds_and_duplicates(self):
+        norms = ["abc", "abc", "abd", "", "", "xyz"]
+        for threshold in (-1.0, 0.0, 0.3, 1.0, 1.5, float("inf"), float("nan")):
+            assert cluster(norms, threshold) == cluster_pairwise(norms, threshold)
+        assert cluster(norms, 1.5) == [[0, 1], [3, 4]]
+        assert cluster(["only"], 0.8) == []
+
+    def test_lcs(self):
+        assert _lcs("kingswood", _char_positions("kingwood"), 8) == 8
+        assert _lcs("abc", _char_positions("xyz"), 3) == 0
+        assert _lcs("", _char_positions("abc"), 3) == 0
+
+
+class TestSimilarEndpoint:
+    def test_clusters_variants_within_country(self, client, db):
+        for i, (school, country) in enumerate([
+            ("Kingswood Academy", "UK"), ("Kingswood Academy", "UK"),
+            ("Kingswod Academy", "UK"), ("Kingswood Academy ", "India"),
+            ("Delhi Public School", "India"),
+        ]):
+            user = make_user(db, f"u{i}@example.com", "password123", f"user{i}")
+            user.school, user.country = school, country
+        db.commit()
+
+        r = client.get("/admin/schools/similar", headers=admin_headers())
+        assert r.status_code == 200
+        body = r.json()
+        assert body["similar_clusters"] == 1
+        (found,) = body["clusters"]
+        assert found["country"] == "UK"
+        assert found["canonical_suggestion"] == "Kingswood Academy"
+        assert [v["name"] for v in found["variants"]] == ["Kingswood Academy", "Kingswod Academy"]
+        assert found["total_users"] == 3
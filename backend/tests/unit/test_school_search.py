@@ -0,0 +1,73 @@
+"""Unit tests for services/school_search.py — the /schools/search index."""
+import models
+from services import school_search
+from services.school_search import SchoolIndex, normalize
+from tests.conftest import make_user, admin_headers
+
+ROWS = [
+    ("St. John's College", "Oxford", None, "UK"),
+    ("Oxford High School", "Oxford", None, "UK"),
+    ("Johnston Academy", "Leeds", None, "UK"),
+    ("Ratnapura St. Johns M.V.", None, None, "Sri Lanka"),
+    ("Bedford Modern School", "Bedford", None, "UK"),
+    ("École Française", None, None, "France"),
+]
+
+
+def _names(results):
+    return [r["name"] for r in results]
+
+
+class TestSchoolIndex:
+    def test_normalize(self):
+        assert normalize("  St. John’s  Académie ") == "st john s academie"
+
+    def test_token_prefix_any_order(self):
+        idx = SchoolIndex(ROWS)
+        assert set(_names(idx.search("john st"))) == {"St. John's College", "Ratnapura St. Johns M.V."}
+
+    def test_starts_with_ranks_before_token_and_substring(self):
+        idx = SchoolIndex(ROWS)
+        assert _names(idx.search("ox")) == ["Oxford High School"]
+        # "ford" is only a substring of Oxford / Bedford.
+        assert set(_names(idx.search("ford"))) == {"Oxford High School", "Bedford Modern School"}
+        assert _names(idx.search("john"))[:1] == ["Johnston Academy"]
+
+    def test_popularity_breaks_ties(self):
+        idx = SchoolIndex(ROWS, popularity={normalize("Ratnapura St. Johns M.V."): 5})
+        assert _names(idx.search("john st")) == ["Ratnapura St. Johns M.V.", "St. John's College"]
+
+    def test_accents_and_short_queries(self):
+        idx = SchoolIndex(ROWS)
+        assert _names(idx.search("ecole fr")) == ["École Française"]
+        assert idx.search("e") == []
+        assert idx.search("zzz") == []
+
+    def test_limit(self):
+        idx = SchoolIndex([(f"School {i}", None, None, "UK") for i in range(50)])
+        assert len(idx.search("school", limit=20)) == 20
+
+
+class TestSearchEndpoint:
+    def test_search_uses_index_and_refreshes_after_cleanup(self, client, db, alice, alice_headers):
+        db.add_all([models.School(name=n, city=c, region=r, country=k) for n, c, r, k in ROWS])
+        db.add(models.School(name="Oxford High School", city="Oxford", country="UK"))
+        db.commit()
+        bob = make_user(db, "bob@example.com", "password123", "bob")
+        alice.school = bob.school = "Oxford High School"
+        db.commit()
+
+        r = client.get("/schools/search", params={"q": "oxf"}, headers=alice_headers)
+        assert r.status_code == 200
+        assert r.json()[0] == {"name": "Oxford High School", "city": "Oxford", "region": None, "country": "UK"}
+        assert len(r.json()) == 2  # duplicate row, merged by cleanup below
+
+        client.post("/admin/schools/cleanup", headers=admin_headers())
+        assert len(client.get("/schools/search", params={"q": "oxf"}, headers=alice_headers).json()) == 1
+
+    def test_falls_back_to_db_before_first_build(self, db, monkeypatch):
+        db.add(models.School(name="Bedford Modern School", country="UK"))
+        db.commit()
+        monkeypatch.setattr(school_search, "INLINE", False)
+        monkeypatch.setattr(school_search, "_refresh_in_background", lambda: None)
+        assert _names(school_search.search(db, "dford")) == ["Bedford Modern School"]
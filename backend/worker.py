@@ -0,0 +1,50 @@
+"""Scheduler worker: runs the cron jobs outside the web process.
+
+The jobs in `main.build_scheduler` (onboarding emails, lifecycle pushes,
+app-rank sync, stale session reaper, ...) used to run inside Uvicorn and
+shared its CPU, GIL and DB pool with request handlers. Run them here
+instead; the web tier can then scale to any number of Uvicorn workers.
+
+Usage:
+    python -m worker          # from backend/
+
+Any number of copies may run (e.g. during a rolling deploy): they elect a
+leader through services/leader.py and only the leader's scheduler fires.
+The rest check every LEADER_CHECK_SECONDS and take over if it goes away.
+
+Required env: the same as the web service (DATABASE_URL, RESEND_API_KEY,
+...). The web service runs the same leader loop unless RUN_SCHEDULER_IN_WEB=0;
+set that on the web service once this worker is deployed, so the crons
+leave the API process. Leaving it on is harmless (same leader lock).
+"""
+from __future__ import annotations
+
+import logging
+import signal
+import threading
+
+
+def main() -> int:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    # Importing main wires up models, services and Sentry exactly as the
+    # web process does; it doesn't serve anything.
+    from main import run_leader_scheduler
+    from services import push as push_service
+
+    stop_event = threading.Event()
+
+    def _shutdown(signum, _frame):
+        logging.getLogger("worker").info(f"Signal {signum}: stopping scheduler")
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, _shutdown)
+    signal.signal(signal.SIGINT, _shutdown)
+    try:
+        run_leader_scheduler(stop_event)
+    finally:
+        push_service.close_client()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())